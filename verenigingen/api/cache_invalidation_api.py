@@ -199,7 +199,8 @@ def test_cache_invalidation_system():
             {
                 "test_name": "single_document_invalidation",
                 "passed": "error" not in test1_result,
-                "patterns_invalidated": len(test1_result.get("patterns_invalidated", [])),
+                "tags_invalidated": len(test1_result.get("tags_invalidated", [])),
+                "keys_invalidated": test1_result.get("keys_invalidated", 0),
                 "execution_time": test1_result.get("performance_impact", {}).get("execution_time", 0),
             }
         )
@@ -301,8 +302,8 @@ def get_invalidation_patterns():
                 for op_type, strategy in invalidation_manager.INVALIDATION_STRATEGIES.items()
             },
             "supported_doctypes": list(invalidation_manager.INVALIDATION_PATTERNS.keys()),
-            "total_patterns": sum(
-                len(config.get("patterns", []))
+            "total_dependencies": sum(
+                len(config.get("dependent_doctypes", []))
                 for config in invalidation_manager.INVALIDATION_PATTERNS.values()
             ),
         }
@@ -4,13 +4,20 @@ Implements robust mechanisms to prevent double debiting and duplicate processing
 """
 
 import hashlib
-import time
+from itertools import islice
 from typing import Dict, List
 
 import frappe
 from frappe import _
 from frappe.utils import flt, getdate
 
+from verenigingen.utils.amount_combinations import (
+    DEFAULT_TOLERANCE,
+    expand_equal_amounts,
+    find_amount_combinations,
+    to_cents,
+)
+from verenigingen.utils.distributed_lock import DistributedLock
 from verenigingen.utils.security.api_security_framework import (
     OperationType,
     critical_api,
@@ -19,6 +26,9 @@ from verenigingen.utils.security.api_security_framework import (
 )
 from verenigingen.utils.security.audit_logging import log_sensitive_operation
 
+# Most combinations identify_split_payment_scenario and identify_partial_success_items list
+MAX_MATCH_ALTERNATIVES = 100
+
 # =============================================================================
 # DUPLICATE PAYMENT PREVENTION
 # =============================================================================
@@ -179,7 +189,8 @@ def check_return_file_processed(return_file_hash: str) -> None:
 # PROCESSING LOCKS
 # =============================================================================
 
-_processing_locks = {}  # In-memory locks for testing; use Redis in production
+# Locks acquired by this process, by lock key, so they can be released by their owner
+_held_processing_locks: Dict[str, DistributedLock] = {}
 
 
 @high_security_api(operation_type=OperationType.FINANCIAL)
@@ -187,6 +198,9 @@ def acquire_processing_lock(resource_type: str, resource_id: str, timeout: int =
     """
     Acquire processing lock to prevent concurrent operations
 
+    The lock is shared by all workers and expires after the timeout if the
+    holder never releases it.
+
     Args:
         resource_type: Type of resource (e.g., 'sepa_batch', 'bank_transaction')
         resource_id: Unique identifier for resource
@@ -196,28 +210,25 @@ def acquire_processing_lock(resource_type: str, resource_id: str, timeout: int =
         True if lock acquired, False otherwise
     """
     lock_key = f"{resource_type}:{resource_id}"
-    current_time = time.time()
-
-    # Check if lock exists and is still valid
-    if lock_key in _processing_locks:
-        lock_time = _processing_locks[lock_key]
-        if current_time - lock_time < timeout:
-            return False  # Lock still active
-        else:
-            # Lock expired, remove it
-            del _processing_locks[lock_key]
-
-    # Acquire new lock
-    _processing_locks[lock_key] = current_time
+    lock = DistributedLock([lock_key], ttl=timeout, wait=0, auto_renew=False)
+
+    try:
+        if not lock.acquire():
+            return False
+    except Exception as e:
+        frappe.log_error(f"Could not acquire processing lock {lock_key}: {str(e)}", "SEPA Processing Lock")
+        return False
+
+    _held_processing_locks[lock_key] = lock
     return True
 
 
 @high_security_api(operation_type=OperationType.FINANCIAL)
 def release_processing_lock(resource_type: str, resource_id: str) -> None:
     """Release processing lock"""
-    lock_key = f"{resource_type}:{resource_id}"
-    if lock_key in _processing_locks:
-        del _processing_locks[lock_key]
+    lock = _held_processing_locks.pop(f"{resource_type}:{resource_id}", None)
+    if lock:
+        lock.release()
 
 
 # =============================================================================
@@ -308,7 +319,10 @@ def identify_split_payment_scenario(bank_transaction) -> List[Dict]:
         bank_transaction: Bank transaction document
 
     Returns:
-        List of possible batch combinations
+        List of possible batch combinations, fewest batches first. Batches
+        with equal totals cannot be told apart by the amount received, so
+        every choice among them is listed, up to MAX_MATCH_ALTERNATIVES
+        combinations.
     """
     transaction_amount = flt(bank_transaction.deposit)
     transaction_date = bank_transaction.date
@@ -327,41 +341,20 @@ def identify_split_payment_scenario(bank_transaction) -> List[Dict]:
         fields=["name", "total_amount", "batch_date", "entry_count"],
     )
 
-    # Find combinations that sum to transaction amount
-    valid_combinations = []
-
-    def find_combinations(batches, target_amount, current_combination=None, start_index=0):
-        if current_combination is None:
-            current_combination = []
-
-        current_sum = sum(batch["total_amount"] for batch in current_combination)
-
-        # Check if we've found a valid combination
-        if amounts_match_with_tolerance(current_sum, target_amount):
-            valid_combinations.append(
-                {
-                    "batches": current_combination.copy(),
-                    "total_amount": current_sum,
-                    "batch_count": len(current_combination),
-                }
-            )
-            return
-
-        # If sum exceeds target, stop exploring this path
-        if current_sum > target_amount:
-            return
-
-        # Try adding each remaining batch
-        for i in range(start_index, len(batches)):
-            batch = batches[i]
-            current_combination.append(batch)
-            find_combinations(batches, target_amount, current_combination, i + 1)
-            current_combination.pop()
+    # Find the combinations that sum to the transaction amount, fewest batches first
+    amounts = [batch["total_amount"] for batch in potential_batches]
+    combinations = find_amount_combinations(amounts, transaction_amount)
 
-    find_combinations(potential_batches, transaction_amount)
-
-    # Sort by preference (fewer batches preferred)
-    valid_combinations.sort(key=lambda x: x["batch_count"])
+    valid_combinations = []
+    for combination in islice(expand_equal_amounts(amounts, combinations), MAX_MATCH_ALTERNATIVES):
+        batches = [potential_batches[index] for index in combination]
+        valid_combinations.append(
+            {
+                "batches": batches,
+                "total_amount": sum(flt(batch["total_amount"]) for batch in batches),
+                "batch_count": len(batches),
+            }
+        )
 
     return valid_combinations
 
@@ -381,35 +374,32 @@ def identify_partial_success_items(batch_items: List[Dict], received_amount: flo
         received_amount: Amount actually received
 
     Returns:
-        List of possible item combinations
+        List of possible item combinations, ordered by the fewest items on
+        the smaller side (returned or collected). Items with equal amounts
+        cannot be told apart by the amount received, so every choice among
+        them is listed, up to MAX_MATCH_ALTERNATIVES combinations.
     """
-    valid_combinations = []
-
-    def find_item_combinations(items, target_amount, current_combination=None, start_index=0):
-        if current_combination is None:
-            current_combination = []
-
-        current_sum = sum(flt(item["amount"]) for item in current_combination)
-
-        # Check if we've found a valid combination
-        if amounts_match_with_tolerance(current_sum, target_amount):
-            valid_combinations.append(current_combination.copy())
-            return
+    amounts = [item["amount"] for item in batch_items]
+    returned_amount = sum(to_cents(amount) for amount in amounts) / 100 - flt(received_amount)
 
-        # If sum exceeds target, stop exploring this path
-        if current_sum > target_amount:
-            return
+    if abs(returned_amount) <= DEFAULT_TOLERANCE:
+        return [list(batch_items)]
 
-        # Try adding each remaining item
-        for i in range(start_index, len(items)):
-            item = items[i]
-            current_combination.append(item)
-            find_item_combinations(items, target_amount, current_combination, i + 1)
-            current_combination.pop()
+    # Search whichever side is smaller: usually only a few items are returned
+    returned_side = 0 < returned_amount < flt(received_amount)
+    combinations = find_amount_combinations(amounts, returned_amount if returned_side else received_amount)
+    alternatives = islice(expand_equal_amounts(amounts, combinations), MAX_MATCH_ALTERNATIVES)
 
-    find_item_combinations(batch_items, received_amount)
+    if returned_side:
+        valid_combinations = []
+        for combination in alternatives:
+            returned = set(combination)
+            valid_combinations.append(
+                [item for index, item in enumerate(batch_items) if index not in returned]
+            )
+        return valid_combinations
 
-    return valid_combinations
+    return [[batch_items[index] for index in combination] for combination in alternatives]
 
 
 # =============================================================================
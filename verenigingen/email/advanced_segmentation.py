@@ -13,7 +13,7 @@ from typing import Dict, List, Optional, Set
 
 import frappe
 from frappe import _
-from frappe.utils import add_days, getdate, now_datetime
+from frappe.utils import add_days, cint, getdate, now_datetime
 
 
 class AdvancedSegmentationManager:
@@ -146,26 +146,35 @@ class AdvancedSegmentationManager:
         except Exception as e:
             return {"success": False, "error": str(e)}
 
-    def _get_built_in_segment_recipients(
-        self, segment_id: str, chapter_name: str = None, additional_filters: Dict = None
-    ) -> Dict:
-        """Get recipients for built-in segments"""
+    def get_segment_conditions(self, segment_id: str, chapter_name: str = None) -> tuple:
+        """
+        Build the WHERE conditions (aliased on ``m`` = tabMember) for a built-in segment
+
+        Shared by the recipient queries below and by the bitmap segment engine, so
+        both always agree on who belongs to a segment.
+
+        Args:
+            segment_id: Built-in segment identifier
+            chapter_name: Chapter name filter (optional)
+
+        Returns:
+            Tuple of (list of SQL conditions, dict of query values)
+        """
         segment_def = self.built_in_segments[segment_id]
         query_type = segment_def["query_type"]
         criteria = segment_def["criteria"]
 
-        base_conditions = [
+        conditions = [
             "m.status = 'Active'",
             "m.email IS NOT NULL",
             "m.email != ''",
             "(m.opt_out_optional_emails IS NULL OR m.opt_out_optional_emails = 0)",
         ]
-
         values = {}
 
         # Add chapter filter if specified
         if chapter_name:
-            base_conditions.append(
+            conditions.append(
                 """
                 EXISTS (
                     SELECT 1 FROM `tabChapter Member` cm
@@ -177,6 +186,70 @@ class AdvancedSegmentationManager:
             )
             values["chapter"] = chapter_name
 
+        if query_type == "date_range":
+            date_value = criteria[list(criteria.keys())[0]]["value"]
+            if date_value == "30_days_ago":
+                conditions.append("m.creation >= DATE_SUB(NOW(), INTERVAL 30 DAY)")
+            elif date_value == "2_years_ago":
+                conditions.append("m.creation <= DATE_SUB(NOW(), INTERVAL 2 YEAR)")
+
+        elif query_type == "volunteer_status":
+            conditions.append(
+                """
+                EXISTS (
+                    SELECT 1 FROM `tabVolunteer` v
+                    WHERE v.member = m.name
+                    AND v.status = 'Active'
+                )
+            """
+            )
+
+        elif query_type == "board_member":
+            conditions.append(
+                """
+                EXISTS (
+                    SELECT 1 FROM `tabChapter Board Member` cbm
+                    INNER JOIN `tabVolunteer` v ON cbm.volunteer = v.name
+                    WHERE v.member = m.name
+                    AND cbm.is_active = 1
+                    AND (cbm.to_date IS NULL OR cbm.to_date >= CURDATE())
+                )
+            """
+            )
+
+        elif query_type == "donation_history":
+            exists_clause = "EXISTS" if criteria["has_donated"]["value"] else "NOT EXISTS"
+            conditions.append(
+                f"""
+                {exists_clause} (
+                    SELECT 1 FROM `tabDonation` d
+                    WHERE d.donor = m.name
+                    AND d.docstatus = 1
+                )
+            """
+            )
+
+        elif query_type == "age_range":
+            age_operator = criteria["age"]["operator"]
+            age_value = int(criteria["age"]["value"])
+
+            # Calculate birth date range
+            if age_operator == "<":
+                conditions.append(f"m.birth_date > DATE_SUB(CURDATE(), INTERVAL {age_value} YEAR)")
+            elif age_operator == ">=":
+                conditions.append(f"m.birth_date <= DATE_SUB(CURDATE(), INTERVAL {age_value} YEAR)")
+            conditions.append("m.birth_date IS NOT NULL")
+
+        return conditions, values
+
+    def _get_built_in_segment_recipients(
+        self, segment_id: str, chapter_name: str = None, additional_filters: Dict = None
+    ) -> Dict:
+        """Get recipients for built-in segments"""
+        segment_def = self.built_in_segments[segment_id]
+        query_type = segment_def["query_type"]
+        base_conditions, values = self.get_segment_conditions(segment_id, chapter_name)
+
         # Build query based on segment type
         if query_type == "engagement":
             # This would require engagement scores to be calculated
@@ -193,12 +266,6 @@ class AdvancedSegmentationManager:
             )
 
         elif query_type == "date_range":
-            date_value = criteria[list(criteria.keys())[0]]["value"]
-            if date_value == "30_days_ago":
-                base_conditions.append("m.creation >= DATE_SUB(NOW(), INTERVAL 30 DAY)")
-            elif date_value == "2_years_ago":
-                base_conditions.append("m.creation <= DATE_SUB(NOW(), INTERVAL 2 YEAR)")
-
             recipients = frappe.db.sql(
                 f"""
                 SELECT DISTINCT m.email, m.name, m.first_name, m.last_name, m.creation
@@ -211,16 +278,6 @@ class AdvancedSegmentationManager:
             )
 
         elif query_type == "volunteer_status":
-            base_conditions.append(
-                """
-                EXISTS (
-                    SELECT 1 FROM `tabVolunteer` v
-                    WHERE v.member = m.name
-                    AND v.status = 'Active'
-                )
-            """
-            )
-
             recipients = frappe.db.sql(
                 f"""
                 SELECT DISTINCT m.email, m.name, m.first_name, m.last_name,
@@ -235,18 +292,6 @@ class AdvancedSegmentationManager:
             )
 
         elif query_type == "board_member":
-            base_conditions.append(
-                """
-                EXISTS (
-                    SELECT 1 FROM `tabChapter Board Member` cbm
-                    INNER JOIN `tabVolunteer` v ON cbm.volunteer = v.name
-                    WHERE v.member = m.name
-                    AND cbm.is_active = 1
-                    AND (cbm.to_date IS NULL OR cbm.to_date >= CURDATE())
-                )
-            """
-            )
-
             recipients = frappe.db.sql(
                 f"""
                 SELECT DISTINCT m.email, m.name, m.first_name, m.last_name,
@@ -262,28 +307,6 @@ class AdvancedSegmentationManager:
             )
 
         elif query_type == "donation_history":
-            has_donated = criteria["has_donated"]["value"]
-            if has_donated:
-                base_conditions.append(
-                    """
-                    EXISTS (
-                        SELECT 1 FROM `tabDonation` d
-                        WHERE d.donor = m.name
-                        AND d.docstatus = 1
-                    )
-                """
-                )
-            else:
-                base_conditions.append(
-                    """
-                    NOT EXISTS (
-                        SELECT 1 FROM `tabDonation` d
-                        WHERE d.donor = m.name
-                        AND d.docstatus = 1
-                    )
-                """
-                )
-
             recipients = frappe.db.sql(
                 f"""
                 SELECT DISTINCT m.email, m.name, m.first_name, m.last_name
@@ -296,22 +319,12 @@ class AdvancedSegmentationManager:
             )
 
         elif query_type == "age_range":
-            age_operator = criteria["age"]["operator"]
-            age_value = criteria["age"]["value"]
-
-            # Calculate birth date range
-            if age_operator == "<":
-                base_conditions.append(f"m.birth_date > DATE_SUB(CURDATE(), INTERVAL {age_value} YEAR)")
-            elif age_operator == ">=":
-                base_conditions.append(f"m.birth_date <= DATE_SUB(CURDATE(), INTERVAL {age_value} YEAR)")
-
             recipients = frappe.db.sql(
                 f"""
                 SELECT DISTINCT m.email, m.name, m.first_name, m.last_name, m.birth_date,
                        FLOOR(DATEDIFF(CURDATE(), m.birth_date) / 365.25) as age
                 FROM `tabMember` m
                 WHERE {" AND ".join(base_conditions)}
-                    AND m.birth_date IS NOT NULL
                 ORDER BY m.birth_date DESC
             """,
                 values,
@@ -347,6 +360,24 @@ class AdvancedSegmentationManager:
         """Get recipients for custom segments (placeholder for future implementation)"""
         return {"success": False, "error": "Custom segments not yet implemented"}
 
+    def _get_bitmap_engine(self):
+        """Bitmap engine sharing this manager's segment definitions"""
+        from verenigingen.email.segment_bitmaps import SegmentBitmapEngine
+
+        engine = SegmentBitmapEngine()
+        engine.manager = self
+        return engine
+
+    def _validate_segment_ids(self, segment_ids: List[str]) -> Optional[Dict]:
+        for segment_id in segment_ids:
+            if segment_id not in self.built_in_segments:
+                result = self._get_custom_segment_recipients(segment_id)
+                return {
+                    "success": False,
+                    "error": f"Failed to get segment {segment_id}: {result.get('error')}",
+                }
+        return None
+
     def create_segment_combination(
         self,
         segment_ids: List[str],
@@ -356,6 +387,9 @@ class AdvancedSegmentationManager:
         """
         Create a combination of multiple segments
 
+        Segments are combined as member bitmaps; only the members in the
+        resulting set are loaded from the database.
+
         Args:
             segment_ids: List of segment IDs to combine
             operation: How to combine segments (intersection/union/exclusion)
@@ -368,69 +402,30 @@ class AdvancedSegmentationManager:
             if not segment_ids:
                 return {"success": False, "error": "No segments specified"}
 
-            # Get recipients for each segment
-            segment_results = []
-            for segment_id in segment_ids:
-                result = self.get_segment_recipients(segment_id, chapter_name)
-                if result["success"]:
-                    recipient_emails = {r["email"] for r in result["recipients"]}
-                    segment_results.append(
-                        {
-                            "id": segment_id,
-                            "name": result["segment_name"],
-                            "emails": recipient_emails,
-                            "recipients": result["recipients"],
-                        }
-                    )
-                else:
-                    return {
-                        "success": False,
-                        "error": f"Failed to get segment {segment_id}: {result.get('error')}",
-                    }
-
-            if not segment_results:
-                return {"success": False, "error": "No valid segments found"}
-
-            # Combine segments based on operation
-            if operation == "intersection":
-                # Members who are in ALL segments
-                combined_emails = segment_results[0]["emails"]
-                for segment in segment_results[1:]:
-                    combined_emails = combined_emails.intersection(segment["emails"])
-
-            elif operation == "union":
-                # Members who are in ANY segment
-                combined_emails = set()
-                for segment in segment_results:
-                    combined_emails = combined_emails.union(segment["emails"])
-
-            elif operation == "exclusion":
-                # Members in first segment but NOT in others
-                if len(segment_results) < 2:
-                    return {"success": False, "error": "Exclusion requires at least 2 segments"}
-
-                combined_emails = segment_results[0]["emails"]
-                for segment in segment_results[1:]:
-                    combined_emails = combined_emails - segment["emails"]
-
-            else:
+            if operation not in ("intersection", "union", "exclusion"):
                 return {
                     "success": False,
                     "error": "Invalid operation. Use: intersection, union, or exclusion",
                 }
 
-            # Get full recipient details for combined emails
-            combined_recipients = []
-            for segment in segment_results:
-                for recipient in segment["recipients"]:
-                    if recipient["email"] in combined_emails:
-                        combined_recipients.append(recipient)
-                        combined_emails.discard(recipient["email"])  # Avoid duplicates
+            if operation == "exclusion" and len(segment_ids) < 2:
+                return {"success": False, "error": "Exclusion requires at least 2 segments"}
+
+            error = self._validate_segment_ids(segment_ids)
+            if error:
+                return error
+
+            engine = self._get_bitmap_engine()
+            combined = engine.combine(segment_ids, operation, chapter_name)
+            combined_recipients = engine.resolve_recipients(combined)
 
             return {
                 "success": True,
                 "operation": operation,
-                "source_segments": [{"id": s["id"], "name": s["name"]} for s in segment_results],
+                "source_segments": [
+                    {"id": segment_id, "name": self.built_in_segments[segment_id]["name"]}
+                    for segment_id in segment_ids
+                ],
                 "recipients": combined_recipients,
                 "recipients_count": len(combined_recipients),
                 "chapter_filter": chapter_name,
@@ -443,6 +438,9 @@ class AdvancedSegmentationManager:
         """
         Analyze overlap between multiple segments
 
+        The overlap matrix is computed from member bitmaps, so no recipient
+        lists are loaded.
+
         Args:
             segment_ids: List of segment IDs to analyze
             chapter_name: Chapter filter
@@ -454,76 +452,61 @@ class AdvancedSegmentationManager:
             if len(segment_ids) < 2:
                 return {"success": False, "error": "Need at least 2 segments for overlap analysis"}
 
-            # Get recipients for each segment
-            segments = {}
-            for segment_id in segment_ids:
-                result = self.get_segment_recipients(segment_id, chapter_name)
-                if result["success"]:
-                    segments[segment_id] = {
-                        "name": result["segment_name"],
-                        "emails": {r["email"] for r in result["recipients"]},
-                        "count": result["recipients_count"],
-                    }
-
-            if len(segments) < 2:
+            segment_ids = [segment_id for segment_id in segment_ids if segment_id in self.built_in_segments]
+            if len(segment_ids) < 2:
                 return {"success": False, "error": "Could not load enough valid segments"}
 
-            # Calculate pairwise overlaps
-            overlap_matrix = {}
-            for seg1_id, seg1_data in segments.items():
-                overlap_matrix[seg1_id] = {}
-                for seg2_id, seg2_data in segments.items():
-                    if seg1_id == seg2_id:
-                        overlap_matrix[seg1_id][seg2_id] = {"count": seg1_data["count"], "percentage": 100.0}
-                    else:
-                        intersection = seg1_data["emails"].intersection(seg2_data["emails"])
-                        overlap_count = len(intersection)
-                        overlap_percentage = (
-                            (overlap_count / seg1_data["count"] * 100) if seg1_data["count"] > 0 else 0
-                        )
-
-                        overlap_matrix[seg1_id][seg2_id] = {
-                            "count": overlap_count,
-                            "percentage": round(overlap_percentage, 1),
-                        }
-
-            # Find unique members (only in one segment)
-            all_emails = set()
-            for seg_data in segments.values():
-                all_emails = all_emails.union(seg_data["emails"])
-
-            unique_members = {}
-            for seg_id, seg_data in segments.items():
-                other_emails = set()
-                for other_id, other_data in segments.items():
-                    if other_id != seg_id:
-                        other_emails = other_emails.union(other_data["emails"])
-
-                unique_to_segment = seg_data["emails"] - other_emails
-                unique_members[seg_id] = {
-                    "count": len(unique_to_segment),
-                    "percentage": (
-                        round(len(unique_to_segment) / seg_data["count"] * 100, 1)
-                        if seg_data["count"] > 0
-                        else 0
-                    ),
-                }
+            overlap = self._get_bitmap_engine().overlap_matrix(segment_ids, chapter_name)
 
             return {
                 "success": True,
                 "segments": {
-                    seg_id: {"name": seg_data["name"], "count": seg_data["count"]}
-                    for seg_id, seg_data in segments.items()
+                    segment_id: {
+                        "name": self.built_in_segments[segment_id]["name"],
+                        "count": overlap["counts"][segment_id],
+                    }
+                    for segment_id in segment_ids
                 },
-                "overlap_matrix": overlap_matrix,
-                "unique_members": unique_members,
-                "total_unique_members": len(all_emails),
+                "overlap_matrix": overlap["overlap_matrix"],
+                "unique_members": overlap["unique_members"],
+                "total_unique_members": overlap["total_unique_members"],
                 "chapter_filter": chapter_name,
             }
 
         except Exception as e:
             return {"success": False, "error": str(e)}
 
+    def get_segment_preview(self, segment_id: str, chapter_name: str = None, sample_size: int = 5) -> Dict:
+        """
+        Count and sample a segment from its bitmap without loading all recipients
+
+        Args:
+            segment_id: Segment identifier
+            chapter_name: Chapter name filter (optional)
+            sample_size: Number of sample recipients to return
+
+        Returns:
+            Dict with count and sample recipients
+        """
+        try:
+            if segment_id not in self.built_in_segments:
+                return self._get_custom_segment_recipients(segment_id, chapter_name)
+
+            engine = self._get_bitmap_engine()
+            bitmap = engine.get_bitmap(segment_id, chapter_name)
+
+            return {
+                "success": True,
+                "segment_id": segment_id,
+                "segment_name": self.built_in_segments[segment_id]["name"],
+                "recipients_count": bitmap.count(),
+                "sample_recipients": engine.resolve_recipients(bitmap, limit=sample_size),
+                "query_type": self.built_in_segments[segment_id]["query_type"],
+            }
+
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
     def get_segment_suggestions(self, chapter_name: str = None) -> Dict:
         """
         Get segment suggestions based on chapter data
@@ -683,21 +666,12 @@ def get_segment_recipients(segment_id: str, chapter_name: str = None, preview_on
         frappe.throw(_("You don't have permission to view this chapter's segments"))
 
     manager = AdvancedSegmentationManager()
-    result = manager.get_segment_recipients(segment_id, chapter_name)
 
-    if result["success"] and preview_only:
-        # Return only preview data
-        recipients = result["recipients"]
-        return {
-            "success": True,
-            "segment_id": segment_id,
-            "segment_name": result["segment_name"],
-            "recipients_count": result["recipients_count"],
-            "sample_recipients": recipients[:5],  # First 5 as sample
-            "query_type": result["query_type"],
-        }
+    if cint(preview_only):
+        # Count and sample come straight from the segment bitmap
+        return manager.get_segment_preview(segment_id, chapter_name)
 
-    return result
+    return manager.get_segment_recipients(segment_id, chapter_name)
 
 
 @frappe.whitelist()
@@ -7,13 +7,31 @@ This module provides comprehensive analytics and tracking for email campaigns,
 newsletters, and member engagement.
 """
 
+import hashlib
 import json
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 
 import frappe
 from frappe import _
-from frappe.utils import add_days, formatdate, get_datetime, now_datetime
+from frappe.utils import add_days, flt, formatdate, get_datetime, getdate, now_datetime
+
+# Engagement scores decay with this half-life, so recent activity weighs most
+ENGAGEMENT_HALF_LIFE_DAYS = 30
+
+# Sends older than this no longer contribute to the decayed score denominator
+ENGAGEMENT_HORIZON_DAYS = 365
+
+# Daily rollups are kept this long; raw events only for the tracker's retention window
+ROLLUP_RETENTION_DAYS = 730
+
+DECAYED_SENDS_CACHE_KEY = "verenigingen:email_engagement_decayed_sends"
+
+RAW_EVENT_DOCTYPES = {
+    "Email Open Event": "opened_at",
+    "Email Click Event": "clicked_at",
+    "Email Unsubscribe Event": "unsubscribed_at",
+}
 
 
 class EmailAnalyticsTracker:
@@ -112,6 +130,14 @@ class EmailAnalyticsTracker:
                 if not frappe.utils.validate_email_address(recipient_email):
                     recipient_email = None
 
+                if recipient_email:
+                    first_open = not frappe.db.exists(
+                        "Email Open Event", {"tracking_id": tracking_id, "recipient_email": recipient_email}
+                    )
+                    self.record_engagement(
+                        recipient_email, tracking_doc.chapter, opens=1, unique_opens=int(first_open)
+                    )
+
                 open_event = frappe.get_doc(
                     {
                         "doctype": "Email Open Event",
@@ -151,6 +177,14 @@ class EmailAnalyticsTracker:
             tracking_doc.last_clicked = now_datetime()
             tracking_doc.save()
 
+            if recipient_email:
+                first_click = not frappe.db.exists(
+                    "Email Click Event", {"tracking_id": tracking_id, "recipient_email": recipient_email}
+                )
+                self.record_engagement(
+                    recipient_email, tracking_doc.chapter, clicks=1, unique_clicks=int(first_click)
+                )
+
             # Create detailed click event
             click_event = frappe.get_doc(
                 {
@@ -189,6 +223,8 @@ class EmailAnalyticsTracker:
             tracking_doc.unsubscribe_count += 1
             tracking_doc.save()
 
+            self.record_engagement(recipient_email, tracking_doc.chapter, unsubscribes=1)
+
             # Create unsubscribe event
             unsubscribe_event = frappe.get_doc(
                 {
@@ -218,6 +254,159 @@ class EmailAnalyticsTracker:
             frappe.log_error(f"Error tracking unsubscribe: {str(e)}", "Email Analytics")
             return False
 
+    @staticmethod
+    def _rollup_name(recipient_email: str, rollup_date, chapter: str = None) -> str:
+        """Deterministic rollup name, so the same member/day/chapter always upserts one row"""
+        key = f"{recipient_email}|{getdate(rollup_date)}|{chapter or ''}"
+        return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+    def record_engagement(
+        self,
+        recipient_email: str,
+        chapter_name: str = None,
+        opens: int = 0,
+        unique_opens: int = 0,
+        clicks: int = 0,
+        unique_clicks: int = 0,
+        unsubscribes: int = 0,
+    ):
+        """
+        Fold one engagement event into the daily rollup and the member's decayed score
+
+        Both writes are single upserts, so event tracking never reads raw events.
+        The decayed counters are aged to the current event time before the new
+        event is added: value * 0.5 ^ (elapsed / half-life) + increment.
+
+        Args:
+            recipient_email: Email address the event belongs to
+            chapter_name: Chapter of the tracked email (optional)
+            opens, unique_opens, clicks, unique_clicks, unsubscribes: Increments
+        """
+        if not recipient_email or not frappe.db.exists("DocType", "Email Engagement Rollup"):
+            return
+
+        now = now_datetime()
+        values = {
+            "name": self._rollup_name(recipient_email, now, chapter_name),
+            "email": recipient_email,
+            "chapter": chapter_name,
+            "rollup_date": now.date(),
+            "now": now,
+            "user": frappe.session.user,
+            "opens": opens,
+            "unique_opens": unique_opens,
+            "clicks": clicks,
+            "unique_clicks": unique_clicks,
+            "unsubscribes": unsubscribes,
+            "half_life": ENGAGEMENT_HALF_LIFE_DAYS * 86400,
+        }
+
+        frappe.db.sql(
+            """
+            INSERT INTO `tabEmail Engagement Rollup`
+                (name, creation, modified, owner, modified_by, recipient_email, member, rollup_date,
+                 chapter, opens, unique_opens, clicks, unique_clicks, unsubscribes)
+            VALUES
+                (%(name)s, %(now)s, %(now)s, %(user)s, %(user)s, %(email)s,
+                 (SELECT m.name FROM `tabMember` m WHERE m.email = %(email)s LIMIT 1),
+                 %(rollup_date)s, %(chapter)s, %(opens)s, %(unique_opens)s, %(clicks)s,
+                 %(unique_clicks)s, %(unsubscribes)s)
+            ON DUPLICATE KEY UPDATE
+                opens = opens + VALUES(opens),
+                unique_opens = unique_opens + VALUES(unique_opens),
+                clicks = clicks + VALUES(clicks),
+                unique_clicks = unique_clicks + VALUES(unique_clicks),
+                unsubscribes = unsubscribes + VALUES(unsubscribes),
+                modified = VALUES(modified)
+        """,
+            values,
+        )
+
+        if not (unique_opens or unique_clicks):
+            return
+
+        # last_event_at is assigned last: MariaDB applies the assignments in order,
+        # so the decay terms above it still see the previous event time
+        frappe.db.sql(
+            """
+            INSERT INTO `tabMember Email Engagement`
+                (name, creation, modified, owner, modified_by, recipient_email, member,
+                 decayed_opens, decayed_clicks, total_opens, total_clicks, last_event_at)
+            VALUES
+                (%(email)s, %(now)s, %(now)s, %(user)s, %(user)s, %(email)s,
+                 (SELECT m.name FROM `tabMember` m WHERE m.email = %(email)s LIMIT 1),
+                 %(unique_opens)s, %(unique_clicks)s, %(unique_opens)s, %(unique_clicks)s, %(now)s)
+            ON DUPLICATE KEY UPDATE
+                decayed_opens = IFNULL(decayed_opens, 0)
+                    * POW(0.5, TIMESTAMPDIFF(SECOND, IFNULL(last_event_at, VALUES(last_event_at)),
+                                             VALUES(last_event_at)) / %(half_life)s)
+                    + VALUES(decayed_opens),
+                decayed_clicks = IFNULL(decayed_clicks, 0)
+                    * POW(0.5, TIMESTAMPDIFF(SECOND, IFNULL(last_event_at, VALUES(last_event_at)),
+                                             VALUES(last_event_at)) / %(half_life)s)
+                    + VALUES(decayed_clicks),
+                total_opens = total_opens + VALUES(total_opens),
+                total_clicks = total_clicks + VALUES(total_clicks),
+                modified = VALUES(modified),
+                last_event_at = VALUES(last_event_at)
+        """,
+            values,
+        )
+
+    def get_decayed_sends(self) -> float:
+        """
+        Decayed number of emails sent, the denominator of every engagement score
+
+        Tracking rows are one per send, so this is a small aggregate; it is
+        cached briefly because every score lookup needs it.
+        """
+        cached = frappe.cache().get_value(DECAYED_SENDS_CACHE_KEY)
+        if cached is not None:
+            return flt(cached)
+
+        decayed_sends = frappe.db.sql(
+            """
+            SELECT IFNULL(SUM(POW(0.5, TIMESTAMPDIFF(SECOND, t.sent_date, NOW()) / %(half_life)s)), 0)
+            FROM `tabEmail Analytics Tracking` t
+            WHERE t.sent_date >= DATE_SUB(NOW(), INTERVAL %(horizon)s DAY)
+                AND t.recipient_count > 0
+        """,
+            {"half_life": ENGAGEMENT_HALF_LIFE_DAYS * 86400, "horizon": ENGAGEMENT_HORIZON_DAYS},
+        )[0][0]
+
+        frappe.cache().set_value(DECAYED_SENDS_CACHE_KEY, flt(decayed_sends), expires_in_sec=900)
+        return flt(decayed_sends)
+
+    @staticmethod
+    def _decay_to_now(value: float, last_event_at) -> float:
+        if not value or not last_event_at:
+            return 0.0
+        elapsed_days = max((now_datetime() - get_datetime(last_event_at)).total_seconds(), 0) / 86400
+        return flt(value) * 0.5 ** (elapsed_days / ENGAGEMENT_HALF_LIFE_DAYS)
+
+    @staticmethod
+    def calculate_engagement_score(
+        decayed_opens: float, decayed_clicks: float, decayed_sends: float
+    ) -> Tuple:
+        """Return (score 0-100, level) from decayed counters; weight 60% opens, 40% clicks"""
+        if decayed_sends <= 0:
+            return 0, "No Activity"
+
+        open_rate = min(decayed_opens / decayed_sends, 1.0)
+        click_rate = min(decayed_clicks / decayed_sends, 1.0)
+        engagement_score = round((open_rate * 60) + (click_rate * 40), 1)
+
+        if engagement_score >= 75:
+            engagement_level = "Highly Engaged"
+        elif engagement_score >= 50:
+            engagement_level = "Moderately Engaged"
+        elif engagement_score >= 25:
+            engagement_level = "Low Engagement"
+        else:
+            engagement_level = "Minimal Engagement"
+
+        return engagement_score, engagement_level
+
     def get_campaign_analytics(
         self, campaign_id: str = None, chapter_name: str = None, days: int = 30
     ) -> Dict:
@@ -389,6 +578,9 @@ class EmailAnalyticsTracker:
         """
         Calculate engagement score for a specific member
 
+        The score comes from the member's decayed counters, the activity summary
+        from daily rollups; neither reads raw open/click events.
+
         Args:
             member_email: Member's email address
 
@@ -396,48 +588,42 @@ class EmailAnalyticsTracker:
             Engagement score and details
         """
         try:
+            engagement = (
+                frappe.db.get_value(
+                    "Member Email Engagement",
+                    member_email,
+                    ["decayed_opens", "decayed_clicks", "last_event_at"],
+                    as_dict=True,
+                )
+                or frappe._dict()
+            )
+
+            engagement_score, engagement_level = self.calculate_engagement_score(
+                self._decay_to_now(engagement.decayed_opens, engagement.last_event_at),
+                self._decay_to_now(engagement.decayed_clicks, engagement.last_event_at),
+                self.get_decayed_sends(),
+            )
+
             # Get member's email activity in last 90 days
             recent_activity = frappe.db.sql(
                 """
                 SELECT
-                    COUNT(DISTINCT o.tracking_id) as emails_opened,
-                    COUNT(DISTINCT c.tracking_id) as emails_clicked,
-                    COUNT(DISTINCT t.name) as emails_received
-                FROM `tabEmail Analytics Tracking` t
-                LEFT JOIN `tabEmail Open Event` o ON o.tracking_id = t.name
-                    AND o.recipient_email = %(email)s
-                LEFT JOIN `tabEmail Click Event` c ON c.tracking_id = t.name
-                    AND c.recipient_email = %(email)s
-                WHERE t.sent_date >= DATE_SUB(NOW(), INTERVAL 90 DAY)
-                    AND t.recipient_count > 0
+                    IFNULL(SUM(r.unique_opens), 0) as emails_opened,
+                    IFNULL(SUM(r.unique_clicks), 0) as emails_clicked
+                FROM `tabEmail Engagement Rollup` r
+                WHERE r.recipient_email = %(email)s
+                    AND r.rollup_date >= DATE_SUB(CURDATE(), INTERVAL 90 DAY)
             """,
                 {"email": member_email},
                 as_dict=True,
             )[0]
 
-            emails_received = recent_activity["emails_received"] or 0
-            emails_opened = recent_activity["emails_opened"] or 0
-            emails_clicked = recent_activity["emails_clicked"] or 0
-
-            # Calculate engagement score (0-100)
-            if emails_received == 0:
-                engagement_score = 0
-                engagement_level = "No Activity"
-            else:
-                open_rate = emails_opened / emails_received
-                click_rate = emails_clicked / emails_received if emails_received > 0 else 0
-
-                # Weight: 60% opens, 40% clicks
-                engagement_score = round((open_rate * 60) + (click_rate * 40), 1)
-
-                if engagement_score >= 75:
-                    engagement_level = "Highly Engaged"
-                elif engagement_score >= 50:
-                    engagement_level = "Moderately Engaged"
-                elif engagement_score >= 25:
-                    engagement_level = "Low Engagement"
-                else:
-                    engagement_level = "Minimal Engagement"
+            emails_received = frappe.db.count(
+                "Email Analytics Tracking",
+                {"sent_date": [">=", add_days(now_datetime(), -90)], "recipient_count": [">", 0]},
+            )
+            emails_opened = int(recent_activity["emails_opened"] or 0)
+            emails_clicked = int(recent_activity["emails_clicked"] or 0)
 
             return {
                 "success": True,
@@ -456,6 +642,7 @@ class EmailAnalyticsTracker:
                     ),
                 },
                 "period": "Last 90 days",
+                "score_half_life_days": ENGAGEMENT_HALF_LIFE_DAYS,
             }
 
         except Exception as e:
@@ -463,13 +650,19 @@ class EmailAnalyticsTracker:
 
     def cleanup_old_analytics(self, retention_days: int = None) -> Dict:
         """
-        Clean up old analytics data to prevent database bloat
+        Compact old analytics data to prevent database bloat
+
+        Raw open/click/unsubscribe events are already folded into the daily
+        rollups as they arrive, so events past the retention window are removed
+        in bulk while their counts live on in the rollups. Per-send tracking rows
+        are aggregates themselves and are kept for long-range trends. Stored
+        engagement scores are refreshed in the same pass.
 
         Args:
-            retention_days: Days to retain data (default from config)
+            retention_days: Days to retain raw events (default from config)
 
         Returns:
-            Cleanup results
+            Compaction results
         """
         if retention_days is None:
             retention_days = self.default_retention_days
@@ -477,27 +670,25 @@ class EmailAnalyticsTracker:
         try:
             cutoff_date = add_days(now_datetime(), -retention_days)
 
-            # Delete old tracking records
-            old_tracking = frappe.get_all(
-                "Email Analytics Tracking", filters={"sent_date": ["<", cutoff_date]}, fields=["name"]
-            )
+            compacted_events = 0
+            for doctype, date_field in RAW_EVENT_DOCTYPES.items():
+                if not frappe.db.exists("DocType", doctype):
+                    continue
+                compacted_events += frappe.db.count(doctype, {date_field: ["<", cutoff_date]})
+                frappe.db.delete(doctype, {date_field: ["<", cutoff_date]})
 
-            deleted_count = 0
-            for tracking in old_tracking:
-                # Delete related events first
-                frappe.db.delete("Email Open Event", {"tracking_id": tracking.name})
-                frappe.db.delete("Email Click Event", {"tracking_id": tracking.name})
-                frappe.db.delete("Email Unsubscribe Event", {"tracking_id": tracking.name})
+            frappe.db.delete(
+                "Email Engagement Rollup", {"rollup_date": ["<", add_days(getdate(), -ROLLUP_RETENTION_DAYS)]}
+            )
 
-                # Delete tracking record
-                frappe.delete_doc("Email Analytics Tracking", tracking.name)
-                deleted_count += 1
+            refreshed_scores = self.refresh_stored_engagement_scores()
 
             frappe.db.commit()
 
             return {
                 "success": True,
-                "deleted_records": deleted_count,
+                "compacted_events": compacted_events,
+                "refreshed_scores": refreshed_scores,
                 "retention_days": retention_days,
                 "cutoff_date": formatdate(cutoff_date.date()),
             }
@@ -505,6 +696,131 @@ class EmailAnalyticsTracker:
         except Exception as e:
             return {"success": False, "error": str(e)}
 
+    def rebuild_engagement_rollups(self) -> Dict:
+        """
+        Rebuild daily rollups and decayed scores from whatever raw events remain
+
+        Used once when rollups are introduced (events that predate them) and as a
+        repair tool. Runs as set-based INSERT ... SELECT statements.
+        """
+        if not frappe.db.exists("DocType", "Email Open Event"):
+            return {"success": True, "rollups": 0}
+
+        frappe.db.delete("Email Engagement Rollup")
+        frappe.db.delete("Member Email Engagement")
+
+        event_sources = [
+            ("Email Open Event", "opened_at", "opens", "unique_opens"),
+            ("Email Click Event", "clicked_at", "clicks", "unique_clicks"),
+            ("Email Unsubscribe Event", "unsubscribed_at", "unsubscribes", None),
+        ]
+
+        for doctype, date_field, count_field, unique_field in event_sources:
+            if not frappe.db.exists("DocType", doctype):
+                continue
+
+            # All events count towards the raw total, only the first event per
+            # (email, recipient) counts as unique - same rule as live tracking
+            sources = [(f"`tab{doctype}`", date_field, count_field)]
+            if unique_field:
+                sources.append(
+                    (
+                        f"""(SELECT tracking_id, recipient_email, MIN({date_field}) AS {date_field}
+                            FROM `tab{doctype}` GROUP BY tracking_id, recipient_email)""",
+                        date_field,
+                        unique_field,
+                    )
+                )
+
+            for source, event_date, target_field in sources:
+                frappe.db.sql(
+                    f"""
+                    INSERT INTO `tabEmail Engagement Rollup`
+                        (name, creation, modified, owner, modified_by, recipient_email, rollup_date,
+                         chapter, {target_field})
+                    SELECT
+                        SUBSTRING(SHA1(CONCAT(e.recipient_email, '|', DATE(e.{event_date}), '|',
+                                              IFNULL(t.chapter, ''))), 1, 20),
+                        NOW(), NOW(), 'Administrator', 'Administrator',
+                        e.recipient_email, DATE(e.{event_date}), t.chapter, COUNT(*)
+                    FROM {source} e
+                    INNER JOIN `tabEmail Analytics Tracking` t ON t.name = e.tracking_id
+                    WHERE e.recipient_email IS NOT NULL AND e.recipient_email != ''
+                    GROUP BY e.recipient_email, DATE(e.{event_date}), t.chapter
+                    ON DUPLICATE KEY UPDATE {target_field} = {target_field} + VALUES({target_field})
+                """
+                )
+
+        frappe.db.sql(
+            """
+            UPDATE `tabEmail Engagement Rollup` r
+            INNER JOIN `tabMember` m ON m.email = r.recipient_email
+            SET r.member = m.name
+            WHERE r.member IS NULL
+        """
+        )
+
+        frappe.db.sql(
+            """
+            INSERT INTO `tabMember Email Engagement`
+                (name, creation, modified, owner, modified_by, recipient_email, member,
+                 decayed_opens, decayed_clicks, total_opens, total_clicks, last_event_at)
+            SELECT
+                r.recipient_email, NOW(), NOW(), 'Administrator', 'Administrator',
+                r.recipient_email, MAX(r.member),
+                SUM(r.unique_opens * POW(0.5, DATEDIFF(CURDATE(), r.rollup_date) / %(half_life_days)s)),
+                SUM(r.unique_clicks * POW(0.5, DATEDIFF(CURDATE(), r.rollup_date) / %(half_life_days)s)),
+                SUM(r.unique_opens), SUM(r.unique_clicks), NOW()
+            FROM `tabEmail Engagement Rollup` r
+            GROUP BY r.recipient_email
+            HAVING SUM(r.unique_opens) + SUM(r.unique_clicks) > 0
+        """,
+            {"half_life_days": ENGAGEMENT_HALF_LIFE_DAYS},
+        )
+
+        self.refresh_stored_engagement_scores()
+
+        return {"success": True, "rollups": frappe.db.count("Email Engagement Rollup")}
+
+    def refresh_stored_engagement_scores(self) -> int:
+        """
+        Re-age every stored engagement score to now in a single UPDATE
+
+        Keeps ``engagement_score`` usable as an indexed filter (e.g. for
+        engagement segments) between events.
+        """
+        decayed_sends = self.get_decayed_sends()
+        if decayed_sends <= 0:
+            return 0
+
+        frappe.db.sql(
+            """
+            UPDATE `tabMember Email Engagement`
+            SET engagement_score = ROUND(
+                    LEAST(decayed_opens * POW(0.5, TIMESTAMPDIFF(SECOND, last_event_at, NOW()) / %(half_life)s)
+                          / %(sends)s, 1) * 60
+                    + LEAST(decayed_clicks * POW(0.5, TIMESTAMPDIFF(SECOND, last_event_at, NOW()) / %(half_life)s)
+                            / %(sends)s, 1) * 40,
+                    1)
+            WHERE last_event_at IS NOT NULL
+        """,
+            {"half_life": ENGAGEMENT_HALF_LIFE_DAYS * 86400, "sends": decayed_sends},
+        )
+        frappe.db.sql(
+            """
+            UPDATE `tabMember Email Engagement`
+            SET engagement_level = CASE
+                WHEN engagement_score >= 75 THEN 'Highly Engaged'
+                WHEN engagement_score >= 50 THEN 'Moderately Engaged'
+                WHEN engagement_score >= 25 THEN 'Low Engagement'
+                ELSE 'Minimal Engagement'
+            END
+            WHERE last_event_at IS NOT NULL
+        """
+        )
+
+        return frappe.db.count("Member Email Engagement", {"last_event_at": ["is", "set"]})
+
 
 # API Functions
 @frappe.whitelist()
@@ -604,7 +920,7 @@ def track_click(tracking_id: str, url: str, email: str = None):
 # Scheduled cleanup job
 def cleanup_old_email_analytics():
     """
-    Scheduled job to clean up old analytics data
+    Scheduled job to compact old raw events into rollups and refresh stored scores
     Add this to hooks.py scheduler_events
     """
     # Only run if analytics is enabled
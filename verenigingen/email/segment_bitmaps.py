@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+"""
+Bitmap Segment Engine
+Phase 3 Implementation - Fast Segment Counting and Combination
+
+Keeps the membership of every built-in segment (and of every chapter) as a
+compressed bitmap over a dense member-ID space, stored in Redis. Counts,
+previews, intersections, unions and overlap matrices become bitwise operations
+on those bitmaps instead of one recipient query per segment.
+
+Bitmaps are rebuilt in full once a day (date-relative segments such as "new
+members" drift over time) and refreshed incrementally from Member, Chapter and
+Volunteer document events in between. Rebuilds and refreshes read, modify and
+write whole bitmaps, so they take turns under one distributed lock.
+"""
+
+import pickle
+import zlib
+from typing import Dict, Iterable, List, Optional
+
+import frappe
+from frappe import _
+
+from verenigingen.email.advanced_segmentation import AdvancedSegmentationManager
+from verenigingen.utils.distributed_lock import DistributedLock
+
+BITMAP_CACHE_KEY = "verenigingen:segment_bitmaps"
+MEMBER_ID_CACHE_KEY = "verenigingen:segment_member_ids"
+MEMBER_NAME_CACHE_KEY = "verenigingen:segment_member_names"
+NEXT_MEMBER_ID_CACHE_KEY = "verenigingen:segment_member_ids:next"
+ENGINE_STATE_CACHE_KEY = "verenigingen:segment_engine_state"
+
+CHAPTER_PREFIX = "chapter:"
+SEGMENT_PREFIX = "segment:"
+
+# Members resolved per query when turning bitmap positions back into recipients
+RESOLVE_CHUNK_SIZE = 1000
+
+# Distributed lock serializing rebuilds and refreshes of the bitmaps
+BITMAP_LOCK_RESOURCE = "segment_bitmaps"
+# Seconds a refresh waits for a running rebuild; below the refresh job's timeout
+BITMAP_LOCK_WAIT = 240
+
+# Set bit positions of every byte value, low bit first
+_BYTE_POSITIONS = tuple(tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256))
+
+
+class MemberBitmap:
+    """
+    Set of dense member IDs backed by a Python integer
+
+    Bit ``i`` is set when the member with dense ID ``i`` is in the set. Python
+    integers give arbitrary-length bitwise AND/OR/ANDNOT and a native popcount,
+    which is all a segment engine needs. Serialized form is zlib-compressed, so
+    sparse segments (board members, new members) stay a few bytes in Redis.
+    """
+
+    __slots__ = ("bits",)
+
+    def __init__(self, bits: int = 0):
+        self.bits = bits
+
+    @classmethod
+    def from_positions(cls, positions: Iterable[int]) -> "MemberBitmap":
+        bits = 0
+        for position in positions:
+            bits |= 1 << position
+        return cls(bits)
+
+    @classmethod
+    def from_bytes(cls, data: Optional[bytes]) -> "MemberBitmap":
+        if not data:
+            return cls()
+        return cls(int.from_bytes(zlib.decompress(data), "little"))
+
+    def to_bytes(self) -> bytes:
+        raw = self.bits.to_bytes((self.bits.bit_length() + 7) // 8, "little")
+        return zlib.compress(raw)
+
+    def add(self, position: int):
+        self.bits |= 1 << position
+
+    def discard(self, position: int):
+        self.bits &= ~(1 << position)
+
+    def count(self) -> int:
+        return self.bits.bit_count()
+
+    def positions(self, limit: int = None) -> List[int]:
+        """Return set positions in ascending order, optionally only the first ``limit``"""
+        result = []
+        if limit is not None and limit <= 0:
+            return result
+
+        # One pass over the bytes; clearing the lowest bit of the integer instead
+        # copies it on every step, which is quadratic for large segments
+        raw = self.bits.to_bytes((self.bits.bit_length() + 7) // 8, "little")
+        for index, byte in enumerate(raw):
+            if byte:
+                offset = index * 8
+                result.extend(offset + bit for bit in _BYTE_POSITIONS[byte])
+                if limit is not None and len(result) >= limit:
+                    return result[:limit]
+        return result
+
+    def __contains__(self, position: int) -> bool:
+        return bool(self.bits >> position & 1)
+
+    def __and__(self, other: "MemberBitmap") -> "MemberBitmap":
+        return MemberBitmap(self.bits & other.bits)
+
+    def __or__(self, other: "MemberBitmap") -> "MemberBitmap":
+        return MemberBitmap(self.bits | other.bits)
+
+    def __sub__(self, other: "MemberBitmap") -> "MemberBitmap":
+        return MemberBitmap(self.bits & ~other.bits)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, MemberBitmap) and self.bits == other.bits
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __repr__(self) -> str:
+        return f"MemberBitmap(count={self.count()})"
+
+
+class SegmentBitmapEngine:
+    """Maintains and queries per-segment and per-chapter member bitmaps"""
+
+    def __init__(self):
+        self.manager = AdvancedSegmentationManager()
+        self.cache = frappe.cache()
+
+    # ------------------------------------------------------------------
+    # Dense member-ID space
+    # ------------------------------------------------------------------
+
+    def _get_member_ids(self, member_names: Iterable[str], create: bool = True) -> Dict[str, int]:
+        """
+        Map member names to dense IDs
+
+        IDs are append-only between full rebuilds: a member keeps its position
+        for as long as the bitmaps exist, and new members take the next free slot.
+        The slot counter is an atomic Redis INCR and the slot is claimed with
+        HSETNX, so when two workers add the same member one claim wins and the
+        other worker reads it back; its slot stays unused.
+        """
+        ids = {}
+        for name in member_names:
+            position = self.cache.hget(MEMBER_ID_CACHE_KEY, name)
+            if position is None and create:
+                slot = self.cache.incr(self.cache.make_key(NEXT_MEMBER_ID_CACHE_KEY)) - 1
+                if self.cache.hsetnx(self.cache.make_key(MEMBER_ID_CACHE_KEY), name, pickle.dumps(slot)):
+                    self.cache.hset(MEMBER_NAME_CACHE_KEY, str(slot), name)
+                    position = slot
+                else:
+                    position = self.cache.hget(MEMBER_ID_CACHE_KEY, name)
+            if position is not None:
+                ids[name] = int(position)
+        return ids
+
+    def _get_member_names(self, positions: List[int]) -> List[str]:
+        if len(positions) > RESOLVE_CHUNK_SIZE:
+            all_names = self.cache.hgetall(MEMBER_NAME_CACHE_KEY) or {}
+            return [all_names[str(p)] for p in positions if str(p) in all_names]
+
+        names = []
+        for position in positions:
+            name = self.cache.hget(MEMBER_NAME_CACHE_KEY, str(position))
+            if name:
+                names.append(name)
+        return names
+
+    # ------------------------------------------------------------------
+    # Bitmap storage
+    # ------------------------------------------------------------------
+
+    def _load_bitmap(self, key: str) -> MemberBitmap:
+        return MemberBitmap.from_bytes(self.cache.hget(BITMAP_CACHE_KEY, key))
+
+    def _store_bitmap(self, key: str, bitmap: MemberBitmap):
+        self.cache.hset(BITMAP_CACHE_KEY, key, bitmap.to_bytes())
+
+    def _bulk_hset(self, name: str, mapping: Dict):
+        """Pipelined HSET in the same pickled format that ``frappe.cache().hget`` reads"""
+        pipe = self.cache.pipeline()
+        redis_key = self.cache.make_key(name)
+        for key, value in mapping.items():
+            pipe.hset(redis_key, key, pickle.dumps(value))
+        pipe.execute()
+
+    def _replace_hashes(self, hashes: Dict[str, Dict], next_member_id: int):
+        """
+        Swap in rebuilt hashes without readers seeing them empty or half written
+
+        Each hash is written to a staging key first; the staging keys are then
+        renamed over the live keys, together with resetting the member-ID
+        counter, in one MULTI/EXEC transaction.
+        """
+        suffix = ":rebuild:" + frappe.generate_hash(length=10)
+        for name, mapping in hashes.items():
+            if mapping:
+                self._bulk_hset(name + suffix, mapping)
+
+        pipe = self.cache.pipeline()
+        for name, mapping in hashes.items():
+            if mapping:
+                pipe.rename(self.cache.make_key(name + suffix), self.cache.make_key(name))
+            else:
+                # Nothing was staged (no members or no chapters); RENAME needs a source key
+                pipe.delete(self.cache.make_key(name))
+        pipe.set(self.cache.make_key(NEXT_MEMBER_ID_CACHE_KEY), next_member_id)
+        pipe.execute()
+
+    def _lock(self) -> DistributedLock:
+        return DistributedLock([BITMAP_LOCK_RESOURCE], wait=BITMAP_LOCK_WAIT)
+
+    def is_built(self) -> bool:
+        return bool(self.cache.get_value(ENGINE_STATE_CACHE_KEY))
+
+    def ensure_built(self):
+        """Rebuild on demand after a cache flush or on a fresh site"""
+        if self.is_built():
+            return
+        with self._lock():
+            # Another worker may have built the bitmaps while this one waited
+            if not self.is_built():
+                self._rebuild_all()
+
+    # ------------------------------------------------------------------
+    # Full rebuild
+    # ------------------------------------------------------------------
+
+    def rebuild_all(self) -> Dict:
+        """
+        Rebuild the member-ID space and every segment and chapter bitmap
+
+        Everything is computed before Redis is touched and then swapped in at
+        once, so counts and previews keep working during the rebuild.
+        """
+        with self._lock():
+            return self._rebuild_all()
+
+    def _rebuild_all(self) -> Dict:
+        member_names = frappe.db.sql_list(
+            """
+            SELECT name FROM `tabMember`
+            WHERE status = 'Active'
+            ORDER BY creation, name
+        """
+        )
+
+        ids = {name: position for position, name in enumerate(member_names)}
+        bitmaps = {}
+
+        for segment_id in self.manager.built_in_segments:
+            members = self._query_segment_members(segment_id)
+            bitmap = MemberBitmap.from_positions(ids[m] for m in members if m in ids)
+            bitmaps[SEGMENT_PREFIX + segment_id] = bitmap.to_bytes()
+
+        chapters = {}
+        for row in self._query_chapter_memberships():
+            if row.member in ids:
+                chapters.setdefault(row.chapter, MemberBitmap()).add(ids[row.member])
+        for chapter_name, bitmap in chapters.items():
+            bitmaps[CHAPTER_PREFIX + chapter_name] = bitmap.to_bytes()
+
+        self._replace_hashes(
+            {
+                MEMBER_ID_CACHE_KEY: ids,
+                MEMBER_NAME_CACHE_KEY: {str(position): name for name, position in ids.items()},
+                BITMAP_CACHE_KEY: bitmaps,
+            },
+            len(member_names),
+        )
+
+        self.cache.set_value(
+            ENGINE_STATE_CACHE_KEY, {"members": len(member_names), "chapters": len(chapters)}
+        )
+
+        return {"success": True, "members": len(member_names), "chapters": len(chapters)}
+
+    # ------------------------------------------------------------------
+    # Incremental refresh
+    # ------------------------------------------------------------------
+
+    def refresh_members(self, member_names: List[str]) -> Dict:
+        """Re-evaluate segment and chapter membership for the given members only"""
+        member_names = [m for m in set(member_names or []) if m]
+        if not member_names:
+            return {"success": True, "refreshed": 0}
+
+        with self._lock():
+            if not self.is_built():
+                # The full rebuild picks up these members as well
+                return self._rebuild_all()
+            return self._refresh_members(member_names)
+
+    def _refresh_members(self, member_names: List[str]) -> Dict:
+        ids = self._get_member_ids(member_names)
+
+        for segment_id in self.manager.built_in_segments:
+            key = SEGMENT_PREFIX + segment_id
+            bitmap = self._load_bitmap(key)
+            current = set(self._query_segment_members(segment_id, member_names))
+            for name, position in ids.items():
+                if name in current:
+                    bitmap.add(position)
+                else:
+                    bitmap.discard(position)
+            self._store_bitmap(key, bitmap)
+
+        memberships = {}
+        for row in self._query_chapter_memberships(member_names):
+            memberships.setdefault(row.chapter, set()).add(row.member)
+
+        chapter_keys = [
+            key.decode() if isinstance(key, bytes) else key
+            for key in (self.cache.hkeys(BITMAP_CACHE_KEY) or [])
+        ]
+        chapter_names = {key[len(CHAPTER_PREFIX) :] for key in chapter_keys if key.startswith(CHAPTER_PREFIX)}
+        for chapter_name in chapter_names | set(memberships):
+            key = CHAPTER_PREFIX + chapter_name
+            bitmap = self._load_bitmap(key)
+            in_chapter = memberships.get(chapter_name, set())
+            for name, position in ids.items():
+                if name in in_chapter:
+                    bitmap.add(position)
+                else:
+                    bitmap.discard(position)
+            self._store_bitmap(key, bitmap)
+
+        return {"success": True, "refreshed": len(ids)}
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def _query_segment_members(self, segment_id: str, member_names: List[str] = None) -> List[str]:
+        conditions, values = self.manager.get_segment_conditions(segment_id)
+        if member_names:
+            conditions.append("m.name IN %(member_names)s")
+            values["member_names"] = tuple(member_names)
+
+        return frappe.db.sql_list(
+            f"""
+            SELECT DISTINCT m.name
+            FROM `tabMember` m
+            WHERE {" AND ".join(conditions)}
+        """,
+            values,
+        )
+
+    def _query_chapter_memberships(self, member_names: List[str] = None) -> List[Dict]:
+        conditions = ["cm.enabled = 1"]
+        values = {}
+        if member_names:
+            conditions.append("cm.member IN %(member_names)s")
+            values["member_names"] = tuple(member_names)
+
+        return frappe.db.sql(
+            f"""
+            SELECT DISTINCT cm.parent AS chapter, cm.member
+            FROM `tabChapter Member` cm
+            WHERE {" AND ".join(conditions)}
+        """,
+            values,
+            as_dict=True,
+        )
+
+    # ------------------------------------------------------------------
+    # Bitmap operations
+    # ------------------------------------------------------------------
+
+    def get_bitmap(self, segment_id: str, chapter_name: str = None) -> MemberBitmap:
+        """Segment bitmap, restricted to the chapter's members when a chapter is given"""
+        if segment_id not in self.manager.built_in_segments:
+            frappe.throw(_("Unknown segment: {0}").format(segment_id))
+
+        self.ensure_built()
+        bitmap = self._load_bitmap(SEGMENT_PREFIX + segment_id)
+        if chapter_name:
+            bitmap = bitmap & self._load_bitmap(CHAPTER_PREFIX + chapter_name)
+        return bitmap
+
+    def count(self, segment_id: str, chapter_name: str = None) -> int:
+        return self.get_bitmap(segment_id, chapter_name).count()
+
+    def combine(
+        self, segment_ids: List[str], operation: str = "intersection", chapter_name: str = None
+    ) -> MemberBitmap:
+        """Combine segments with intersection, union or exclusion (first minus the rest)"""
+        bitmaps = [self.get_bitmap(segment_id, chapter_name) for segment_id in segment_ids]
+
+        combined = bitmaps[0]
+        for bitmap in bitmaps[1:]:
+            if operation == "intersection":
+                combined = combined & bitmap
+            elif operation == "union":
+                combined = combined | bitmap
+            elif operation == "exclusion":
+                combined = combined - bitmap
+            else:
+                frappe.throw(_("Invalid operation. Use: intersection, union, or exclusion"))
+        return combined
+
+    def overlap_matrix(self, segment_ids: List[str], chapter_name: str = None) -> Dict:
+        """Pairwise overlaps, per-segment unique members and total distinct members"""
+        bitmaps = {segment_id: self.get_bitmap(segment_id, chapter_name) for segment_id in segment_ids}
+        counts = {segment_id: bitmap.count() for segment_id, bitmap in bitmaps.items()}
+
+        matrix = {}
+        for seg1_id, seg1_bitmap in bitmaps.items():
+            matrix[seg1_id] = {}
+            for seg2_id, seg2_bitmap in bitmaps.items():
+                if seg1_id == seg2_id:
+                    matrix[seg1_id][seg2_id] = {"count": counts[seg1_id], "percentage": 100.0}
+                    continue
+                overlap_count = (seg1_bitmap & seg2_bitmap).count()
+                matrix[seg1_id][seg2_id] = {
+                    "count": overlap_count,
+                    "percentage": round(overlap_count / counts[seg1_id] * 100, 1) if counts[seg1_id] else 0,
+                }
+
+        all_members = MemberBitmap()
+        for bitmap in bitmaps.values():
+            all_members = all_members | bitmap
+
+        unique_members = {}
+        for seg_id, bitmap in bitmaps.items():
+            others = MemberBitmap()
+            for other_id, other_bitmap in bitmaps.items():
+                if other_id != seg_id:
+                    others = others | other_bitmap
+            unique_count = (bitmap - others).count()
+            unique_members[seg_id] = {
+                "count": unique_count,
+                "percentage": round(unique_count / counts[seg_id] * 100, 1) if counts[seg_id] else 0,
+            }
+
+        return {
+            "counts": counts,
+            "overlap_matrix": matrix,
+            "unique_members": unique_members,
+            "total_unique_members": all_members.count(),
+        }
+
+    def resolve_recipients(self, bitmap: MemberBitmap, limit: int = None) -> List[Dict]:
+        """Turn bitmap positions back into recipient rows (email, name, first_name, last_name)"""
+        member_names = self._get_member_names(bitmap.positions(limit))
+
+        recipients = []
+        for start in range(0, len(member_names), RESOLVE_CHUNK_SIZE):
+            chunk = member_names[start : start + RESOLVE_CHUNK_SIZE]
+            recipients.extend(
+                frappe.db.sql(
+                    """
+                    SELECT m.email, m.name, m.first_name, m.last_name
+                    FROM `tabMember` m
+                    WHERE m.name IN %(member_names)s
+                        AND m.email IS NOT NULL
+                        AND m.email != ''
+                    ORDER BY m.first_name, m.last_name
+                """,
+                    {"member_names": tuple(chunk)},
+                    as_dict=True,
+                )
+            )
+        return recipients
+
+
+def refresh_segment_members(member_names: List[str]):
+    """Background job: incremental bitmap refresh for changed members"""
+    try:
+        SegmentBitmapEngine().refresh_members(member_names)
+    except Exception as e:
+        frappe.log_error(f"Segment bitmap refresh failed: {str(e)}", "Segment Bitmap Engine")
+
+
+def _queue_member_refresh(member_names: List[str]):
+    member_names = [m for m in set(member_names) if m]
+    if not member_names:
+        return
+
+    frappe.enqueue(
+        "verenigingen.email.segment_bitmaps.refresh_segment_members",
+        member_names=member_names,
+        queue="short",
+        timeout=300,
+        enqueue_after_commit=True,
+    )
+
+
+def on_member_change(doc, method=None):
+    """Member doc event hook (on_update / after_insert / on_trash)"""
+    _queue_member_refresh([doc.name])
+
+
+def on_chapter_change(doc, method=None):
+    """Chapter doc event hook: roster changes live in the Chapter Member child table"""
+    current = {row.member for row in (doc.get("members") or [])}
+    previous_doc = doc.get_doc_before_save() if hasattr(doc, "get_doc_before_save") else None
+    previous = {row.member for row in (previous_doc.get("members") or [])} if previous_doc else set()
+    _queue_member_refresh(list(current | previous))
+
+
+def on_volunteer_change(doc, method=None):
+    """Volunteer doc event hook: volunteer and board-member segments depend on it"""
+    _queue_member_refresh([doc.get("member")])
+
+
+def rebuild_segment_bitmaps():
+    """Scheduled daily full rebuild, also catches date-relative segment drift"""
+    try:
+        return SegmentBitmapEngine().rebuild_all()
+    except Exception as e:
+        frappe.log_error(f"Segment bitmap rebuild failed: {str(e)}", "Segment Bitmap Engine")
+        return {"success": False, "error": str(e)}
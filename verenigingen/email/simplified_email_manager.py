@@ -8,13 +8,54 @@ to various member segments, leveraging the existing CommunicationManager and
 Frappe's Newsletter module.
 """
 
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 
 import frappe
 from frappe import _
+from frappe.utils import add_to_date, cint, now_datetime
 
 from verenigingen.verenigingen.doctype.chapter.managers.communication_manager import CommunicationManager
 
+# Recipients fetched per page and queued per Email Queue entry
+RECIPIENT_PAGE_SIZE = 500
+
+# Sends above this many recipients are streamed from a background job
+BACKGROUND_SEND_THRESHOLD = 2000
+
+# Default throughput for staggering Email Queue entries (recipients per hour)
+DEFAULT_EMAILS_PER_HOUR = 20000
+
+# Shared FROM/WHERE clauses per chapter segment, aliased on m = tabMember
+CHAPTER_SEGMENT_QUERIES = {
+    "all": """
+        FROM `tabMember` m
+        INNER JOIN `tabChapter Member` cm ON m.name = cm.member
+        WHERE cm.parent = %(chapter)s
+            AND cm.enabled = 1
+            AND m.status = 'Active'
+            AND m.email IS NOT NULL
+            AND (m.opt_out_optional_emails IS NULL OR m.opt_out_optional_emails = 0)  -- FIELD FIX: Handle NULL values properly
+    """,
+    "board": """
+        FROM `tabChapter Board Member` cbm
+        INNER JOIN `tabVolunteer` v ON cbm.volunteer = v.name
+        INNER JOIN `tabMember` m ON v.member = m.name
+        WHERE cbm.parent = %(chapter)s
+            AND cbm.is_active = 1
+            AND m.email IS NOT NULL
+            AND (m.opt_out_optional_emails IS NULL OR m.opt_out_optional_emails = 0)  -- FIELD FIX: Handle NULL values properly
+    """,
+    "volunteers": """
+        FROM `tabVolunteer` v
+        INNER JOIN `tabMember` m ON v.member = m.name
+        INNER JOIN `tabChapter Member` cm ON m.name = cm.member
+        WHERE cm.parent = %(chapter)s
+            AND v.status = 'Active'
+            AND m.email IS NOT NULL
+            AND (m.opt_out_optional_emails IS NULL OR m.opt_out_optional_emails = 0)  -- FIELD FIX: Handle NULL values properly
+    """,
+}
+
 
 class SimplifiedEmailManager(CommunicationManager):
     """Minimal enhancement using existing infrastructure for bulk email sending"""
@@ -40,55 +81,12 @@ class SimplifiedEmailManager(CommunicationManager):
         Returns:
             Dict with success status and details
         """
-        # Build recipient query based on segment
-        if segment == "all":
-            recipients = frappe.db.sql_list(
-                """
-                SELECT DISTINCT m.email
-                FROM `tabMember` m
-                INNER JOIN `tabChapter Member` cm ON m.name = cm.member
-                WHERE cm.parent = %s
-                    AND cm.enabled = 1
-                    AND m.status = 'Active'
-                    AND m.email IS NOT NULL
-                    AND (m.opt_out_optional_emails IS NULL OR m.opt_out_optional_emails = 0)  -- FIELD FIX: Handle NULL values properly
-            """,
-                chapter_name,
-            )
-
-        elif segment == "board":
-            recipients = frappe.db.sql_list(
-                """
-                SELECT DISTINCT m.email
-                FROM `tabChapter Board Member` cbm
-                INNER JOIN `tabVolunteer` v ON cbm.volunteer = v.name
-                INNER JOIN `tabMember` m ON v.member = m.name
-                WHERE cbm.parent = %s
-                    AND cbm.is_active = 1
-                    AND m.email IS NOT NULL
-                    AND (m.opt_out_optional_emails IS NULL OR m.opt_out_optional_emails = 0)  -- FIELD FIX: Handle NULL values properly
-            """,
-                chapter_name,
-            )
-
-        elif segment == "volunteers":
-            recipients = frappe.db.sql_list(
-                """
-                SELECT DISTINCT m.email
-                FROM `tabVolunteer` v
-                INNER JOIN `tabMember` m ON v.member = m.name
-                INNER JOIN `tabChapter Member` cm ON m.name = cm.member
-                WHERE cm.parent = %s
-                    AND v.status = 'Active'
-                    AND m.email IS NOT NULL
-                    AND (m.opt_out_optional_emails IS NULL OR m.opt_out_optional_emails = 0)  -- FIELD FIX: Handle NULL values properly
-            """,
-                chapter_name,
-            )
-        else:
+        if segment not in CHAPTER_SEGMENT_QUERIES:
             return {"success": False, "error": f"Unknown segment: {segment}"}
 
-        if not recipients:
+        recipients_count = self.count_chapter_segment(chapter_name, segment)
+
+        if not recipients_count:
             return {"success": False, "error": "No eligible recipients found"}
 
         # If test mode, just return the count
@@ -96,43 +94,18 @@ class SimplifiedEmailManager(CommunicationManager):
             return {
                 "success": True,
                 "test_mode": True,
-                "recipients_count": len(recipients),
-                "segment": segment,
-            }
-
-        # Use Newsletter module for actual sending
-        try:
-            newsletter = frappe.get_doc(
-                {
-                    "doctype": "Newsletter",
-                    "subject": subject or f"Newsletter from {chapter_name}",
-                    "content_type": "Rich Text",
-                    "message": content,
-                    "send_from": frappe.session.user,
-                    "schedule_send": 0,  # Send immediately
-                }
-            )
-
-            # Add recipients directly
-            for email in recipients:
-                newsletter.append("recipients", {"email": email})
-
-            newsletter.save()
-
-            # Queue for sending
-            if not frappe.flags.in_test:
-                newsletter.queue_all()
-
-            return {
-                "success": True,
-                "recipients_count": len(recipients),
-                "newsletter": newsletter.name,
+                "recipients_count": recipients_count,
                 "segment": segment,
             }
 
-        except Exception as e:
-            frappe.log_error(f"Error sending chapter email: {str(e)}", "SimplifiedEmailManager")
-            return {"success": False, "error": str(e)}
+        return self._send_streaming_newsletter(
+            source={"type": "chapter", "chapter": chapter_name, "segment": segment},
+            subject=subject or f"Newsletter from {chapter_name}",
+            content=content,
+            recipients_count=recipients_count,
+            extra={"segment": segment},
+            error_title="Error sending chapter email",
+        )
 
     def send_organization_wide(
         self, filters: Dict = None, subject: str = None, content: str = None, test_mode: bool = False
@@ -149,51 +122,149 @@ class SimplifiedEmailManager(CommunicationManager):
         Returns:
             Dict with success status and details
         """
+        filters = self._get_organization_filters(filters)
+
+        recipients_count = frappe.db.count("Member", filters=filters)
+
+        if not recipients_count:
+            return {"success": False, "error": "No eligible recipients"}
+
+        # If test mode, just return the count
+        if test_mode:
+            return {"success": True, "test_mode": True, "recipients_count": recipients_count}
+
+        return self._send_streaming_newsletter(
+            source={"type": "organization", "filters": filters},
+            subject=subject or "Organization Newsletter",
+            content=content,
+            recipients_count=recipients_count,
+            error_title="Error sending organization-wide email",
+        )
+
+    @staticmethod
+    def _get_organization_filters(filters: Dict = None) -> Dict:
         # Default to active members with emails
-        if not filters:
-            filters = {"status": "Active", "email": ["!=", ""]}
+        filters = dict(filters or {"status": "Active", "email": ["!=", ""]})
 
         # Add opt-out check to filters
         filters["opt_out_optional_emails"] = ["!=", 1]
+        return filters
+
+    @staticmethod
+    def count_chapter_segment(chapter_name: str, segment: str) -> int:
+        """Count distinct recipients of a chapter segment without loading them"""
+        return cint(
+            frappe.db.sql(
+                f"SELECT COUNT(DISTINCT m.name) {CHAPTER_SEGMENT_QUERIES[segment]}",
+                {"chapter": chapter_name},
+            )[0][0]
+        )
+
+    @staticmethod
+    def iter_recipient_pages(source: Dict, page_size: int = RECIPIENT_PAGE_SIZE) -> Iterator[List[str]]:
+        """
+        Yield recipient email addresses one page at a time
 
-        # Get eligible members
-        members = frappe.db.get_all("Member", filters=filters, fields=["email"], limit=10000)  # Safety limit
+        Uses keyset pagination on Member name rather than an unbuffered cursor,
+        so Email Queue inserts can run on the same connection between pages and
+        every page query is an index range scan no matter how deep the send is.
 
-        eligible_emails = [m.email for m in members if m.email]
+        Args:
+            source: Recipient source, {"type": "chapter", "chapter", "segment"}
+                or {"type": "organization", "filters"}
+            page_size: Recipients per page
 
-        if not eligible_emails:
-            return {"success": False, "error": "No eligible recipients"}
+        Yields:
+            Lists of email addresses
+        """
+        last_member = ""
+
+        while True:
+            if source["type"] == "chapter":
+                rows = frappe.db.sql(
+                    f"""
+                    SELECT DISTINCT m.name, m.email
+                    {CHAPTER_SEGMENT_QUERIES[source["segment"]]}
+                        AND m.name > %(last_member)s
+                    ORDER BY m.name
+                    LIMIT %(page_size)s
+                """,
+                    {"chapter": source["chapter"], "last_member": last_member, "page_size": page_size},
+                    as_dict=True,
+                )
+            else:
+                filters = dict(source["filters"])
+                filters["name"] = [">", last_member]
+                rows = frappe.get_all(
+                    "Member",
+                    filters=filters,
+                    fields=["name", "email"],
+                    order_by="name asc",
+                    limit_page_length=page_size,
+                )
 
-        # If test mode, just return the count
-        if test_mode:
-            return {"success": True, "test_mode": True, "recipients_count": len(eligible_emails)}
+            if not rows:
+                return
+
+            last_member = rows[-1].name
+            yield list(dict.fromkeys(row.email for row in rows if row.email))
+
+            if len(rows) < page_size:
+                return
+
+    def _send_streaming_newsletter(
+        self,
+        source: Dict,
+        subject: str,
+        content: str,
+        recipients_count: int,
+        extra: Dict = None,
+        error_title: str = "Error sending newsletter",
+    ) -> Dict:
+        """
+        Create the Newsletter record and queue its Email Queue entries page by page
 
-        # Send via Newsletter
+        The Newsletter only records what was sent; recipients are not stored as
+        child rows. Large sends are handed to a background job so the request
+        never holds one long transaction.
+        """
         try:
             newsletter = frappe.get_doc(
                 {
                     "doctype": "Newsletter",
-                    "subject": subject or "Organization Newsletter",
+                    "subject": subject,
                     "content_type": "Rich Text",
                     "message": content,
                     "send_from": frappe.session.user,
                     "schedule_send": 0,  # Send immediately
                 }
             )
+            newsletter.insert()
 
-            for email in eligible_emails:
-                newsletter.append("recipients", {"email": email})
-
-            newsletter.save()
+            result = {
+                "success": True,
+                "recipients_count": recipients_count,
+                "newsletter": newsletter.name,
+                **(extra or {}),
+            }
 
-            # Queue for sending
-            if not frappe.flags.in_test:
-                newsletter.queue_all()
+            if recipients_count > BACKGROUND_SEND_THRESHOLD and not frappe.flags.in_test:
+                frappe.enqueue(
+                    "verenigingen.email.simplified_email_manager.queue_newsletter_recipients",
+                    newsletter_name=newsletter.name,
+                    source=source,
+                    queue="long",
+                    timeout=3600,
+                    enqueue_after_commit=True,
+                )
+                result["queued_in_background"] = True
+            else:
+                result["queued_count"] = queue_newsletter_recipients(newsletter.name, source, commit=False)
 
-            return {"success": True, "recipients_count": len(eligible_emails), "newsletter": newsletter.name}
+            return result
 
         except Exception as e:
-            frappe.log_error(f"Error sending organization-wide email: {str(e)}", "SimplifiedEmailManager")
+            frappe.log_error(f"{error_title}: {str(e)}", "SimplifiedEmailManager")
             return {"success": False, "error": str(e)}
 
     def get_segment_preview(self, chapter_name: str, segment: str = "all") -> Dict:
@@ -344,3 +415,56 @@ def send_organization_newsletter(subject: str, content: str, filters: Dict = Non
     manager = SimplifiedEmailManager(chapter_doc)
 
     return manager.send_organization_wide(filters=filters, subject=subject, content=content)
+
+
+def queue_newsletter_recipients(
+    newsletter_name: str,
+    source: Dict,
+    page_size: int = RECIPIENT_PAGE_SIZE,
+    emails_per_hour: int = DEFAULT_EMAILS_PER_HOUR,
+    commit: bool = True,
+) -> int:
+    """
+    Stream recipients into Email Queue in bulk chunks
+
+    Each page of recipients becomes one Email Queue entry, staggered with
+    ``send_after`` so the outgoing mail rate stays under ``emails_per_hour``.
+    When ``commit`` is set (background job), each chunk is committed on its own
+    so no transaction grows with the size of the send.
+
+    Args:
+        newsletter_name: Newsletter the emails are sent for
+        source: Recipient source, see SimplifiedEmailManager.iter_recipient_pages
+        page_size: Recipients per Email Queue entry
+        emails_per_hour: Target sending rate used to stagger chunks
+        commit: Commit after every chunk
+
+    Returns:
+        Number of recipients queued
+    """
+    newsletter = frappe.get_doc("Newsletter", newsletter_name)
+    chunk_interval = 3600.0 * page_size / max(cint(emails_per_hour), 1)
+    start = now_datetime()
+    queued = 0
+
+    for chunk_index, emails in enumerate(SimplifiedEmailManager.iter_recipient_pages(source, page_size)):
+        if not emails:
+            continue
+
+        frappe.sendmail(
+            recipients=emails,
+            sender=newsletter.send_from,
+            subject=newsletter.subject,
+            message=newsletter.message,
+            reference_doctype="Newsletter",
+            reference_name=newsletter.name,
+            send_after=add_to_date(start, seconds=chunk_index * chunk_interval) if chunk_index else None,
+        )
+        queued += len(emails)
+
+        if commit:
+            frappe.db.commit()
+
+    newsletter.db_set({"email_sent": 1, "total_recipients": queued}, commit=commit)
+
+    return queued
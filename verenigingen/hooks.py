@@ -326,6 +326,10 @@ doc_events = {
     # Updated to use dues schedule system instead of subscription hooks
     "Chapter": {
         "validate": "verenigingen.verenigingen.doctype.chapter.chapter.validate_chapter_access",
+        "on_update": [
+            "verenigingen.email.segment_bitmaps.on_chapter_change",  # Segment bitmap refresh
+            "verenigingen.utils.cache_invalidation.on_document_update",  # Cache invalidation
+        ],
     },
     "Verenigingen Settings": {
         "validate": "verenigingen.validations.validate_verenigingen_settings",
@@ -425,6 +429,10 @@ doc_events = {
     "Bank Transaction": {
         "on_submit": "verenigingen.utils.donor_auto_creation.process_payment_for_donor_creation",
     },
+    # Keep the indexed IBAN lookup column in sync
+    "Bank Account": {
+        "validate": "verenigingen.utils.iban_lookup.set_normalized_iban",
+    },
     "Expense Claim": {
         "validate": "verenigingen.utils.account_group_validation_hooks.validate_expense_claim",
         "after_save": "verenigingen.events.expense_events.emit_expense_claim_updated",
@@ -454,6 +462,7 @@ doc_events = {
     },
     # Member updates can affect board member roles and email groups
     "Member": {
+        "validate": "verenigingen.utils.iban_lookup.set_normalized_iban",
         "before_save": "verenigingen.verenigingen.doctype.member.member_utils.update_termination_status_display",
         "after_save": [
             "verenigingen.verenigingen.doctype.member.member.handle_fee_override_after_save",
@@ -463,10 +472,30 @@ doc_events = {
         "on_update": [
             "verenigingen.utils.chapter_role_events.on_member_on_update",
             "verenigingen.utils.cache_invalidation.on_document_update",  # Cache invalidation
+            "verenigingen.email.segment_bitmaps.on_member_change",  # Segment bitmap refresh
+            "verenigingen.utils.address_matching.address_clusters.on_member_update",  # Address clusters
+        ],
+        "on_trash": "verenigingen.email.segment_bitmaps.on_member_change",
+        "after_delete": "verenigingen.utils.address_matching.address_clusters.on_member_delete",
+    },
+    # Keep member address fingerprints in step with edits to their primary address
+    "Address": {
+        "on_update": "verenigingen.tasks.address_optimization.on_address_update",
+    },
+    # Volunteer status feeds the volunteer and board member email segments
+    "Volunteer": {
+        "on_update": [
+            "verenigingen.email.segment_bitmaps.on_volunteer_change",
+            "verenigingen.utils.cache_invalidation.on_document_update",  # Cache invalidation
+        ],
+        "on_trash": [
+            "verenigingen.email.segment_bitmaps.on_volunteer_change",
+            "verenigingen.utils.cache_invalidation.on_document_update",  # Cache invalidation
         ],
     },
     # SEPA Mandate events for cache invalidation
     "SEPA Mandate": {
+        "validate": "verenigingen.utils.iban_lookup.set_normalized_iban",
         "after_save": [
             "verenigingen.utils.cache_invalidation.on_document_update",
             "verenigingen.utils.performance_event_handlers.on_sepa_mandate_change",  # Safe performance optimization
@@ -474,10 +503,17 @@ doc_events = {
         "on_update": [
             "verenigingen.utils.cache_invalidation.on_document_update",
             "verenigingen.utils.performance_event_handlers.on_sepa_mandate_change",  # Safe performance optimization
+            # Rescore the mandate in the mandate health table
+            "verenigingen.verenigingen_payments.utils.sepa_mandate_health.on_mandate_update",
         ],
         "on_submit": "verenigingen.utils.cache_invalidation.on_document_submit",
         "on_cancel": "verenigingen.utils.cache_invalidation.on_document_cancel",
         "on_trash": "verenigingen.utils.cache_invalidation.on_document_update",
+        "after_delete": "verenigingen.verenigingen_payments.utils.sepa_mandate_health.on_mandate_delete",
+    },
+    # Usage rows saved on their own (collected, failed, returned) rescore their mandate
+    "SEPA Mandate Usage": {
+        "on_update": "verenigingen.verenigingen_payments.utils.sepa_mandate_health.on_mandate_usage_update",
     },
     # Volunteer Expense approval validation
     "Volunteer Expense": {
@@ -495,11 +531,21 @@ doc_events = {
         "before_delete": "verenigingen.utils.chapter_role_profile_manager.on_chapter_board_member_remove",
         "on_update": "verenigingen.utils.chapter_role_profile_manager.on_chapter_board_member_update",
     },
+    # Drop this worker's cached roles for the user (API security role matrix)
+    "User": {
+        "on_update": "verenigingen.utils.security.security_matrix.on_user_update",
+    },
 }
 
 # Scheduled Tasks
 # ---------------
 scheduler_events = {
+    "cron": {
+        # Write buffered audit events in bulk
+        "* * * * *": ["verenigingen.utils.security.audit_buffer.flush_audit_buffer"],
+        # Materialize monitoring dashboard widgets
+        "*/5 * * * *": ["verenigingen.utils.monitoring_metrics_store.materialize_dashboard_metrics"],
+    },
     "daily": [
         # Member financial history refresh - runs once daily
         "verenigingen.verenigingen.doctype.member.scheduler.refresh_all_member_financial_histories",
@@ -509,6 +555,9 @@ scheduler_events = {
         "verenigingen.email.email_group_sync.scheduled_email_group_sync",
         "verenigingen.email.analytics_tracker.cleanup_old_email_analytics",
         "verenigingen.email.automated_campaigns.process_scheduled_campaigns",
+        "verenigingen.email.segment_bitmaps.rebuild_segment_bitmaps",
+        # Rescore mandates whose score changes with the date (lapsing mandates, ageing returns)
+        "verenigingen.verenigingen_payments.utils.sepa_mandate_health.rebuild_mandate_health",
         # Core membership system
         "verenigingen.verenigingen.doctype.membership.scheduler.process_expired_memberships",
         "verenigingen.verenigingen.doctype.membership.scheduler.send_renewal_reminders",
@@ -561,6 +610,7 @@ scheduler_events = {
         "verenigingen.utils.security.audit_logging.cleanup_old_audit_logs",
         # Monitoring and alerting system
         "verenigingen.utils.alert_manager.run_daily_checks",
+        "verenigingen.utils.monitoring_metrics_store.cleanup_old_metric_snapshots",
         # Address optimization maintenance
         "verenigingen.tasks.address_optimization.update_all_member_address_fingerprints",
         # Authentication system monitoring
@@ -587,6 +637,8 @@ scheduler_events = {
         "verenigingen.utils.security.audit_logging.weekly_security_health_check",
         # Address display refresh
         "verenigingen.tasks.address_optimization.refresh_member_address_displays",
+        # Address cluster index rebuild (members changed by imports and direct SQL)
+        "verenigingen.utils.address_matching.address_clusters.rebuild_address_clusters",
         # Expense history integrity validation
         "verenigingen.utils.expense_history_batch_processor.validate_expense_history_integrity",
         # Session cleanup to prevent "User None is disabled" errors
@@ -700,6 +752,11 @@ has_permission = {
     "Project": "verenigingen.utils.project_permissions.has_project_permission_via_team",
 }
 
+# Bulk print checks permission per document; authorize the selection in one pass first
+override_whitelisted_methods = {
+    "frappe.utils.print_format.download_multi_pdf": "verenigingen.permissions.download_multi_pdf",
+}
+
 # Workflow Action Handlers
 # -------------------------
 workflow_action_handlers = {
@@ -867,6 +924,12 @@ fixtures = [
             ["fieldname", "=", "custom_eboekhouden_grootboek_nummer"],
         ],
     },
+    {
+        "doctype": "Custom Field",
+        "filters": [
+            ["fieldname", "=", "custom_normalized_iban"],
+        ],
+    },
     # Membership Types
     {
         "doctype": "Membership Type",
@@ -964,6 +1027,14 @@ on_logout = "verenigingen.auth_hooks.on_logout"
 # Session validation is now handled properly in the on_session_creation hook.
 # before_request = "verenigingen.auth_hooks.validate_session_before_request"
 
+# Hand audit events buffered during the request to the bulk writer, and flush
+# operation metrics recorded during the request or job to Redis
+after_request = [
+    "verenigingen.utils.security.audit_buffer.flush_request_audit_events",
+    "verenigingen.utils.operation_metrics.flush_operation_metrics",
+]
+after_job = ["verenigingen.utils.operation_metrics.flush_operation_metrics"]
+
 # Custom auth validation (if needed)
 # auth_hooks = [
 #     "verenigingen.auth_hooks.validate_auth_via_api"
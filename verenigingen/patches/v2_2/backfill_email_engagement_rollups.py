@@ -0,0 +1,19 @@
+"""
+Backfill email engagement rollups from existing raw open/click/unsubscribe events.
+
+Engagement scores now read per-member daily rollups and decayed counters that
+are maintained as events arrive. Events recorded before the rollups existed are
+folded in once here, before the daily compaction starts removing raw events.
+"""
+
+import frappe
+
+
+def execute():
+    """Build Email Engagement Rollup and Member Email Engagement from raw events"""
+    from verenigingen.email.analytics_tracker import EmailAnalyticsTracker
+
+    result = EmailAnalyticsTracker().rebuild_engagement_rollups()
+
+    if frappe.flags.in_migrate:
+        print(f"Email engagement rollups backfilled: {result.get('rollups', 0)} rows")
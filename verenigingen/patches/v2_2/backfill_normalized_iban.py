@@ -0,0 +1,54 @@
+"""
+Backfill the indexed normalized IBAN columns.
+
+IBAN lookups now compare against normalized_iban (Member, SEPA Mandate) and
+custom_normalized_iban (Bank Account), which are maintained on save. Existing
+records are filled in once here with the same normalization in SQL.
+"""
+
+import frappe
+from frappe.custom.doctype.custom_field.custom_field import create_custom_fields
+
+NORMALIZE_SQL = "NULLIF(UPPER(REPLACE(REPLACE({column}, ' ', ''), '-', '')), '')"
+
+
+def execute():
+    """Fill normalized IBAN columns from the existing iban fields"""
+    # Fixtures sync after patches, so make sure the Bank Account column exists
+    create_custom_fields(
+        {
+            "Bank Account": [
+                {
+                    "fieldname": "custom_normalized_iban",
+                    "label": "Normalized IBAN",
+                    "fieldtype": "Data",
+                    "length": 34,
+                    "insert_after": "iban",
+                    "hidden": 1,
+                    "read_only": 1,
+                    "no_copy": 1,
+                    "search_index": 1,
+                    "description": "IBAN (or account number) without spaces in upper case, "
+                    "maintained on save for indexed lookups",
+                }
+            ]
+        },
+        update=True,
+    )
+
+    normalized_iban = NORMALIZE_SQL.format(column="iban")
+    normalized_account_no = NORMALIZE_SQL.format(column="bank_account_no")
+
+    frappe.db.sql(f"UPDATE `tabMember` SET normalized_iban = {normalized_iban}")
+    frappe.db.sql(f"UPDATE `tabSEPA Mandate` SET normalized_iban = {normalized_iban}")
+    frappe.db.sql(
+        f"""
+        UPDATE `tabBank Account`
+        SET custom_normalized_iban = COALESCE({normalized_iban}, {normalized_account_no})
+    """
+    )
+
+    frappe.db.commit()
+
+    if frappe.flags.in_migrate:
+        print("Normalized IBAN columns backfilled for Member, SEPA Mandate and Bank Account")
@@ -0,0 +1,19 @@
+"""
+Build the member address cluster index.
+
+"Other members at this address" now reads Member Address Cluster, which is
+maintained as member fingerprints change. Existing members are grouped once
+here so lookups use the index straight after the upgrade.
+"""
+
+import frappe
+
+
+def execute():
+    """Group existing members into Member Address Cluster by address fingerprint"""
+    from verenigingen.utils.address_matching.address_clusters import rebuild_address_clusters
+
+    result = rebuild_address_clusters()
+
+    if frappe.flags.in_migrate:
+        print(f"Member address clusters built: {result.get('row_count', 0)} addresses")
@@ -0,0 +1,20 @@
+"""
+Build the SEPA mandate health table.
+
+Mandate health reports and expiry alerts now read SEPA Mandate Health, which
+is maintained as mandates, their usage and return files change. Existing
+mandates are scored once here so reports use the table straight after the
+upgrade.
+"""
+
+import frappe
+
+
+def execute():
+    """Score existing mandates into SEPA Mandate Health"""
+    from verenigingen.verenigingen_payments.utils.sepa_mandate_health import rebuild_mandate_health
+
+    result = rebuild_mandate_health()
+
+    if frappe.flags.in_migrate:
+        print(f"SEPA mandate health built: {result.get('row_count', 0)} mandates")
@@ -0,0 +1,17 @@
+"""
+Drop the SEPA_Distributed_Lock table.
+
+SEPA locks are kept in Redis (verenigingen.utils.distributed_lock). The table
+was created on demand by the old database-backed lock manager and is no
+longer read or written.
+"""
+
+import frappe
+
+
+def execute():
+    """Drop the unused database lock table if it exists"""
+    frappe.db.sql_ddl("DROP TABLE IF EXISTS `tabSEPA_Distributed_Lock`")
+
+    if frappe.flags.in_migrate:
+        print("Dropped SEPA_Distributed_Lock table (locks now kept in Redis)")
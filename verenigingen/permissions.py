@@ -56,7 +56,8 @@ Technical Implementation:
 """
 
 import time
-from functools import lru_cache
+from contextlib import contextmanager
+from functools import lru_cache, wraps
 
 import frappe
 
@@ -140,6 +141,7 @@ def clear_permission_cache():
     try:
         get_user_chapter_memberships_cached.cache_clear()
         get_user_treasurer_chapters_cached.cache_clear()
+        clear_permission_memo()
 
         # Clear Frappe's internal cache as well
         if hasattr(frappe.local, "cache"):
@@ -154,6 +156,300 @@ def get_cache_key():
     return int(time.time() // 300)  # 5-minute cache intervals
 
 
+# Request-Scoped Permission Memo
+# ==============================
+# Frappe calls the has_*_permission hooks once per document, so list, report and
+# print views repeat the same role, member and chapter lookups hundreds of times
+# per request. The memo below lives exactly as long as one HTTP request (or one
+# explicit permission_memo_scope block) and holds both those lookups and the
+# final per-document decisions. Outside a request and outside a scope nothing is
+# memoized, so background jobs and tests always see fresh data.
+
+
+def get_permission_memo():
+    """Return the active permission memo dict, or None when memoization is off"""
+    scope = getattr(frappe.local, "permission_memo_scope", None)
+    if scope is not None:
+        return scope
+
+    request = getattr(frappe.local, "request", None)
+    if request is None:
+        return None
+
+    owner = getattr(frappe.local, "permission_memo_owner", None)
+    if owner != id(request):
+        frappe.local.permission_memo_owner = id(request)
+        frappe.local.permission_memo = {}
+    return frappe.local.permission_memo
+
+
+@contextmanager
+def permission_memo_scope():
+    """Memoize permission lookups and decisions for the duration of the block"""
+    previous = getattr(frappe.local, "permission_memo_scope", None)
+    if previous is None:
+        request_memo = get_permission_memo()
+        frappe.local.permission_memo_scope = request_memo if request_memo is not None else {}
+    try:
+        yield frappe.local.permission_memo_scope
+    finally:
+        frappe.local.permission_memo_scope = previous
+
+
+def clear_permission_memo():
+    """Drop memoized decisions, e.g. after changing chapter membership mid-request"""
+    memo = get_permission_memo()
+    if memo is not None:
+        memo.clear()
+
+
+def _memoized(key, compute):
+    memo = get_permission_memo()
+    if memo is None:
+        return compute()
+    if key not in memo:
+        memo[key] = compute()
+    return memo[key]
+
+
+def get_memoized_roles(user):
+    """frappe.get_roles, memoized per request"""
+    return _memoized(("roles", user), lambda: frappe.get_roles(user))
+
+
+def get_user_member(user):
+    """Member record linked to a user account, memoized per request"""
+    return _memoized(("user_member", user), lambda: frappe.db.get_value("Member", {"user": user}, "name"))
+
+
+def get_user_board_chapters(user_member):
+    """Chapters where the member is an active board member, memoized per request"""
+
+    def compute():
+        return {
+            row[0]
+            for row in frappe.db.sql(
+                """
+                SELECT DISTINCT cbm.parent as chapter_name
+                FROM `tabChapter Board Member` cbm
+                JOIN `tabVolunteer` v ON cbm.volunteer = v.name
+                WHERE v.member = %s AND cbm.is_active = 1
+            """,
+                user_member,
+            )
+        }
+
+    return _memoized(("board_chapters", user_member), compute)
+
+
+def get_member_active_chapters(member_name):
+    """Chapters where the member has an active Chapter Member row, memoized per request"""
+
+    def compute():
+        return {
+            row[0]
+            for row in frappe.db.sql(
+                """
+                SELECT DISTINCT parent as chapter_name
+                FROM `tabChapter Member`
+                WHERE member = %s AND status = 'Active'
+            """,
+                member_name,
+            )
+        }
+
+    return _memoized(("member_chapters", member_name), compute)
+
+
+def get_linked_member(doctype, name):
+    """``member`` field of a Volunteer or Membership Termination Request, memoized per request"""
+    return _memoized(("linked_member", doctype, name), lambda: frappe.db.get_value(doctype, name, "member"))
+
+
+def _get_address_member(user):
+    """Member matched to a user by email first, then by user link, memoized per request"""
+
+    def compute():
+        return frappe.db.get_value("Member", {"email": user}, "name") or get_user_member(user)
+
+    return _memoized(("address_member", user), compute)
+
+
+def get_member_primary_address(member_name):
+    """Primary address of a member, memoized per request"""
+    return _memoized(
+        ("primary_address", member_name),
+        lambda: frappe.db.get_value("Member", member_name, "primary_address"),
+    )
+
+
+def memoize_permission_decision(doctype):
+    """
+    Memoize a has_*_permission hook per (doctype, document, user)
+
+    Unsaved documents are never memoized: their name is temporary and their
+    fields may still change before the next check.
+    """
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(doc, user=None, permission_type=None):
+            user = user or frappe.session.user
+            name = doc.name if hasattr(doc, "name") else doc if isinstance(doc, str) else None
+
+            is_new = getattr(doc, "is_new", None)
+            if not name or (callable(is_new) and is_new()):
+                return fn(doc, user, permission_type)
+
+            return _memoized(("decision", doctype, name, user), lambda: fn(doc, user, permission_type))
+
+        return wrapper
+
+    return decorator
+
+
+def _prefetch_member_chapters(memo, member_names):
+    member_names = [m for m in set(member_names) if m and ("member_chapters", m) not in memo]
+    if not member_names:
+        return
+
+    chapters = {member: set() for member in member_names}
+    for member, chapter in frappe.db.sql(
+        """
+        SELECT DISTINCT member, parent
+        FROM `tabChapter Member`
+        WHERE member IN %(members)s AND status = 'Active'
+    """,
+        {"members": tuple(member_names)},
+    ):
+        chapters[member].add(chapter)
+
+    for member, member_chapters in chapters.items():
+        memo[("member_chapters", member)] = member_chapters
+
+
+def _prefetch_linked_members(memo, doctype, names):
+    linked = dict.fromkeys(names)
+    linked.update(
+        frappe.db.sql(
+            f"SELECT name, member FROM `tab{doctype}` WHERE name IN %(names)s",
+            {"names": tuple(names)},
+        )
+    )
+    for name, member in linked.items():
+        memo[("linked_member", doctype, name)] = member
+    return [member for member in linked.values() if member]
+
+
+def _prefetch_address_links(memo, names, user):
+    member_name = _get_address_member(user)
+    if not member_name:
+        return
+
+    linked = {
+        row[0]
+        for row in frappe.db.sql(
+            """
+            SELECT parent FROM `tabDynamic Link`
+            WHERE parent IN %(names)s
+                AND parenttype = 'Address'
+                AND link_doctype = 'Member'
+                AND link_name = %(member)s
+        """,
+            {"names": tuple(names), "member": member_name},
+        )
+    }
+    for name in names:
+        memo[("address_linked", name, member_name)] = name in linked
+    get_member_primary_address(member_name)
+
+
+PREAUTHORIZATION_HANDLERS = {
+    "Member": "has_member_permission",
+    "Volunteer": "has_volunteer_permission",
+    "Address": "has_address_permission",
+    "Membership Termination Request": "has_membership_termination_request_permission",
+}
+
+
+def preauthorize_documents(doctype, names, user=None, permission_type=None):
+    """
+    Resolve permission decisions for many documents with a constant number of queries
+
+    Prefetches roles, the user's member and board chapters, the documents'
+    linked members and their chapters (one chapter-overlap query for all names)
+    into the permission memo, then evaluates each document with the regular
+    has_*_permission hook, which now only hits the memo. Inside a request the
+    decisions stay memoized, so Frappe's own per-document hook calls that follow
+    are free.
+
+    Args:
+        doctype: One of Member, Volunteer, Address, Membership Termination Request
+        names: Document names to authorize
+        user: User to check (defaults to session user)
+        permission_type: Permission type passed through to the hooks
+
+    Returns:
+        Dict mapping document name to True/False
+    """
+    if doctype not in PREAUTHORIZATION_HANDLERS:
+        frappe.throw(f"Bulk pre-authorization is not supported for {doctype}")
+
+    user = user or frappe.session.user
+    names = list(dict.fromkeys(n for n in names or [] if n))
+    if not names:
+        return {}
+
+    check = globals()[PREAUTHORIZATION_HANDLERS[doctype]]
+
+    with permission_memo_scope() as memo:
+        get_memoized_roles(user)
+        user_member = get_user_member(user)
+        if user_member:
+            get_user_board_chapters(user_member)
+
+        if doctype == "Member":
+            _prefetch_member_chapters(memo, names)
+        elif doctype in ("Volunteer", "Membership Termination Request"):
+            _prefetch_member_chapters(memo, _prefetch_linked_members(memo, doctype, names))
+        elif doctype == "Address":
+            _prefetch_address_links(memo, names, user)
+
+        return {name: bool(check(name, user, permission_type)) for name in names}
+
+
+@frappe.whitelist()
+def preauthorize_documents_api(doctype, names, permission_type=None):
+    """Whitelisted API wrapper for preauthorize_documents, for the session user"""
+    return preauthorize_documents(doctype, frappe.parse_json(names), permission_type=permission_type)
+
+
+@frappe.whitelist()
+def download_multi_pdf(doctype, name, format=None, no_letterhead=False, letterhead=None, options=None):
+    """
+    Bulk print with the selected documents pre-authorized together
+
+    Overrides frappe.utils.print_format.download_multi_pdf (see
+    override_whitelisted_methods in hooks.py). Frappe checks print permission
+    once per document; authorizing the selection first leaves those checks to
+    the request memo.
+    """
+    from frappe.utils.print_format import download_multi_pdf as frappe_download_multi_pdf
+
+    if isinstance(doctype, dict):
+        targets = doctype
+    else:
+        targets = {doctype: frappe.parse_json(name)}
+
+    for target_doctype, names in targets.items():
+        if target_doctype in PREAUTHORIZATION_HANDLERS:
+            preauthorize_documents(target_doctype, names, permission_type="print")
+
+    return frappe_download_multi_pdf(
+        doctype, name, format=format, no_letterhead=no_letterhead, letterhead=letterhead, options=options
+    )
+
+
 @frappe.whitelist()
 def can_terminate_member_api(member_name):
     """Whitelisted API wrapper for can_terminate_member"""
@@ -219,6 +515,7 @@ def test_team_member_access(team_name=None):
     return result
 
 
+@memoize_permission_decision("Member")
 def has_member_permission(doc, user=None, permission_type=None):
     """
     Direct permission check for Member doctype with chapter-based access control
@@ -232,10 +529,10 @@ def has_member_permission(doc, user=None, permission_type=None):
     if not user:
         user = frappe.session.user
 
-    # Log for debugging
-    frappe.logger().debug(f"Checking Member permissions for user {user} with roles {frappe.get_roles(user)}")
+    user_roles = get_memoized_roles(user)
 
-    user_roles = frappe.get_roles(user)
+    # Log for debugging
+    frappe.logger().debug(f"Checking Member permissions for user {user} with roles {user_roles}")
 
     # Admin roles always have access
     admin_roles = ["System Manager", "Verenigingen Manager", "Verenigingen Administrator"]
@@ -260,17 +557,7 @@ def has_member_permission(doc, user=None, permission_type=None):
                 return False
 
             # Check if the target member is in any of the user's chapters
-            member_chapters = frappe.db.sql(
-                """
-                SELECT DISTINCT parent as chapter_name
-                FROM `tabChapter Member`
-                WHERE member = %s AND status = 'Active'
-            """,
-                member_name,
-                as_dict=True,
-            )
-
-            member_chapter_names = [ch["chapter_name"] for ch in member_chapters]
+            member_chapter_names = get_member_active_chapters(member_name)
 
             # Allow access if there's any chapter overlap
             has_chapter_overlap = bool(set(user_chapter_names) & set(member_chapter_names))
@@ -294,7 +581,7 @@ def has_member_permission(doc, user=None, permission_type=None):
     # For regular members, check if they own the record
     if "Verenigingen Member" in user_roles:
         # Get user's member record
-        user_member = frappe.db.get_value("Member", {"user": user}, "name")
+        user_member = get_user_member(user)
         if user_member == member_name:
             frappe.logger().debug(f"User {user} accessing own member record")
             return True
@@ -311,6 +598,7 @@ def has_member_permission(doc, user=None, permission_type=None):
     return False
 
 
+@memoize_permission_decision("Volunteer")
 def has_volunteer_permission(doc, user=None, permission_type=None):
     """
     Direct permission check for Volunteer doctype with member and chapter-based access control
@@ -327,7 +615,7 @@ def has_volunteer_permission(doc, user=None, permission_type=None):
 
     frappe.logger().debug(f"Checking Volunteer permissions for user {user}")
 
-    user_roles = frappe.get_roles(user)
+    user_roles = get_memoized_roles(user)
 
     # Admin roles always have access
     admin_roles = [
@@ -347,13 +635,13 @@ def has_volunteer_permission(doc, user=None, permission_type=None):
         return False
 
     # Get the volunteer's linked member
-    volunteer_member = frappe.db.get_value("Volunteer", volunteer_name, "member")
+    volunteer_member = get_linked_member("Volunteer", volunteer_name)
     if not volunteer_member:
         frappe.logger().debug(f"Volunteer {volunteer_name} has no linked member")
         return False
 
     # Get current user's member record
-    user_member = frappe.db.get_value("Member", {"user": user}, "name")
+    user_member = get_user_member(user)
     if not user_member:
         frappe.logger().debug(f"User {user} has no Member record")
         return False
@@ -368,32 +656,11 @@ def has_volunteer_permission(doc, user=None, permission_type=None):
     if "Chapter Board Member" in user_roles:
         try:
             # Get chapters where the user is an active board member
-            user_chapters = frappe.db.sql(
-                """
-                SELECT DISTINCT cbm.parent as chapter_name
-                FROM `tabChapter Board Member` cbm
-                JOIN `tabVolunteer` v ON cbm.volunteer = v.name
-                WHERE v.member = %s AND cbm.is_active = 1
-            """,
-                user_member,
-                as_dict=True,
-            )
-
-            if user_chapters:
-                user_chapter_names = [ch["chapter_name"] for ch in user_chapters]
+            user_chapter_names = get_user_board_chapters(user_member)
 
+            if user_chapter_names:
                 # Check if the volunteer's member is in any of the user's chapters
-                volunteer_chapters = frappe.db.sql(
-                    """
-                    SELECT DISTINCT parent as chapter_name
-                    FROM `tabChapter Member`
-                    WHERE member = %s AND status = 'Active'
-                """,
-                    volunteer_member,
-                    as_dict=True,
-                )
-
-                volunteer_chapter_names = [ch["chapter_name"] for ch in volunteer_chapters]
+                volunteer_chapter_names = get_member_active_chapters(volunteer_member)
 
                 # Allow access if there's any chapter overlap
                 has_chapter_overlap = bool(set(user_chapter_names) & set(volunteer_chapter_names))
@@ -538,6 +805,7 @@ def get_donor_permission_query(user):
     return "1=0"
 
 
+@memoize_permission_decision("Address")
 def has_address_permission(doc, user=None, permission_type=None):
     """Permission check for Address doctype - allows members to access their own addresses"""
     if not user:
@@ -545,33 +813,44 @@ def has_address_permission(doc, user=None, permission_type=None):
 
     # Admin roles always have access
     admin_roles = ["System Manager", "Verenigingen Administrator"]
-    if any(role in frappe.get_roles(user) for role in admin_roles):
+    if any(role in get_memoized_roles(user) for role in admin_roles):
         return True
 
+    address_name = doc.name if hasattr(doc, "name") else doc
+
     # Check if this address is linked to the user's member record
-    member_name = frappe.db.get_value("Member", {"email": user}, "name")
-    if not member_name:
-        member_name = frappe.db.get_value("Member", {"user": user}, "name")
+    member_name = _get_address_member(user)
 
     if member_name:
         # Check if address is linked to this member via Dynamic Link
-        link_exists = frappe.db.exists(
-            "Dynamic Link",
-            {"parent": doc.name, "parenttype": "Address", "link_doctype": "Member", "link_name": member_name},
+        link_exists = _memoized(
+            ("address_linked", address_name, member_name),
+            lambda: bool(
+                frappe.db.exists(
+                    "Dynamic Link",
+                    {
+                        "parent": address_name,
+                        "parenttype": "Address",
+                        "link_doctype": "Member",
+                        "link_name": member_name,
+                    },
+                )
+            ),
         )
 
         if link_exists:
             return True
 
         # Also check if this is the member's primary address
-        member_primary_address = frappe.db.get_value("Member", member_name, "primary_address")
-        if member_primary_address == doc.name:
+        if get_member_primary_address(member_name) == address_name:
             return True
 
     # Fall back to standard Contact-based permissions
     contact_name = frappe.db.get_value("Contact", {"email_id": user}, "name")
     if contact_name:
         contact = frappe.get_doc("Contact", contact_name)
+        if isinstance(doc, str):
+            doc = frappe.get_doc("Address", doc)
         return contact.has_common_link(doc)
 
     return False
@@ -997,6 +1276,7 @@ def get_termination_permission_query(user):
     )"""
 
 
+@memoize_permission_decision("Membership Termination Request")
 def has_membership_termination_request_permission(doc, user=None, permission_type=None):
     """
     Direct permission check for Membership Termination Request doctype
@@ -1005,12 +1285,12 @@ def has_membership_termination_request_permission(doc, user=None, permission_typ
     if not user:
         user = frappe.session.user
 
+    user_roles = get_memoized_roles(user)
+
     frappe.logger().debug(
-        f"Checking Membership Termination Request permissions for user {user} with roles {frappe.get_roles(user)}"
+        f"Checking Membership Termination Request permissions for user {user} with roles {user_roles}"
     )
 
-    user_roles = frappe.get_roles(user)
-
     # Admin roles always have access
     admin_roles = ["System Manager", "Verenigingen Administrator"]
     if any(role in user_roles for role in admin_roles):
@@ -1021,9 +1301,7 @@ def has_membership_termination_request_permission(doc, user=None, permission_typ
     termination_member = (
         doc.member
         if hasattr(doc, "member")
-        else frappe.db.get_value(
-            "Membership Termination Request", doc if isinstance(doc, str) else doc.name, "member"
-        )
+        else get_linked_member("Membership Termination Request", doc if isinstance(doc, str) else doc.name)
     )
 
     if not termination_member:
@@ -1034,41 +1312,20 @@ def has_membership_termination_request_permission(doc, user=None, permission_typ
     if "Chapter Board Member" in user_roles:
         try:
             # Get the current user's member record
-            user_member = frappe.db.get_value("Member", {"user": user}, "name")
+            user_member = get_user_member(user)
             if not user_member:
                 frappe.logger().debug(f"User {user} has Chapter Board Member role but no Member record")
                 return False
 
             # Get chapters where the user is an active board member
-            user_chapters = frappe.db.sql(
-                """
-                SELECT DISTINCT cbm.parent as chapter_name
-                FROM `tabChapter Board Member` cbm
-                JOIN `tabVolunteer` v ON cbm.volunteer = v.name
-                WHERE v.member = %s AND cbm.is_active = 1
-            """,
-                user_member,
-                as_dict=True,
-            )
+            user_chapter_names = get_user_board_chapters(user_member)
 
-            if not user_chapters:
+            if not user_chapter_names:
                 frappe.logger().debug(f"User {user} is not an active board member in any chapter")
                 return False
 
-            user_chapter_names = [ch["chapter_name"] for ch in user_chapters]
-
             # Check if the termination target member is in any of the user's chapters
-            target_member_chapters = frappe.db.sql(
-                """
-                SELECT DISTINCT parent as chapter_name
-                FROM `tabChapter Member`
-                WHERE member = %s AND status = 'Active'
-            """,
-                termination_member,
-                as_dict=True,
-            )
-
-            target_member_chapter_names = [ch["chapter_name"] for ch in target_member_chapters]
+            target_member_chapter_names = get_member_active_chapters(termination_member)
 
             # Allow access if there's any chapter overlap
             has_chapter_overlap = bool(set(user_chapter_names) & set(target_member_chapter_names))
@@ -5,97 +5,86 @@ This module contains background tasks that maintain the computed address fields
 for optimal performance of the 'other members at address' functionality.
 """
 
+from typing import Dict, List, Tuple
+
 import frappe
 from frappe.utils import now
 
+from verenigingen.utils.address_matching.address_clusters import refresh_address_clusters
+from verenigingen.utils.address_matching.dutch_address_normalizer import (
+    AddressFingerprintCollisionHandler,
+    DutchAddressNormalizer,
+)
+
+# Members read per page of the nightly scan
+FINGERPRINT_PAGE_SIZE = 2000
+# Members written per UPDATE statement
+FINGERPRINT_UPDATE_CHUNK = 500
+
+ADDRESS_FIELDS = ("address_fingerprint", "normalized_address_line", "normalized_city", "address_last_updated")
 
-def update_all_member_address_fingerprints():
+
+def update_all_member_address_fingerprints(page_size=FINGERPRINT_PAGE_SIZE):
     """
     Nightly task to update computed address fields for all members.
 
     This task ensures that:
     1. All members have computed address fingerprints for fast matching
-    2. Any members with missing computed fields get updated
+    2. Members whose primary address was edited since their last update are refreshed
     3. Performance optimization is maintained across the system
 
+    Members are read with their address in pages of one joined query and
+    written back with bulk UPDATEs. Address edits are normally picked up by
+    on_address_update, so in steady state this finds nothing to do.
+
     Scheduled to run daily at 2:00 AM to minimize system impact.
     """
     try:
         frappe.logger().info("Starting nightly address fingerprint update task")
 
-        # Get all members with primary addresses but missing computed fields
-        members_needing_update = frappe.db.sql(
-            """
-            SELECT name, primary_address
-            FROM `tabMember`
-            WHERE primary_address IS NOT NULL
-            AND primary_address != ''
-            AND (
-                address_fingerprint IS NULL
-                OR address_fingerprint = ''
-                OR normalized_address_line IS NULL
-                OR normalized_address_line = ''
-            )
-            ORDER BY modified DESC
-        """,
-            as_dict=True,
-        )
-
-        if not members_needing_update:
-            frappe.logger().info("No members need address fingerprint updates")
-            return {"status": "success", "updated_count": 0}
-
-        frappe.logger().info(f"Found {len(members_needing_update)} members needing address updates")
-
         updated_count = 0
         error_count = 0
+        total_processed = 0
+        last_name = ""
 
-        # Process members in batches to avoid memory issues
-        batch_size = 50
-        for i in range(0, len(members_needing_update), batch_size):
-            batch = members_needing_update[i : i + batch_size]
+        while True:
+            page = _get_members_needing_update(last_name, page_size)
+            if not page:
+                break
 
-            for member_data in batch:
-                try:
-                    # Load the member document
-                    member = frappe.get_doc("Member", member_data["name"])
-
-                    if member.primary_address:
-                        # Trigger the computed field update
-                        member._update_computed_address_fields()
+            last_name = page[-1]["name"]
+            total_processed += len(page)
 
-                        # Save to database without triggering full validation
-                        frappe.db.set_value(
-                            "Member",
-                            member.name,
-                            {
-                                "address_fingerprint": member.address_fingerprint,
-                                "normalized_address_line": member.normalized_address_line,
-                                "normalized_city": member.normalized_city,
-                                "address_last_updated": member.address_last_updated,
-                            },
-                        )
+            updates, errors = _compute_address_fields(page)
+            error_count += errors
 
-                        updated_count += 1
+            try:
+                _bulk_update_address_fields(updates)
+                refresh_address_clusters(_changed_fingerprints(page, updates))
+                frappe.db.commit()
+                updated_count += len(updates)
+            except Exception as e:
+                frappe.db.rollback()
+                error_count += len(updates)
+                frappe.log_error(
+                    f"Error writing address fields for members after {page[0]['name']}: {str(e)}",
+                    "Address Fingerprint Update",
+                )
 
-                        if updated_count % 10 == 0:
-                            frappe.logger().info(f"Updated {updated_count} members so far...")
+            frappe.logger().info(f"Updated {updated_count} members so far...")
 
-                except Exception as e:
-                    error_count += 1
-                    frappe.log_error(
-                        f"Error updating address fields for member {member_data['name']}: {str(e)}",
-                        "Address Fingerprint Update",
-                    )
+            if len(page) < page_size:
+                break
 
-            # Commit batch changes
-            frappe.db.commit()
+        if not total_processed:
+            frappe.logger().info("No members need address fingerprint updates")
+            return {"status": "success", "updated_count": 0}
 
         result = {
             "status": "success",
             "updated_count": updated_count,
             "error_count": error_count,
-            "total_processed": len(members_needing_update),
+            "total_processed": total_processed,
             "completion_time": now(),
         }
 
@@ -107,6 +96,158 @@ def update_all_member_address_fingerprints():
         return {"status": "error", "error": str(e)}
 
 
+def on_address_update(doc, method=None):
+    """
+    Address on_update hook - refresh the computed fields of the members using
+    this address as their primary address when the street or city changed.
+    """
+    if not (doc.has_value_changed("address_line1") or doc.has_value_changed("city")):
+        return
+
+    try:
+        members = frappe.get_all(
+            "Member", filters={"primary_address": doc.name}, fields=["name", "address_fingerprint"]
+        )
+        if not members:
+            return
+
+        rows = [
+            {
+                "name": member.name,
+                "address_fingerprint": member.address_fingerprint,
+                "address_line1": doc.address_line1,
+                "city": doc.city,
+            }
+            for member in members
+        ]
+        updates, _ = _compute_address_fields(rows)
+        _bulk_update_address_fields(updates)
+        refresh_address_clusters(_changed_fingerprints(rows, updates))
+
+    except Exception as e:
+        frappe.log_error(
+            f"Error updating member address fields for address {doc.name}: {str(e)}",
+            "Address Fingerprint Update",
+        )
+
+
+def _get_members_needing_update(last_name: str, page_size: int) -> List[Dict]:
+    """One page of members, with their primary address, whose computed fields are stale"""
+    return frappe.db.sql(
+        """
+        SELECT m.name, m.address_fingerprint, a.address_line1, a.city
+        FROM `tabMember` m
+        INNER JOIN `tabAddress` a ON a.name = m.primary_address
+        WHERE m.name > %(last_name)s
+        AND (
+            m.address_fingerprint IS NULL
+            OR m.address_fingerprint = ''
+            OR m.normalized_address_line IS NULL
+            OR m.address_last_updated IS NULL
+            OR a.modified > m.address_last_updated
+        )
+        ORDER BY m.name
+        LIMIT %(page_size)s
+    """,
+        {"last_name": last_name, "page_size": page_size},
+        as_dict=True,
+    )
+
+
+def _compute_address_fields(rows: List[Dict]) -> Tuple[List[Tuple], int]:
+    """
+    Normalize and fingerprint a batch of member addresses
+
+    Fingerprint collisions are checked against existing members with one query
+    for the whole batch (and against the batch itself); only a real collision
+    goes through the per-fingerprint resolution of the collision handler.
+
+    Returns:
+        (rows of (member, fingerprint, normalized line, normalized city, timestamp), error count)
+    """
+    computed = []
+    error_count = 0
+    for row in rows:
+        try:
+            normalized_line, normalized_city, fingerprint = DutchAddressNormalizer.normalize_address_pair(
+                row["address_line1"] or "", row["city"] or ""
+            )
+            computed.append((row["name"], fingerprint, normalized_line, normalized_city))
+        except Exception as e:
+            error_count += 1
+            frappe.log_error(
+                f"Error updating address fields for member {row['name']}: {str(e)}",
+                "Address Fingerprint Update",
+            )
+
+    if not computed:
+        return [], error_count
+
+    # Addresses already stored per fingerprint, by member
+    existing: Dict[str, Dict[str, Tuple[str, str]]] = {}
+    for member in frappe.get_all(
+        "Member",
+        filters={"address_fingerprint": ["in", list({row[1] for row in computed})]},
+        fields=["name", "address_fingerprint", "normalized_address_line", "normalized_city"],
+    ):
+        existing.setdefault(member.address_fingerprint, {})[member.name] = (
+            member.normalized_address_line,
+            member.normalized_city,
+        )
+
+    timestamp = now()
+    updates = []
+    batch: Dict[str, Tuple[str, str]] = {}
+    for name, fingerprint, normalized_line, normalized_city in computed:
+        address = (normalized_line, normalized_city)
+        others = [value for member, value in existing.get(fingerprint, {}).items() if member != name]
+        if fingerprint in batch:
+            others.append(batch[fingerprint])
+
+        if any(other != address for other in others):
+            fingerprint = AddressFingerprintCollisionHandler.resolve_collision(
+                fingerprint, normalized_line, normalized_city, name
+            )
+
+        batch.setdefault(fingerprint, address)
+        updates.append((name, fingerprint, normalized_line, normalized_city, timestamp))
+
+    return updates, error_count
+
+
+def _changed_fingerprints(rows: List[Dict], updates: List[Tuple]) -> set:
+    """Old and new fingerprints of the members whose fingerprint changed"""
+    previous = {row["name"]: row.get("address_fingerprint") for row in rows}
+    changed = set()
+    for name, fingerprint, *_ in updates:
+        if previous.get(name) != fingerprint:
+            changed.update((previous.get(name), fingerprint))
+    return changed
+
+
+def _bulk_update_address_fields(updates: List[Tuple]):
+    """Write computed address fields with one UPDATE per chunk of members"""
+    for i in range(0, len(updates), FINGERPRINT_UPDATE_CHUNK):
+        chunk = updates[i : i + FINGERPRINT_UPDATE_CHUNK]
+        names = [row[0] for row in chunk]
+
+        assignments = []
+        values = []
+        for column, field in enumerate(ADDRESS_FIELDS, start=1):
+            assignments.append(f"`{field}` = CASE name {' '.join(['WHEN %s THEN %s'] * len(chunk))} END")
+            for row in chunk:
+                values.extend((row[0], row[column]))
+
+        frappe.db.sql(
+            f"""
+            UPDATE `tabMember`
+            SET {", ".join(assignments)}
+            WHERE name IN ({", ".join(["%s"] * len(names))})
+        """,
+            values + names,
+        )
+
+
 def refresh_member_address_displays():
     """
     Weekly task to refresh the HTML display fields for member addresses.
@@ -197,7 +338,7 @@ def cleanup_orphaned_address_data():
         # Find members with computed fields but no primary address
         orphaned_members = frappe.db.sql(
             """
-            SELECT name, full_name
+            SELECT name, full_name, address_fingerprint
             FROM `tabMember`
             WHERE (primary_address IS NULL OR primary_address = '')
             AND (
@@ -241,6 +382,7 @@ def cleanup_orphaned_address_data():
                     "Address Cleanup",
                 )
 
+        refresh_address_clusters(member_data["address_fingerprint"] for member_data in orphaned_members)
         frappe.db.commit()
 
         result = {
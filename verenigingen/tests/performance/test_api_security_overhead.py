@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+API Security Decorator Overhead Benchmark
+=========================================
+
+Endpoint policies are compiled when the decorator is applied and user roles
+come from a bounded per-worker cache, so the per-call cost of the security
+decorators should be a few frozenset lookups. This micro-benchmark runs a
+decorated endpoint against lightweight collaborators (no database, no Redis)
+and asserts the added overhead stays within budget.
+
+Performance Targets:
+- Decorator overhead: < 50 microseconds per call
+- Role lookups: one frappe.get_roles call per user per cache TTL
+"""
+
+import time
+import types
+import unittest
+from unittest.mock import patch
+
+from verenigingen.utils.security import api_security_framework as framework_module
+from verenigingen.utils.security import security_matrix
+from verenigingen.utils.security.api_security_framework import (
+    APISecurityFramework,
+    OperationType,
+    SecurityLevel,
+    api_security_framework,
+    high_security_api,
+)
+from verenigingen.utils.security.security_matrix import RolePermissionMatrix, UserRoleCache
+
+OVERHEAD_BUDGET_SECONDS = 50e-6
+ITERATIONS = 5000
+
+
+def _fake_frappe(roles):
+    calls = []
+
+    def get_roles(user):
+        calls.append(user)
+        return list(roles)
+
+    fake = types.SimpleNamespace(
+        session=types.SimpleNamespace(user="manager@example.com"),
+        local=types.SimpleNamespace(site="test.local"),
+        request=None,
+        get_roles=get_roles,
+    )
+    return fake, calls
+
+
+def _lightweight_framework():
+    framework = APISecurityFramework.__new__(APISecurityFramework)
+    framework.audit_logger = types.SimpleNamespace(log_event=lambda *args, **kwargs: None)
+    framework.rate_limiter = types.SimpleNamespace(check_token_bucket=lambda *args: None)
+    framework.csrf_protection = types.SimpleNamespace(validate_request=lambda: None)
+    framework.auth_manager = None
+    return framework
+
+
+class TestCompiledEndpointPolicy(unittest.TestCase):
+    def test_policy_compiled_at_decoration(self):
+        @api_security_framework(operation_type=OperationType.MEMBER_DATA, roles=["Chapter Board Member"])
+        def update_member_profile():
+            return "ok"
+
+        policy = update_member_profile._security_policy
+        self.assertEqual(policy.level, SecurityLevel.HIGH)
+        self.assertIn("Chapter Board Member", policy.required_roles)
+        self.assertTrue(policy.requires_csrf)
+        self.assertTrue(policy.operation_key.endswith(".update_member_profile"))
+
+        # Extra roles no longer leak into the shared profile
+        self.assertNotIn(
+            "Chapter Board Member", APISecurityFramework.SECURITY_PROFILES[SecurityLevel.HIGH].required_roles
+        )
+
+    def test_read_only_exemptions_compiled(self):
+        @high_security_api()
+        def get_member_overview():
+            return "ok"
+
+        @high_security_api()
+        def can_terminate_member():
+            return "ok"
+
+        self.assertFalse(get_member_overview._security_policy.requires_csrf)
+        self.assertTrue(get_member_overview._security_policy.audit_successful_calls)
+        self.assertFalse(can_terminate_member._security_policy.audit_successful_calls)
+
+
+class TestRoleCaches(unittest.TestCase):
+    def test_user_role_cache_is_bounded_and_cached(self):
+        fake, calls = _fake_frappe(["Verenigingen Manager"])
+        cache = UserRoleCache(max_users=2, ttl_seconds=60)
+
+        with patch.object(security_matrix, "frappe", fake):
+            for _ in range(3):
+                cache.get("a@example.com")
+            cache.get("b@example.com")
+            cache.get("c@example.com")
+
+        self.assertEqual(calls, ["a@example.com", "b@example.com", "c@example.com"])
+        self.assertEqual(len(cache), 2)
+
+    def test_role_permission_matrix(self):
+        matrix = RolePermissionMatrix({"Staff": ["read"], "Treasurer": ["read", "process"]})
+
+        self.assertEqual(matrix.permissions_for(frozenset(["Staff", "Treasurer"])), {"read", "process"})
+        self.assertEqual(matrix.permissions_for(frozenset(["Guest"])), frozenset())
+
+
+class TestDecoratorOverhead(unittest.TestCase):
+    def test_per_call_overhead_within_budget(self):
+        fake, calls = _fake_frappe(["Verenigingen Manager"])
+
+        def endpoint():
+            return 1
+
+        decorated = high_security_api(operation_type=OperationType.MEMBER_DATA)(endpoint)
+        security_matrix.clear_user_role_cache()
+
+        with patch.object(framework_module, "frappe", fake), patch.object(
+            security_matrix, "frappe", fake
+        ), patch.object(framework_module, "get_security_framework", return_value=_lightweight_framework()):
+            decorated()  # warm the role cache
+
+            start = time.perf_counter()
+            for _ in range(ITERATIONS):
+                endpoint()
+            baseline = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for _ in range(ITERATIONS):
+                decorated()
+            protected = time.perf_counter() - start
+
+        overhead = (protected - baseline) / ITERATIONS
+        print(f"\nAPI security decorator overhead: {overhead * 1e6:.2f} µs/call")
+
+        self.assertEqual(len(calls), 1)
+        self.assertLess(overhead, OVERHEAD_BUDGET_SECONDS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Distributed Token Bucket Benchmark
+==================================
+
+The Mollie and API security rate limiters share their buckets through Redis,
+with every refill-and-take done in one Lua script call. This benchmark runs
+several threads (standing in for gunicorn/RQ workers) against the same bucket
+on the test site's Redis and checks that:
+
+- the limit holds across workers: no more tokens are granted than the bucket
+  capacity plus what refilled during the run
+- the limiter sustains a useful throughput for the request path
+
+Performance Targets:
+- Throughput: > 1000 acquisitions/second across 8 workers
+- Over-grant: 0 tokens beyond capacity + refill
+
+Skipped when the site has no reachable Redis.
+"""
+
+import threading
+import time
+import unittest
+import uuid
+
+import frappe
+
+from verenigingen.verenigingen_payments.core.resilience.rate_limiter import TokenBucketRateLimiter
+
+WORKERS = 8
+THROUGHPUT_SECONDS = 2.0
+MIN_ACQUISITIONS_PER_SECOND = 1000
+
+
+def _redis_available():
+    try:
+        return frappe.cache().ping() is True
+    except Exception:
+        return False
+
+
+@unittest.skipUnless(_redis_available(), "Redis is not available")
+class TestDistributedTokenBucketThroughput(unittest.TestCase):
+    def setUp(self):
+        self.site = frappe.local.site
+        self.key = f"benchmark:{uuid.uuid4().hex}"
+
+    def tearDown(self):
+        TokenBucketRateLimiter(distributed_key=self.key).reset()
+
+    def _run_workers(self, worker):
+        results = [None] * WORKERS
+
+        def run(index):
+            frappe.init(site=self.site)
+            try:
+                results[index] = worker()
+            finally:
+                frappe.destroy()
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(WORKERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_limit_holds_across_workers(self):
+        capacity = 50
+        refill_per_second = 1.0
+
+        def worker():
+            limiter = TokenBucketRateLimiter(
+                max_tokens=capacity, refill_rate=refill_per_second, distributed_key=self.key
+            )
+            return sum(limiter.acquire() for _ in range(40))
+
+        start = time.time()
+        granted = sum(self._run_workers(worker))
+        elapsed = time.time() - start
+
+        allowed = capacity + int(elapsed * refill_per_second) + 1
+        print(f"\nGranted {granted} of {WORKERS * 40} requests (allowed {allowed}) in {elapsed:.2f}s")
+        self.assertGreaterEqual(granted, capacity)
+        self.assertLessEqual(granted, allowed)
+
+    def test_sustained_throughput(self):
+        def worker():
+            limiter = TokenBucketRateLimiter(max_tokens=10**9, refill_rate=10**6, distributed_key=self.key)
+            count = 0
+            deadline = time.time() + THROUGHPUT_SECONDS
+            while time.time() < deadline:
+                limiter.acquire()
+                count += 1
+            return count
+
+        total = sum(self._run_workers(worker))
+        rate = total / THROUGHPUT_SECONDS
+        print(f"\nDistributed token bucket: {rate:,.0f} acquisitions/second across {WORKERS} workers")
+        self.assertGreater(rate, MIN_ACQUISITIONS_PER_SECOND)
+
+
+if __name__ == "__main__":
+    unittest.main()
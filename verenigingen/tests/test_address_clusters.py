@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the member address cluster index
+
+Covers rebuilding clusters from member fingerprints, answering "other members
+at this address" from the cluster row, falling back to the lookup tiers while
+the index is not built, and duplicate detection within clusters.
+"""
+
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+import frappe
+
+from verenigingen.utils import derived_table
+from verenigingen.utils.address_matching import address_clusters
+from verenigingen.utils.address_matching import optimized_matcher as matcher_module
+from verenigingen.utils.address_matching.optimized_matcher import OptimizedAddressMatcher
+
+
+def member_row(name, fingerprint, line="markt 1", city="ede", **fields):
+    return frappe._dict(
+        name=name,
+        address_fingerprint=fingerprint,
+        normalized_address_line=line,
+        normalized_city=city,
+        **fields,
+    )
+
+
+class TestAddressClusters(unittest.TestCase):
+    def setUp(self):
+        db_patcher = patch.object(address_clusters.frappe, "db")
+        self.db = db_patcher.start()
+        self.addCleanup(db_patcher.stop)
+
+        log_patcher = patch.object(address_clusters.frappe, "log_error")
+        log_patcher.start()
+        self.addCleanup(log_patcher.stop)
+
+    def _inserted(self):
+        query, values = next(
+            call.args for call in self.db.sql.call_args_list if "INSERT INTO" in call.args[0]
+        )
+        columns = derived_table.STANDARD_FIELDS + address_clusters.cluster_table.fields
+        rows = [dict(zip(columns, values[i : i + len(columns)])) for i in range(0, len(values), len(columns))]
+        return {row["name"]: row for row in rows}
+
+    def test_refresh_groups_members_by_fingerprint(self):
+        self.db.sql.side_effect = [
+            [
+                member_row("MEM-001", "aaaa"),
+                member_row("MEM-002", "aaaa"),
+                member_row("MEM-003", "bbbb", "dorpsweg 9", "zeist"),
+            ],
+            None,
+        ]
+
+        written = address_clusters.refresh_address_clusters(["bbbb", "aaaa", None, "gone"])
+
+        self.assertEqual(written, 2)
+        # Clusters that still have members are upserted; only the emptied one is deleted
+        self.db.delete.assert_called_once_with(address_clusters.CLUSTER_DOCTYPE, {"name": ("in", ["gone"])})
+        clusters = self._inserted()
+        self.assertEqual(set(clusters), {"aaaa", "bbbb"})
+        self.assertEqual(clusters["aaaa"]["member_count"], 2)
+        self.assertEqual(json.loads(clusters["aaaa"]["members"]), ["MEM-001", "MEM-002"])
+        self.assertEqual(clusters["bbbb"]["normalized_city"], "zeist")
+
+    def test_member_without_housemates_needs_no_member_query(self):
+        self.db.get_value.return_value = '["MEM-001"]'
+        member = MagicMock(primary_address="ADDR-1", address_fingerprint="aaaa")
+        member.name = "MEM-001"
+
+        with patch.object(matcher_module.frappe, "get_doc"), patch.object(
+            OptimizedAddressMatcher, "_fingerprint_lookup"
+        ) as fingerprint_lookup:
+            result = OptimizedAddressMatcher.get_other_members_at_address_optimized(member)
+
+        self.assertEqual(result, [])
+        self.db.get_value.assert_called_once_with(address_clusters.CLUSTER_DOCTYPE, "aaaa", "members")
+        self.db.sql.assert_not_called()
+        fingerprint_lookup.assert_not_called()
+
+    def test_housemates_read_by_primary_key(self):
+        self.db.get_value.return_value = '["MEM-001", "MEM-002"]'
+        self.db.sql.return_value = [{"name": "MEM-002"}]
+        member = MagicMock(primary_address="ADDR-1", address_fingerprint="aaaa")
+        member.name = "MEM-001"
+
+        with patch.object(matcher_module.frappe, "get_doc"):
+            result = OptimizedAddressMatcher.get_other_members_at_address_optimized(member)
+
+        self.assertEqual(result, [{"name": "MEM-002"}])
+        self.assertEqual(self.db.sql.call_args.args[1], {"member_names": ["MEM-002"]})
+
+    def test_lookup_does_not_write_clusters(self):
+        self.db.get_value.return_value = '["MEM-001"]'
+        member = MagicMock(primary_address="ADDR-1", address_fingerprint=None)
+        member.name = "MEM-001"
+        normalized = ("markt 1", "ede", "aaaa")
+
+        with patch.object(matcher_module.frappe, "get_doc"), patch.object(
+            matcher_module.DutchAddressNormalizer, "normalize_address_pair", return_value=normalized
+        ), patch.object(
+            matcher_module.AddressFingerprintCollisionHandler, "detect_collision", return_value=False
+        ):
+            result = OptimizedAddressMatcher.get_other_members_at_address_optimized(member)
+
+        # The member's fingerprint and cluster are stored by the Member hooks and scheduled
+        # tasks, not by reads
+        self.assertEqual(result, [])
+        self.db.get_value.assert_called_once_with("Member Address Cluster", "aaaa", "members")
+        self.db.set_value.assert_not_called()
+        self.db.delete.assert_not_called()
+        self.db.sql.assert_not_called()
+
+    def test_lookup_tiers_used_until_index_is_built(self):
+        self.db.get_value.return_value = None
+        member = MagicMock(primary_address="ADDR-1", address_fingerprint="aaaa")
+        member.name = "MEM-001"
+
+        with patch.object(matcher_module.frappe, "get_doc"), patch.object(
+            OptimizedAddressMatcher, "_fingerprint_lookup", return_value=[{"name": "MEM-002"}]
+        ) as fingerprint_lookup:
+            result = OptimizedAddressMatcher.get_other_members_at_address_optimized(member)
+
+        self.assertEqual(result, [{"name": "MEM-002"}])
+        fingerprint_lookup.assert_called_once_with("aaaa", "MEM-001")
+
+    def test_duplicates_found_within_clusters(self):
+        self.db.sql.return_value = [
+            member_row("MEM-001", "aaaa", full_name="Jan Jansen", email="jan@example.com", status="Active"),
+            member_row("MEM-002", "aaaa", full_name="jan jansen ", email="j2@example.com", status="Active"),
+            member_row("MEM-003", "aaaa", full_name="Piet Jansen", email="piet@example.com", status="Active"),
+            member_row("MEM-004", "bbbb", full_name="Jan Jansen", email="jan@example.com", status="Active"),
+        ]
+
+        with patch.object(address_clusters.frappe, "only_for"):
+            duplicates = address_clusters.find_possible_duplicate_members()
+
+        self.assertEqual(len(duplicates), 1)
+        self.assertEqual(duplicates[0]["matched_on"], "name")
+        self.assertEqual([m["name"] for m in duplicates[0]["members"]], ["MEM-001", "MEM-002"])
+
+
+if __name__ == "__main__":
+    unittest.main()
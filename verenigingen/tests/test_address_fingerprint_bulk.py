@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Unit tests for bulk and incremental member address fingerprinting
+
+Covers the single-pass street type normalization, the nightly task writing
+computed fields with bulk UPDATEs, bulk collision detection and the Address
+on_update hook that keeps members current between nightly runs.
+"""
+
+import unittest
+from unittest.mock import MagicMock, patch
+
+import frappe
+
+from verenigingen.tasks import address_optimization as task
+from verenigingen.utils.address_matching.dutch_address_normalizer import DutchAddressNormalizer
+
+
+class TestAddressFingerprintBulk(unittest.TestCase):
+    def setUp(self):
+        db_patcher = patch.object(task.frappe, "db")
+        self.db = db_patcher.start()
+        self.addCleanup(db_patcher.stop)
+
+        get_all_patcher = patch.object(task.frappe, "get_all", return_value=[])
+        self.get_all = get_all_patcher.start()
+        self.addCleanup(get_all_patcher.stop)
+
+        log_patcher = patch.object(task.frappe, "log_error")
+        log_patcher.start()
+        self.addCleanup(log_patcher.stop)
+
+        clusters_patcher = patch.object(task, "refresh_address_clusters")
+        self.refresh_clusters = clusters_patcher.start()
+        self.addCleanup(clusters_patcher.stop)
+
+    def test_street_abbreviations_expanded_in_one_pass(self):
+        self.assertEqual(DutchAddressNormalizer.normalize_address_line("Hoofd Str. 5"), "hoofd straat 5")
+        self.assertEqual(DutchAddressNormalizer.normalize_address_line("Molen Ln 2"), "molen laan 2")
+        # Abbreviations only match whole words
+        self.assertEqual(DutchAddressNormalizer.normalize_address_line("Kerkstr 5"), "kerkstr 5")
+
+    def test_pair_fingerprint_matches_raw_fingerprint(self):
+        line, city, fingerprint = DutchAddressNormalizer.normalize_address_pair(
+            "Van Hogendorplaan 12", "Den Haag"
+        )
+        self.assertEqual((line, city), ("hogendorplaan van 12", "s-gravenhage"))
+        self.assertEqual(
+            fingerprint, DutchAddressNormalizer.generate_fingerprint("Van Hogendorplaan 12", "Den Haag")
+        )
+
+    def test_nightly_task_writes_page_with_bulk_update(self):
+        page = [
+            {"name": "MEM-001", "address_fingerprint": None, "address_line1": "Markt 1", "city": "Ede"},
+            {"name": "MEM-002", "address_fingerprint": "old", "address_line1": "Markt 1", "city": "Ede"},
+            {"name": "MEM-003", "address_fingerprint": None, "address_line1": "Dorpsweg 9", "city": "Zeist"},
+        ]
+        self.db.sql.side_effect = lambda query, *args, **kwargs: page if "SELECT" in query else None
+
+        result = task.update_all_member_address_fingerprints(page_size=10)
+
+        self.assertEqual((result["updated_count"], result["total_processed"]), (3, 3))
+        updates = [call for call in self.db.sql.call_args_list if "UPDATE" in call.args[0]]
+        self.assertEqual(len(updates), 1)
+        self.db.commit.assert_called_once()
+
+        values = updates[0].args[1]
+        self.assertEqual(values[-3:], ["MEM-001", "MEM-002", "MEM-003"])
+        fingerprints = dict(zip(values[0:6:2], values[1:6:2]))
+        expected = DutchAddressNormalizer.generate_fingerprint("Markt 1", "Ede")
+        self.assertEqual(fingerprints["MEM-001"], expected)
+        # Members at the same address share a fingerprint
+        self.assertEqual(fingerprints["MEM-002"], expected)
+
+        # Clusters of the old and new fingerprints are refreshed
+        refreshed = self.refresh_clusters.call_args.args[0]
+        self.assertEqual(refreshed, {None, "old", expected, fingerprints["MEM-003"]})
+
+    def test_collision_with_other_address_is_resolved(self):
+        _, _, fingerprint = DutchAddressNormalizer.normalize_address_pair("Hoofdstraat 1", "Utrecht")
+        self.get_all.return_value = [
+            frappe._dict(
+                name="MEM-009",
+                address_fingerprint=fingerprint,
+                normalized_address_line="other street 4",
+                normalized_city="elsewhere",
+            )
+        ]
+        rows = [{"name": "MEM-001", "address_line1": "Hoofdstraat 1", "city": "Utrecht"}]
+
+        with patch.object(
+            task.AddressFingerprintCollisionHandler, "resolve_collision", return_value="resolved"
+        ) as resolve:
+            updates, errors = task._compute_address_fields(rows)
+
+        resolve.assert_called_once_with(fingerprint, "hoofdstraat 1", "utrecht", "MEM-001")
+        self.assertEqual((updates[0][1], errors), ("resolved", 0))
+
+    def test_address_edit_updates_members_using_it(self):
+        self.get_all.side_effect = [
+            [
+                frappe._dict(name="MEM-001", address_fingerprint="old"),
+                frappe._dict(name="MEM-002", address_fingerprint="old"),
+            ],
+            [],
+        ]
+        address = MagicMock(address_line1="Dorpsweg 9", city="Zeist")
+        address.name = "ADDR-1"
+        address.has_value_changed.side_effect = lambda field: field == "city"
+
+        task.on_address_update(address)
+
+        query, values = self.db.sql.call_args.args
+        self.assertIn("UPDATE `tabMember`", query)
+        self.assertEqual(values[-2:], ["MEM-001", "MEM-002"])
+        self.assertEqual(values[1], DutchAddressNormalizer.generate_fingerprint("Dorpsweg 9", "Zeist"))
+
+    def test_unrelated_address_edit_is_ignored(self):
+        address = MagicMock()
+        address.has_value_changed.return_value = False
+
+        task.on_address_update(address)
+
+        self.get_all.assert_not_called()
+        self.db.sql.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
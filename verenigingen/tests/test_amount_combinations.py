@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the amount combination matching engine
+
+Covers tolerance handling in cents, fewest-items-first ordering, grouping of
+equal amounts, resolving partial returns of large SEPA batches through
+identify_partial_success_items, and listing every choice among batches with
+equal totals in identify_split_payment_scenario.
+"""
+
+import random
+import time
+import unittest
+from unittest.mock import patch
+
+import frappe
+
+from verenigingen.utils.amount_combinations import find_amount_combinations
+
+
+class TestAmountCombinations(unittest.TestCase):
+    def test_fewest_items_first(self):
+        amounts = [10.00, 20.00, 30.00, 5.00, 25.00]
+
+        combinations = find_amount_combinations(amounts, 30.00)
+
+        self.assertEqual(combinations[0], (2,))
+        self.assertEqual(sorted(combinations[1:3]), [(0, 1), (3, 4)])
+        self.assertEqual([len(c) for c in combinations], sorted(len(c) for c in combinations))
+
+    def test_large_combinations_from_dynamic_programming(self):
+        amounts = [1.00, 2.00, 4.00, 8.00, 16.00, 32.00, 64.00]
+
+        self.assertEqual(find_amount_combinations(amounts, 63.00), [(0, 1, 2, 3, 4, 5)])
+
+    def test_tolerance_in_cents(self):
+        self.assertEqual(find_amount_combinations([10.01, 19.99], 30.02), [(0, 1)])
+        self.assertEqual(find_amount_combinations([10.01, 19.99], 30.03), [])
+        self.assertEqual(find_amount_combinations([10.01, 19.99], 30.03, tolerance=0.03), [(0, 1)])
+
+    def test_equal_amounts_returned_once(self):
+        combinations = find_amount_combinations([25.00] * 50 + [12.50], 50.00, max_results=100)
+
+        # Any two of the fifty equal items make 50.00; they count as one combination
+        self.assertEqual(combinations, [(0, 1)])
+
+    def test_partial_success_lists_every_choice_of_equal_items(self):
+        from verenigingen.api.sepa_duplicate_prevention import identify_partial_success_items
+
+        items = [{"name": f"ITEM-{i}", "amount": 25.00} for i in range(1, 4)]
+
+        combinations = identify_partial_success_items.__wrapped__(items, 50.00)
+
+        self.assertEqual(
+            sorted([item["name"] for item in combination] for combination in combinations),
+            [["ITEM-1", "ITEM-2"], ["ITEM-1", "ITEM-3"], ["ITEM-2", "ITEM-3"]],
+        )
+
+    def test_split_payment_lists_every_choice_of_equal_batches(self):
+        from verenigingen.api import sepa_duplicate_prevention
+
+        batches = [
+            {"name": "DDB-1", "total_amount": 100.00},
+            {"name": "DDB-2", "total_amount": 250.00},
+            {"name": "DDB-3", "total_amount": 100.00},
+        ]
+        transaction = frappe._dict(deposit=350.00, date="2025-03-01")
+
+        with patch.object(sepa_duplicate_prevention.frappe, "get_all", return_value=batches):
+            combinations = sepa_duplicate_prevention.identify_split_payment_scenario.__wrapped__(transaction)
+
+        self.assertEqual(
+            sorted([batch["name"] for batch in combination["batches"]] for combination in combinations),
+            [["DDB-1", "DDB-2"], ["DDB-2", "DDB-3"]],
+        )
+
+    def test_time_budget_enforced_for_many_distinct_amounts(self):
+        rng = random.Random(3)
+        amounts = [rng.randint(500, 20000) / 100 for _ in range(3000)]
+
+        for target in (amounts[5] + amounts[9] + amounts[11] + 999.99, sum(amounts) * 0.6):
+            start = time.monotonic()
+            find_amount_combinations(amounts, target, time_budget=0.5)
+            self.assertLess(time.monotonic() - start, 1.0)
+
+    def test_large_partial_return_resolved_quickly(self):
+        from verenigingen.api.sepa_duplicate_prevention import identify_partial_success_items
+
+        rng = random.Random(7)
+        items = [
+            {"name": f"ITEM-{i:03d}", "amount": rng.choice([12.50, 25.00, 37.50]) + rng.randint(0, 99) / 100}
+            for i in range(200)
+        ]
+        # Only this pair of amounts can make up the returned total
+        items[17]["amount"], items[142]["amount"] = 73.19, 88.41
+        returned = {"ITEM-017", "ITEM-142"}
+        received = sum(item["amount"] for item in items if item["name"] not in returned)
+
+        start = time.monotonic()
+        # Called without the API security wrapper
+        combinations = identify_partial_success_items.__wrapped__(items, received)
+
+        self.assertLess(time.monotonic() - start, 1.0)
+        collected = {item["name"] for item in combinations[0]}
+        self.assertEqual({item["name"] for item in items} - collected, returned)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the buffered audit pipeline
+
+Covers request-scoped buffering, the bulk writer that splits events between
+SEPA Audit Log and API Audit Log, and alert thresholds tracked with sliding
+window counters instead of COUNT queries.
+"""
+
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+import frappe
+
+from verenigingen.utils.security import audit_buffer
+from verenigingen.utils.security.audit_buffer import SlidingWindowCounter
+from verenigingen.utils.security.audit_logging import AuditEventType, AuditSeverity, SEPAAuditLogger
+
+
+class TestRequestBuffering(unittest.TestCase):
+    def setUp(self):
+        self._saved_local = dict(vars(frappe.local))
+        self.addCleanup(self._restore_local)
+        frappe.local.site = "test.local"
+        frappe.local.audit_event_buffer = None
+
+    def _restore_local(self):
+        vars(frappe.local).clear()
+        vars(frappe.local).update(self._saved_local)
+
+    def test_outside_request_is_not_buffered(self):
+        frappe.local.request = None
+        self.assertFalse(audit_buffer.buffer_audit_event({"event_id": "audit_1"}))
+
+    def test_request_events_pushed_in_one_call(self):
+        frappe.local.request = object()
+        for i in range(3):
+            self.assertTrue(audit_buffer.buffer_audit_event({"event_id": f"audit_{i}"}))
+
+        with patch.object(audit_buffer.frappe, "cache") as cache:
+            pipe = cache.return_value.pipeline.return_value
+            pipe.execute.return_value = [3]
+            audit_buffer.flush_request_audit_events()
+
+        pipe.rpush.assert_called_once()
+        pushed = [json.loads(raw)["event_id"] for raw in pipe.rpush.call_args[0][1:]]
+        self.assertEqual(pushed, ["audit_0", "audit_1", "audit_2"])
+        self.assertEqual(frappe.local.audit_event_buffer, [])
+
+
+class TestBulkWriter(unittest.TestCase):
+    def setUp(self):
+        with patch("verenigingen.utils.security.audit_logging.frappe"):
+            self.audit_logger = SEPAAuditLogger()
+        self.audit_logger.logger = MagicMock()
+
+    def _event(self, event_type, severity="info"):
+        return {
+            "event_id": f"audit_{event_type}",
+            "timestamp": "2026-10-18 12:00:00",
+            "event_type": event_type,
+            "severity": severity,
+            "user": "user@example.com",
+            "ip_address": "127.0.0.1",
+            "user_agent": "test",
+            "referer": "",
+            "session_id": "sid",
+            "details": {"batch": "DD-1"},
+            "sensitive_data": False,
+        }
+
+    def test_events_split_between_audit_tables(self):
+        events = [self._event("sepa_batch_created"), self._event("api_call_success")]
+
+        with patch("verenigingen.utils.security.audit_logging.frappe.db") as db:
+            self.audit_logger.write_events(events)
+
+        doctypes = [call.args[0] for call in db.bulk_insert.call_args_list]
+        self.assertEqual(doctypes, ["SEPA Audit Log", "API Audit Log"])
+
+        sepa_call = db.bulk_insert.call_args_list[0]
+        row = dict(zip(sepa_call.kwargs["fields"], sepa_call.kwargs["values"][0]))
+        self.assertEqual(row["name"], "audit_sepa_batch_created")
+        self.assertEqual(row["process_type"], "Batch Generation")
+        self.assertEqual(row["compliance_status"], "Compliant")
+        self.assertTrue(sepa_call.kwargs["ignore_duplicates"])
+        db.commit.assert_called_once()
+        self.assertEqual(self.audit_logger.logger.info.call_count, 2)
+
+    def test_alerts_use_counters_not_queries(self):
+        event = self._event(AuditEventType.UNAUTHORIZED_ACCESS_ATTEMPT.value, "warning")
+        self.audit_logger._alert_counter = MagicMock()
+        self.audit_logger._alert_counter.increment.side_effect = [1, 2, 3]
+
+        with patch("verenigingen.utils.security.audit_logging.frappe.db") as db, patch.object(
+            self.audit_logger, "_trigger_security_alert"
+        ) as trigger:
+            for _ in range(3):
+                self.audit_logger._check_alert_conditions(event)
+
+        db.count.assert_not_called()
+        trigger.assert_called_once_with(
+            AuditEventType.UNAUTHORIZED_ACCESS_ATTEMPT.value, 3, {"count": 3, "window_minutes": 5}
+        )
+
+    def test_alert_events_do_not_trigger_alerts(self):
+        event = self._event(AuditEventType.SUSPICIOUS_ACTIVITY.value, AuditSeverity.CRITICAL.value)
+        event["details"] = {"alert_type": "threshold_exceeded"}
+        self.audit_logger._alert_counter = MagicMock()
+
+        self.audit_logger._check_alert_conditions(event)
+
+        self.audit_logger._alert_counter.increment.assert_not_called()
+
+
+class TestSlidingWindowCounter(unittest.TestCase):
+    def test_local_window_drops_old_events(self):
+        counter = SlidingWindowCounter()
+        self.assertEqual(counter._increment_local("csrf", 1, now=1000.0), 1)
+        self.assertEqual(counter._increment_local("csrf", 1, now=1030.0), 2)
+        self.assertEqual(counter._increment_local("csrf", 1, now=1061.0), 2)
+
+    def test_redis_buckets_are_summed(self):
+        counter = SlidingWindowCounter()
+        with patch.object(audit_buffer.frappe, "cache") as cache:
+            cache.return_value.make_key.side_effect = lambda key: key
+            pipe = cache.return_value.pipeline.return_value
+            pipe.execute.return_value = [1, True, [b"2", None, b"1"]]
+
+            self.assertEqual(counter.increment("csrf", 3), 3)
+
+        keys = pipe.mget.call_args[0][0]
+        self.assertEqual(len(keys), 3)
+        pipe.incr.assert_called_once_with(keys[-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Unit tests for page-level duplicate detection in BulkTransactionImporter
+
+Each page of Mollie payments is checked against existing Bank Transactions
+with a single query, and consumer IBANs are matched to SEPA Mandates in bulk.
+"""
+
+import unittest
+from datetime import date
+from unittest.mock import patch
+
+import frappe
+
+from verenigingen.verenigingen_payments.clients import bulk_transaction_importer
+from verenigingen.verenigingen_payments.clients.bulk_transaction_importer import BulkTransactionImporter
+
+
+def _payment(payment_id, value="10.00", created_at="2025-02-10T10:00:00Z", account=None):
+    payment = {"id": payment_id, "createdAt": created_at, "amount": {"value": value, "currency": "EUR"}}
+    if account:
+        payment["details"] = {"consumerAccount": account}
+    return payment
+
+
+class TestBulkDuplicateDetection(unittest.TestCase):
+    def setUp(self):
+        self.importer = BulkTransactionImporter.__new__(BulkTransactionImporter)
+        self.importer._member_by_iban = {}
+        self.importer._mollie_fields_validated = False
+
+        patcher = patch.object(bulk_transaction_importer.frappe, "db")
+        self.db = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_single_query_for_page(self):
+        self.db.sql.return_value = [
+            frappe._dict(
+                name="BT-1",
+                custom_mollie_payment_id="tr_1",
+                reference_number="tr_1",
+                date=date(2025, 2, 10),
+                deposit=10,
+                withdrawal=0,
+                docstatus=1,
+            ),
+            # Legacy row without Mollie ID, matched by amount/date/reference
+            frappe._dict(
+                name="BT-2",
+                custom_mollie_payment_id=None,
+                reference_number="tr_2",
+                date=date(2025, 2, 10),
+                deposit=10,
+                withdrawal=0,
+                docstatus=0,
+            ),
+            # Cancelled row with a different amount does not count
+            frappe._dict(
+                name="BT-3",
+                custom_mollie_payment_id=None,
+                reference_number="tr_3",
+                date=date(2025, 2, 10),
+                deposit=10,
+                withdrawal=0,
+                docstatus=2,
+            ),
+        ]
+        rows = [self.importer._payment_transaction_data(_payment(f"tr_{i}")) for i in range(1, 5)]
+
+        duplicates = self.importer._find_duplicate_payment_ids(rows)
+
+        self.assertEqual(duplicates, {"tr_1", "tr_2"})
+        self.assertEqual(self.db.sql.call_count, 1)
+
+    def test_negative_amount_becomes_withdrawal(self):
+        row = self.importer._payment_transaction_data(_payment("tr_9", value="-5.50"))
+        self.assertEqual((row["deposit"], row["withdrawal"]), (0, 5.5))
+
+    def test_iban_members_prefetched_once(self):
+        self.db.sql.return_value = [
+            frappe._dict(
+                normalized_iban="NL91ABNA0417164300", member="MEM-1", mandate="MAND-1", source="SEPA Mandate"
+            )
+        ]
+
+        self.importer._prefetch_members_by_iban(["NL91 ABNA 0417 1643 00", "DE89370400440532013000", None])
+        self.importer._prefetch_members_by_iban(["NL91ABNA0417164300"])
+
+        self.assertEqual(self.db.sql.call_count, 1)
+        self.assertEqual(self.importer._member_by_iban["NL91ABNA0417164300"], "MEM-1")
+        self.assertIsNone(self.importer._member_by_iban["DE89370400440532013000"])
+        self.assertEqual(self.importer._find_member_by_payment_details(None, "NL91ABNA0417164300"), "MEM-1")
+        self.assertEqual(self.db.sql.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
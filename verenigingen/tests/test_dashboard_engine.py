@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the dashboard execution engine
+
+Covers dependency ordering, concurrent evaluation, per-widget timeouts,
+serving the last good value when a widget is slow or fails, and keeping
+timed-out and nested widgets from exhausting the pool. Site setup in the
+worker threads is patched out; the widgets here do not touch the database.
+"""
+
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+from verenigingen.utils import dashboard_engine
+from verenigingen.utils.dashboard_engine import DashboardEngine, Widget
+
+
+class TestDashboardEngine(unittest.TestCase):
+    def setUp(self):
+        self.cache = MagicMock()
+        self.cache.hget.return_value = None
+        patches = [
+            patch.object(dashboard_engine.frappe, "cache", return_value=self.cache),
+            patch.object(dashboard_engine.frappe, "init"),
+            patch.object(dashboard_engine.frappe, "connect"),
+            patch.object(dashboard_engine.frappe, "set_user"),
+            patch.object(dashboard_engine.frappe, "destroy"),
+            patch.object(dashboard_engine.frappe, "log_error"),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _engine(self, widgets, **kwargs):
+        with patch.object(dashboard_engine.frappe, "session", MagicMock(user="admin@example.com")):
+            engine = DashboardEngine("test", widgets, **kwargs)
+        context = dashboard_engine._SiteContext("test.local", ".", "admin@example.com")
+        engine._capture_context = lambda: context
+        return engine
+
+    def test_dependencies_receive_values(self):
+        engine = self._engine(
+            [
+                Widget("members", lambda: 10),
+                Widget("fee", lambda: 5),
+                Widget("revenue", lambda members, fee: members * fee, depends_on=("members", "fee")),
+            ],
+            parallel=False,
+        )
+
+        self.assertEqual(engine.values(), {"members": 10, "fee": 5, "revenue": 50})
+
+    def test_independent_widgets_run_concurrently(self):
+        barrier = threading.Barrier(3, timeout=2)
+
+        def widget(value):
+            def compute():
+                barrier.wait()  # Only passes when all three run at the same time
+                return value
+
+            return compute
+
+        engine = self._engine([Widget(name, widget(name)) for name in ("a", "b", "c")], parallel=True)
+
+        results = engine.run()
+
+        statuses = {name: result.status for name, result in results.items()}
+        self.assertEqual(statuses, dict.fromkeys("abc", "ok"))
+
+    def test_slow_widget_served_from_last_good_value(self):
+        self.cache.hget.return_value = {"count": 7}
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        slow = Widget("slow", lambda: release.wait(5) and {"count": 8}, timeout=0.1)
+        engine = self._engine([Widget("fast", lambda: 1), slow], parallel=True)
+
+        start = time.monotonic()
+        results = engine.run()
+
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertEqual(results["fast"].value, 1)
+        self.assertEqual(results["slow"].status, "timeout")
+        self.assertTrue(results["slow"].stale)
+        self.assertEqual(results["slow"].value, {"count": 7})
+
+    def test_running_widget_not_submitted_again_after_timeout(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        calls = []
+
+        def slow():
+            calls.append(1)
+            release.wait(5)
+            return 8
+
+        engine = self._engine([Widget("stuck", slow, timeout=0.1)], parallel=True)
+
+        self.assertEqual(engine.run()["stuck"].status, "timeout")
+        retry = engine.run()["stuck"]
+
+        self.assertEqual((retry.status, retry.error), ("timeout", "Previous run still in progress"))
+        self.assertEqual(len(calls), 1)
+
+        release.set()
+        deadline = time.monotonic() + 2
+        while dashboard_engine._in_flight and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(engine.run()["stuck"].status, "ok")
+
+    def test_queued_widget_cancelled_on_timeout(self):
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        release = threading.Event()
+        self.addCleanup(release.set)
+        queued_calls = []
+
+        engine = self._engine(
+            [
+                Widget("blocking", lambda: release.wait(5), timeout=0.1),
+                Widget("queued", lambda: queued_calls.append(1), timeout=0.1),
+            ],
+            parallel=True,
+        )
+        with patch.object(dashboard_engine, "_get_executor", return_value=executor):
+            results = engine.run()
+
+        release.set()
+        executor.shutdown(wait=True)
+        self.assertEqual(results["queued"].status, "timeout")
+        self.assertEqual(queued_calls, [])
+
+    def test_nested_dashboard_runs_serially_in_worker(self):
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+
+        def nested():
+            inner = DashboardEngine(
+                "inner", [Widget("x", lambda: 2), Widget("y", lambda: 3)], per_user=False, parallel=True
+            )
+            return inner.values()
+
+        engine = self._engine([Widget("outer", nested, timeout=2)], parallel=True)
+        with patch.object(dashboard_engine, "_get_executor", return_value=executor):
+            result = engine.run()["outer"]
+
+        # On the single pool thread the nested widgets could never have been scheduled
+        self.assertEqual((result.status, result.value), ("ok", {"x": 2, "y": 3}))
+
+    def test_failed_widget_uses_default(self):
+        def broken():
+            raise RuntimeError("query failed")
+
+        engine = self._engine([Widget("broken", broken, default=[])], parallel=False)
+
+        result = engine.run()["broken"]
+
+        self.assertEqual((result.status, result.value, result.error), ("error", [], "query failed"))
+
+    def test_circular_dependencies_rejected(self):
+        with self.assertRaises(ValueError):
+            self._engine(
+                [Widget("a", lambda b: b, depends_on=("b",)), Widget("b", lambda a: a, depends_on=("a",))]
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
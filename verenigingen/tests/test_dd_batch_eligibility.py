@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Unit tests for Direct Debit batch eligibility
+
+Covers that eligible invoices come from a single query that excludes batched
+invoices with an anti-join and requires an active mandate, without a mandate
+lookup per invoice, and that sequence types are determined in bulk.
+"""
+
+import unittest
+from unittest.mock import patch
+
+import frappe
+
+from verenigingen.verenigingen_payments.api import dd_batch_optimizer
+
+
+def invoice_row(name, member_status="Active", membership_status="Active"):
+    return frappe._dict(
+        invoice=name,
+        member=f"MEM-{name}",
+        member_status=member_status,
+        membership_status=membership_status,
+        payment_method="SEPA Direct Debit",
+        mandate_reference=f"MANDATE-{name}",
+    )
+
+
+class TestDDBatchEligibility(unittest.TestCase):
+    def setUp(self):
+        db_patcher = patch.object(dd_batch_optimizer.frappe, "db")
+        self.db = db_patcher.start()
+        self.addCleanup(db_patcher.stop)
+
+        for name in ("log_error", "logger"):
+            patcher = patch.object(dd_batch_optimizer.frappe, name)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_eligibility_is_one_query(self):
+        self.db.sql.return_value = [invoice_row("SI-001"), invoice_row("SI-002")]
+
+        invoices = dd_batch_optimizer.get_eligible_invoices_for_batching()
+
+        self.assertEqual([inv.invoice for inv in invoices], ["SI-001", "SI-002"])
+        self.db.sql.assert_called_once()
+        self.db.exists.assert_not_called()
+
+        query = " ".join(self.db.sql.call_args.args[0].split())
+        self.assertIn("NOT EXISTS", query)
+        self.assertIn("ddi.invoice = si.name", query)
+        self.assertNotIn("NOT IN ( SELECT", query)
+        self.assertIn("sm.is_active = 1", query)
+
+    def test_inactive_member_still_excluded(self):
+        self.db.sql.return_value = [invoice_row("SI-001"), invoice_row("SI-002", member_status="Suspended")]
+
+        invoices = dd_batch_optimizer.get_eligible_invoices_for_batching()
+
+        self.assertEqual([inv.invoice for inv in invoices], ["SI-001"])
+
+    def test_standalone_validation_checks_mandate(self):
+        self.db.exists.return_value = None
+
+        self.assertFalse(dd_batch_optimizer.validate_member_eligibility_for_billing(invoice_row("SI-001")))
+        self.db.exists.assert_called_once_with(
+            "SEPA Mandate", {"member": "MEM-SI-001", "status": "Active", "is_active": 1}
+        )
+
+    def test_sequence_types_from_one_query(self):
+        self.db.sql.return_value = [
+            frappe._dict(name="M-1", sign_date="2024-01-01", last_collected="2024-06-01"),
+            frappe._dict(name="M-2", sign_date="2024-01-01", last_collected=None),
+            frappe._dict(name="M-3", sign_date="2024-09-01", last_collected="2024-06-01"),
+        ]
+        invoices = [{"invoice": f"SI-{i}", "mandate": f"M-{i}"} for i in (1, 2, 3)]
+
+        dd_batch_optimizer.attach_sequence_types(invoices)
+
+        self.assertEqual([inv["sequence_type"] for inv in invoices], ["RCUR", "FRST", "FRST"])
+        self.db.sql.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the Direct Debit batch packing engine
+
+Covers the batch limits, FRST/RCUR separation, keeping a customer's
+invoices together, placing every invoice (including leftovers below the
+minimum batch size), amount balancing and packing 100k invoices quickly.
+"""
+
+import random
+import time
+import unittest
+
+from verenigingen.verenigingen_payments.utils.dd_batch_packing import _CapacityTree, pack_invoices
+
+CONFIG = {
+    "max_amount_per_batch": 4000,
+    "max_invoices_per_batch": 20,
+    "min_invoices_per_batch": 3,
+}
+
+
+def make_invoices(count, seed=1, customers=None, frst_share=0.1):
+    rng = random.Random(seed)
+    return [
+        {
+            "invoice": f"SI-{i:06d}",
+            "customer": f"CUST-{rng.randrange(customers or count):06d}",
+            "amount": rng.choice([5.00, 10.00, 15.00, 25.00, 60.00, 120.00, 450.00]),
+            "sequence_type": "FRST" if rng.random() < frst_share else "RCUR",
+        }
+        for i in range(count)
+    ]
+
+
+class TestDDBatchPacking(unittest.TestCase):
+    def assertValidPacking(self, invoices, packing, config=CONFIG):
+        placed = [invoice["invoice"] for batch in packing.batches for invoice in batch]
+        self.assertEqual(sorted(placed), sorted(invoice["invoice"] for invoice in invoices))
+
+        for batch in packing.batches:
+            self.assertLessEqual(len(batch), config["max_invoices_per_batch"])
+            self.assertLessEqual(sum(inv["amount"] for inv in batch), config["max_amount_per_batch"])
+            self.assertEqual(len({inv["sequence_type"] for inv in batch}), 1)
+
+    def test_limits_and_sequence_types_respected(self):
+        invoices = make_invoices(2000)
+
+        packing = pack_invoices(invoices, CONFIG)
+
+        self.assertValidPacking(invoices, packing)
+        self.assertEqual(packing.report["undersized_batches"], 0)
+        self.assertGreaterEqual(packing.report["efficiency"], 90)
+
+    def test_customer_invoices_kept_together(self):
+        invoices = make_invoices(600, seed=2, customers=150)
+
+        packing = pack_invoices(invoices, CONFIG)
+
+        self.assertValidPacking(invoices, packing)
+        batch_of = {}
+        for index, batch in enumerate(packing.batches):
+            for invoice in batch:
+                key = (invoice["customer"], invoice["sequence_type"])
+                self.assertEqual(batch_of.setdefault(key, index), index)
+
+    def test_leftovers_below_minimum_are_not_dropped(self):
+        invoices = make_invoices(43, seed=3, frst_share=0)
+        invoices += [
+            {"invoice": "SI-FRST-1", "customer": "C1", "amount": 10.00, "sequence_type": "FRST"},
+            {"invoice": "SI-FRST-2", "customer": "C2", "amount": 10.00, "sequence_type": "FRST"},
+        ]
+
+        packing = pack_invoices(invoices, CONFIG)
+
+        self.assertValidPacking(invoices, packing)
+        # 43 RCUR invoices: three batches, none below the minimum after topping up
+        self.assertEqual(packing.report["batches_by_partition"], {"FRST": 1, "RCUR": 3})
+        self.assertEqual(packing.report["undersized_batches"], 1)
+
+    def test_amounts_balanced_across_batches(self):
+        invoices = [
+            {"invoice": f"SI-{i}", "customer": f"C{i}", "amount": amount, "sequence_type": "RCUR"}
+            for i, amount in enumerate([500.00] * 10 + [10.00] * 50)
+        ]
+
+        packing = pack_invoices(invoices, CONFIG)
+
+        self.assertValidPacking(invoices, packing)
+        self.assertEqual(len(packing.batches), 3)
+        # First-fit alone puts all large invoices together; balancing spreads them
+        self.assertLessEqual(packing.report["amount_spread"], 500)
+
+    def test_oversized_invoice_gets_own_batch(self):
+        invoices = make_invoices(30, seed=4, frst_share=0)
+        invoices.append(
+            {"invoice": "SI-BIG", "customer": "C-BIG", "amount": 5000.00, "sequence_type": "RCUR"}
+        )
+
+        packing = pack_invoices(invoices, CONFIG)
+
+        self.assertEqual(packing.report["oversized_invoices"], ["SI-BIG"])
+        self.assertIn([invoices[-1]], packing.batches)
+
+    def test_capacity_tree_finds_first_batch_with_room(self):
+        rng = random.Random(11)
+        for size in (1, 2, 7, 64, 100):
+            capacities = [rng.randint(-1, 50) for _ in range(size)]
+            tree = _CapacityTree(size, -1)
+            for index, capacity in enumerate(capacities):
+                tree.set(index, capacity)
+
+            for value in range(0, 52, 3):
+                for start in range(size + 1):
+                    expected = next((i for i in range(start, size) if capacities[i] >= value), -1)
+                    self.assertEqual(tree.first_at_least(value, start), expected)
+
+    def test_hundred_thousand_invoices(self):
+        invoices = make_invoices(100_000, seed=5, customers=80_000)
+
+        start = time.monotonic()
+        packing = pack_invoices(invoices, CONFIG)
+        elapsed = time.monotonic() - start
+
+        self.assertValidPacking(invoices, packing)
+        self.assertLess(elapsed, 10)
+        self.assertEqual(packing.report["invoices"], 100_000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Unit tests for derived tables
+
+Covers upserting rows so concurrent refreshes of a key cannot fail on the
+primary key, deleting only the keys left without a row, and a rebuild that
+replaces rows without emptying the table first.
+"""
+
+import unittest
+from unittest.mock import patch
+
+from verenigingen.utils import derived_table
+from verenigingen.utils.derived_table import DerivedTable
+
+
+class TestDerivedTable(unittest.TestCase):
+    def setUp(self):
+        db_patcher = patch.object(derived_table.frappe, "db")
+        self.db = db_patcher.start()
+        self.addCleanup(db_patcher.stop)
+
+        log_patcher = patch.object(derived_table.frappe, "log_error")
+        self.log_error = log_patcher.start()
+        self.addCleanup(log_patcher.stop)
+
+        self.table = DerivedTable("Test Summary", ["total"], "Test Summary")
+
+    def test_rows_are_upserted(self):
+        with patch.object(derived_table, "WRITE_CHUNK", 2):
+            written = self.table.write([("a", 1), ("b", 2), ("c", 3)], "2026-01-01 00:00:00")
+
+        self.assertEqual(written, 3)
+        self.assertEqual(self.db.sql.call_count, 2)
+        query, values = self.db.sql.call_args_list[0].args
+        self.assertIn("ON DUPLICATE KEY UPDATE", query)
+        self.assertIn("`total` = VALUES(`total`)", query)
+        self.assertNotIn("`creation` = VALUES", query)
+        self.assertEqual(len(values), 2 * (len(derived_table.STANDARD_FIELDS) + 1))
+
+    def test_refresh_deletes_only_keys_without_rows(self):
+        def compute(keys):
+            return [(key, 1) for key in keys if key != "gone"]
+
+        self.table.refresh(["b", "gone", None, "a", "b"], compute)
+
+        self.db.delete.assert_called_once_with("Test Summary", {"name": ("in", ["gone"])})
+
+    def test_rebuild_deletes_rows_it_did_not_write(self):
+        with patch.object(derived_table, "now", return_value="2026-01-01 00:00:00.000001"):
+            result = self.table.rebuild(lambda: [("a", 1)])
+
+        self.assertEqual(result["row_count"], 1)
+        self.db.delete.assert_not_called()
+        query, started = self.db.sql.call_args.args
+        self.assertIn("WHERE modified < %s", query)
+        self.assertEqual(started, "2026-01-01 00:00:00.000001")
+        self.db.commit.assert_called_once()
+
+    def test_failed_rebuild_rolls_back(self):
+        self.db.sql.side_effect = RuntimeError("lock wait timeout")
+
+        result = self.table.rebuild(lambda: [("a", 1)])
+
+        self.assertEqual(result["status"], "error")
+        self.db.rollback.assert_called_once()
+        self.log_error.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the Redis distributed lock service
+
+Runs the lock against an in-memory stand-in for the Redis client whose
+scripts follow the Lua scripts' semantics: all-or-nothing acquisition of
+several resources, increasing fencing tokens checked before writes,
+owner-checked release and capped renewal, and waiters woken by release
+messages.
+"""
+
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from verenigingen.utils import distributed_lock
+from verenigingen.utils.distributed_lock import DistributedLock, LockNotAcquired, holds_fencing_token
+
+
+class FakeRedis:
+    """Keys with millisecond expiry, the three lock scripts and release notifications"""
+
+    def __init__(self):
+        self.values = {}
+        self.expiry = {}
+        self.released = threading.Condition()
+
+    def make_key(self, key):
+        return f"site:{key}"
+
+    def _get(self, key):
+        if key in self.expiry and self.expiry[key] <= time.monotonic():
+            self.values.pop(key, None)
+            self.expiry.pop(key, None)
+        return self.values.get(key)
+
+    def register_script(self, script):
+        return {
+            distributed_lock.ACQUIRE_SCRIPT: self._acquire,
+            distributed_lock.RELEASE_SCRIPT: self._release,
+            distributed_lock.RENEW_SCRIPT: self._renew,
+        }[script]
+
+    def _acquire(self, keys, args):
+        fence_key, lock_keys = keys[0], keys[1:]
+        for index, key in enumerate(lock_keys, 1):
+            if self._get(key) is not None:
+                return [0, index, int((self.expiry[key] - time.monotonic()) * 1000)]
+        fence = self.values[fence_key] = self.values.get(fence_key, 0) + 1
+        for key in lock_keys:
+            self.values[key] = f"{fence}|{args[0]}"
+            self.expiry[key] = time.monotonic() + args[1] / 1000
+        return [1, fence, 0]
+
+    def _release(self, keys, args):
+        released = 0
+        with self.released:
+            for key in keys:
+                if self._get(key) == args[0]:
+                    del self.values[key]
+                    released += 1
+            self.released.notify_all()
+        return released
+
+    def _renew(self, keys, args):
+        renewed = 0
+        for key in keys:
+            if self._get(key) == args[0]:
+                self.expiry[key] = time.monotonic() + args[1] / 1000
+                renewed += 1
+        return renewed
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return FakePubSub(self)
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.keys = []
+
+    def get(self, key):
+        self.keys.append(key)
+
+    def execute(self):
+        return [self.redis._get(key) for key in self.keys]
+
+
+class FakePubSub:
+    def __init__(self, redis):
+        self.redis = redis
+        self.channels = ()
+
+    def subscribe(self, *channels):
+        self.channels = channels
+
+    def get_message(self, timeout=0):
+        with self.redis.released:
+            self.redis.released.wait(timeout)
+
+    def close(self):
+        pass
+
+
+class TestDistributedLock(unittest.TestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        cache_patcher = patch.object(distributed_lock.frappe, "cache", return_value=self.redis)
+        cache_patcher.start()
+        self.addCleanup(cache_patcher.stop)
+
+        hash_patcher = patch.object(
+            distributed_lock.frappe, "generate_hash", side_effect=lambda length: f"lock-{time.monotonic_ns()}"
+        )
+        hash_patcher.start()
+        self.addCleanup(hash_patcher.stop)
+
+    def test_fencing_tokens_increase(self):
+        with DistributedLock(["sepa_batch:B1"], auto_renew=False) as first:
+            pass
+        with DistributedLock(["sepa_batch:B1"], auto_renew=False) as second:
+            pass
+
+        self.assertGreater(second.fencing_token, first.fencing_token)
+        self.assertEqual(self.redis.values, {"site:distributed_lock_fence": 2})
+
+    def test_overlapping_resource_sets_exclude_each_other(self):
+        batch = DistributedLock(["invoice:A", "invoice:B"], wait=0, auto_renew=False)
+        self.assertTrue(batch.acquire())
+
+        overlapping = DistributedLock(["invoice:B", "invoice:C"], wait=0, auto_renew=False)
+        self.assertFalse(overlapping.acquire())
+        # Nothing of a failed acquisition is left behind
+        self.assertIsNone(self.redis._get("site:distributed_lock:invoice:C"))
+
+        with self.assertRaises(LockNotAcquired):
+            with DistributedLock(["invoice:A"], wait=0, auto_renew=False):
+                pass
+
+        batch.release()
+        self.assertTrue(overlapping.acquire())
+
+    def test_release_only_by_owner(self):
+        stale = DistributedLock(["return_file:abc"], ttl=0.05, wait=0, auto_renew=False)
+        self.assertTrue(stale.acquire())
+        time.sleep(0.1)
+
+        current = DistributedLock(["return_file:abc"], wait=0, auto_renew=False)
+        self.assertTrue(current.acquire())
+
+        # The expired holder can neither release nor renew the new holder's lock
+        self.assertFalse(stale.renew())
+        self.assertFalse(stale.release())
+        self.assertTrue(current.renew())
+        self.assertTrue(current.release())
+
+    def test_fencing_token_checked_before_write(self):
+        stale = DistributedLock(["invoice:D", "invoice:E"], ttl=0.05, wait=0, auto_renew=False)
+        self.assertTrue(stale.acquire())
+        self.assertTrue(holds_fencing_token(stale.resources, stale.fencing_token))
+        time.sleep(0.1)
+
+        current = DistributedLock(["invoice:E"], wait=0, auto_renew=False)
+        self.assertTrue(current.acquire())
+
+        # The stalled holder must not commit; the current holder may
+        self.assertFalse(holds_fencing_token(stale.resources, stale.fencing_token))
+        self.assertTrue(holds_fencing_token(current.resources, current.fencing_token))
+        self.assertFalse(holds_fencing_token(current.resources, None))
+
+        current.release()
+        self.assertFalse(holds_fencing_token(current.resources, current.fencing_token))
+
+    def test_waiter_woken_by_release(self):
+        holder = DistributedLock(["sepa_batch:B2"], ttl=30, auto_renew=False)
+        self.assertTrue(holder.acquire())
+        threading.Timer(0.1, holder.release).start()
+
+        start = time.monotonic()
+        waiter = DistributedLock(["sepa_batch:B2"], wait=5, auto_renew=False)
+
+        self.assertTrue(waiter.acquire())
+        self.assertLess(time.monotonic() - start, 1.0)
+        waiter.release()
+
+    def test_auto_renew_keeps_lock_past_ttl(self):
+        with DistributedLock(["sepa_batch:B3"], ttl=0.15):
+            time.sleep(0.4)
+            self.assertFalse(DistributedLock(["sepa_batch:B3"], wait=0, auto_renew=False).acquire())
+
+        self.assertIsNone(self.redis._get("site:distributed_lock:sepa_batch:B3"))
+
+    def test_auto_renew_stops_after_max_renewal(self):
+        logger = MagicMock()
+        with patch.object(distributed_lock.frappe, "logger", return_value=logger):
+            lock = DistributedLock(["sepa_batch:B4"], ttl=0.15, max_renewal=0.3)
+            self.assertTrue(lock.acquire())
+
+            # Never released: renewal stops, then the lock runs out its TTL
+            time.sleep(0.8)
+            self.assertTrue(DistributedLock(["sepa_batch:B4"], wait=0, auto_renew=False).acquire())
+
+        self.assertFalse(lock._renewer.is_alive())
+        logger.warning.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
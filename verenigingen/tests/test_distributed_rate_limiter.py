@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the Redis-backed rate limiter integration
+
+The Lua script itself is exercised by the throughput benchmark against a real
+Redis; these tests cover how the limiters use the shared bucket: delegation,
+local fallback when Redis is unavailable, shared pauses on 429 responses,
+returning unused tokens, and that bucket calls leave the clock to Redis.
+"""
+
+import unittest
+from unittest.mock import MagicMock, patch
+
+from verenigingen.utils.security.rate_limiting import RateLimiter, RateLimitExceeded
+from verenigingen.verenigingen_payments.core.resilience import rate_limiter as rate_limiter_module
+from verenigingen.verenigingen_payments.core.resilience import redis_token_bucket
+from verenigingen.verenigingen_payments.core.resilience.rate_limiter import (
+    AdaptiveRateLimiter,
+    EndpointRateLimiter,
+    TokenBucketRateLimiter,
+)
+from verenigingen.verenigingen_payments.core.resilience.redis_token_bucket import (
+    BucketResult,
+    RedisTokenBucket,
+)
+
+
+class TestDistributedTokenBucket(unittest.TestCase):
+    def _limiter(self, cls=TokenBucketRateLimiter, **kwargs):
+        bucket = MagicMock()
+        with patch.object(rate_limiter_module, "RedisTokenBucket", return_value=bucket):
+            limiter = cls(distributed_key="mollie_api:test", **kwargs)
+        return limiter, bucket
+
+    def test_acquire_uses_shared_bucket(self):
+        limiter, bucket = self._limiter(max_tokens=10, refill_rate=5.0, refill_period=1.0)
+        bucket.take.side_effect = [BucketResult(True, 9, 0), BucketResult(False, 0, 0.2)]
+
+        self.assertTrue(limiter.acquire())
+        self.assertFalse(limiter.acquire())
+
+        bucket.take.assert_called_with(1, 10, 5.0)
+        self.assertEqual(limiter.total_denied, 1)
+        self.assertEqual(limiter.tokens, 10)  # local bucket untouched
+
+    def test_falls_back_to_local_bucket(self):
+        limiter, bucket = self._limiter(max_tokens=1, refill_rate=0.0)
+        bucket.take.return_value = None
+
+        self.assertTrue(limiter.acquire())
+        self.assertFalse(limiter.acquire())
+        self.assertEqual(limiter.tokens, 0)
+
+    def test_wait_sleeps_for_retry_hint(self):
+        limiter, bucket = self._limiter(max_tokens=1)
+        bucket.take.side_effect = [BucketResult(False, 0, 0.05), BucketResult(True, 0, 0)]
+
+        with patch.object(rate_limiter_module.time, "sleep") as sleep:
+            self.assertTrue(limiter.acquire(wait=True, timeout=1.0))
+
+        sleep.assert_called_once_with(0.05)
+
+    def test_rate_limit_response_pauses_all_workers(self):
+        limiter, bucket = self._limiter(
+            cls=AdaptiveRateLimiter, initial_max_tokens=20, initial_refill_rate=4.0
+        )
+
+        limiter.on_rate_limit(retry_after=30)
+
+        bucket.pause.assert_called_once_with(30, 20, 4.0)
+        self.assertEqual(limiter.refill_rate, 2.0)
+
+    def test_endpoint_limiter_returns_global_tokens(self):
+        bucket = MagicMock()
+        bucket.take.side_effect = [BucketResult(True, 99, 0), BucketResult(False, 0, 1.0), None]
+        with patch.object(rate_limiter_module, "RedisTokenBucket", return_value=bucket) as bucket_cls:
+            limiter = EndpointRateLimiter(global_limit=100, distributed_prefix="mollie")
+            self.assertFalse(limiter.acquire("payments", wait=False))
+
+        names = [call.args[0] for call in bucket_cls.call_args_list]
+        self.assertEqual(names, ["mollie:global", "mollie:payments"])
+        self.assertEqual(bucket.take.call_args_list[-1].args[0], -1)
+
+
+class TestSecurityTokenBucket(unittest.TestCase):
+    def setUp(self):
+        self.limiter = RateLimiter(backend="memory")
+        patcher = patch(
+            "verenigingen.utils.security.rate_limiting.RedisTokenBucket",
+            return_value=MagicMock(take=MagicMock(return_value=None)),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        roles = patch("verenigingen.utils.security.rate_limiting.get_user_roles", return_value=frozenset())
+        roles.start()
+        self.addCleanup(roles.stop)
+
+    def test_profile_limit_enforced(self):
+        for _ in range(3):
+            self.limiter.check_token_bucket("api.endpoint", 3, 3600, user="member@example.com", ip="1.2.3.4")
+
+        with self.assertRaises(RateLimitExceeded):
+            self.limiter.check_token_bucket("api.endpoint", 3, 3600, user="member@example.com", ip="1.2.3.4")
+
+        # Other users have their own bucket
+        self.limiter.check_token_bucket("api.endpoint", 3, 3600, user="other@example.com", ip="1.2.3.4")
+
+    def test_system_users_skip_limit(self):
+        for _ in range(5):
+            result = self.limiter.check_token_bucket("api.endpoint", 1, 3600, user="Administrator")
+            self.assertTrue(result["allowed"])
+
+
+class TestRedisTokenBucket(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.object(redis_token_bucket, "frappe")
+        self.frappe = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.frappe.cache.return_value.make_key.side_effect = lambda key: f"site|{key}"
+        self.scripts = {"take": MagicMock(return_value=[1, "9", "0"]), "pause": MagicMock()}
+        scripts = patch.object(redis_token_bucket, "_get_scripts", return_value=self.scripts)
+        scripts.start()
+        self.addCleanup(scripts.stop)
+
+    def test_scripts_read_the_redis_clock(self):
+        for script in (redis_token_bucket.TOKEN_BUCKET_SCRIPT, redis_token_bucket.PAUSE_SCRIPT):
+            self.assertIn("redis.call('TIME')", script)
+
+    def test_take_and_pause_pass_no_client_time(self):
+        bucket = RedisTokenBucket("mollie_api:test")
+
+        self.assertEqual(bucket.take(1, 10, 5.0), BucketResult(True, 9.0, 0.0))
+        self.assertTrue(bucket.pause(30, 10, 5.0))
+
+        self.scripts["take"].assert_called_once_with(
+            keys=["site|token_bucket:mollie_api:test"], args=[10, 5.0, 1, 62]
+        )
+        self.scripts["pause"].assert_called_once_with(
+            keys=["site|token_bucket:mollie_api:test"], args=[30, 92]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
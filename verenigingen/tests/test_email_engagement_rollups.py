@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Unit tests for email engagement rollups and decayed engagement scores
+"""
+
+import unittest
+from datetime import timedelta
+from unittest.mock import patch
+
+import frappe
+from frappe.utils import now_datetime
+
+from verenigingen.email.analytics_tracker import ENGAGEMENT_HALF_LIFE_DAYS, EmailAnalyticsTracker
+
+
+class TestEmailEngagementRollups(unittest.TestCase):
+    """Score maths and rollup keys, independent of stored events"""
+
+    def test_rollup_name_is_deterministic_per_member_day_chapter(self):
+        name = EmailAnalyticsTracker._rollup_name("a@example.org", "2026-01-05", "Amsterdam")
+
+        self.assertEqual(name, EmailAnalyticsTracker._rollup_name("a@example.org", "2026-01-05", "Amsterdam"))
+        other_day = EmailAnalyticsTracker._rollup_name("a@example.org", "2026-01-06", "Amsterdam")
+        self.assertNotEqual(name, other_day)
+        self.assertNotEqual(name, EmailAnalyticsTracker._rollup_name("a@example.org", "2026-01-05", None))
+        self.assertEqual(len(name), 20)
+
+    def test_decay_halves_after_half_life(self):
+        last_event = now_datetime() - timedelta(days=ENGAGEMENT_HALF_LIFE_DAYS)
+        self.assertAlmostEqual(EmailAnalyticsTracker._decay_to_now(8.0, last_event), 4.0, places=2)
+        self.assertEqual(EmailAnalyticsTracker._decay_to_now(8.0, None), 0.0)
+
+    def test_engagement_score_levels(self):
+        score = EmailAnalyticsTracker.calculate_engagement_score
+
+        self.assertEqual(score(0, 0, 0), (0, "No Activity"))
+        self.assertEqual(score(10, 10, 10), (100.0, "Highly Engaged"))
+        self.assertEqual(score(5, 0, 10), (30.0, "Low Engagement"))
+        self.assertEqual(score(1, 0, 10), (6.0, "Minimal Engagement"))
+        # Rates are capped so repeated activity cannot exceed 100
+        self.assertEqual(score(50, 50, 10)[0], 100.0)
+
+    def test_member_score_reads_rollups_not_raw_events(self):
+        tracker = EmailAnalyticsTracker()
+
+        with patch("verenigingen.email.analytics_tracker.frappe") as mock_frappe, patch.object(
+            tracker, "get_decayed_sends", return_value=10.0
+        ):
+            mock_frappe.db.get_value.return_value = frappe._dict(
+                decayed_opens=8.0, decayed_clicks=2.0, last_event_at=now_datetime()
+            )
+            mock_frappe.db.sql.return_value = [{"emails_opened": 4, "emails_clicked": 1}]
+            mock_frappe.db.count.return_value = 5
+
+            result = tracker.get_member_engagement_score("a@example.org")
+
+            queries = " ".join(str(call.args[0]) for call in mock_frappe.db.sql.call_args_list)
+
+        self.assertTrue(result["success"])
+        self.assertEqual(result["engagement_level"], "Moderately Engaged")
+        self.assertEqual(result["activity_summary"]["emails_opened"], 4)
+        self.assertIn("tabEmail Engagement Rollup", queries)
+        self.assertNotIn("tabEmail Open Event", queries)
+
+
+if __name__ == "__main__":
+    unittest.main()
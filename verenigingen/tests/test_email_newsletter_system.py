@@ -743,6 +743,50 @@ class TestEmailNewsletterSystemPerformance(EnhancedTestCase):
             "Email System Performance"
         )
 
+    def test_streaming_recipient_pages(self):
+        """
+        Test that recipients are paged in bounded chunks and the Newsletter
+        record does not carry every recipient as a child row.
+        """
+        stream_chapter = self.factory.ensure_test_chapter("Streaming Test Chapter", {"short_name": "STRM"})
+
+        member_count = 5
+        for i in range(member_count):
+            member = self.create_test_member(
+                first_name=f"StreamMember{i}",
+                last_name="Test",
+                email=f"stream{i}@test.invalid",
+                birth_date="1990-01-01"
+            )
+            frappe.get_doc({
+                "doctype": "Chapter Member",
+                "parent": stream_chapter.name,
+                "parenttype": "Chapter",
+                "parentfield": "chapter_members",
+                "member": member.name,
+                "enabled": 1
+            }).insert()
+
+        source = {"type": "chapter", "chapter": stream_chapter.name, "segment": "all"}
+        pages = list(SimplifiedEmailManager.iter_recipient_pages(source, page_size=2))
+
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(len({email for page in pages for email in page}), member_count)
+
+        result = self.email_manager.send_to_chapter_segment(
+            chapter_name=stream_chapter.name,
+            segment="all",
+            subject="Streaming Test",
+            content="<p>Streaming test</p>",
+        )
+
+        self.assertTrue(result.get("success"))
+        self.assertEqual(result.get("queued_count"), member_count)
+        newsletter = frappe.get_doc("Newsletter", result["newsletter"])
+        self.assertFalse(newsletter.get("recipients"))
+        queue_filters = {"reference_doctype": "Newsletter", "reference_name": newsletter.name}
+        self.assertTrue(frappe.db.exists("Email Queue", queue_filters))
+
     def test_complex_segmentation_query_performance(self):
         """
         Test performance of complex segmentation queries.
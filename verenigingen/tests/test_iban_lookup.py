@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the normalized IBAN column and the bulk IBAN lookup
+
+Covers normalization on save for Member, SEPA Mandate and Bank Account, and
+the chunked lookup that prefers Active SEPA Mandates over Member IBANs.
+"""
+
+import unittest
+from unittest.mock import patch
+
+import frappe
+
+from verenigingen.utils import iban_lookup
+from verenigingen.utils.validation.iban_validator import normalize_iban
+
+
+class _Doc(frappe._dict):
+    def set(self, key, value):
+        self[key] = value
+
+
+class TestNormalizedIban(unittest.TestCase):
+    def test_normalize_iban(self):
+        self.assertEqual(normalize_iban(" nl91 abna-0417 1643 00 "), "NL91ABNA0417164300")
+        self.assertIsNone(normalize_iban(""))
+        self.assertIsNone(normalize_iban("  "))
+        self.assertIsNone(normalize_iban(None))
+
+    def test_set_normalized_iban_on_save(self):
+        mandate = _Doc(doctype="SEPA Mandate", iban="NL91 ABNA 0417 1643 00")
+        iban_lookup.set_normalized_iban(mandate)
+        self.assertEqual(mandate.normalized_iban, "NL91ABNA0417164300")
+
+        mandate.iban = None
+        iban_lookup.set_normalized_iban(mandate)
+        self.assertIsNone(mandate.normalized_iban)
+
+    def test_bank_account_falls_back_to_account_number(self):
+        account = _Doc(doctype="Bank Account", iban=None, bank_account_no="nl91abna0417164300")
+        iban_lookup.set_normalized_iban(account)
+        self.assertEqual(account.custom_normalized_iban, "NL91ABNA0417164300")
+
+
+class TestLookupMembersByIban(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.object(iban_lookup.frappe, "db")
+        self.db = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_mandate_wins_over_member_iban(self):
+        self.db.sql.return_value = [
+            frappe._dict(
+                normalized_iban="NL91ABNA0417164300", member="MEM-1", mandate="MAND-1", source="SEPA Mandate"
+            ),
+            frappe._dict(normalized_iban="NL91ABNA0417164300", member="MEM-2", mandate=None, source="Member"),
+            frappe._dict(
+                normalized_iban="DE89370400440532013000", member="MEM-3", mandate=None, source="Member"
+            ),
+        ]
+
+        result = iban_lookup.lookup_members_by_iban(
+            ["NL91 ABNA 0417 1643 00", "de89 3704 0044 0532 0130 00", "", None]
+        )
+
+        self.assertEqual(self.db.sql.call_count, 1)
+        params = self.db.sql.call_args[0][1]
+        self.assertEqual(params["ibans"], ("DE89370400440532013000", "NL91ABNA0417164300"))
+        self.assertEqual(result["NL91ABNA0417164300"]["mandate"], "MAND-1")
+        self.assertEqual(result["DE89370400440532013000"]["source"], "Member")
+
+    def test_lookup_is_chunked(self):
+        self.db.sql.return_value = []
+        ibans = [f"NL{i:016d}" for i in range(iban_lookup.LOOKUP_CHUNK_SIZE + 1)]
+
+        self.assertEqual(iban_lookup.lookup_members_by_iban(ibans), {})
+        self.assertEqual(self.db.sql.call_count, 2)
+
+    def test_empty_input_skips_query(self):
+        self.assertEqual(iban_lookup.lookup_active_mandates_by_iban([None, " "]), {})
+        self.db.sql.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
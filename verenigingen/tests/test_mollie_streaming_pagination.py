@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Unit tests for streaming Mollie pagination
+
+Covers MollieBaseClient.iter_pages cursor handling and resumption, the list
+form kept by _request_paginated, and the early stop of
+PaymentsClient.iter_payment_pages once payments predate the requested range,
+prefetching the next page until then.
+"""
+
+import threading
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+import frappe
+
+from verenigingen.verenigingen_payments.clients.payments_client import PaymentsClient
+from verenigingen.verenigingen_payments.core.mollie_base_client import MollieBaseClient
+
+
+def _page(items, next_from=None):
+    response = {"_embedded": {"payments": items}, "_links": {}}
+    if next_from:
+        href = f"https://api.mollie.com/v2/payments?from={next_from}&limit=250"
+        response["_links"]["next"] = {"href": href}
+    return response, 200
+
+
+def _client(cls, responses):
+    client = cls.__new__(cls)
+    client.http_client = MagicMock()
+    client.http_client.request.side_effect = lambda **kwargs: responses[kwargs["params"].get("from")]
+    client._validate_response = MagicMock()
+    return client
+
+
+class TestIterPages(unittest.TestCase):
+    def setUp(self):
+        self.responses = {
+            None: _page([{"id": "tr_1"}, {"id": "tr_2"}], next_from="tr_3"),
+            "tr_3": _page([{"id": "tr_3"}], next_from="tr_4"),
+            "tr_4": _page([{"id": "tr_4"}]),
+        }
+
+    def test_yields_pages_with_cursors(self):
+        client = _client(MollieBaseClient, self.responses)
+
+        pages = list(client.iter_pages("payments", prefetch=False))
+
+        self.assertEqual([len(p.items) for p in pages], [2, 1, 1])
+        self.assertEqual([p.cursor for p in pages], [None, "tr_3", "tr_4"])
+        self.assertEqual([p.next_cursor for p in pages], ["tr_3", "tr_4", None])
+        self.assertEqual(client.http_client.request.call_args.kwargs["params"]["limit"], 250)
+
+    def test_resume_from_cursor(self):
+        client = _client(MollieBaseClient, self.responses)
+
+        items = list(client.iter_items("payments", start_from="tr_4", prefetch=False))
+
+        self.assertEqual(items, [{"id": "tr_4"}])
+        self.assertEqual(client.http_client.request.call_count, 1)
+
+    def test_request_paginated_collects_all_items(self):
+        client = _client(MollieBaseClient, self.responses)
+        params = {"status": "paid"}
+
+        items = client._request_paginated("GET", "payments", params)
+
+        self.assertEqual([i["id"] for i in items], ["tr_1", "tr_2", "tr_3", "tr_4"])
+        self.assertEqual(params, {"status": "paid"})  # caller's params are not mutated
+
+
+class TestIterPaymentPages(unittest.TestCase):
+    def setUp(self):
+        # A site context enables prefetching in iter_pages; the prefetch thread's
+        # own site setup is patched out
+        patchers = [patch.object(frappe.local, "site", "test.site", create=True)]
+        patchers += [patch.object(frappe, name) for name in ("init", "connect", "destroy", "db")]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_stops_after_reaching_from_date(self):
+        responses = {
+            None: _page(
+                [
+                    {"id": "tr_new", "createdAt": "2025-03-10T10:00:00Z"},
+                    {"id": "tr_in", "createdAt": "2025-02-10T10:00:00Z"},
+                ],
+                next_from="tr_x",
+            ),
+            "tr_x": _page(
+                [
+                    {"id": "tr_in2", "createdAt": "2025-02-02T10:00:00Z"},
+                    {"id": "tr_old", "createdAt": "2025-01-10T10:00:00Z"},
+                ],
+                next_from="tr_y",
+            ),
+        }
+        client = _client(PaymentsClient, responses)
+
+        pages = list(
+            client.iter_payment_pages(
+                from_date=datetime(2025, 2, 1, tzinfo=timezone.utc),
+                to_date=datetime(2025, 2, 28, tzinfo=timezone.utc),
+            )
+        )
+
+        self.assertEqual([[p["id"] for p in page.items] for page in pages], [["tr_in"], ["tr_in2"]])
+        self.assertIsNone(pages[-1].next_cursor)
+        self.assertEqual(client.http_client.request.call_count, 2)
+
+    def test_next_page_prefetched_while_in_range(self):
+        responses = {
+            None: _page([{"id": "tr_1", "createdAt": "2025-02-20T10:00:00Z"}], next_from="tr_2"),
+            "tr_2": _page([{"id": "tr_2", "createdAt": "2025-02-10T10:00:00Z"}], next_from="tr_3"),
+            "tr_3": _page([{"id": "tr_3", "createdAt": "2025-01-10T10:00:00Z"}], next_from="tr_4"),
+        }
+        client = _client(PaymentsClient, responses)
+        fetched_by = {}
+
+        def request(**kwargs):
+            cursor = kwargs["params"].get("from")
+            fetched_by[cursor] = threading.current_thread() is threading.main_thread()
+            return responses[cursor]
+
+        client.http_client.request.side_effect = request
+
+        pages = list(client.iter_payment_pages(from_date=datetime(2025, 2, 1, tzinfo=timezone.utc)))
+
+        self.assertEqual([[p["id"] for p in page.items] for page in pages], [["tr_1"], ["tr_2"], []])
+        # Pages after the first come from the prefetch thread; none past from_date is requested
+        self.assertEqual(fetched_by, {None: True, "tr_2": False, "tr_3": False})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the precomputed monitoring metrics store
+
+Covers serving widgets from the Redis hash, falling back to the latest
+Monitoring Metric Snapshot row, and the materialization job that writes the
+time series in one bulk insert.
+"""
+
+import json
+import unittest
+from unittest.mock import patch
+
+import frappe
+
+from verenigingen.utils import monitoring_metrics_store as store
+
+
+class TestMonitoringMetricsStore(unittest.TestCase):
+    def setUp(self):
+        self.computed = []
+
+        def compute_members():
+            self.computed.append("members")
+            return {"active": 10}
+
+        def compute_broken():
+            self.computed.append("broken")
+            raise RuntimeError("analytics engine down")
+
+        widgets = {"members": compute_members, "broken": compute_broken}
+        patcher = patch.dict(store._widgets, widgets, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        cache_patcher = patch.object(store.frappe, "cache")
+        self.cache = cache_patcher.start().return_value
+        self.addCleanup(cache_patcher.stop)
+        self.cache.make_key.side_effect = lambda key: key
+        self.pipe = self.cache.pipeline.return_value
+
+    def _entry(self, value, captured_at="2026-10-18 12:00:00"):
+        return json.dumps({"value": value, "status": "OK", "captured_at": captured_at, "duration_ms": 5.0})
+
+    def test_decorated_widget_reads_stored_value(self):
+        @store.precomputed_widget("members")
+        def get_members():
+            return {"active": 99}
+
+        self.cache.hmget.return_value = [self._entry({"active": 10})]
+
+        self.assertEqual(get_members(), {"active": 10})
+        self.assertEqual(get_members.compute(), {"active": 99})
+        self.assertEqual(self.computed, [])
+
+    def test_dashboard_widgets_read_in_one_call(self):
+        self.cache.hmget.return_value = [
+            self._entry({"active": 10}, "2026-10-18 12:05:00"),
+            self._entry({"error": "old"}, "2026-10-18 12:00:00"),
+        ]
+
+        with patch.object(store.frappe, "get_all") as get_all:
+            data = store.get_dashboard_widgets(["members", "broken"])
+
+        self.cache.hmget.assert_called_once_with(store.METRICS_CACHE_KEY, ["members", "broken"])
+        get_all.assert_not_called()
+        self.assertEqual(data["members"], {"active": 10})
+        self.assertEqual(data["captured_at"], "2026-10-18 12:00:00")
+        self.assertEqual(self.computed, [])
+
+    def test_snapshot_row_used_when_cache_is_empty(self):
+        self.cache.hmget.return_value = [None]
+        row = frappe._dict(
+            captured_at="2026-10-18 12:00:00", status="OK", duration_ms=3.0, payload='{"active": 7}'
+        )
+
+        with patch.object(store.frappe, "get_all", return_value=[row]):
+            self.assertEqual(store.get_widget("members"), {"active": 7})
+
+        self.assertEqual(self.computed, [])
+        mapping = self.pipe.hset.call_args.kwargs["mapping"]
+        self.assertEqual(json.loads(mapping["members"])["value"], {"active": 7})
+
+    def test_materialize_stores_time_series_in_bulk(self):
+        with patch.object(store, "get_registered_widgets", return_value=dict(store._widgets)), patch.object(
+            store.frappe, "db"
+        ) as db, patch.object(store.frappe, "generate_hash", return_value="abc"):
+            result = store.materialize_dashboard_metrics()
+
+        self.assertEqual(result, {"computed": 2, "failed": ["broken"]})
+        db.bulk_insert.assert_called_once()
+        call = db.bulk_insert.call_args
+        rows = [dict(zip(call.kwargs["fields"], values)) for values in call.kwargs["values"]]
+        self.assertEqual([row["widget"] for row in rows], ["members", "broken"])
+        self.assertEqual([row["status"] for row in rows], ["OK", "Error"])
+        self.assertEqual(json.loads(rows[0]["payload"]), {"active": 10})
+
+        # The widget that raised keeps serving its last good value
+        mapping = self.pipe.hset.call_args.kwargs["mapping"]
+        self.assertEqual(list(mapping), ["members"])
+
+
+if __name__ == "__main__":
+    unittest.main()
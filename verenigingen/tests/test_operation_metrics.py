@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Unit tests for cluster-wide operation metrics
+
+Runs OperationMetrics against an in-memory stand-in for the Redis client whose
+flush script follows the Lua script's semantics, so histograms recorded by
+several workers can be merged and summarized like in production.
+"""
+
+import json
+import unittest
+from collections import defaultdict
+from unittest.mock import patch
+
+from verenigingen.utils import operation_metrics
+from verenigingen.utils.operation_metrics import Histogram, OperationMetrics
+
+
+class FakeRedis:
+    """Hashes and sets, the flush script and a pipeline of hgetall calls"""
+
+    def __init__(self):
+        self.hashes = defaultdict(dict)
+        self.sets = defaultdict(set)
+        self.script_calls = 0
+
+    def make_key(self, key):
+        return f"site|{key}"
+
+    def register_script(self, script):
+        assert script == operation_metrics.FLUSH_SCRIPT
+        return self._flush
+
+    def _flush(self, keys, args):
+        self.script_calls += 1
+        for key, update in zip(keys[1:], json.loads(args[0])):
+            fields = self.hashes[key]
+            for field, value in {**update["incr"], **update["float_incr"]}.items():
+                fields[field] = fields.get(field, 0) + value
+            for field, value in update["max"].items():
+                if field not in fields or fields[field] < value:
+                    fields[field] = value
+            for field, value in update["min"].items():
+                if field not in fields or fields[field] > value:
+                    fields[field] = value
+            self.sets[keys[0]].add(update["operation"].encode())
+        return len(keys) - 1
+
+    def smembers(self, name):
+        return self.sets[self.make_key(name)]
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def hgetall(self, key):
+        self.calls.append(key)
+
+    def execute(self):
+        # Redis returns bytes
+        return [
+            {k.encode(): str(v).encode() for k, v in self.redis.hashes.get(key, {}).items()}
+            for key in self.calls
+        ]
+
+
+class TestOperationMetrics(unittest.TestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = patch.object(operation_metrics.frappe, "cache", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        operation_metrics._instances.clear()
+        self.addCleanup(operation_metrics._instances.clear)
+
+    def test_workers_merge_into_one_histogram(self):
+        web, worker = OperationMetrics("sepa_test"), OperationMetrics("sepa_test")
+        for duration in range(1, 101):
+            web.record("batch_creation", float(duration), success=True, records=2)
+        worker.record("batch_creation", 5000.0, success=False)
+        worker.record("mandate_validation", 3.0)
+
+        summary = web.summary(hours=1)
+
+        # The other worker's operations only count once they are flushed
+        self.assertEqual(summary["batch_creation"]["count"], 100)
+        operation_metrics.flush_operation_metrics()
+        summary = web.summary(hours=1)
+
+        batch = summary["batch_creation"]
+        self.assertEqual(batch["count"], 101)
+        self.assertEqual((batch["success"], batch["failure"], batch["records"]), (100, 1, 200))
+        self.assertEqual((batch["min_ms"], batch["max_ms"]), (1.0, 5000.0))
+        self.assertEqual(summary["mandate_validation"]["count"], 1)
+        self.assertEqual(web.operations(), ["batch_creation", "mandate_validation"])
+
+    def test_percentiles_within_bucket_resolution(self):
+        histogram = Histogram()
+        for duration in range(1, 1001):
+            histogram.observe(float(duration))
+
+        # Bucket bounds around 500 and 950 are 250-500 and 500-1000
+        self.assertAlmostEqual(histogram.percentile(50), 500.0, delta=1)
+        self.assertTrue(500 <= histogram.percentile(95) <= 1000)
+        self.assertEqual(histogram.percentile(100), 1000.0)
+        self.assertEqual(Histogram().percentile(99), 0.0)
+
+    def test_record_does_not_touch_redis_within_interval(self):
+        metrics = OperationMetrics("sepa_test")
+        for _ in range(1000):
+            metrics.record("batch_creation", 12.5)
+
+        self.assertEqual(self.redis.script_calls, 0)
+        metrics.flush()
+        self.assertEqual(self.redis.script_calls, 1)
+        self.assertEqual(metrics.totals()["batch_creation"].count, 1000)
+
+    def test_window_counts_carry_over_the_previous_hour(self):
+        metrics = OperationMetrics("sepa_test")
+        hour = 1_000_000 * operation_metrics.SLOT_SECONDS
+        with patch.object(operation_metrics.time, "time", return_value=hour - 60):
+            for _ in range(8):
+                metrics.record("batch_creation", 10.0, success=False)
+            metrics.flush()
+
+        # A quarter past the hour, three quarters of the previous hour are in the window
+        with patch.object(operation_metrics.time, "time", return_value=hour + 900):
+            metrics.record("batch_creation", 10.0, success=False)
+            counts = metrics.window_counts(3600)
+            self.assertEqual(metrics.summary(hours=1)["batch_creation"]["failure"], 1)
+
+        self.assertEqual(counts["batch_creation"]["failure"], 8 * 0.75 + 1)
+        self.assertEqual(counts["batch_creation"]["success"], 0)
+
+    def test_prometheus_export(self):
+        metrics = OperationMetrics("sepa_test")
+        metrics.record("batch_creation", 40.0, records=3)
+        metrics.record("batch_creation", 700.0, success=False)
+
+        text = metrics.prometheus(metric_prefix="sepa_operation")
+
+        self.assertIn("# TYPE sepa_operation_duration_seconds histogram", text)
+        self.assertIn('sepa_operation_duration_seconds_bucket{operation="batch_creation",le="0.05"} 1', text)
+        self.assertIn('sepa_operation_duration_seconds_bucket{operation="batch_creation",le="1"} 2', text)
+        self.assertIn('sepa_operation_duration_seconds_bucket{operation="batch_creation",le="+Inf"} 2', text)
+        self.assertIn('sepa_operation_duration_seconds_sum{operation="batch_creation"} 0.740000', text)
+        self.assertIn('sepa_operation_total{operation="batch_creation",outcome="failure"} 1', text)
+        self.assertIn('sepa_operation_records_total{operation="batch_creation"} 3', text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the request-scoped permission memo
+
+Checks that repeated has_*_permission calls inside one memo scope reuse role,
+member and chapter lookups, that nothing is memoized outside a scope, and that
+preauthorize_documents resolves many documents with a constant number of
+queries, both directly and ahead of a bulk print.
+"""
+
+import sys
+import types
+import unittest
+from unittest.mock import MagicMock, patch
+
+from verenigingen import permissions
+
+BOARD_USER = "board@example.com"
+
+
+class PermissionMemoTestBase(unittest.TestCase):
+    """Patch frappe in the permissions module with a board member's view of the database"""
+
+    def setUp(self):
+        self.frappe = MagicMock()
+        self.frappe.local = types.SimpleNamespace()
+        self.frappe.session.user = BOARD_USER
+        self.frappe.get_roles.return_value = ["Chapter Board Member", "Verenigingen Member"]
+        self.frappe.db.get_value.side_effect = self._get_value
+        self.frappe.db.sql.side_effect = self._sql
+
+        patcher = patch.object(permissions, "frappe", self.frappe)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        cached = patch.object(permissions, "get_user_chapter_memberships_cached", return_value=["Amsterdam"])
+        cached.start()
+        self.addCleanup(cached.stop)
+
+    def _get_value(self, doctype, filters, fieldname=None):
+        if doctype == "Member" and filters == {"user": BOARD_USER}:
+            return "MEM-BOARD"
+        return None
+
+    def _sql(self, query, values=None, *args, **kwargs):
+        if "IN %(members)s" in query:
+            chapters = {"MEM-1": "Amsterdam", "MEM-2": "Utrecht", "MEM-3": "Amsterdam"}
+            return [(m, chapters[m]) for m in values["members"] if m in chapters]
+        if "`tabChapter Member`" in query:
+            return [("Amsterdam",)] if values in ("MEM-1", "MEM-3") else [("Utrecht",)]
+        if "`tabChapter Board Member`" in query:
+            return [("Amsterdam",)]
+        return []
+
+
+class TestPermissionMemo(PermissionMemoTestBase):
+    def test_no_memo_outside_request_or_scope(self):
+        self.assertIsNone(permissions.get_permission_memo())
+
+        permissions.has_member_permission("MEM-1", BOARD_USER)
+        permissions.has_member_permission("MEM-1", BOARD_USER)
+
+        self.assertEqual(self.frappe.get_roles.call_count, 2)
+
+    def test_scope_memoizes_lookups_and_decisions(self):
+        with permissions.permission_memo_scope():
+            self.assertTrue(permissions.has_member_permission("MEM-1", BOARD_USER))
+            self.assertTrue(permissions.has_member_permission("MEM-1", BOARD_USER))
+            self.assertTrue(permissions.has_member_permission("MEM-3", BOARD_USER))
+
+        self.assertEqual(self.frappe.get_roles.call_count, 1)
+        self.assertEqual(self.frappe.db.sql.call_count, 2)
+        self.assertIsNone(permissions.get_permission_memo())
+
+    def test_request_memo_is_reset_per_request(self):
+        self.frappe.local.request = object()
+        permissions.has_member_permission("MEM-1", BOARD_USER)
+        permissions.has_member_permission("MEM-1", BOARD_USER)
+        self.assertEqual(self.frappe.get_roles.call_count, 1)
+
+        self.frappe.local.request = object()
+        permissions.has_member_permission("MEM-1", BOARD_USER)
+        self.assertEqual(self.frappe.get_roles.call_count, 2)
+
+    def test_new_documents_are_not_memoized(self):
+        doc = MagicMock()
+        doc.name = "new-member-1"
+        doc.is_new.return_value = True
+
+        with permissions.permission_memo_scope() as memo:
+            permissions.has_member_permission(doc, BOARD_USER)
+
+        self.assertNotIn(("decision", "Member", "new-member-1", BOARD_USER), memo)
+
+
+class TestPreauthorizeDocuments(PermissionMemoTestBase):
+    def test_constant_query_count(self):
+        names = ["MEM-1", "MEM-2", "MEM-3"]
+
+        result = permissions.preauthorize_documents("Member", names, BOARD_USER)
+
+        self.assertEqual(result, {"MEM-1": True, "MEM-2": False, "MEM-3": True})
+        # Board chapters + one chapter-overlap query for every member
+        self.assertEqual(self.frappe.db.sql.call_count, 2)
+        self.assertEqual(self.frappe.get_roles.call_count, 1)
+
+    def test_unsupported_doctype(self):
+        self.frappe.throw.side_effect = Exception("unsupported")
+        with self.assertRaises(Exception):
+            permissions.preauthorize_documents("Sales Invoice", ["SINV-1"], BOARD_USER)
+
+    def test_api_parses_names(self):
+        self.frappe.parse_json.side_effect = lambda value: ["MEM-1", "MEM-2"]
+
+        result = permissions.preauthorize_documents_api("Member", '["MEM-1", "MEM-2"]')
+
+        self.assertEqual(result, {"MEM-1": True, "MEM-2": False})
+
+    def test_bulk_print_preauthorizes_before_printing(self):
+        self.frappe.parse_json.side_effect = lambda value: ["MEM-1", "MEM-2", "MEM-3"]
+        self.frappe.local.request = object()
+        print_format = types.ModuleType("frappe.utils.print_format")
+        print_format.download_multi_pdf = MagicMock()
+
+        with patch.dict(sys.modules, {"frappe.utils.print_format": print_format}):
+            permissions.download_multi_pdf("Member", '["MEM-1", "MEM-2", "MEM-3"]', format="Standard")
+
+        print_format.download_multi_pdf.assert_called_once_with(
+            "Member",
+            '["MEM-1", "MEM-2", "MEM-3"]',
+            format="Standard",
+            no_letterhead=False,
+            letterhead=None,
+            options=None,
+        )
+        # Frappe's per-document checks that follow are answered from the request memo
+        self.assertEqual(self.frappe.db.sql.call_count, 2)
+        self.assertTrue(permissions.has_member_permission("MEM-3", BOARD_USER))
+        self.assertEqual(self.frappe.db.sql.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
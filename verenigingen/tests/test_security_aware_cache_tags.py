@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Unit tests for tag-based invalidation in the security-aware API cache
+
+A small in-memory stand-in for the Redis commands the cache uses keeps these
+tests independent of a running Redis; they check that responses are indexed
+under their tags and that invalidation removes exactly the affected keys.
+"""
+
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from verenigingen.utils.performance import security_aware_cache as cache_module
+from verenigingen.utils.performance.security_aware_cache import (
+    SecurityAwareCacheManager,
+    cached_api_call,
+)
+from verenigingen.utils.security.api_security_framework import OperationType
+
+
+class InMemoryRedis:
+    """The subset of redis-py used by SecurityAwareCacheManager"""
+
+    def __init__(self):
+        self.data = {}
+
+    def make_key(self, key):
+        return f"site:{key}"
+
+    def pipeline(self, transaction=True):
+        return InMemoryPipeline(self)
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+        return True
+
+    def delete(self, *keys):
+        return sum(1 for key in keys if self.data.pop(key, None) is not None)
+
+    def sadd(self, key, *members):
+        self.data.setdefault(key, set()).update(members)
+
+    def srem(self, key, *members):
+        self.data.get(key, set()).difference_update(members)
+
+    def smembers(self, key):
+        return set(self.data.get(key, set()))
+
+    def sinter(self, *keys):
+        return set.intersection(*(self.smembers(key) for key in keys))
+
+    def expire(self, key, seconds):
+        return True
+
+    def hincrby(self, key, field, amount=1):
+        counters = self.data.setdefault(key, {})
+        counters[field] = counters.get(field, 0) + amount
+        return counters[field]
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+
+class InMemoryPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+
+        return queue
+
+    def execute(self):
+        results = [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+        self.commands = []
+        return results
+
+
+class TestSecurityAwareCacheTags(unittest.TestCase):
+    def setUp(self):
+        self.redis = InMemoryRedis()
+        patches = [
+            patch.object(cache_module.frappe, "cache", return_value=self.redis),
+            patch.object(cache_module.frappe, "session", SimpleNamespace(user="admin@example.com")),
+            patch.object(cache_module, "get_user_roles", return_value=frozenset({"System Manager"})),
+            patch.object(cache_module, "_cache_manager", None),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.manager = SecurityAwareCacheManager()
+
+    def _tagged(self, tag):
+        return self.redis.smembers(self.manager._tag_key(tag))
+
+    def test_response_indexed_under_its_tags(self):
+        self.manager.set_cached_api_response("member_summary", OperationType.MEMBER_DATA, {"count": 3})
+
+        key = next(iter(self._tagged("op:member_data")))
+        self.assertEqual(self._tagged("doctype:Member"), {key})
+        self.assertEqual(self._tagged("doctype:Volunteer"), {key})
+        self.assertEqual(self._tagged("user:admin@example.com"), {key})
+        self.assertEqual(self._tagged("doctype:Sales Invoice"), set())
+
+        cached = self.manager.get_cached_api_response("member_summary", OperationType.MEMBER_DATA)
+        self.assertEqual(cached, {"count": 3})
+
+    def test_data_change_removes_only_dependent_responses(self):
+        self.manager.set_cached_api_response("member_summary", OperationType.MEMBER_DATA, {"count": 3})
+        self.manager.set_cached_api_response("invoice_totals", OperationType.FINANCIAL, {"total": 10})
+
+        removed = self.manager.invalidate_data_cache("Member", "MEM-001")
+
+        self.assertEqual(removed, 1)
+        self.assertIsNone(self.manager.get_cached_api_response("member_summary", OperationType.MEMBER_DATA))
+        self.assertEqual(
+            self.manager.get_cached_api_response("invoice_totals", OperationType.FINANCIAL), {"total": 10}
+        )
+
+    def test_document_scoped_responses(self):
+        calls = []
+
+        @cached_api_call(OperationType.MEMBER_DATA, custom_ttl=3600, document_args={"member": "Member"})
+        def member_overview(member):
+            calls.append(member)
+            return {"member": member}
+
+        member_overview("MEM-001")
+        member_overview(member="MEM-002")
+        member_overview("MEM-001")
+        self.assertEqual(calls, ["MEM-001", "MEM-002"])
+
+        # Another member's change leaves MEM-001 cached
+        self.manager.invalidate_data_cache("Member", "MEM-002")
+        member_overview("MEM-001")
+        self.assertEqual(calls, ["MEM-001", "MEM-002"])
+
+        self.manager.invalidate_data_cache("Member", "MEM-001")
+        member_overview("MEM-001")
+        self.assertEqual(calls, ["MEM-001", "MEM-002", "MEM-001"])
+
+    def test_user_invalidation_by_operation_type(self):
+        self.manager.set_cached_api_response("member_summary", OperationType.MEMBER_DATA, {"count": 3})
+        self.manager.set_cached_api_response("invoice_totals", OperationType.FINANCIAL, {"total": 10})
+
+        removed = self.manager.invalidate_user_cache("admin@example.com", [OperationType.FINANCIAL])
+
+        self.assertEqual(removed, 1)
+        self.assertIsNone(self.manager.get_cached_api_response("invoice_totals", OperationType.FINANCIAL))
+        self.assertEqual(len(self._tagged("user:admin@example.com")), 1)
+
+    def test_hit_rate_from_counters(self):
+        self.manager.set_cached_api_response("member_summary", OperationType.MEMBER_DATA, {"count": 3})
+        self.manager.get_cached_api_response("member_summary", OperationType.MEMBER_DATA)
+        self.manager.get_cached_api_response("unknown", OperationType.MEMBER_DATA)
+
+        counters = self.manager._get_counters()
+        self.assertEqual((counters["hits"], counters["misses"], counters["writes"]), (1, 1, 1))
+        self.assertEqual(self.manager._calculate_hit_rate(counters), 50.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the bitmap segment engine
+
+Covers the MemberBitmap set operations and serialization, the overlap
+matrix computed by SegmentBitmapEngine from stored bitmaps, swapping in the
+bitmaps of a full rebuild, and the engine's handling of concurrent workers.
+"""
+
+import pickle
+import random
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from verenigingen.email.segment_bitmaps import MemberBitmap, SegmentBitmapEngine
+
+
+class TestMemberBitmap(unittest.TestCase):
+    """MemberBitmap behaves like a set of dense member IDs"""
+
+    def test_set_operations(self):
+        a = MemberBitmap.from_positions([0, 3, 5, 200])
+        b = MemberBitmap.from_positions([3, 4, 200, 10_000])
+
+        self.assertEqual((a & b).positions(), [3, 200])
+        self.assertEqual((a | b).positions(), [0, 3, 4, 5, 200, 10_000])
+        self.assertEqual((a - b).positions(), [0, 5])
+        self.assertEqual(len(a | b), 6)
+
+    def test_add_discard_and_contains(self):
+        bitmap = MemberBitmap()
+        bitmap.add(42)
+        bitmap.add(7)
+        self.assertIn(42, bitmap)
+        bitmap.discard(42)
+        bitmap.discard(99)  # discarding an absent member is a no-op
+        self.assertNotIn(42, bitmap)
+        self.assertEqual(bitmap.positions(), [7])
+
+    def test_positions_limit(self):
+        bitmap = MemberBitmap.from_positions(range(0, 100, 10))
+        self.assertEqual(bitmap.positions(limit=3), [0, 10, 20])
+
+    def test_positions_of_large_bitmap(self):
+        rng = random.Random(5)
+        members = sorted(rng.sample(range(2_000_000), 200_000))
+        bitmap = MemberBitmap.from_positions(members)
+
+        start = time.monotonic()
+        self.assertEqual(bitmap.positions(), members)
+        self.assertLess(time.monotonic() - start, 2.0)
+        self.assertEqual(bitmap.positions(limit=5), members[:5])
+        self.assertEqual(bitmap.positions(limit=0), [])
+
+    def test_serialization_round_trip(self):
+        bitmap = MemberBitmap.from_positions([1, 64, 65, 100_000])
+        self.assertEqual(MemberBitmap.from_bytes(bitmap.to_bytes()), bitmap)
+        self.assertEqual(MemberBitmap.from_bytes(None).count(), 0)
+        self.assertEqual(MemberBitmap.from_bytes(MemberBitmap().to_bytes()).count(), 0)
+
+    def test_sparse_bitmap_compresses(self):
+        bitmap = MemberBitmap.from_positions([100_000])
+        self.assertLess(len(bitmap.to_bytes()), 200)
+
+
+class TestSegmentBitmapEngineOverlap(unittest.TestCase):
+    """Overlap analysis is computed from bitmaps alone"""
+
+    def test_overlap_matrix(self):
+        bitmaps = {
+            "volunteers_only": MemberBitmap.from_positions([1, 2, 3, 4]),
+            "donors": MemberBitmap.from_positions([3, 4, 5]),
+        }
+
+        with patch("verenigingen.email.segment_bitmaps.frappe"):
+            engine = SegmentBitmapEngine()
+
+        def get_bitmap(segment_id, chapter=None):
+            return bitmaps[segment_id]
+
+        with patch.object(engine, "get_bitmap", side_effect=get_bitmap):
+            result = engine.overlap_matrix(["volunteers_only", "donors"])
+
+        self.assertEqual(result["counts"], {"volunteers_only": 4, "donors": 3})
+        overlap = result["overlap_matrix"]
+        self.assertEqual(overlap["volunteers_only"]["donors"], {"count": 2, "percentage": 50.0})
+        self.assertEqual(overlap["donors"]["volunteers_only"]["count"], 2)
+        self.assertEqual(result["unique_members"]["volunteers_only"]["count"], 2)
+        self.assertEqual(result["unique_members"]["donors"]["count"], 1)
+        self.assertEqual(result["total_unique_members"], 5)
+
+
+class TestSegmentBitmapEngineRebuild(unittest.TestCase):
+    """A full rebuild swaps the new bitmaps in without clearing the live ones first"""
+
+    def test_rebuild_renames_staged_hashes_over_live_keys(self):
+        with patch("verenigingen.email.segment_bitmaps.frappe") as mock_frappe, patch(
+            "verenigingen.email.segment_bitmaps.DistributedLock"
+        ):
+            mock_frappe.generate_hash.return_value = "abc"
+            engine = SegmentBitmapEngine()
+            cache = engine.cache
+            cache.make_key.side_effect = lambda key: f"site|{key}"
+            pipes = []
+            cache.pipeline.side_effect = lambda: pipes.append(MagicMock()) or pipes[-1]
+            engine.manager = SimpleNamespace(built_in_segments={"donors": {}})
+            mock_frappe.db.sql_list.return_value = ["MEM-1", "MEM-2"]
+            chapter_row = SimpleNamespace(chapter="Amsterdam", member="MEM-1")
+
+            with patch.object(engine, "_query_segment_members", return_value=["MEM-2"]), patch.object(
+                engine, "_query_chapter_memberships", return_value=[chapter_row]
+            ):
+                result = engine.rebuild_all()
+
+        self.assertEqual(result, {"success": True, "members": 2, "chapters": 1})
+        cache.delete_key.assert_not_called()
+        cache.hset.assert_not_called()
+
+        staged = [pipe.hset.call_args_list[0].args[0] for pipe in pipes[:-1]]
+        self.assertEqual(
+            staged,
+            [
+                "site|verenigingen:segment_member_ids:rebuild:abc",
+                "site|verenigingen:segment_member_names:rebuild:abc",
+                "site|verenigingen:segment_bitmaps:rebuild:abc",
+            ],
+        )
+
+        swap = pipes[-1]
+        self.assertEqual(
+            [call.args for call in swap.rename.call_args_list],
+            [(key, key.split(":rebuild:")[0]) for key in staged],
+        )
+        swap.delete.assert_not_called()
+        swap.set.assert_called_once_with("site|verenigingen:segment_member_ids:next", 2)
+        swap.execute.assert_called_once()
+
+
+class TestSegmentBitmapEngineConcurrency(unittest.TestCase):
+    """Member IDs and bitmap updates stay consistent across workers"""
+
+    def setUp(self):
+        frappe_patcher = patch("verenigingen.email.segment_bitmaps.frappe")
+        frappe_patcher.start()
+        self.addCleanup(frappe_patcher.stop)
+        lock_patcher = patch("verenigingen.email.segment_bitmaps.DistributedLock")
+        self.lock = lock_patcher.start()
+        self.addCleanup(lock_patcher.stop)
+
+        self.engine = SegmentBitmapEngine()
+        self.cache = self.engine.cache
+        self.cache.make_key.side_effect = lambda key: f"site|{key}"
+        self.cache.incr.return_value = 10
+
+    def test_new_member_claims_next_slot(self):
+        self.cache.hget.return_value = None
+        self.cache.hsetnx.return_value = True
+
+        self.assertEqual(self.engine._get_member_ids(["MEM-1"]), {"MEM-1": 9})
+        self.cache.hsetnx.assert_called_once_with(
+            "site|verenigingen:segment_member_ids", "MEM-1", pickle.dumps(9)
+        )
+        self.cache.hset.assert_called_once_with("verenigingen:segment_member_names", "9", "MEM-1")
+
+    def test_member_added_concurrently_keeps_first_slot(self):
+        # Another worker claimed a slot for the member between the read and HSETNX
+        self.cache.hget.side_effect = [None, 4]
+        self.cache.hsetnx.return_value = False
+
+        self.assertEqual(self.engine._get_member_ids(["MEM-1"]), {"MEM-1": 4})
+        self.cache.hset.assert_not_called()
+
+    def test_refresh_and_rebuild_share_one_lock(self):
+        self.cache.get_value.return_value = None
+
+        with patch.object(self.engine, "_rebuild_all", return_value={"success": True}) as rebuild:
+            self.engine.refresh_members(["MEM-1"])
+
+        # Rebuilding an unbuilt engine from a refresh does not take the lock twice
+        rebuild.assert_called_once_with()
+        self.lock.assert_called_once()
+        self.lock.return_value.__enter__.assert_called_once()
+
+        self.lock.reset_mock()
+        self.cache.get_value.return_value = {"members": 1}
+        with patch.object(self.engine, "_refresh_members", return_value={"success": True}) as refresh:
+            self.engine.refresh_members(["MEM-1"])
+
+        refresh.assert_called_once_with(["MEM-1"])
+        self.lock.return_value.__enter__.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the SEPA collection preview
+
+Covers folding grouped aggregate rows into per-date and per-sequence type
+totals, capping requested pages, and the batch preview API returning
+aggregates and a bounded sample instead of every invoice.
+"""
+
+import unittest
+from datetime import date
+from unittest.mock import patch
+
+import frappe
+
+from verenigingen.verenigingen_payments.doctype.direct_debit_batch import sepa_processor
+from verenigingen.verenigingen_payments.utils import sepa_collection_preview as preview
+
+
+def group(collection_date, sequence_type, count, total_amount):
+    return frappe._dict(
+        date=collection_date, sequence_type=sequence_type, count=count, total_amount=total_amount
+    )
+
+
+class TestCollectionPreviewSummaries(unittest.TestCase):
+    def test_groups_folded_per_date_and_sequence_type(self):
+        groups = [
+            group(date(2026, 11, 1), "FRST", 2, 50.0),
+            group(date(2026, 11, 1), "RCUR", 10, 250.0),
+            group(date(2026, 11, 15), "RCUR", 3, 75.0),
+            group(date(2026, 11, 15), None, 1, 25.0),
+        ]
+
+        by_date = preview.summarize_by_date(groups)
+
+        self.assertEqual(
+            [(entry["date"], entry["count"], entry["total_amount"]) for entry in by_date],
+            [
+                (date(2026, 11, 1), 12, 300.0),
+                (date(2026, 11, 15), 4, 100.0),
+            ],
+        )
+        self.assertEqual(
+            by_date[1]["sequence_types"][preview.WITHOUT_MANDATE], {"count": 1, "total_amount": 25.0}
+        )
+        self.assertEqual(
+            preview.summarize_sequence_types(groups),
+            {
+                "FRST": {"count": 2, "total_amount": 50.0},
+                "RCUR": {"count": 13, "total_amount": 325.0},
+                preview.WITHOUT_MANDATE: {"count": 1, "total_amount": 25.0},
+            },
+        )
+
+    def test_page_bounds(self):
+        self.assertEqual(preview.page_bounds(None, None), (0, preview.DEFAULT_PAGE_LENGTH))
+        self.assertEqual(preview.page_bounds("100", "20"), (100, 20))
+        self.assertEqual(preview.page_bounds(-5, 100000), (0, preview.MAX_PAGE_LENGTH))
+
+
+class TestSEPABatchPreview(unittest.TestCase):
+    def setUp(self):
+        db_patcher = patch.object(preview.frappe, "db")
+        self.db = db_patcher.start()
+        self.addCleanup(db_patcher.stop)
+        self.db.sql.side_effect = self._sql
+
+        config_patcher = patch.object(sepa_processor, "get_sepa_config_manager")
+        config_manager = config_patcher.start()
+        config_manager.return_value.get_processing_config.return_value = {"lookback_days": 60}
+        self.addCleanup(config_patcher.stop)
+
+    def _sql(self, query, values=None, as_dict=False):
+        if "COUNT(DISTINCT mds.member)" in query:
+            return [frappe._dict(count=20000, total_amount=500000.0, members=19500)]
+        if "GROUP BY" in query:
+            return [
+                group(date(2026, 11, 1), "FRST", 500, 12500.0),
+                group(date(2026, 11, 1), "RCUR", 19500, 487500.0),
+            ]
+        return [frappe._dict(name=f"SINV-{i}", sequence_type="RCUR") for i in range(values["page_length"])]
+
+    def test_preview_aggregates_without_loading_invoices(self):
+        result = sepa_processor.get_sepa_batch_preview("2026-11-01")
+
+        self.assertEqual(
+            (result["unpaid_invoices_found"], result["total_amount"], result["members_affected"]),
+            (20000, 500000.0, 19500),
+        )
+        self.assertEqual(result["sequence_types"]["FRST"], {"count": 500, "total_amount": 12500.0})
+        self.assertEqual(len(result["sample_invoices"]), 5)
+
+        page_queries = [call for call in self.db.sql.call_args_list if "LIMIT" in call.args[0]]
+        self.assertEqual([call.args[1]["page_length"] for call in page_queries], [5])
+
+    def test_invoice_pages_filter_and_cap(self):
+        result = sepa_processor.get_sepa_batch_preview_invoices(
+            "2026-11-01", start=1000, page_length=10000, sequence_type="FRST"
+        )
+
+        self.assertEqual((result["start"], result["page_length"]), (1000, preview.MAX_PAGE_LENGTH))
+        query, values = self.db.sql.call_args.args
+        self.assertIn("= %(sequence_type)s", query)
+        self.assertEqual((values["start"], values["sequence_type"]), (1000, "FRST"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the SEPA mandate health table
+
+Covers scoring and lapse dates, refreshing health rows from mandate and usage
+aggregates, recording a return file with one update per reason, and the
+summary that lifecycle reports and the monitoring dashboard read.
+"""
+
+import unittest
+from datetime import date
+from unittest.mock import patch
+
+import frappe
+
+from verenigingen.utils import derived_table
+from verenigingen.verenigingen_payments.utils import sepa_mandate_health as health
+
+
+def mandate_row(name, status="Active", iban="NL91ABNA0417164300", **fields):
+    row = dict(
+        name=name,
+        mandate_id=f"ID-{name}",
+        member="MEM-001",
+        member_name="Jan Jansen",
+        status=status,
+        iban=iban,
+        sign_date=date(2025, 1, 1),
+        expiry_date=None,
+        usage_count=0,
+        collected_count=0,
+        failed_count=0,
+        returned_count=0,
+        total_collected=0,
+        first_used=None,
+        last_used=None,
+        last_return_date=None,
+        last_return_reason=None,
+    )
+    row.update(fields)
+    return frappe._dict(row)
+
+
+class TestSEPAMandateHealth(unittest.TestCase):
+    def setUp(self):
+        db_patcher = patch.object(health.frappe, "db")
+        self.db = db_patcher.start()
+        self.addCleanup(db_patcher.stop)
+
+        today_patcher = patch.object(health, "today", return_value="2026-06-01")
+        today_patcher.start()
+        self.addCleanup(today_patcher.stop)
+
+    def _inserted(self):
+        query, values = next(
+            call.args for call in self.db.sql.call_args_list if "INSERT INTO" in call.args[0]
+        )
+        columns = derived_table.STANDARD_FIELDS + health.health_table.fields
+        rows = [dict(zip(columns, values[i : i + len(columns)])) for i in range(0, len(values), len(columns))]
+        return {row["name"]: row for row in rows}
+
+    def test_score_mandate(self):
+        today_date = date(2026, 6, 1)
+        base = {"mandate_status": "Active", "has_iban": 1, "valid_until": date(2028, 1, 1)}
+
+        self.assertEqual(health.score_mandate(base, today_date), (100, "Healthy"))
+        self.assertEqual(health.score_mandate({**base, "mandate_status": "Cancelled"}), (0, "Inactive"))
+        self.assertEqual(
+            health.score_mandate({**base, "valid_until": date(2026, 5, 31)}, today_date), (0, "Critical")
+        )
+        # Half of the collections returned, one of them last month
+        returned = {**base, "usage_count": 4, "returned_count": 2, "last_return_date": date(2026, 5, 1)}
+        self.assertEqual(health.score_mandate(returned, today_date), (60, "Attention"))
+        # Missing IBAN and lapsing within 30 days
+        lapsing = {**base, "has_iban": 0, "valid_until": date(2026, 6, 20)}
+        self.assertEqual(health.score_mandate(lapsing, today_date), (20, "Critical"))
+
+    def test_valid_until_is_first_of_expiry_and_lapse(self):
+        self.assertEqual(
+            health.calculate_valid_until(date(2020, 1, 1), None, date(2024, 3, 15)), date(2027, 3, 15)
+        )
+        self.assertEqual(
+            health.calculate_valid_until(date(2020, 1, 1), date(2026, 1, 1), date(2024, 3, 15)),
+            date(2026, 1, 1),
+        )
+        self.assertEqual(health.calculate_valid_until(date(2020, 1, 1), None, None), date(2023, 1, 1))
+        self.assertIsNone(health.calculate_valid_until(None, None, None))
+
+    def test_refresh_writes_scored_rows(self):
+        self.db.sql.side_effect = [
+            [
+                mandate_row(
+                    "MAND-1",
+                    usage_count=3,
+                    collected_count=3,
+                    total_collected=75.5,
+                    last_used=date(2026, 5, 1),
+                ),
+                mandate_row("MAND-2", status="Cancelled", iban=None),
+            ],
+            None,
+        ]
+
+        written = health.refresh_mandate_health(["MAND-2", "MAND-1", None, "MAND-GONE"])
+
+        self.assertEqual(written, 2)
+        self.db.delete.assert_called_once_with(health.HEALTH_DOCTYPE, {"name": ("in", ["MAND-GONE"])})
+        rows = self._inserted()
+        self.assertEqual(rows["MAND-1"]["health_score"], 100)
+        self.assertEqual(rows["MAND-1"]["valid_until"], date(2029, 5, 1))
+        self.assertEqual(rows["MAND-1"]["total_collected"], 75.5)
+        self.assertEqual((rows["MAND-2"]["has_iban"], rows["MAND-2"]["health_status"]), (0, "Inactive"))
+
+    def test_returns_update_usage_once_per_reason(self):
+        self.db.sql_list.return_value = ["MAND-1", "MAND-2"]
+
+        with patch.object(health, "refresh_mandate_health", return_value=2) as refresh:
+            refreshed = health.record_mandate_returns(
+                [
+                    {"invoice": "SINV-1", "reason": "AM04"},
+                    {"invoice": "SINV-2", "reason": "AM04"},
+                    {"invoice": "SINV-3", "reason": "MD01"},
+                    {"invoice": "SINV-4", "reason": "AC04", "status": "Failed"},
+                    {"invoice": None, "reason": "AM04"},
+                ]
+            )
+
+        self.assertEqual(refreshed, 2)
+        updates = {
+            (call.args[1]["status"], call.args[1]["reason"]): set(call.args[1]["invoices"])
+            for call in self.db.sql.call_args_list
+        }
+        self.assertEqual(
+            updates,
+            {
+                ("Returned", "AM04"): {"SINV-1", "SINV-2"},
+                ("Returned", "MD01"): {"SINV-3"},
+                ("Failed", "AC04"): {"SINV-4"},
+            },
+        )
+        refresh.assert_called_once_with(["MAND-1", "MAND-2"])
+        self.assertEqual(health.record_mandate_returns([]), 0)
+
+    def test_summary_aggregates_groups(self):
+        def group(mandate_status, health_status, count, **fields):
+            values = dict(
+                score_total=0,
+                with_iban=count,
+                age_total=0,
+                dated=0,
+                oldest_sign_date=None,
+                newest_sign_date=None,
+                used_30d=0,
+                used_90d=0,
+                expiring=0,
+            )
+            values.update(fields)
+            return frappe._dict(
+                mandate_status=mandate_status, health_status=health_status, count=count, **values
+            )
+
+        self.db.sql.return_value = [
+            group(
+                "Active",
+                "Healthy",
+                3,
+                score_total=290,
+                age_total=300,
+                dated=3,
+                oldest_sign_date=date(2025, 1, 1),
+                newest_sign_date=date(2026, 1, 1),
+                used_30d=2,
+                used_90d=3,
+            ),
+            group(
+                "Active",
+                "Critical",
+                1,
+                score_total=10,
+                with_iban=0,
+                age_total=700,
+                dated=1,
+                oldest_sign_date=date(2024, 6, 1),
+                newest_sign_date=date(2024, 6, 1),
+                expiring=1,
+            ),
+            group("Cancelled", "Inactive", 2),
+        ]
+
+        summary = health.get_mandate_health_summary()
+
+        self.assertEqual(summary["total"], 6)
+        self.assertEqual(summary["with_iban"], 5)
+        self.assertEqual(summary["by_health"], {"Healthy": 3, "Critical": 1, "Inactive": 2})
+        self.assertEqual(summary["average_score"], 75.0)
+        self.assertEqual(summary["expiring"], 1)
+        self.assertEqual(summary["usage"], {"frequent_usage": 2, "moderate_usage": 1, "low_usage": 1})
+        active = summary["by_status"]["Active"]
+        self.assertEqual(active["count"], 4)
+        self.assertEqual(active["avg_age_days"], 250)
+        self.assertEqual(
+            (active["oldest_sign_date"], active["newest_sign_date"]), (date(2024, 6, 1), date(2026, 1, 1))
+        )
+        self.assertIsNone(summary["by_status"]["Cancelled"]["avg_age_days"])
+
+
+if __name__ == "__main__":
+    unittest.main()
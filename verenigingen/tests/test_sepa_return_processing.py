@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Unit tests for batched SEPA return file processing
+
+Covers streaming pain.002 and camt.054 parsing, resolving a whole chunk of
+end-to-end IDs with one query, applying failures with one statement per
+reason, skipping invoices that were already processed, and scheduling
+retries in bulk.
+"""
+
+import unittest
+from unittest.mock import MagicMock, patch
+
+import frappe
+
+from verenigingen.utils import payment_retry
+from verenigingen.utils.payment_retry import PaymentRetryManager
+from verenigingen.verenigingen_payments.utils import sepa_return_processing as returns
+
+PAIN_002 = """<?xml version="1.0" encoding="UTF-8"?>
+<Document xmlns="urn:iso:std:iso:20022:tech:xsd:pain.002.001.03">
+  <CstmrPmtStsRpt>
+    <OrgnlPmtInfAndSts>
+      <TxInfAndSts>
+        <OrgnlEndToEndId>E2E-ACC-SINV-0001</OrgnlEndToEndId>
+        <TxSts>RJCT</TxSts>
+        <StsRsnInf><Rsn><Cd>AM04</Cd></Rsn><AddtlInf>Insufficient funds</AddtlInf></StsRsnInf>
+        <OrgnlTxRef><Amt><InstdAmt Ccy="EUR">25.00</InstdAmt></Amt></OrgnlTxRef>
+      </TxInfAndSts>
+      <TxInfAndSts>
+        <OrgnlEndToEndId>E2E-ACC-SINV-0002</OrgnlEndToEndId>
+        <TxSts>ACSC</TxSts>
+      </TxInfAndSts>
+      <TxInfAndSts>
+        <OrgnlEndToEndId>E2E-ACC-SINV-0003</OrgnlEndToEndId>
+        <TxSts>PDNG</TxSts>
+      </TxInfAndSts>
+    </OrgnlPmtInfAndSts>
+  </CstmrPmtStsRpt>
+</Document>
+"""
+
+CAMT_054 = """<?xml version="1.0" encoding="UTF-8"?>
+<Document xmlns="urn:iso:std:iso:20022:tech:xsd:camt.054.001.02">
+  <BkToCstmrDbtCdtNtfctn><Ntfctn><Ntry><NtryDtls>
+    <TxDtls>
+      <Refs><EndToEndId>E2E-ACC-SINV-0004</EndToEndId></Refs>
+      <AmtDtls><TxAmt><Amt Ccy="EUR">12.50</Amt></TxAmt></AmtDtls>
+      <RtrInf><Rsn><Cd>MD06</Cd></Rsn></RtrInf>
+    </TxDtls>
+    <TxDtls>
+      <Refs><EndToEndId>E2E-ACC-SINV-0005</EndToEndId></Refs>
+    </TxDtls>
+  </NtryDtls></Ntry></Ntfctn></BkToCstmrDbtCdtNtfctn>
+</Document>
+"""
+
+
+def batch_invoice(invoice, status="Pending", batch="DD-BATCH-1"):
+    return frappe._dict(
+        name=f"row-{invoice}",
+        batch=batch,
+        invoice=invoice,
+        member="MEM-001",
+        membership="MSHIP-001",
+        amount=25.0,
+        status=status,
+    )
+
+
+def rejection(invoice, reason_code="AM04", status="Rejected"):
+    return {"end_to_end_id": f"E2E-{invoice}", "status": status, "reason_code": reason_code}
+
+
+class TestSEPAReturnParsing(unittest.TestCase):
+    def test_pain002_final_statuses(self):
+        items = list(returns.iter_return_transactions(PAIN_002))
+
+        self.assertEqual(
+            [(item["end_to_end_id"], item["status"]) for item in items],
+            [("E2E-ACC-SINV-0001", "Rejected"), ("E2E-ACC-SINV-0002", "Accepted")],
+        )
+        self.assertEqual(items[0]["reason_code"], "AM04")
+        self.assertEqual(items[0]["reason_text"], "Insufficient funds")
+        self.assertEqual(items[0]["amount"], 25.0)
+
+    def test_camt054_only_r_transactions(self):
+        items = list(returns.iter_return_transactions(CAMT_054.encode()))
+
+        self.assertEqual(len(items), 1)
+        self.assertEqual(
+            (items[0]["end_to_end_id"], items[0]["status"], items[0]["reason_code"], items[0]["amount"]),
+            ("E2E-ACC-SINV-0004", "Returned", "MD06", 12.5),
+        )
+
+
+class TestSEPAReturnProcessing(unittest.TestCase):
+    def setUp(self):
+        db_patcher = patch.object(returns.frappe, "db")
+        self.db = db_patcher.start()
+        self.addCleanup(db_patcher.stop)
+
+        self.retry_manager = MagicMock()
+        self.retry_manager.schedule_retries.side_effect = lambda failures: {
+            "scheduled": [failure["invoice"] for failure in failures],
+            "escalated": [],
+        }
+        retry_patcher = patch.object(payment_retry, "PaymentRetryManager", return_value=self.retry_manager)
+        retry_patcher.start()
+        self.addCleanup(retry_patcher.stop)
+
+        health_patcher = patch(
+            "verenigingen.verenigingen_payments.utils.sepa_mandate_health.record_mandate_returns"
+        )
+        self.record_mandate_returns = health_patcher.start()
+        self.addCleanup(health_patcher.stop)
+
+        self.rows = {}
+        self.db.sql.side_effect = self._sql
+
+    def _sql(self, query, values=None, as_dict=False):
+        if query.lstrip().startswith("SELECT"):
+            return [self.rows[invoice] for invoice in values["invoices"] if invoice in self.rows]
+        return []
+
+    def _updates(self, table):
+        return [call.args for call in self.db.sql.call_args_list if f"UPDATE `{table}`" in call.args[0]]
+
+    def test_failures_applied_in_bulk(self):
+        self.rows = {
+            f"SINV-{i}": batch_invoice(f"SINV-{i}", batch="DD-BATCH-1" if i < 3 else "DD-BATCH-2")
+            for i in range(5)
+        }
+        transactions = [rejection("SINV-0"), rejection("SINV-1"), rejection("SINV-2", "MD01")]
+        transactions += [rejection("SINV-3", "MD06", status="Returned"), rejection("SINV-UNKNOWN")]
+        transactions.append({"end_to_end_id": "E2E-SINV-4", "status": "Accepted"})
+
+        with patch.object(returns, "RETURN_CHUNK_SIZE", 10):
+            summary = returns.process_return_transactions(iter(transactions))
+
+        lookups = [call for call in self.db.sql.call_args_list if call.args[0].lstrip().startswith("SELECT")]
+        self.assertEqual(len(lookups), 1)
+        self.assertEqual(
+            (summary["rejected"], summary["returned"], summary["accepted"], summary["unmatched"]),
+            (3, 1, 1, 1),
+        )
+        self.assertEqual(summary["unmatched_ids"], ["E2E-SINV-UNKNOWN"])
+        self.assertEqual(summary["batches"], {"DD-BATCH-1": 3, "DD-BATCH-2": 1})
+
+        failed = {
+            values["result_code"]: set(values["names"])
+            for _query, values in self._updates("tabDirect Debit Batch Invoice")
+            if "result_code" in values
+        }
+        self.assertEqual(
+            failed, {"AM04": {"row-SINV-0", "row-SINV-1"}, "MD01": {"row-SINV-2"}, "MD06": {"row-SINV-3"}}
+        )
+        self.assertEqual(len(self._updates("tabDirect Debit Batch")), 2)
+
+        self.retry_manager.schedule_retries.assert_called_once()
+        self.assertEqual(summary["retries_scheduled"], 4)
+        usage_statuses = {
+            item["invoice"]: item["status"] for item in self.record_mandate_returns.call_args.args[0]
+        }
+        self.assertEqual(usage_statuses["SINV-0"], "Failed")
+        self.assertEqual(usage_statuses["SINV-3"], "Returned")
+
+    def test_reprocessing_is_idempotent(self):
+        self.rows = {
+            "SINV-0": batch_invoice("SINV-0", status="Failed"),
+            "SINV-1": batch_invoice("SINV-1", status="Successful"),
+        }
+
+        summary = returns.process_return_transactions(
+            [rejection("SINV-0"), {"end_to_end_id": "E2E-SINV-1", "status": "Accepted"}]
+        )
+
+        self.assertEqual(summary["already_processed"], 2)
+        self.assertEqual(self._updates("tabDirect Debit Batch Invoice"), [])
+        self.retry_manager.schedule_retries.assert_not_called()
+
+    def test_chunks_bound_each_lookup(self):
+        self.rows = {f"SINV-{i}": batch_invoice(f"SINV-{i}") for i in range(25)}
+
+        with patch.object(returns, "RETURN_CHUNK_SIZE", 10):
+            summary = returns.process_return_transactions(rejection(f"SINV-{i}") for i in range(25))
+
+        lookups = [call for call in self.db.sql.call_args_list if call.args[0].lstrip().startswith("SELECT")]
+        self.assertEqual([len(call.args[1]["invoices"]) for call in lookups], [10, 10, 5])
+        self.assertEqual(summary["rejected"], 25)
+        self.assertEqual(summary["batches"], {"DD-BATCH-1": 25})
+
+
+class TestBulkRetryScheduling(unittest.TestCase):
+    def setUp(self):
+        for target, kwargs in (
+            ("get_single", {"return_value": frappe._dict(sepa_max_retries=3)}),
+            ("db", {}),
+            ("get_all", {}),
+            ("enqueue", {}),
+            ("get_doc", {}),
+            ("log_error", {}),
+        ):
+            patcher = patch.object(payment_retry.frappe, target, create=True, **kwargs)
+            setattr(self, target, patcher.start())
+            self.addCleanup(patcher.stop)
+
+        self.manager = PaymentRetryManager()
+        self.manager.calculate_next_retry_date = lambda record: f"next-{record.retry_count}"
+        self.manager.escalate_payment_failure = MagicMock()
+
+    def test_existing_and_new_records_updated_per_count_and_reason(self):
+        self.get_all.return_value = [
+            frappe._dict(name="RETRY-A", invoice="SINV-A", retry_count=1),
+            frappe._dict(name="RETRY-MAX", invoice="SINV-MAX", retry_count=3),
+        ]
+        failures = [
+            {"invoice": invoice, "member": "MEM-001", "amount": 25.0, "reason_code": "AM04"}
+            for invoice in ("SINV-A", "SINV-MAX", "SINV-B", "SINV-C")
+        ]
+
+        with patch.object(
+            payment_retry.frappe,
+            "generate_hash",
+            side_effect=["RETRY-B", "RETRY-C", "L1", "L2", "L3"],
+            create=True,
+        ):
+            result = self.manager.schedule_retries(failures)
+
+        inserted = self.db.bulk_insert.call_args_list
+        self.assertEqual(inserted[0].args[0], "SEPA Payment Retry")
+        self.assertEqual([row[5] for row in inserted[0].kwargs["values"]], ["SINV-B", "SINV-C"])
+
+        updates = {
+            call.args[1]["next_retry_date"]: set(call.args[1]["names"]) for call in self.db.sql.call_args_list
+        }
+        self.assertEqual(updates, {"next-0": {"RETRY-B", "RETRY-C"}, "next-1": {"RETRY-A"}})
+        self.assertEqual(sorted(result["scheduled"]), ["RETRY-A", "RETRY-B", "RETRY-C"])
+        self.assertEqual(result["escalated"], ["RETRY-MAX"])
+        self.get_doc.assert_called_once_with("SEPA Payment Retry", "RETRY-MAX")
+        self.manager.escalate_payment_failure.assert_called_once()
+        self.enqueue.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Unit tests for column-wise SEPA validation
+
+Covers running each rule once per distinct value, caching IBANs and
+mandates that passed across batches (including the previous month's cache,
+keyed by digest), the
+generator's transaction validation messages, and the rulebook validator's
+column checks on a pain.008 document.
+"""
+
+import hashlib
+import json
+import unittest
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+from verenigingen.verenigingen_payments.utils import sepa_validation_plan as plan
+from verenigingen.verenigingen_payments.utils.sepa_rulebook_validator import SEPARulebookValidator
+from verenigingen.verenigingen_payments.utils.sepa_xml_enhanced_generator import (
+    EnhancedSEPAXMLGenerator,
+    SEPADebtor,
+    SEPAMandate,
+    SEPASequenceType,
+    SEPATransaction,
+)
+
+VALID_IBAN = "NL91ABNA0417164300"
+
+PAIN_008 = """<?xml version="1.0" encoding="UTF-8"?>
+<Document xmlns="urn:iso:std:iso:20022:tech:xsd:pain.008.001.08">
+  <CstmrDrctDbtInitn>
+    <PmtInf>
+      <PmtTpInf><SeqTp>FRST</SeqTp></PmtTpInf>
+      {transactions}
+    </PmtInf>
+  </CstmrDrctDbtInitn>
+</Document>
+"""
+
+TRANSACTION = """
+      <DrctDbtTxInf>
+        <PmtId><EndToEndId>{e2e}</EndToEndId></PmtId>
+        <InstdAmt Ccy="EUR">{amount}</InstdAmt>
+        <DrctDbtTx><MndtRltdInf>
+          <MndtId>{mandate}</MndtId><DtOfSgntr>{signed}</DtOfSgntr>
+        </MndtRltdInf></DrctDbtTx>
+        <Dbtr><Nm>{name}</Nm></Dbtr>
+        <DbtrAcct><Id><IBAN>{iban}</IBAN></Id></DbtrAcct>
+        <RmtInf><Ustrd>Contributie</Ustrd></RmtInf>
+      </DrctDbtTxInf>"""
+
+
+def transaction(end_to_end_id="E2E-SINV-1", amount="25.00", iban=VALID_IBAN, bic=None, **mandate):
+    return SEPATransaction(
+        end_to_end_id=end_to_end_id,
+        amount=Decimal(amount),
+        currency="EUR",
+        debtor=SEPADebtor(name="Jan Jansen", iban=iban, bic=bic),
+        mandate=SEPAMandate(
+            mandate_id=mandate.get("mandate_id", "MANDATE-1"),
+            date_of_signature=mandate.get("date_of_signature", date(2025, 1, 1)),
+        ),
+        remittance_info="Contributie",
+        sequence_type=SEPASequenceType.RCUR,
+    )
+
+
+class RedisUnavailable(unittest.TestCase):
+    """Run with only the in-process tier of the validation caches"""
+
+    def setUp(self):
+        cache_patcher = patch.object(plan.frappe, "cache", side_effect=ConnectionError, create=True)
+        cache_patcher.start()
+        self.addCleanup(cache_patcher.stop)
+        for cache in (plan.iban_cache, plan.mandate_cache):
+            cache.local.clear()
+            self.addCleanup(cache.local.clear)
+
+
+class TestValidationPlan(RedisUnavailable):
+    def test_rules_run_once_per_distinct_value(self):
+        check = MagicMock(side_effect=lambda value: [("error", "odd")] if value % 2 else [])
+        validation_plan = plan.ValidationPlan(
+            [plan.ColumnRule("number", check), plan.ColumnRule("name", lambda name: [("warning", name)])]
+        )
+
+        findings = validation_plan.run({"number": [1, 2, 1, 3], "name": ["a", "b", "a", "b"]})
+
+        self.assertEqual(check.call_count, 3)
+        self.assertEqual(
+            findings,
+            [
+                (0, "error", "odd"),
+                (0, "warning", "a"),
+                (1, "warning", "b"),
+                (2, "error", "odd"),
+                (2, "warning", "a"),
+                (3, "error", "odd"),
+                (3, "warning", "b"),
+            ],
+        )
+
+    def test_cached_ibans_are_not_validated_again(self):
+        with patch.object(plan, "validate_iban", wraps=plan.validate_iban) as validate_iban:
+            first = plan.validate_ibans([VALID_IBAN, "NL00ABNA0000000000", VALID_IBAN])
+            second = plan.validate_ibans([VALID_IBAN, "NL00ABNA0000000000"])
+
+        # Only the valid IBAN is cached; the invalid one is checked again for its message
+        self.assertEqual(validate_iban.call_count, 3)
+        self.assertEqual(first, second)
+        self.assertTrue(first[VALID_IBAN]["valid"])
+        self.assertFalse(first["NL00ABNA0000000000"]["valid"])
+
+
+class TestValidationCache(unittest.TestCase):
+    def test_previous_month_results_carried_over(self):
+        redis = MagicMock()
+        redis.make_key.side_effect = lambda key: f"site1|{key}"
+        pipeline = redis.pipeline.return_value
+        pipeline.execute.side_effect = [[[None, None], [b"1", None]], []]
+        cache = plan.ValidationCache("test")
+        digest = hashlib.sha256(VALID_IBAN.encode()).hexdigest()
+
+        with (
+            patch.object(plan.frappe, "cache", return_value=redis, create=True),
+            patch.object(plan, "today", return_value="2026-03-15"),
+        ):
+            found = cache.get_many([VALID_IBAN, "new"])
+
+        self.assertEqual(found, {VALID_IBAN: []})
+        self.assertEqual(
+            [call.args for call in pipeline.hmget.call_args_list],
+            [
+                ("site1|sepa_validation:test:2026-03", [digest, plan._field("new")]),
+                ("site1|sepa_validation:test:2026-02", [digest, plan._field("new")]),
+            ],
+        )
+        pipeline.hset.assert_called_once_with("site1|sepa_validation:test:2026-03", mapping={digest: 1})
+
+    def test_only_values_without_findings_are_cached(self):
+        redis = MagicMock()
+        redis.make_key.side_effect = lambda key: f"site1|{key}"
+        cache = plan.ValidationCache("test")
+
+        with (
+            patch.object(plan.frappe, "cache", return_value=redis, create=True),
+            patch.object(plan, "today", return_value="2026-03-15"),
+        ):
+            cache.set_many({("Jan", VALID_IBAN): [], ("Piet", "NL00"): [("error", "Ongeldige IBAN")]})
+
+        mapping = redis.pipeline.return_value.hset.call_args.kwargs["mapping"]
+        self.assertEqual(list(mapping), [plan._field(("Jan", VALID_IBAN))])
+        self.assertNotIn(VALID_IBAN, json.dumps(mapping))
+
+
+class TestGeneratorTransactionValidation(RedisUnavailable):
+    def test_findings_per_transaction(self):
+        generator = EnhancedSEPAXMLGenerator()
+        transactions = [
+            transaction(),
+            transaction("E2E-SINV-2", amount="0", bic="NOTABIC"),
+            transaction("E2E-" + "X" * 40, date_of_signature=date.today() + timedelta(days=1)),
+        ]
+
+        with patch(
+            "verenigingen.verenigingen_payments.utils.sepa_xml_enhanced_generator.validate_iban",
+            return_value={"valid": True, "message": "Valid IBAN"},
+        ) as validate_iban:
+            generator._validate_transactions(transactions, "Payment Info 1")
+
+        # Two distinct mandates
+        self.assertEqual(validate_iban.call_count, 2)
+        self.assertEqual(
+            generator.validation_errors,
+            [
+                "Payment Info 1, Transaction 2: Amount must be positive",
+                "Payment Info 1, Transaction 2: Invalid debtor BIC format",
+                "Payment Info 1, Transaction 3: End-to-end ID must be 1-35 characters",
+            ],
+        )
+        self.assertEqual(
+            generator.validation_warnings,
+            ["Payment Info 1, Transaction 3: Mandate signature date is in the future"],
+        )
+
+
+class TestRulebookColumnValidation(RedisUnavailable):
+    def _issues(self, rows):
+        xml = PAIN_008.format(transactions="".join(TRANSACTION.format(**row) for row in rows))
+        result = SEPARulebookValidator().validate_sepa_xml(xml, country="NL")
+        return {(issue["rule_id"], issue["element_value"]) for issue in result["issues"]}
+
+    def test_transaction_columns(self):
+        row = dict(
+            e2e="E2E-SINV-1",
+            amount="25.00",
+            mandate="MANDATE-1",
+            signed="2026-01-01",
+            name="Jan",
+            iban=VALID_IBAN,
+        )
+        rows = [
+            row,
+            {**row, "amount": "0.00", "mandate": "M" * 40, "signed": "2020-01-01"},
+            {**row, "e2e": "E2E-SINV-3", "iban": "NL00ABNA0000000000", "name": "Jøn"},
+        ]
+
+        issues = self._issues(rows)
+
+        self.assertIn(("TXN001", "0.00"), issues)
+        self.assertIn(("TXN002", None), issues)
+        self.assertIn(("TXN003", "NL00ABNA0000000000"), issues)
+        self.assertIn(("MND001", "M" * 40), issues)
+        self.assertIn(("MND005", "2020-01-01"), issues)
+        self.assertIn(("CHR001", "Jøn"), issues)
+        self.assertNotIn(("MND005", "2026-01-01"), issues)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -96,9 +96,6 @@ class TestSEPAWeek3Features(unittest.TestCase):
     def cleanup_test_data(self):
         """Clean up test data from database"""
         try:
-            # Clean up test locks
-            frappe.db.sql("DELETE FROM `tabSEPA_Distributed_Lock` WHERE lock_owner LIKE 'test_%'")
-            
             # Clean up test rollback operations
             frappe.db.sql("DELETE FROM `tabSEPA_Rollback_Operation` WHERE operation_id LIKE 'TEST_%'")
             
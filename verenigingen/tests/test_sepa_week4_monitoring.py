@@ -30,7 +30,10 @@ from verenigingen.verenigingen_payments.utils.sepa_alerting_system import (
     SEPAAlertingSystem, AlertSeverity, AlertStatus, get_alerting_system
 )
 from verenigingen.verenigingen_payments.utils.sepa_admin_reporting import SEPAAdminReportGenerator
-from verenigingen.verenigingen_payments.utils.sepa_zabbix_enhanced import SEPAZabbixIntegration
+from verenigingen.verenigingen_payments.utils.sepa_zabbix_enhanced import (
+    SNAPSHOT_CACHE_KEY,
+    SEPAZabbixIntegration,
+)
 from verenigingen.verenigingen_payments.utils.sepa_memory_optimizer import SEPAMemoryMonitor
 
 
@@ -537,6 +540,8 @@ class TestSEPAZabbixIntegration(VereningingenTestCase):
     def setUp(self):
         super().setUp()
         self.zabbix_integration = SEPAZabbixIntegration()
+        # Collect metrics from the data created by each test
+        frappe.cache().delete_value(SNAPSHOT_CACHE_KEY)
     
     def test_get_zabbix_metrics(self):
         """Test Zabbix metrics collection"""
@@ -817,6 +822,7 @@ class TestSEPAWeek4Integration(VereningingenTestCase):
         
         # Get Zabbix metrics
         zabbix = SEPAZabbixIntegration()
+        zabbix.get_metrics_snapshot(refresh=True)
         zabbix_metrics = zabbix.get_zabbix_metrics()
         
         # Both should show consistent mandate counts
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the cached SEPA Zabbix metrics snapshot
+
+Checks that metrics, item families and discovery share one collection pass
+within the snapshot TTL, and that pollers are served the previous snapshot
+while another worker holds the collection lock.
+"""
+
+import time
+import unittest
+from unittest.mock import patch
+
+from verenigingen.verenigingen_payments.utils import sepa_zabbix_enhanced
+from verenigingen.verenigingen_payments.utils.sepa_zabbix_enhanced import (
+    SNAPSHOT_CACHE_KEY,
+    SNAPSHOT_TTL,
+    SEPAZabbixIntegration,
+)
+
+
+class FakeCache:
+    def __init__(self):
+        self.values = {}
+
+    def get_value(self, key):
+        return self.values.get(key)
+
+    def set_value(self, key, value, expires_in_sec=None):
+        self.values[key] = value
+
+
+class FakeLock:
+    held = False
+
+    def __init__(self, resources, **kwargs):
+        pass
+
+    def acquire(self):
+        return not FakeLock.held
+
+    def release(self):
+        return True
+
+
+class TestSEPAZabbixSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.cache = FakeCache()
+        FakeLock.held = False
+        for patcher in (
+            patch.object(sepa_zabbix_enhanced.frappe, "cache", return_value=self.cache),
+            patch.object(sepa_zabbix_enhanced, "DistributedLock", FakeLock),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.integration = SEPAZabbixIntegration.__new__(SEPAZabbixIntegration)
+        self.integration.zabbix_items = {"sepa.batch.count.total": {"type": "integer", "name": "Batches"}}
+        self.collections = 0
+
+        def collect():
+            self.collections += 1
+            return {
+                "collected_at": time.time(),
+                "values": {"sepa.batch.count.total": self.collections, "sepa.mandate.count.active": 3},
+                "discovery": [{"{#BATCH_NAME}": "BATCH-1"}],
+            }
+
+        self.integration._collect_snapshot = collect
+
+    def test_endpoints_share_one_collection(self):
+        with patch.object(sepa_zabbix_enhanced.frappe, "local", create=True) as local:
+            local.site = "test.site"
+            metrics = self.integration.get_zabbix_metrics()
+
+        self.assertEqual(metrics["metrics"]["sepa.batch.count.total"]["value"], 1)
+        self.assertEqual(self.integration.get_zabbix_discovery_data()["data"][0]["{#BATCH_NAME}"], "BATCH-1")
+        self.assertEqual(self.integration._get_batch_metrics(), {"sepa.batch.count.total": 1})
+        self.assertEqual(self.integration._get_mandate_metrics(), {"sepa.mandate.count.active": 3})
+        self.assertEqual(self.collections, 1)
+
+    def test_expired_snapshot_collected_again(self):
+        self.integration.get_metrics_snapshot()
+        self.cache.values[SNAPSHOT_CACHE_KEY]["collected_at"] -= SNAPSHOT_TTL + 1
+
+        self.assertEqual(self.integration.get_metrics_snapshot()["values"]["sepa.batch.count.total"], 2)
+        refreshed = self.integration.get_metrics_snapshot(refresh=True)
+        self.assertEqual(refreshed["values"]["sepa.batch.count.total"], 3)
+
+    def test_previous_snapshot_served_while_another_worker_collects(self):
+        self.integration.get_metrics_snapshot()
+        self.cache.values[SNAPSHOT_CACHE_KEY]["collected_at"] -= SNAPSHOT_TTL + 1
+        FakeLock.held = True
+
+        snapshot = self.integration.get_metrics_snapshot()
+
+        self.assertEqual(snapshot["values"]["sepa.batch.count.total"], 1)
+        self.assertEqual(self.collections, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,230 @@
+"""
+Address Cluster Index
+
+Member Address Cluster holds one row per address fingerprint, named by the
+fingerprint, with the IDs of all members whose primary address has that
+fingerprint. It is maintained incrementally: every write of a member's
+computed address fields refreshes the clusters of its old and new
+fingerprint, and a weekly rebuild catches members changed outside those
+code paths.
+
+With the index, "other members at this address" is a primary key read that
+answers definitively (most members live alone, so usually with nothing more
+to fetch), and household reports and duplicate detection read clusters
+instead of grouping the whole Member table.
+"""
+
+import json
+from typing import Dict, Iterable, List, Optional
+
+import frappe
+from frappe.utils import cint
+
+from verenigingen.utils.derived_table import DerivedTable
+
+CLUSTER_DOCTYPE = "Member Address Cluster"
+
+cluster_table = DerivedTable(
+    CLUSTER_DOCTYPE,
+    ["address_fingerprint", "normalized_address_line", "normalized_city", "member_count", "members"],
+    "Address Cluster",
+)
+
+_MEMBER_QUERY = """
+    SELECT name, address_fingerprint, normalized_address_line, normalized_city
+    FROM `tabMember`
+    WHERE {condition}
+    ORDER BY address_fingerprint, name
+"""
+
+
+def refresh_address_clusters(fingerprints: Iterable[str]) -> int:
+    """
+    Recompute the clusters of the given fingerprints from the Member table
+
+    Call with both the old and the new fingerprint of every member whose
+    computed address fields changed.
+
+    Returns:
+        int: Number of clusters that still have members
+    """
+    return cluster_table.refresh(fingerprints, _compute_clusters)
+
+
+def rebuild_address_clusters() -> Dict:
+    """
+    Weekly task to recompute every address cluster.
+
+    Catches members changed outside the normal code paths (imports, direct SQL).
+    """
+    return cluster_table.rebuild(_compute_all_clusters)
+
+
+def get_cluster_members(fingerprint: str) -> Optional[List[str]]:
+    """
+    IDs of all members at the address with this fingerprint
+
+    Returns None when the fingerprint has no cluster row (index not built yet).
+    """
+    if not fingerprint:
+        return None
+
+    members = frappe.db.get_value(CLUSTER_DOCTYPE, fingerprint, "members")
+    return json.loads(members) if members is not None else None
+
+
+def on_member_update(doc, method=None):
+    """Member on_update hook - move the member between clusters when its fingerprint changed"""
+    if not doc.has_value_changed("address_fingerprint"):
+        return
+
+    previous = doc.get_doc_before_save()
+    old_fingerprint = previous.address_fingerprint if previous else None
+    cluster_table.refresh_logged(
+        [doc.address_fingerprint, old_fingerprint], _compute_clusters, f"member {doc.name}"
+    )
+
+
+def on_member_delete(doc, method=None):
+    """Member after_delete hook - drop the member from its cluster"""
+    cluster_table.refresh_logged([doc.get("address_fingerprint")], _compute_clusters, f"member {doc.name}")
+
+
+@frappe.whitelist()
+def get_household_report(min_members=2, start=0, page_length=100):
+    """
+    Addresses shared by several members, largest households first
+
+    Args:
+        min_members: Minimum number of members at the address
+        start: Offset for paging
+        page_length: Number of addresses to return
+
+    Returns:
+        List of clusters with their member IDs, names and statuses
+    """
+    frappe.only_for(["System Manager", "Verenigingen Administrator"])
+
+    clusters = frappe.get_all(
+        CLUSTER_DOCTYPE,
+        filters={"member_count": (">=", cint(min_members))},
+        fields=[
+            "address_fingerprint",
+            "normalized_address_line",
+            "normalized_city",
+            "member_count",
+            "members",
+        ],
+        order_by="member_count desc, name asc",
+        start=cint(start),
+        page_length=cint(page_length),
+    )
+
+    member_ids = [member for cluster in clusters for member in json.loads(cluster.members or "[]")]
+    details = {}
+    if member_ids:
+        details = {
+            member.name: member
+            for member in frappe.get_all(
+                "Member",
+                filters={"name": ("in", member_ids)},
+                fields=["name", "full_name", "status", "member_since"],
+            )
+        }
+
+    for cluster in clusters:
+        cluster.members = [details[name] for name in json.loads(cluster.members or "[]") if name in details]
+    return clusters
+
+
+@frappe.whitelist()
+def find_possible_duplicate_members():
+    """
+    Members at the same address with the same name or email address
+
+    Returns:
+        List of groups of member IDs that are likely the same person
+    """
+    frappe.only_for(["System Manager", "Verenigingen Administrator"])
+
+    members = frappe.db.sql(
+        f"""
+        SELECT m.name, m.full_name, m.email, m.status, m.address_fingerprint
+        FROM `tabMember` m
+        INNER JOIN `tab{CLUSTER_DOCTYPE}` c ON c.name = m.address_fingerprint
+        WHERE c.member_count > 1
+        ORDER BY m.address_fingerprint, m.name
+    """,
+        as_dict=True,
+    )
+
+    groups: Dict[tuple, List[Dict]] = {}
+    for member in members:
+        keys = []
+        if member.full_name:
+            keys.append(("name", member.full_name.strip().lower()))
+        if member.email:
+            keys.append(("email", member.email.strip().lower()))
+        for kind, value in keys:
+            groups.setdefault((member.address_fingerprint, kind, value), []).append(member)
+
+    duplicates = []
+    seen = set()
+    for (fingerprint, kind, value), group in groups.items():
+        names = tuple(member.name for member in group)
+        if len(names) < 2 or names in seen:
+            continue
+        seen.add(names)
+        duplicates.append(
+            {
+                "address_fingerprint": fingerprint,
+                "matched_on": kind,
+                "value": value,
+                "members": [{"name": m.name, "full_name": m.full_name, "status": m.status} for m in group],
+            }
+        )
+    return duplicates
+
+
+def _compute_clusters(fingerprints: List[str]) -> List[tuple]:
+    members = frappe.db.sql(
+        _MEMBER_QUERY.format(condition="address_fingerprint IN %(fingerprints)s"),
+        {"fingerprints": fingerprints},
+        as_dict=True,
+    )
+    return _cluster_rows(members)
+
+
+def _compute_all_clusters() -> List[tuple]:
+    members = frappe.db.sql(
+        _MEMBER_QUERY.format(condition="address_fingerprint IS NOT NULL AND address_fingerprint != ''"),
+        as_dict=True,
+    )
+    return _cluster_rows(members)
+
+
+def _cluster_rows(members: List[Dict]) -> List[tuple]:
+    """Cluster rows from member rows sorted by fingerprint"""
+    grouped: Dict[str, Dict] = {}
+    for member in members:
+        cluster = grouped.setdefault(
+            member.address_fingerprint,
+            {
+                "normalized_address_line": member.normalized_address_line,
+                "normalized_city": member.normalized_city,
+                "members": [],
+            },
+        )
+        cluster["members"].append(member.name)
+
+    return [
+        (
+            fingerprint,
+            fingerprint,
+            cluster["normalized_address_line"],
+            cluster["normalized_city"],
+            len(cluster["members"]),
+            json.dumps(cluster["members"]),
+        )
+        for fingerprint, cluster in grouped.items()
+    ]
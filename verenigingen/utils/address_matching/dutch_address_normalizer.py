@@ -47,6 +47,19 @@ class DutchAddressNormalizer:
     # House number pattern matching for separation
     HOUSE_NUMBER_PATTERN = re.compile(r"\s+(\d+[\w\-]*)\s*$")
 
+    # Abbreviation -> street type, matched with a single compiled pattern so
+    # normalizing an address is one pass instead of one re.sub per abbreviation
+    ABBREVIATION_TO_STREET_TYPE = {
+        abbrev: full_name for full_name, abbrevs in STREET_ABBREVIATIONS.items() for abbrev in abbrevs
+    }
+    ABBREVIATION_PATTERN = re.compile(
+        r"\b(" + "|".join(map(re.escape, sorted(ABBREVIATION_TO_STREET_TYPE, key=len, reverse=True))) + r")\b"
+    )
+
+    WHITESPACE_PATTERN = re.compile(r"\s+")
+    ADDRESS_PUNCTUATION_PATTERN = re.compile(r"[.,;:!?]")
+    CITY_PUNCTUATION_PATTERN = re.compile(r"[.,;:!?()-]")
+
     @classmethod
     def normalize_address_line(cls, address_line: str) -> str:
         """
@@ -69,8 +82,8 @@ class DutchAddressNormalizer:
         normalized = normalized.lower().strip()
 
         # Step 3: Remove extra whitespace and normalize punctuation
-        normalized = re.sub(r"\s+", " ", normalized)
-        normalized = re.sub(r"[.,;:!?]", "", normalized)
+        normalized = cls.WHITESPACE_PATTERN.sub(" ", normalized)
+        normalized = cls.ADDRESS_PUNCTUATION_PATTERN.sub("", normalized)
 
         # Step 4: Extract and normalize house number separately
         house_number = ""
@@ -79,12 +92,10 @@ class DutchAddressNormalizer:
             house_number = house_match.group(1)
             normalized = cls.HOUSE_NUMBER_PATTERN.sub("", normalized).strip()
 
-        # Step 5: Normalize street type abbreviations
-        for full_name, abbreviations in cls.STREET_ABBREVIATIONS.items():
-            for abbrev in abbreviations:
-                # Match abbreviation at word boundaries, case insensitive
-                pattern = r"\b" + re.escape(abbrev) + r"\b"
-                normalized = re.sub(pattern, full_name, normalized)
+        # Step 5: Normalize street type abbreviations (whole words only)
+        normalized = cls.ABBREVIATION_PATTERN.sub(
+            lambda match: cls.ABBREVIATION_TO_STREET_TYPE[match.group(1)], normalized
+        )
 
         # Step 6: Handle Dutch prefixes (move to consistent position)
         words = normalized.split()
@@ -121,10 +132,10 @@ class DutchAddressNormalizer:
 
         # Step 2: Convert to lowercase, strip, remove punctuation
         normalized = normalized.lower().strip()
-        normalized = re.sub(r"[.,;:!?()-]", "", normalized)
+        normalized = cls.CITY_PUNCTUATION_PATTERN.sub("", normalized)
 
         # Step 3: Remove extra whitespace
-        normalized = re.sub(r"\s+", " ", normalized)
+        normalized = cls.WHITESPACE_PATTERN.sub(" ", normalized)
 
         # Step 4: Handle common Dutch city name variations
         city_variations = {
@@ -155,9 +166,16 @@ class DutchAddressNormalizer:
             str: 16-character hexadecimal fingerprint for database indexing
         """
         # Ensure we're working with normalized inputs
-        normalized_address = cls.normalize_address_line(address_line)
-        normalized_city = cls.normalize_city(city)
+        return cls.fingerprint_normalized(cls.normalize_address_line(address_line), cls.normalize_city(city))
 
+    @staticmethod
+    def fingerprint_normalized(normalized_address: str, normalized_city: str) -> str:
+        """
+        Fingerprint of an already normalized address line and city
+
+        Normalization is not idempotent (Dutch prefixes are rotated), so pass
+        the output of normalize_address_line/normalize_city, not a re-normalized value.
+        """
         # Create composite key with separator
         composite_key = f"{normalized_address}|{normalized_city}"
 
@@ -181,7 +199,7 @@ class DutchAddressNormalizer:
         """
         normalized_line = cls.normalize_address_line(address_line)
         normalized_city = cls.normalize_city(city)
-        fingerprint = cls.generate_fingerprint(address_line, city)  # Pass raw for consistent hashing
+        fingerprint = cls.fingerprint_normalized(normalized_line, normalized_city)
 
         return normalized_line, normalized_city, fingerprint
 
@@ -1,8 +1,10 @@
 """
-Optimized Address Matcher with Three-Tier Lookup Strategy
+Optimized Address Matcher with Cluster Index Lookup
 
 This module provides O(log N) address matching using computed fields,
 composite indexes, and intelligent caching for high-performance lookups.
+Members are read from the Member Address Cluster index (one primary key
+read); the three lookup tiers remain as fallback while the index is built.
 """
 
 import time
@@ -10,6 +12,7 @@ from typing import Dict, List, Optional, Tuple
 
 import frappe
 
+from verenigingen.utils.address_matching.address_clusters import get_cluster_members
 from verenigingen.utils.address_matching.dutch_address_normalizer import (
     AddressFingerprintCollisionHandler,
     DutchAddressNormalizer,
@@ -43,8 +46,14 @@ class OptimizedAddressMatcher:
             # Get address details
             address = frappe.get_doc("Address", member_doc.primary_address)
 
-            # Generate normalized forms and fingerprint if not already computed
-            if not getattr(member_doc, "address_fingerprint", None):
+            fingerprint = getattr(member_doc, "address_fingerprint", None)
+            normalized_line = getattr(member_doc, "normalized_address_line", None)
+            normalized_city = getattr(member_doc, "normalized_city", None)
+
+            # Members not fingerprinted yet are matched on a fingerprint computed here.
+            # It is not saved: the Member hooks and the scheduled fingerprint task store
+            # it together with the member's address cluster.
+            if not fingerprint:
                 normalized_line, normalized_city, fingerprint = DutchAddressNormalizer.normalize_address_pair(
                     address.address_line1 or "", address.city or ""
                 )
@@ -57,27 +66,18 @@ class OptimizedAddressMatcher:
                         fingerprint, normalized_line, normalized_city, member_doc.name
                     )
 
-                # Update member with computed fields
-                frappe.db.set_value(
-                    "Member",
-                    member_doc.name,
-                    {
-                        "address_fingerprint": fingerprint,
-                        "normalized_address_line": normalized_line,
-                        "normalized_city": normalized_city,
-                        "address_last_updated": frappe.utils.now(),
-                    },
+            # CLUSTER: one primary key read answers for the whole address
+            cluster_members = get_cluster_members(fingerprint)
+            if cluster_members is not None:
+                other_members = [name for name in cluster_members if name != member_doc.name]
+                matching_members = OptimizedAddressMatcher._cluster_lookup(other_members)
+                OptimizedAddressMatcher._track_performance(
+                    "cluster", time.time() - start_time, len(matching_members), True
                 )
-
-                # Update the document object for immediate use
-                member_doc.address_fingerprint = fingerprint
-                member_doc.normalized_address_line = normalized_line
-                member_doc.normalized_city = normalized_city
+                return matching_members
 
             # TIER 1: O(1) Fingerprint lookup (fastest, highest confidence)
-            matching_members = OptimizedAddressMatcher._fingerprint_lookup(
-                member_doc.address_fingerprint, member_doc.name
-            )
+            matching_members = OptimizedAddressMatcher._fingerprint_lookup(fingerprint, member_doc.name)
 
             lookup_tier = "fingerprint"
             if matching_members:
@@ -88,7 +88,7 @@ class OptimizedAddressMatcher:
 
             # TIER 2: O(log N) Normalized lookup (fast fallback, medium confidence)
             matching_members = OptimizedAddressMatcher._normalized_lookup(
-                member_doc.normalized_address_line, member_doc.normalized_city, member_doc.name
+                normalized_line, normalized_city, member_doc.name
             )
 
             lookup_tier = "normalized"
@@ -115,6 +115,53 @@ class OptimizedAddressMatcher:
             OptimizedAddressMatcher._track_performance("error", time.time() - start_time, 0, False)
             return []
 
+    @staticmethod
+    def _cluster_lookup(member_names: List[str]) -> List[Dict]:
+        """
+        Enrich the members of an address cluster by primary key
+
+        Args:
+            member_names (List[str]): Other members in the cluster
+
+        Returns:
+            List[Dict]: Matching members with enriched data
+        """
+        if not member_names:
+            return []
+
+        try:
+            return frappe.db.sql(
+                """
+                SELECT
+                    m.name,
+                    m.full_name,
+                    m.email,
+                    m.status,
+                    m.member_since,
+                    m.birth_date,
+                    COALESCE(m.relationship_guess, 'Unknown') as relationship,
+                    CASE
+                        WHEN TIMESTAMPDIFF(YEAR, m.birth_date, CURDATE()) < 18 THEN 'Minor'
+                        WHEN TIMESTAMPDIFF(YEAR, m.birth_date, CURDATE()) >= 65 THEN 'Senior'
+                        ELSE 'Adult'
+                    END as age_group,
+                    m.contact_number,
+                    m.application_date,
+                    DATEDIFF(CURDATE(), m.member_since) as days_member
+                FROM `tabMember` m
+                WHERE m.name IN %(member_names)s
+                    AND m.status IN ('Active', 'Pending', 'Suspended')
+                ORDER BY m.member_since ASC, m.full_name ASC
+                LIMIT 20
+            """,
+                {"member_names": member_names},
+                as_dict=True,
+            )
+
+        except Exception as e:
+            frappe.log_error(f"Error in cluster lookup: {e}")
+            return []
+
     @staticmethod
     def _fingerprint_lookup(fingerprint: str, exclude_member: str) -> List[Dict]:
         """
@@ -285,7 +332,7 @@ class OptimizedAddressMatcher:
         Track address matching performance metrics for monitoring and optimization (lightweight version)
 
         Args:
-            tier (str): Lookup tier used (fingerprint, normalized, join, error)
+            tier (str): Lookup tier used (cluster, fingerprint, normalized, join, error)
             duration_seconds (float): Time taken for the lookup
             result_count (int): Number of results returned
             success (bool): Whether the lookup succeeded
@@ -437,7 +484,7 @@ def create_address_matching_metrics_doctype():
                     "fieldname": "tier",
                     "label": "Lookup Tier",
                     "fieldtype": "Select",
-                    "options": "fingerprint\nnormalized\njoin\nerror",
+                    "options": "cluster\nfingerprint\nnormalized\njoin\nerror",
                     "reqd": 1,
                 },
                 {
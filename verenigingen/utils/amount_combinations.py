@@ -0,0 +1,283 @@
+"""
+Amount Combination Matching
+
+Finds which items (Direct Debit Batches, batch items, ...) add up to an amount
+received from the bank, for split deposits and partial pain.002 returns.
+
+Recursive backtracking over item subsets is exponential and cannot resolve a
+200 item batch. This engine works in integer cents instead:
+
+- items with the same amount are interchangeable for the sum, so they are
+  grouped and only the number taken from each group is searched; all amounts
+  are divided by their greatest common divisor, which shrinks the state
+  space for dues that are multiples of whole euros
+- combinations of up to four items are found by meet-in-the-middle: sums of
+  one or two amounts are hashed and matched against the tolerance band,
+  which answers the common cases (a few batches, a few returned items) in
+  milliseconds
+- larger combinations come from a dynamic programming pass that records, for
+  every reachable sum, the fewest items that make it (pseudo-polynomial in
+  the target amount), followed by a best-first search backwards from every
+  sum inside the tolerance band that uses those minimum counts as an exact
+  lower bound, so combinations come out fewest items first
+
+The search stops after max_results combinations or when the time budget is
+spent, returning what was found so far.
+"""
+
+import heapq
+import itertools
+import time
+from collections import Counter
+from math import gcd
+from typing import Iterable, Iterator, List, Sequence, Tuple
+
+from frappe.utils import flt
+
+DEFAULT_TOLERANCE = 0.02
+DEFAULT_MAX_RESULTS = 10
+# Seconds the solver may spend before returning the combinations found
+DEFAULT_TIME_BUDGET = 0.5
+# Largest combination found by meet-in-the-middle before falling back to the DP
+MITM_MAX_ITEMS = 4
+# Reachable sums processed between deadline checks in the dynamic programming pass
+DEADLINE_CHECK_INTERVAL = 4096
+
+
+def to_cents(amount) -> int:
+    """Amount in whole cents"""
+    return int(round(flt(amount) * 100))
+
+
+def find_amount_combinations(
+    amounts: Sequence,
+    target,
+    tolerance=DEFAULT_TOLERANCE,
+    max_results: int = DEFAULT_MAX_RESULTS,
+    time_budget: float = DEFAULT_TIME_BUDGET,
+) -> List[Tuple[int, ...]]:
+    """
+    Find combinations of amounts whose sum matches the target within tolerance
+
+    Args:
+        amounts: Item amounts (in currency units, e.g. euros)
+        target: Amount to match
+        tolerance: Maximum difference between the sum and the target
+        max_results: Maximum number of combinations to return
+        time_budget: Seconds to spend before returning what was found
+
+    Returns:
+        Tuples of item indexes, fewest items first and then closest to the
+        target. Items with equal amounts are interchangeable, so each distinct
+        combination of amounts is returned once, using the earliest items.
+    """
+    deadline = time.monotonic() + time_budget
+    cents = [to_cents(amount) for amount in amounts]
+    lower = max(to_cents(target) - to_cents(tolerance), 1)
+    upper = to_cents(target) + to_cents(tolerance)
+    if upper < lower or max_results <= 0:
+        return []
+
+    # Group interchangeable items; amounts that cannot contribute are skipped
+    groups = {}
+    for index, amount in enumerate(cents):
+        if 0 < amount <= upper:
+            groups.setdefault(amount, []).append(index)
+    if not groups:
+        return []
+
+    amounts_by_group = list(groups)
+    indexes_by_group = list(groups.values())
+
+    divisor = 0
+    for amount in amounts_by_group:
+        divisor = gcd(divisor, amount)
+    units = [amount // divisor for amount in amounts_by_group]
+    target_units = range(-(-lower // divisor), upper // divisor + 1)
+    if not target_units:
+        return []
+
+    counts = [len(indexes) for indexes in indexes_by_group]
+    exact = to_cents(target) / divisor
+
+    def expand(multiplicities):
+        indexes = (indexes_by_group[group][:count] for group, count in multiplicities)
+        return tuple(sorted(itertools.chain.from_iterable(indexes)))
+
+    small = _small_combinations(units, counts, target_units, exact, max_results, deadline)
+    results = [expand(multiplicities) for multiplicities in small]
+    if len(results) >= max_results or time.monotonic() > deadline:
+        return results[:max_results]
+
+    layers = _min_count_layers(units, counts, target_units.stop - 1, deadline)
+    if layers is None:
+        return results
+
+    for multiplicities in _enumerate_combinations(layers, units, counts, target_units, exact, deadline):
+        if sum(count for _, count in multiplicities) <= MITM_MAX_ITEMS:
+            continue  # Already found by meet-in-the-middle
+        results.append(expand(multiplicities))
+        if len(results) >= max_results:
+            break
+    return results
+
+
+def expand_equal_amounts(
+    amounts: Sequence, combinations: Iterable[Tuple[int, ...]]
+) -> Iterator[Tuple[int, ...]]:
+    """
+    Yield every set of items that has the same amounts as one of combinations
+
+    find_amount_combinations returns each combination of amounts once, using
+    the earliest items. When the caller needs to know which items are
+    involved, the items with equal amounts are swapped for each other: two of
+    three 25.00 items make 50.00 in three ways.
+    """
+    indexes_by_amount = {}
+    for index, amount in enumerate(amounts):
+        indexes_by_amount.setdefault(to_cents(amount), []).append(index)
+
+    for combination in combinations:
+        taken = Counter(to_cents(amounts[index]) for index in combination)
+        choices = [
+            itertools.combinations(indexes_by_amount[amount], count) for amount, count in taken.items()
+        ]
+        for picks in itertools.product(*choices):
+            yield tuple(sorted(itertools.chain.from_iterable(picks)))
+
+
+def _small_combinations(
+    units: List[int],
+    counts: List[int],
+    target_units: range,
+    exact: float,
+    max_results: int,
+    deadline: float,
+):
+    """
+    Combinations of up to MITM_MAX_ITEMS items as ((group, count), ...)
+
+    A combination is a sorted tuple of groups (a group repeated when several
+    of its items are used), split into a left and right half of at most two
+    groups; the right half is looked up by the sum the band still needs.
+    Returned by size, then by distance to the target. The table of group
+    pairs is quadratic in the number of distinct amounts, so it is only
+    built for combinations of three or more items and, like the matching,
+    stops at the deadline with the combinations found so far.
+    """
+    halves = {1: {}, 2: {}}  # half length -> sum -> sorted tuples of groups
+    for group, unit in enumerate(units):
+        halves[1].setdefault(unit, []).append((group,))
+
+    results = []
+    for size in range(1, MITM_MAX_ITEMS + 1):
+        left_size = size // 2
+        right_size = size - left_size
+        if size == 3 and not _pair_halves(units, counts, halves[2], deadline):
+            return results
+
+        found = []
+        left_halves = [((), 0)]
+        if left_size:
+            left_halves = (
+                (half, total) for total, group_halves in halves[left_size].items() for half in group_halves
+            )
+        for left, left_total in left_halves:
+            if time.monotonic() > deadline:
+                found.sort()
+                return results + [multiplicities for _, multiplicities in found]
+            for total in target_units:
+                for right in halves[right_size].get(total - left_total, ()):
+                    if left and left[-1] > right[0]:
+                        continue
+                    groups = left + right
+                    multiplicities = tuple((group, groups.count(group)) for group in sorted(set(groups)))
+                    if all(count <= counts[group] for group, count in multiplicities):
+                        found.append((abs(total - exact), multiplicities))
+
+        found.sort()
+        results.extend(multiplicities for _, multiplicities in found)
+        if len(results) >= max_results:
+            break
+    return results
+
+
+def _pair_halves(units: List[int], counts: List[int], pairs: dict, deadline: float) -> bool:
+    """
+    Fill pairs with sum -> sorted (group, group) tuples
+
+    Returns False when the time budget runs out before the table is complete.
+    """
+    for first, unit in enumerate(units):
+        if time.monotonic() > deadline:
+            return False
+        for second in range(first, len(units)):
+            if second == first and counts[first] < 2:
+                continue
+            pairs.setdefault(unit + units[second], []).append((first, second))
+    return True
+
+
+def _min_count_layers(units: List[int], counts: List[int], limit: int, deadline: float):
+    """
+    layers[g][s] = fewest items from the first g groups that sum to s
+
+    Returns None when the time budget runs out.
+    """
+    layers = [{0: 0}]
+    for unit, count in zip(units, counts):
+        previous = layers[-1]
+        layer = dict(previous)
+        for position, (reached, items) in enumerate(previous.items()):
+            if not position % DEADLINE_CHECK_INTERVAL and time.monotonic() > deadline:
+                return None
+            total = reached
+            for taken in range(1, count + 1):
+                total += unit
+                if total > limit:
+                    break
+                best = layer.get(total)
+                if best is None or items + taken < best:
+                    layer[total] = items + taken
+        layers.append(layer)
+    return layers
+
+
+def _enumerate_combinations(
+    layers, units: List[int], counts: List[int], target_units: Iterable[int], exact: float, deadline: float
+):
+    """
+    Yield combinations as ((group, count), ...) in order of item count
+
+    Best-first search from the target sums back to zero; the priority is
+    items taken so far plus the fewest items that can make the remainder,
+    which is exact, so combinations are produced in non-decreasing size.
+    """
+    final = layers[-1]
+    heap = []
+    sequence = itertools.count()
+    for total in target_units:
+        if total in final:
+            deviation = abs(total - exact)
+            heapq.heappush(heap, (final[total], deviation, next(sequence), 0, len(units), total, ()))
+
+    while heap:
+        if time.monotonic() > deadline:
+            return
+        _, deviation, _, used, group, remaining, taken = heapq.heappop(heap)
+        if group == 0:
+            yield taken
+            continue
+
+        unit = units[group - 1]
+        previous = layers[group - 1]
+        for count in range(counts[group - 1] + 1):
+            rest = remaining - count * unit
+            if rest < 0:
+                break
+            if rest in previous:
+                choice = taken + ((group - 1, count),) if count else taken
+                priority = used + count + previous[rest]
+                heapq.heappush(
+                    heap, (priority, deviation, next(sequence), used + count, group - 1, rest, choice)
+                )
@@ -83,6 +83,9 @@ class CacheInvalidationManager:
 
             frappe.logger().debug(f"Cache invalidation triggered for {doctype}: {doc_name} ({method})")
 
+            # Cached API responses tagged with this document or its doctype
+            cls._invalidate_api_response_cache(doc, method)
+
             # Get invalidation strategy for this DocType
             if doctype not in cls.CACHE_DEPENDENCIES:
                 return  # No cache invalidation needed for this DocType
@@ -105,6 +108,17 @@ class CacheInvalidationManager:
         except Exception as e:
             frappe.log_error(f"Cache invalidation failed for {doc.doctype}:{doc.name}: {str(e)}")
 
+    @classmethod
+    def _invalidate_api_response_cache(cls, doc, method: str = None):
+        """Drop security-aware API cache entries that depend on this document"""
+        try:
+            from verenigingen.utils.performance.cache_invalidation_strategy import handle_document_change
+
+            handle_document_change(doc, method)
+
+        except Exception as e:
+            frappe.log_error(f"Failed to invalidate API response cache for {doc.name}: {str(e)}")
+
     @classmethod
     def _invalidate_direct_caches(cls, doc, cache_types: List[str]):
         """Invalidate caches directly related to this document"""
@@ -0,0 +1,316 @@
+"""
+Dashboard Execution Engine
+
+Dashboards in this app are a list of independent query functions that used to
+run one after another, so a page took the sum of all widget times. The engine
+declares each widget with the widgets it depends on and runs every widget whose
+dependencies are resolved concurrently on a shared thread pool:
+
+- each task initializes the site in its thread and opens its own database
+  connection, running as the requesting user
+- every widget has a timeout; a widget that is slow or fails is served from
+  its last good value (kept in Redis per dashboard variant) or its default
+- a widget that finishes after its timeout still stores its value, so the
+  next load is fresh again; a timed-out widget that has not started yet is
+  cancelled, and while one is still running the same widget of the same
+  dashboard variant is served from its fallback instead of being submitted
+  again, so slow widgets cannot pile up and occupy the whole pool
+- dashboards evaluated inside a widget run serially in that worker thread;
+  waiting on the shared pool from one of its own threads would deadlock once
+  the pool is saturated
+
+Dashboard latency becomes roughly the slowest widget instead of the sum. In
+tests, or outside a site context, widgets run serially in the calling thread
+so they see the same transaction.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+import frappe
+
+DEFAULT_WIDGET_TIMEOUT = 10.0
+DASHBOARD_MAX_WORKERS = 8
+LAST_GOOD_TTL = 24 * 3600
+LAST_GOOD_KEY_PREFIX = "dashboard_last_good"
+
+_executor = None
+_executor_lock = threading.Lock()
+# Submitted widget runs by (last good cache name, widget name), until they finish
+_in_flight: Dict[Tuple[str, str], Future] = {}
+_in_flight_lock = threading.Lock()
+# Set in the executor's threads while they evaluate a widget
+_worker = threading.local()
+
+
+@dataclass(frozen=True)
+class Widget:
+    """
+    One dashboard widget
+
+    Args:
+        name: Key of the widget in the dashboard result
+        compute: Function returning the widget value; widgets listed in
+            depends_on are passed to it as keyword arguments
+        depends_on: Names of widgets whose values this widget needs
+        timeout: Seconds to wait before serving the last good value
+        default: Value served when the widget fails and has no last good value
+    """
+
+    name: str
+    compute: Callable[..., Any]
+    depends_on: Tuple[str, ...] = ()
+    timeout: Optional[float] = None
+    default: Any = None
+
+
+@dataclass
+class WidgetResult:
+    """Outcome of one widget in a dashboard run"""
+
+    value: Any
+    status: str  # "ok", "error" or "timeout"
+    duration_ms: float
+    stale: bool = False  # value served from the last good cache or default
+    error: Optional[str] = None
+
+
+@dataclass
+class _SiteContext:
+    site: str
+    sites_path: str
+    user: str
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DASHBOARD_MAX_WORKERS, thread_name_prefix="dashboard")
+        return _executor
+
+
+def _forget_in_flight(key: Tuple[str, str], future: Future):
+    with _in_flight_lock:
+        if _in_flight.get(key) is future:
+            del _in_flight[key]
+
+
+class DashboardEngine:
+    """Runs a set of widgets concurrently, respecting their dependencies"""
+
+    def __init__(
+        self,
+        name: str,
+        widgets: Iterable[Widget],
+        variant: Any = None,
+        timeout: float = DEFAULT_WIDGET_TIMEOUT,
+        per_user: bool = True,
+        keep_last_good: bool = True,
+        parallel: Optional[bool] = None,
+    ):
+        """
+        Initialize dashboard engine
+
+        Args:
+            name: Dashboard identifier, used for the last good cache
+            widgets: Widget declarations
+            variant: Parameters the widget values depend on (year, filters, ...)
+            timeout: Default per-widget timeout in seconds
+            per_user: Keep last good values per user (widgets honour permissions)
+            keep_last_good: Store successful values and serve them on timeout/failure
+            parallel: Force parallel or serial execution (default: parallel
+                unless running tests or outside a site context); dashboards
+                evaluated inside a widget always run serially
+        """
+        self.name = name
+        self.widgets = {widget.name: widget for widget in widgets}
+        self.timeout = timeout
+        self.keep_last_good = keep_last_good
+        self.parallel = parallel
+        self.cache_name = self._cache_name(variant, per_user)
+        self._validate_dependencies()
+
+    def run(self) -> Dict[str, WidgetResult]:
+        """Evaluate all widgets and return their results by name"""
+        results: Dict[str, WidgetResult] = {}
+        pending = dict(self.widgets)
+        parallel = self._use_parallel()
+        context = self._capture_context() if parallel else None
+
+        while pending:
+            ready = [
+                widget
+                for widget in pending.values()
+                if all(dependency in results for dependency in widget.depends_on)
+            ]
+
+            if parallel:
+                results.update(self._run_parallel(ready, results, context))
+            else:
+                for widget in ready:
+                    results[widget.name] = self._run_serial(widget, results)
+
+            for widget in ready:
+                del pending[widget.name]
+
+        return results
+
+    def values(self) -> Dict[str, Any]:
+        """Evaluate all widgets and return just their values"""
+        return {name: result.value for name, result in self.run().items()}
+
+    def _run_serial(self, widget: Widget, results: Dict[str, WidgetResult]) -> WidgetResult:
+        start = time.monotonic()
+        try:
+            value = widget.compute(**self._dependency_values(widget, results))
+        except Exception as e:
+            return self._fallback(widget, "error", start, str(e))
+
+        self._store_last_good(widget.name, value)
+        return WidgetResult(value, "ok", self._elapsed_ms(start))
+
+    def _run_parallel(self, ready, results, context: _SiteContext) -> Dict[str, WidgetResult]:
+        executor = _get_executor()
+        submitted = {}
+        wave = {}
+        for widget in ready:
+            kwargs = self._dependency_values(widget, results)
+            key = (self.cache_name, widget.name)
+            start = time.monotonic()
+            with _in_flight_lock:
+                previous = _in_flight.get(key)
+                if previous is None or previous.done():
+                    future = _in_flight[key] = executor.submit(self._run_in_site, context, widget, kwargs)
+                else:
+                    future = None
+            if future is None:
+                wave[widget.name] = self._fallback(widget, "timeout", start, "Previous run still in progress")
+                continue
+            future.add_done_callback(partial(_forget_in_flight, key))
+            submitted[widget.name] = (widget, future, start)
+
+        for name, (widget, future, start) in submitted.items():
+            timeout = widget.timeout or self.timeout
+            remaining = max(0.0, start + timeout - time.monotonic())
+            try:
+                value = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                # Still queued behind other widgets: drop it. Once running it cannot be
+                # stopped, but stays in _in_flight so reloads do not start it again.
+                future.cancel()
+                wave[name] = self._fallback(widget, "timeout", start, f"Timed out after {timeout}s")
+                continue
+            except Exception as e:
+                wave[name] = self._fallback(widget, "error", start, str(e))
+                continue
+
+            wave[name] = WidgetResult(value, "ok", self._elapsed_ms(start))
+        return wave
+
+    def _run_in_site(self, context: _SiteContext, widget: Widget, kwargs: Dict[str, Any]):
+        """Worker thread: own site context and database connection"""
+        frappe.init(site=context.site, sites_path=context.sites_path)
+        _worker.active = True
+        try:
+            frappe.connect()
+            frappe.set_user(context.user)
+
+            value = widget.compute(**kwargs)
+            # Stored here so a value that arrives after the timeout is kept too
+            self._store_last_good(widget.name, value)
+            return value
+        finally:
+            _worker.active = False
+            frappe.destroy()
+
+    def _fallback(self, widget: Widget, status: str, start: float, error: str) -> WidgetResult:
+        label = f"{self.name}.{widget.name}"
+        if status == "error":
+            frappe.log_error(f"Dashboard widget {label} failed: {error}", "Dashboard Widget")
+        else:
+            frappe.logger("dashboard").warning(f"Dashboard widget {label}: {error}")
+
+        value = self._load_last_good(widget.name)
+        if value is None:
+            value = widget.default
+        return WidgetResult(value, status, self._elapsed_ms(start), stale=True, error=error)
+
+    def _store_last_good(self, widget_name: str, value: Any):
+        if not self.keep_last_good:
+            return
+        try:
+            cache = frappe.cache()
+            cache.hset(self.cache_name, widget_name, value)
+            cache.expire(cache.make_key(self.cache_name), LAST_GOOD_TTL)
+        except Exception:
+            pass  # Never fail a dashboard because the cache is unavailable
+
+    def _load_last_good(self, widget_name: str) -> Any:
+        if not self.keep_last_good:
+            return None
+        try:
+            return frappe.cache().hget(self.cache_name, widget_name)
+        except Exception:
+            return None
+
+    def _use_parallel(self) -> bool:
+        if getattr(_worker, "active", False):
+            return False  # Nested in a widget: never wait on the pool from its own thread
+        if self.parallel is not None:
+            return self.parallel
+        if frappe.flags.in_test or not getattr(frappe.local, "site", None):
+            return False
+        return len(self.widgets) > 1
+
+    def _capture_context(self) -> _SiteContext:
+        return _SiteContext(
+            site=frappe.local.site,
+            sites_path=getattr(frappe.local, "sites_path", "."),
+            user=frappe.session.user,
+        )
+
+    def _cache_name(self, variant: Any, per_user: bool) -> str:
+        parts = [LAST_GOOD_KEY_PREFIX, self.name]
+        if per_user:
+            parts.append(frappe.session.user)
+        if variant is not None:
+            variant_str = json.dumps(variant, sort_keys=True, default=str)
+            parts.append(hashlib.md5(variant_str.encode(), usedforsecurity=False).hexdigest()[:12])
+        return ":".join(parts)
+
+    def _validate_dependencies(self):
+        for widget in self.widgets.values():
+            unknown = set(widget.depends_on) - set(self.widgets)
+            if unknown:
+                raise ValueError(f"Widget {widget.name} depends on unknown widgets: {', '.join(unknown)}")
+
+        # Detect cycles by resolving the graph once
+        resolved = set()
+        pending = set(self.widgets)
+        while pending:
+            ready = {name for name in pending if set(self.widgets[name].depends_on) <= resolved}
+            if not ready:
+                raise ValueError(f"Circular widget dependencies: {', '.join(sorted(pending))}")
+            resolved |= ready
+            pending -= ready
+
+    @staticmethod
+    def _dependency_values(widget: Widget, results: Dict[str, WidgetResult]) -> Dict[str, Any]:
+        return {dependency: results[dependency].value for dependency in widget.depends_on}
+
+    @staticmethod
+    def _elapsed_ms(start: float) -> float:
+        return round((time.monotonic() - start) * 1000, 2)
+
+
+def run_dashboard(name: str, widgets: Iterable[Widget], **kwargs) -> Dict[str, Any]:
+    """Evaluate a dashboard and return widget values by name"""
+    return DashboardEngine(name, widgets, **kwargs).values()
@@ -0,0 +1,134 @@
+"""
+Derived Tables
+
+A derived table is a doctype whose rows are computed from other tables and
+named by the key they summarize, such as the Member Address Cluster per
+address fingerprint. Writers refresh the rows of the keys they touched and a
+scheduled task rebuilds every row.
+
+Rows are upserted (INSERT ... ON DUPLICATE KEY UPDATE) rather than deleted
+and inserted again, so two workers refreshing the same key, or a refresh
+during a rebuild, overwrite each other's row instead of failing on the
+primary key. A rebuild upserts every row and then deletes the rows it did
+not write, so readers never see an empty table.
+"""
+
+from typing import Callable, Dict, Iterable, List, Sequence
+
+import frappe
+from frappe.utils import now
+
+STANDARD_FIELDS = ("name", "creation", "modified", "owner", "modified_by")
+# Keys recomputed per query when refreshing
+REFRESH_CHUNK = 500
+# Rows per INSERT statement
+WRITE_CHUNK = 1000
+
+# (name, *values of the derived fields)
+Row = Sequence
+
+
+class DerivedTable:
+    """
+    Rows of a doctype computed from other tables, one per key
+
+    Args:
+        doctype: Doctype holding the rows; the row name is the key
+        fields: Derived fields, in the order of the values in a row
+        title: Title of the Error Log entries of failed refreshes and rebuilds
+    """
+
+    def __init__(self, doctype: str, fields: Sequence[str], title: str):
+        self.doctype = doctype
+        self.fields = tuple(fields)
+        self.title = title
+
+    def refresh(self, keys: Iterable[str], compute: Callable[[List[str]], List[Row]]) -> int:
+        """
+        Recompute the rows of the given keys
+
+        Args:
+            keys: Keys to refresh; empty keys are skipped
+            compute: Rows for a list of keys; keys without a row are deleted
+
+        Returns:
+            int: Number of rows written
+        """
+        keys = sorted({key for key in keys if key})
+        written = 0
+
+        for i in range(0, len(keys), REFRESH_CHUNK):
+            chunk = keys[i : i + REFRESH_CHUNK]
+            rows = compute(chunk)
+            written += self.write(rows)
+
+            stale = set(chunk).difference(row[0] for row in rows)
+            if stale:
+                frappe.db.delete(self.doctype, {"name": ("in", sorted(stale))})
+
+        return written
+
+    def refresh_logged(self, keys: Iterable[str], compute: Callable[[List[str]], List[Row]], context: str):
+        """
+        Refresh from a document hook; a failure is logged instead of failing the save
+
+        The next rebuild repairs rows a failed refresh left behind.
+        """
+        try:
+            self.refresh(keys, compute)
+        except Exception as e:
+            frappe.log_error(f"Error refreshing {self.doctype} for {context}: {str(e)}", self.title)
+
+    def rebuild(self, compute_all: Callable[[], List[Row]]) -> Dict:
+        """
+        Recompute every row and drop rows whose key no longer exists
+
+        Returns:
+            Dict with status, row_count and completion_time, or the error
+        """
+        try:
+            started = now()
+            row_count = self.write(compute_all(), started)
+            # Rows refreshed while the rebuild ran have a later modified timestamp
+            frappe.db.sql(f"DELETE FROM `tab{self.doctype}` WHERE modified < %s", started)
+            frappe.db.commit()
+
+            result = {"status": "success", "row_count": row_count, "completion_time": now()}
+            frappe.logger().info(f"{self.doctype} rebuild completed: {result}")
+            return result
+
+        except Exception as e:
+            frappe.db.rollback()
+            frappe.log_error(f"Fatal error in {self.doctype} rebuild: {str(e)}", f"{self.title} Rebuild")
+            return {"status": "error", "error": str(e)}
+
+    def write(self, rows: List[Row], timestamp: str = None) -> int:
+        """Upsert rows of (name, *derived field values)"""
+        if not rows:
+            return 0
+
+        timestamp = timestamp or now()
+        columns = STANDARD_FIELDS + self.fields
+        column_list = ", ".join(f"`{column}`" for column in columns)
+        placeholders = "({})".format(", ".join(["%s"] * len(columns)))
+        updates = ", ".join(
+            f"`{column}` = VALUES(`{column}`)"
+            for column in columns
+            if column not in ("name", "creation", "owner")
+        )
+
+        for i in range(0, len(rows), WRITE_CHUNK):
+            chunk = rows[i : i + WRITE_CHUNK]
+            values = []
+            for row in chunk:
+                values.extend((row[0], timestamp, timestamp, "Administrator", "Administrator", *row[1:]))
+            frappe.db.sql(
+                f"""
+                INSERT INTO `tab{self.doctype}` ({column_list})
+                VALUES {", ".join([placeholders] * len(chunk))}
+                ON DUPLICATE KEY UPDATE {updates}
+            """,
+                values,
+            )
+
+        return len(rows)
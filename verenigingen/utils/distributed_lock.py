@@ -0,0 +1,340 @@
+"""
+Distributed Locks
+Locks shared by every web and background worker, kept in Redis
+
+Features:
+- A lock is a key written with SET NX PX semantics; locks on several
+  resources (e.g. every invoice of a batch) are taken all-or-nothing in one
+  Lua script, so overlapping invoice sets cannot interleave or deadlock
+- Every acquisition gets a fencing token from one INCR counter; tokens only
+  increase, so a holder that stalled past its expiry can be told apart from
+  the current one. Writers call holds_fencing_token right before committing
+  and roll back when a newer holder has taken over
+- Release and renewal only touch keys still holding the owner's value, and a
+  background renewal keeps long operations locked with a short TTL, for at
+  most max_renewal seconds so a lock that is never released still expires
+- Waiting for a held lock subscribes to the lock's release channel instead of
+  polling; each wait is capped by the holder's remaining TTL, so a lock whose
+  holder died is picked up as soon as it expires
+"""
+
+import json
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+import frappe
+
+from verenigingen.utils.error_handling import VerenigingenException
+
+LOCK_KEY_PREFIX = "distributed_lock"
+FENCE_KEY = "distributed_lock_fence"
+RELEASE_CHANNEL_SUFFIX = ":released"
+
+DEFAULT_LOCK_TTL = 60  # seconds; renewed while held
+DEFAULT_WAIT = 30  # seconds to wait for a held lock
+DEFAULT_MAX_RENEWAL = 3600  # seconds a held lock is renewed in the background
+# Longest single wait for a release message before retrying
+MAX_WAIT_SLICE = 1.0
+
+# KEYS[1]: fencing counter, KEYS[2..n]: lock keys
+# ARGV: owner description, ttl (milliseconds)
+# Returns {1, fencing token, 0} or {0, index of the held key, its pttl}
+ACQUIRE_SCRIPT = """
+for i = 2, #KEYS do
+    if redis.call('EXISTS', KEYS[i]) == 1 then
+        return {0, i - 1, redis.call('PTTL', KEYS[i])}
+    end
+end
+local fence = redis.call('INCR', KEYS[1])
+local value = fence .. '|' .. ARGV[1]
+for i = 2, #KEYS do
+    redis.call('SET', KEYS[i], value, 'PX', ARGV[2])
+end
+return {1, fence, 0}
+"""
+
+# KEYS: lock keys; ARGV: value written at acquisition
+RELEASE_SCRIPT = """
+local released = 0
+for i = 1, #KEYS do
+    if redis.call('GET', KEYS[i]) == ARGV[1] then
+        redis.call('DEL', KEYS[i])
+        redis.call('PUBLISH', KEYS[i] .. ':released', '1')
+        released = released + 1
+    end
+end
+return released
+"""
+
+# KEYS: lock keys; ARGV: value written at acquisition, ttl (milliseconds)
+RENEW_SCRIPT = """
+local renewed = 0
+for i = 1, #KEYS do
+    if redis.call('GET', KEYS[i]) == ARGV[1] then
+        redis.call('PEXPIRE', KEYS[i], ARGV[2])
+        renewed = renewed + 1
+    end
+end
+return renewed
+"""
+
+
+class LockNotAcquired(VerenigingenException):
+    """Raised when a lock could not be acquired within the wait time"""
+
+    pass
+
+
+_scripts = None
+_scripts_client = None
+
+
+def _get_scripts():
+    """Lock scripts registered once per Redis client (EVALSHA, reloaded if flushed)"""
+    global _scripts, _scripts_client
+
+    cache = frappe.cache()
+    if _scripts is None or _scripts_client is not cache:
+        _scripts = {
+            "acquire": cache.register_script(ACQUIRE_SCRIPT),
+            "release": cache.register_script(RELEASE_SCRIPT),
+            "renew": cache.register_script(RENEW_SCRIPT),
+        }
+        _scripts_client = cache
+    return _scripts
+
+
+def lock_key(resource: str) -> str:
+    return frappe.cache().make_key(f"{LOCK_KEY_PREFIX}:{resource}")
+
+
+class DistributedLock:
+    """
+    Lock on one or more resources, usable as a context manager
+
+    Example:
+        with DistributedLock([f"invoice:{name}" for name in invoices], ttl=120):
+            ...
+    """
+
+    def __init__(
+        self,
+        resources: Iterable[str],
+        ttl: float = DEFAULT_LOCK_TTL,
+        wait: float = DEFAULT_WAIT,
+        auto_renew: bool = True,
+        metadata: Optional[Dict[str, Any]] = None,
+        max_renewal: float = DEFAULT_MAX_RENEWAL,
+    ):
+        """
+        Initialize distributed lock
+
+        Args:
+            resources: Resource identifiers to lock together (site-scoped)
+            ttl: Seconds before the lock expires if not renewed or released
+            wait: Seconds to wait for held resources (0 to try once)
+            auto_renew: Renew the lock in the background while it is held
+            metadata: Information stored with the lock for status pages
+            max_renewal: Seconds after acquisition that auto_renew stops, so
+                the lock expires ttl seconds later if it is still held
+        """
+        self.resources = tuple(sorted(set(resources)))
+        if not self.resources:
+            raise ValueError("At least one resource is required")
+
+        self.ttl = ttl
+        self.wait = wait
+        self.auto_renew = auto_renew
+        self.metadata = metadata or {}
+        self.max_renewal = max_renewal
+        self.fencing_token: Optional[int] = None
+        self.lock_id = frappe.generate_hash(length=20)
+        self._value: Optional[str] = None
+        self._renewer: Optional["_LockRenewer"] = None
+
+    @property
+    def held(self) -> bool:
+        return self._value is not None
+
+    def acquire(self) -> bool:
+        """Acquire all resources, waiting up to ``wait`` seconds"""
+        cache = frappe.cache()
+        scripts = _get_scripts()
+        keys = [lock_key(resource) for resource in self.resources]
+        owner = json.dumps(
+            {
+                "lock_id": self.lock_id,
+                "owner": frappe.session.user if getattr(frappe, "session", None) else "system",
+                "acquired_at": time.time(),
+                "metadata": self.metadata,
+            },
+            default=str,
+        )
+
+        deadline = time.monotonic() + self.wait
+        pubsub = None
+        try:
+            while True:
+                acquired, fence_or_index, held_pttl = scripts["acquire"](
+                    keys=[cache.make_key(FENCE_KEY), *keys], args=[owner, self._ttl_ms()]
+                )
+                if acquired:
+                    self.fencing_token = int(fence_or_index)
+                    self._value = f"{self.fencing_token}|{owner}"
+                    if self.auto_renew:
+                        self._renewer = _LockRenewer(self, scripts["renew"], keys)
+                        self._renewer.start()
+                    return True
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+
+                if pubsub is None:
+                    # Retry once subscribed, so a release in between is not missed
+                    pubsub = cache.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(*(key + RELEASE_CHANNEL_SUFFIX for key in keys))
+                    continue
+
+                wait = min(remaining, MAX_WAIT_SLICE)
+                if held_pttl and int(held_pttl) > 0:
+                    wait = min(wait, int(held_pttl) / 1000)
+                pubsub.get_message(timeout=wait)
+        finally:
+            if pubsub is not None:
+                pubsub.close()
+
+    def release(self) -> bool:
+        """Release the lock; False if it had already expired or been taken over"""
+        if not self.held:
+            return False
+
+        if self._renewer:
+            self._renewer.stop()
+            self._renewer = None
+
+        value, self._value = self._value, None
+        keys = [lock_key(resource) for resource in self.resources]
+        try:
+            released = _get_scripts()["release"](keys=keys, args=[value])
+        except Exception as e:
+            frappe.logger("distributed_lock").warning(f"Could not release lock {self.lock_id}: {str(e)}")
+            return False
+        return int(released) == len(keys)
+
+    def renew(self, ttl: Optional[float] = None) -> bool:
+        """Extend the lock; False if any resource is no longer held by this lock"""
+        if not self.held:
+            return False
+        if ttl is not None:
+            self.ttl = ttl
+
+        keys = [lock_key(resource) for resource in self.resources]
+        renewed = _get_scripts()["renew"](keys=keys, args=[self._value, self._ttl_ms()])
+        return int(renewed) == len(keys)
+
+    def __enter__(self):
+        try:
+            acquired = self.acquire()
+        except Exception as e:
+            raise LockNotAcquired(f"Lock service unavailable: {str(e)}")
+
+        if not acquired:
+            raise LockNotAcquired(f"Resources are locked by another process: {', '.join(self.resources)}")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+    def _ttl_ms(self) -> int:
+        return int(self.ttl * 1000)
+
+
+class _LockRenewer(threading.Thread):
+    """Renews a held lock every third of its TTL until stopped, lost or max_renewal has passed"""
+
+    def __init__(self, lock: DistributedLock, script, keys):
+        super().__init__(name=f"lock-renewer-{lock.lock_id}", daemon=True)
+        self.lock = lock
+        # Keys and script are resolved in the caller's thread, which has the site context
+        self.script = script
+        self.keys = keys
+        self.value = lock._value
+        self._stopped = threading.Event()
+
+    def run(self):
+        interval = max(self.lock.ttl / 3, 0.1)
+        deadline = time.monotonic() + self.lock.max_renewal
+        while not self._stopped.wait(interval):
+            if time.monotonic() >= deadline:
+                # Never released (e.g. a hung worker); let the lock run out its TTL
+                frappe.logger("distributed_lock").warning(
+                    f"Stopped renewing lock {self.lock.lock_id} after {self.lock.max_renewal} seconds"
+                )
+                return
+            try:
+                renewed = self.script(keys=self.keys, args=[self.value, self.lock._ttl_ms()])
+            except Exception:
+                continue  # Try again next interval; the TTL still covers two more attempts
+            if int(renewed) != len(self.keys):
+                return  # Lost (expired or force released); nothing left to renew
+
+    def stop(self):
+        self._stopped.set()
+
+
+def get_lock_info(resource: str) -> Dict[str, Any]:
+    """Holder of a resource lock, or an empty dict when it is free"""
+    cache = frappe.cache()
+    key = lock_key(resource)
+    pipe = cache.pipeline()
+    pipe.get(key)
+    pipe.pttl(key)
+    value, pttl = pipe.execute()
+    if not value:
+        return {}
+
+    if isinstance(value, bytes):
+        value = value.decode()
+    fence, _, owner = value.partition("|")
+    info = json.loads(owner)
+    info.update({"resource": resource, "fencing_token": int(fence), "expires_in": max(int(pttl), 0) / 1000})
+    return info
+
+
+def holds_fencing_token(resources: Iterable[str], fencing_token: Optional[int]) -> bool:
+    """
+    Whether every resource is still locked under the given fencing token
+
+    Call right before committing a write made under the lock: a holder that
+    stalled past its expiry finds a newer token (or no lock) and must roll
+    back instead of overwriting the current holder's work.
+    """
+    if fencing_token is None:
+        return False
+
+    cache = frappe.cache()
+    pipe = cache.pipeline()
+    for resource in resources:
+        pipe.get(lock_key(resource))
+
+    prefix = f"{fencing_token}|"
+    for value in pipe.execute():
+        if isinstance(value, bytes):
+            value = value.decode()
+        if not value or not value.startswith(prefix):
+            return False
+    return True
+
+
+def force_release(resource: str) -> bool:
+    """Drop a resource lock regardless of its holder and wake up waiters"""
+    cache = frappe.cache()
+    key = lock_key(resource)
+    pipe = cache.pipeline()
+    pipe.delete(key)
+    pipe.publish(key + RELEASE_CHANNEL_SUFFIX, "1")
+    deleted, _ = pipe.execute()
+    return bool(deleted)
@@ -7,6 +7,8 @@ import frappe
 from frappe import _
 from frappe.utils import today
 
+from verenigingen.utils.validation.iban_validator import normalize_iban
+
 
 @frappe.whitelist()
 def create_initial_iban_history(member_name):
@@ -114,7 +116,7 @@ def track_iban_change(member_doc):
         # Get old IBAN from database
         old_iban = frappe.db.get_value("Member", member_doc.name, "iban")
 
-        if old_iban and old_iban != member_doc.iban:
+        if old_iban and normalize_iban(old_iban) != normalize_iban(member_doc.iban):
             # Close the previous IBAN history record
             history_records = frappe.get_all(
                 "Member IBAN History", filters={"parent": member_doc.name, "is_active": 1}, fields=["name"]
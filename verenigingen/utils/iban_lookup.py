@@ -0,0 +1,126 @@
+"""
+IBAN Lookup
+
+Canonical, indexed IBAN matching shared by the importers and the MT940 flow.
+
+Member, SEPA Mandate and Bank Account carry a normalized copy of their IBAN
+(no spaces or hyphens, upper case) that is maintained on save and indexed, so
+lookups compare against a plain column instead of running
+UPPER(REPLACE(iban, ' ', '')) over every row of the table.
+"""
+
+from typing import Dict, Iterable, Optional
+
+import frappe
+
+from verenigingen.utils.validation.iban_validator import normalize_iban
+
+# Column holding the normalized IBAN per DocType, and the fields it is derived from
+NORMALIZED_IBAN_FIELDS = {
+    "Member": ("normalized_iban", ("iban",)),
+    "SEPA Mandate": ("normalized_iban", ("iban",)),
+    "Bank Account": ("custom_normalized_iban", ("iban", "bank_account_no")),
+}
+
+LOOKUP_CHUNK_SIZE = 1000
+
+
+def set_normalized_iban(doc, method=None):
+    """Doc event (validate) - keep the indexed normalized IBAN column in sync"""
+    config = NORMALIZED_IBAN_FIELDS.get(doc.doctype)
+    if not config:
+        return
+
+    target_field, source_fields = config
+    value = None
+    for source_field in source_fields:
+        value = normalize_iban(doc.get(source_field))
+        if value:
+            break
+
+    if doc.get(target_field) != value:
+        doc.set(target_field, value)
+
+
+def _normalized_set(ibans: Iterable[str]) -> set:
+    return {normalized for normalized in (normalize_iban(iban) for iban in ibans or ()) if normalized}
+
+
+def _chunks(values: set):
+    ordered = sorted(values)
+    for start in range(0, len(ordered), LOOKUP_CHUNK_SIZE):
+        yield tuple(ordered[start : start + LOOKUP_CHUNK_SIZE])
+
+
+def lookup_members_by_iban(ibans: Iterable[str], include_member_iban: bool = True) -> Dict[str, dict]:
+    """
+    Resolve many IBANs to members in one indexed query per chunk
+
+    An Active SEPA Mandate wins over the IBAN stored on the Member itself;
+    among several mandates the most recently modified one is used.
+
+    Args:
+        ibans: IBANs in any formatting
+        include_member_iban: Also match Member.iban when no mandate matches
+
+    Returns:
+        Dict keyed by normalized IBAN with member, mandate (or None) and source
+        ("SEPA Mandate" or "Member"). IBANs without a match are left out.
+    """
+    wanted = _normalized_set(ibans)
+    results: Dict[str, dict] = {}
+    if not wanted:
+        return results
+
+    member_query = (
+        """
+            UNION ALL
+            SELECT normalized_iban, name AS member, NULL AS mandate, 'Member' AS source,
+                1 AS priority, modified
+            FROM `tabMember`
+            WHERE normalized_iban IN %(ibans)s
+        """
+        if include_member_iban
+        else ""
+    )
+
+    for chunk in _chunks(wanted):
+        rows = frappe.db.sql(
+            f"""
+            SELECT normalized_iban, member, mandate, source FROM (
+                SELECT normalized_iban, member, name AS mandate, 'SEPA Mandate' AS source,
+                    0 AS priority, modified
+                FROM `tabSEPA Mandate`
+                WHERE normalized_iban IN %(ibans)s AND status = %(status)s
+                {member_query}
+            ) matches
+            ORDER BY priority, modified DESC
+        """,
+            {"ibans": chunk, "status": "Active"},
+            as_dict=True,
+        )
+
+        for row in rows:
+            if row.member and row.normalized_iban not in results:
+                results[row.normalized_iban] = {
+                    "member": row.member,
+                    "mandate": row.mandate,
+                    "source": row.source,
+                }
+
+    return results
+
+
+def lookup_active_mandates_by_iban(ibans: Iterable[str]) -> Dict[str, dict]:
+    """Resolve many IBANs to their Active SEPA Mandate (and its member) only"""
+    return lookup_members_by_iban(ibans, include_member_iban=False)
+
+
+def find_member_by_iban(iban: str, include_member_iban: bool = True) -> Optional[str]:
+    """Single-IBAN convenience wrapper around lookup_members_by_iban"""
+    normalized = normalize_iban(iban)
+    if not normalized:
+        return None
+
+    match = lookup_members_by_iban([normalized], include_member_iban).get(normalized)
+    return match["member"] if match else None
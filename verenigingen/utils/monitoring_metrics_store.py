@@ -0,0 +1,298 @@
+"""
+Precomputed Monitoring Metrics Store
+
+The monitoring dashboard used to compute every widget (member counts, error
+summaries, AnalyticsEngine forecasts, compliance and security health, ...)
+inline on each page load, which put the most load on the database exactly
+when people were watching it during an incident. Widgets now register with
+this store and are computed on a schedule instead:
+
+- materialize_dashboard_metrics runs every five minutes, computes the widgets
+  concurrently through the dashboard engine and appends the results to
+  Monitoring Metric Snapshot (a compact time series)
+- the latest value per widget is mirrored in one Redis hash, so the page and
+  its endpoints read all widgets in a single round trip
+- if Redis was flushed the latest snapshot row is used and the hash re-primed;
+  a widget is only computed inline when it has never been materialized
+"""
+
+import functools
+import json
+from typing import Any, Callable, Dict, Optional
+
+import frappe
+from frappe.utils import add_to_date, get_datetime, now, now_datetime
+
+from verenigingen.utils.dashboard_engine import DashboardEngine, Widget
+
+METRICS_CACHE_KEY = "monitoring_dashboard:widgets"
+SNAPSHOT_DOCTYPE = "Monitoring Metric Snapshot"
+SNAPSHOT_RETENTION_DAYS = 7
+# Seconds a widget may take before the run records it as failed
+WIDGET_TIMEOUT = 60.0
+
+# Modules whose widgets are registered on import
+WIDGET_MODULES = ("verenigingen.www.monitoring_dashboard",)
+
+SNAPSHOT_FIELDS = [
+    "name",
+    "creation",
+    "modified",
+    "owner",
+    "modified_by",
+    "widget",
+    "captured_at",
+    "status",
+    "duration_ms",
+    "payload",
+]
+
+_widgets: Dict[str, Callable[[], Any]] = {}
+
+
+def precomputed_widget(name: str):
+    """
+    Register a dashboard widget and serve it from the metrics store
+
+    The decorated function returns the latest materialized value; the original
+    computation stays available as ``func.compute`` for the scheduler job.
+    Place it below ``@frappe.whitelist()`` so endpoints read stored values too.
+    """
+
+    def decorator(func):
+        _widgets[name] = func
+
+        @functools.wraps(func)
+        def wrapper():
+            return get_widget(name)
+
+        wrapper.compute = func
+        wrapper.widget_name = name
+        return wrapper
+
+    return decorator
+
+
+def get_registered_widgets() -> Dict[str, Callable[[], Any]]:
+    """Widget name -> compute function for every registered widget"""
+    for module in WIDGET_MODULES:
+        frappe.get_module(module)
+    return dict(_widgets)
+
+
+def get_widget(name: str) -> Any:
+    """Latest value of a widget, computing it only if it was never materialized"""
+    entry = _get_cached_entries([name]).get(name)
+    if entry is None:
+        entry = _load_latest_snapshot(name)
+    if entry is None:
+        entry = _materialize_widgets({name: _widgets[name]}).get(name)
+    return entry["value"] if entry else None
+
+
+def get_dashboard_widgets(names) -> Dict[str, Any]:
+    """
+    Latest values for several widgets in one Redis round trip
+
+    Returns the widget values by name plus ``captured_at``, the time of the
+    oldest value returned, so the page can show how fresh the data is.
+    """
+    names = list(names)
+    entries = _get_cached_entries(names)
+
+    for name in names:
+        if name not in entries:
+            entry = _load_latest_snapshot(name)
+            if entry is None:
+                get_registered_widgets()
+                entry = _materialize_widgets({name: _widgets[name]}).get(name)
+            if entry:
+                entries[name] = entry
+
+    result = {name: entries[name]["value"] if name in entries else None for name in names}
+    captured = [entries[name]["captured_at"] for name in names if name in entries]
+    result["captured_at"] = min(captured) if captured else None
+    return result
+
+
+def materialize_dashboard_metrics() -> Dict[str, Any]:
+    """
+    Scheduled job (every 5 minutes) - compute all dashboard widgets
+
+    Returns:
+        Dict with the number of widgets computed and the names that failed
+    """
+    entries = _materialize_widgets(get_registered_widgets())
+    failed = [name for name, entry in entries.items() if entry["status"] == "Error"]
+    if failed:
+        frappe.logger("monitoring_metrics").warning(f"Dashboard widgets failed: {', '.join(failed)}")
+    return {"computed": len(entries), "failed": failed}
+
+
+def cleanup_old_metric_snapshots(days: int = SNAPSHOT_RETENTION_DAYS) -> int:
+    """Scheduled job (daily) - drop snapshots past the retention window"""
+    cutoff = add_to_date(now_datetime(), days=-days)
+    count = frappe.db.count(SNAPSHOT_DOCTYPE, {"captured_at": ("<", cutoff)})
+    if count:
+        frappe.db.delete(SNAPSHOT_DOCTYPE, {"captured_at": ("<", cutoff)})
+        frappe.db.commit()
+    return count
+
+
+@frappe.whitelist()
+def get_widget_history(widget: str, hours: int = 24):
+    """Time series of a widget's values for trend charts"""
+    frappe.only_for(["System Manager", "Verenigingen Administrator"])
+
+    rows = frappe.get_all(
+        SNAPSHOT_DOCTYPE,
+        filters={"widget": widget, "captured_at": (">=", add_to_date(now_datetime(), hours=-int(hours)))},
+        fields=["captured_at", "status", "duration_ms", "payload"],
+        order_by="captured_at asc",
+    )
+    return [
+        {
+            "captured_at": row.captured_at,
+            "status": row.status,
+            "duration_ms": row.duration_ms,
+            "value": json.loads(row.payload) if row.payload else None,
+        }
+        for row in rows
+    ]
+
+
+@frappe.whitelist()
+def get_materialization_status():
+    """Age, status and compute time of the latest value of each widget"""
+    frappe.only_for(["System Manager", "Verenigingen Administrator"])
+
+    names = list(get_registered_widgets())
+    entries = _get_cached_entries(names)
+    current = now_datetime()
+    status = {}
+    for name in names:
+        entry = entries.get(name) or _load_latest_snapshot(name)
+        if entry is None:
+            status[name] = {"status": "Missing"}
+            continue
+        status[name] = {
+            "status": entry["status"],
+            "captured_at": entry["captured_at"],
+            "age_seconds": int((current - get_datetime(entry["captured_at"])).total_seconds()),
+            "duration_ms": entry["duration_ms"],
+        }
+    return status
+
+
+def _materialize_widgets(widgets: Dict[str, Callable[[], Any]]) -> Dict[str, Dict[str, Any]]:
+    captured_at = now()
+    entries = {}
+    failed = set()
+
+    # Widgets are independent; compute them concurrently, each with a timeout
+    engine = DashboardEngine(
+        "monitoring_metrics",
+        [Widget(name, compute) for name, compute in widgets.items()],
+        timeout=WIDGET_TIMEOUT,
+        per_user=False,
+        keep_last_good=False,
+    )
+
+    for name, result in engine.run().items():
+        if result.status == "ok":
+            value = json.loads(json.dumps(result.value, default=str))
+            status = "Error" if isinstance(value, dict) and value.get("error") else "OK"
+        else:
+            value = {"error": result.error}
+            status = "Error"
+            failed.add(name)
+
+        entries[name] = {
+            "value": value,
+            "status": status,
+            "captured_at": captured_at,
+            "duration_ms": result.duration_ms,
+        }
+
+    if not entries:
+        return entries
+
+    _store_snapshots(entries)
+
+    # Keep serving the last good value when a widget raised or timed out
+    _set_cached_entries({name: entry for name, entry in entries.items() if name not in failed})
+    return entries
+
+
+def _store_snapshots(entries: Dict[str, Dict[str, Any]]):
+    values = []
+    for name, entry in entries.items():
+        values.append(
+            (
+                frappe.generate_hash(length=10),
+                entry["captured_at"],
+                entry["captured_at"],
+                "Administrator",
+                "Administrator",
+                name,
+                entry["captured_at"],
+                entry["status"],
+                entry["duration_ms"],
+                json.dumps(entry["value"]),
+            )
+        )
+
+    try:
+        frappe.db.bulk_insert(SNAPSHOT_DOCTYPE, fields=SNAPSHOT_FIELDS, values=values)
+        frappe.db.commit()
+    except Exception as e:
+        frappe.log_error(f"Could not store dashboard metric snapshots: {str(e)}", "Monitoring Metrics Error")
+
+
+def _load_latest_snapshot(name: str) -> Optional[Dict[str, Any]]:
+    try:
+        rows = frappe.get_all(
+            SNAPSHOT_DOCTYPE,
+            filters={"widget": name},
+            fields=["captured_at", "status", "duration_ms", "payload"],
+            order_by="captured_at desc",
+            limit=1,
+        )
+    except Exception:
+        return None
+    if not rows:
+        return None
+
+    row = rows[0]
+    entry = {
+        "value": json.loads(row.payload) if row.payload else None,
+        "status": row.status,
+        "captured_at": str(row.captured_at),
+        "duration_ms": row.duration_ms,
+    }
+    _set_cached_entries({name: entry})
+    return entry
+
+
+def _get_cached_entries(names) -> Dict[str, Dict[str, Any]]:
+    try:
+        cache = frappe.cache()
+        raw = cache.hmget(cache.make_key(METRICS_CACHE_KEY), list(names))
+    except Exception:
+        return {}
+    return {name: json.loads(value) for name, value in zip(names, raw) if value}
+
+
+def _set_cached_entries(entries: Dict[str, Dict[str, Any]]):
+    if not entries:
+        return
+    try:
+        cache = frappe.cache()
+        pipe = cache.pipeline()
+        pipe.hset(
+            cache.make_key(METRICS_CACHE_KEY),
+            mapping={name: json.dumps(entry) for name, entry in entries.items()},
+        )
+        pipe.execute()
+    except Exception as e:
+        frappe.logger("monitoring_metrics").warning(f"Could not cache dashboard widgets: {str(e)}")
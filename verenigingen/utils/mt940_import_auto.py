@@ -5,6 +5,8 @@ import traceback
 
 import frappe
 
+from verenigingen.utils.validation.iban_validator import normalize_iban
+
 
 @frappe.whitelist()
 def import_mt940_file_auto(file_content, company=None):
@@ -174,31 +176,12 @@ def find_bank_account_by_iban(iban, company=None):
         if bank_account:
             return bank_account
 
-        # Try without spaces in both fields (in case stored differently)
-        clean_iban_no_spaces = clean_iban.replace(" ", "")
-
-        # Custom SQL query to handle different formatting
-        sql_query = """
-            SELECT name FROM `tabBank Account`
-            WHERE disabled = 0
-            AND is_company_account = 1
-            AND (
-                REPLACE(UPPER(iban), ' ', '') = %(iban)s
-                OR REPLACE(UPPER(bank_account_no), ' ', '') = %(iban)s
-            )
-        """
-
-        params = {"iban": clean_iban_no_spaces}
-
-        if company:
-            sql_query += " AND company = %(company)s"
-            params["company"] = company
-
-        sql_query += " LIMIT 1"
-
-        result = frappe.db.sql(sql_query, params)
-        if result:
-            return result[0][0]
+        # Try the indexed normalized column (covers differently formatted iban/bank_account_no)
+        filters.pop("bank_account_no")
+        filters["custom_normalized_iban"] = normalize_iban(clean_iban)
+        bank_account = frappe.db.get_value("Bank Account", filters)
+        if bank_account:
+            return bank_account
 
     except Exception as e:
         frappe.logger().error(f"Error finding bank account by IBAN {iban}: {str(e)}")
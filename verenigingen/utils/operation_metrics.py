@@ -0,0 +1,377 @@
+"""
+Operation Metrics
+
+Counters and fixed-bucket latency histograms per operation, aggregated
+across all web and background workers in Redis:
+
+- recording only updates an in-process histogram (microseconds); pending
+  histograms are flushed at most once per FLUSH_INTERVAL, and at the end of
+  every request and background job, in a single Lua script call
+- histograms have fixed bucket bounds, so histograms from different workers
+  and hours merge by adding counts; each operation has one hash per hour
+  (kept for SLOT_RETENTION_DAYS) and one with running totals
+- percentiles are interpolated within the bucket that holds the rank, so they
+  reflect every worker at bucket resolution rather than sorting raw samples
+- counts over a sliding window (e.g. the last hour for alerts) add the
+  hourly slots it covers and the share of the oldest slot inside it
+- the running totals can be exported in the Prometheus text format
+"""
+
+import json
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional
+
+import frappe
+
+# Upper bounds of the latency buckets in milliseconds; a final bucket catches the rest
+DURATION_BUCKETS_MS = (
+    1,
+    2.5,
+    5,
+    10,
+    25,
+    50,
+    100,
+    250,
+    500,
+    1000,
+    2500,
+    5000,
+    10000,
+    30000,
+    60000,
+    120000,
+    300000,
+)
+
+SLOT_SECONDS = 3600
+SLOT_RETENTION_DAYS = 8
+# Seconds between flushes of a worker's pending histograms
+FLUSH_INTERVAL = 1.0
+
+# KEYS[1]: set of operation names, KEYS[2..n]: histogram hashes
+# ARGV[1]: JSON list, one entry per hash: operation, ttl, incr, float_incr, max, min
+FLUSH_SCRIPT = """
+local updates = cjson.decode(ARGV[1])
+for i, update in ipairs(updates) do
+    local key = KEYS[i + 1]
+    for field, value in pairs(update.incr) do
+        redis.call('HINCRBY', key, field, value)
+    end
+    for field, value in pairs(update.float_incr) do
+        redis.call('HINCRBYFLOAT', key, field, value)
+    end
+    for field, value in pairs(update.max) do
+        local current = redis.call('HGET', key, field)
+        if not current or tonumber(current) < value then
+            redis.call('HSET', key, field, value)
+        end
+    end
+    for field, value in pairs(update.min) do
+        local current = redis.call('HGET', key, field)
+        if not current or tonumber(current) > value then
+            redis.call('HSET', key, field, value)
+        end
+    end
+    if update.ttl > 0 then
+        redis.call('EXPIRE', key, update.ttl)
+    end
+    redis.call('SADD', KEYS[1], update.operation)
+end
+return #updates
+"""
+
+
+class Histogram:
+    """Mergeable latency histogram with success, failure and record counters"""
+
+    def __init__(self):
+        self.buckets = [0] * (len(DURATION_BUCKETS_MS) + 1)
+        self.success = 0
+        self.failure = 0
+        self.records = 0
+        self.sum_ms = 0.0
+        self.min_ms: Optional[float] = None
+        self.max_ms: Optional[float] = None
+        self.last_at: Optional[float] = None
+
+    @property
+    def count(self) -> int:
+        return self.success + self.failure
+
+    def observe(self, duration_ms: float, success: bool = True, records: int = 0, at: float = None):
+        self.buckets[bisect_left(DURATION_BUCKETS_MS, duration_ms)] += 1
+
+        if success:
+            self.success += 1
+        else:
+            self.failure += 1
+        self.records += records
+        self.sum_ms += duration_ms
+        self.min_ms = duration_ms if self.min_ms is None else min(self.min_ms, duration_ms)
+        self.max_ms = duration_ms if self.max_ms is None else max(self.max_ms, duration_ms)
+        self.last_at = at or time.time()
+
+    def merge(self, other: "Histogram") -> "Histogram":
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+        self.success += other.success
+        self.failure += other.failure
+        self.records += other.records
+        self.sum_ms += other.sum_ms
+        for field, pick in (("min_ms", min), ("max_ms", max), ("last_at", max)):
+            values = [v for v in (getattr(self, field), getattr(other, field)) if v is not None]
+            setattr(self, field, pick(values) if values else None)
+        return self
+
+    def percentile(self, percentile: float) -> float:
+        """Percentile (0-100) interpolated within its bucket and clamped to the observed range"""
+        if not self.count:
+            return 0.0
+
+        rank = percentile / 100 * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = DURATION_BUCKETS_MS[index - 1] if index else 0.0
+                upper = DURATION_BUCKETS_MS[index] if index < len(DURATION_BUCKETS_MS) else self.max_ms
+                value = lower + (upper - lower) * max(rank - seen, 0) / bucket_count
+                return min(max(value, self.min_ms), self.max_ms)
+            seen += bucket_count
+        return self.max_ms
+
+    def to_update(self) -> Dict[str, Any]:
+        """Fields for the flush script"""
+        incr = {f"b{index}": count for index, count in enumerate(self.buckets) if count}
+        incr.update(success=self.success, failure=self.failure, records=self.records)
+        return {
+            "incr": incr,
+            "float_incr": {"sum_ms": self.sum_ms},
+            "max": {"max_ms": self.max_ms, "last_at": self.last_at},
+            "min": {"min_ms": self.min_ms},
+        }
+
+    @classmethod
+    def from_hash(cls, fields: Dict) -> "Histogram":
+        fields = {_text(key): _text(value) for key, value in (fields or {}).items()}
+        histogram = cls()
+        histogram.buckets = [int(fields.get(f"b{index}", 0)) for index in range(len(histogram.buckets))]
+        histogram.success = int(fields.get("success", 0))
+        histogram.failure = int(fields.get("failure", 0))
+        histogram.records = int(fields.get("records", 0))
+        histogram.sum_ms = float(fields.get("sum_ms", 0))
+        for field in ("min_ms", "max_ms", "last_at"):
+            if fields.get(field) is not None:
+                setattr(histogram, field, float(fields[field]))
+        return histogram
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "success": self.success,
+            "failure": self.failure,
+            "records": self.records,
+            "avg_ms": self.sum_ms / self.count if self.count else 0.0,
+            "min_ms": self.min_ms or 0.0,
+            "max_ms": self.max_ms or 0.0,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "sum_ms": self.sum_ms,
+            "last_at": self.last_at,
+        }
+
+
+class OperationMetrics:
+    """
+    Cluster-wide metrics for one family of operations (e.g. "sepa_operations")
+
+    Example:
+        metrics = OperationMetrics("sepa_operations")
+        metrics.record("batch_creation", 1834.2, success=True, records=120)
+        metrics.summary(hours=24)["batch_creation"]["p95_ms"]
+    """
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        self._pending: Dict[str, Dict[tuple, Histogram]] = {}  # site -> (operation, slot) -> histogram
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._script = None
+        self._script_client = None
+        _instances.append(self)
+
+    def record(self, operation: str, duration_ms: float, success: bool = True, records: int = 0):
+        """Record one operation; flushes to Redis when FLUSH_INTERVAL has passed"""
+        now = time.time()
+        key = (operation, int(now // SLOT_SECONDS))
+        with self._lock:
+            pending = self._pending.setdefault(_site(), {})
+            histogram = pending.get(key)
+            if histogram is None:
+                histogram = pending[key] = Histogram()
+            histogram.observe(duration_ms, success, records, now)
+
+        if time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self) -> int:
+        """Write this worker's pending histograms for the current site to Redis"""
+        self._last_flush = time.monotonic()
+        with self._lock:
+            pending = self._pending.pop(_site(), None)
+        if not pending:
+            return 0
+
+        keys, updates = [], []
+        totals: Dict[str, Histogram] = {}
+        for (operation, slot), histogram in pending.items():
+            keys.append(self._key(operation, slot))
+            updates.append(dict(histogram.to_update(), operation=operation, ttl=SLOT_RETENTION_DAYS * 86400))
+            totals.setdefault(operation, Histogram()).merge(histogram)
+        for operation, histogram in totals.items():
+            keys.append(self._key(operation, "total"))
+            updates.append(dict(histogram.to_update(), operation=operation, ttl=0))
+
+        try:
+            self._get_script()(keys=[self._key("operations"), *keys], args=[json.dumps(updates)])
+        except Exception as e:
+            # Metrics are best effort; never fail the operation being measured
+            frappe.logger("operation_metrics").warning(f"Could not flush {self.namespace} metrics: {e}")
+            return 0
+        return len(pending)
+
+    def operations(self) -> List[str]:
+        # The cache wrapper's smembers makes the site key itself
+        return sorted(_text(name) for name in frappe.cache().smembers(f"{self.namespace}:operations") or ())
+
+    def histograms(self, hours: int = 24, operations: Iterable[str] = None) -> Dict[str, Histogram]:
+        """Merged histogram per operation over the last ``hours`` hourly slots, all workers"""
+        current = int(time.time() // SLOT_SECONDS)
+        slots = range(current - max(int(hours), 1) + 1, current + 1)
+
+        merged = {}
+        for operation, histograms in self._slot_histograms(slots, operations).items():
+            histogram = Histogram()
+            for slot_histogram in histograms:
+                histogram.merge(slot_histogram)
+            if histogram.count:
+                merged[operation] = histogram
+        return merged
+
+    def window_counts(self, seconds: int = SLOT_SECONDS, operations: Iterable[str] = None) -> Dict[str, Dict]:
+        """
+        Estimated count, success and failure per operation over the last ``seconds``
+
+        A sliding window over hourly slots: the slots it covers count in full,
+        the oldest slot it reaches into by the share of that hour inside the
+        window, assuming operations were spread evenly over the hour. Unlike
+        histograms(hours=1), the estimate does not drop to zero when a new
+        clock hour starts.
+        """
+        now = time.time()
+        start = now - seconds
+        first = int(start // SLOT_SECONDS)
+        slots = range(first, int(now // SLOT_SECONDS) + 1)
+        weights = [((first + 1) * SLOT_SECONDS - start) / SLOT_SECONDS] + [1.0] * (len(slots) - 1)
+
+        counts = {}
+        for operation, histograms in self._slot_histograms(slots, operations).items():
+            success = sum(weight * h.success for weight, h in zip(weights, histograms))
+            failure = sum(weight * h.failure for weight, h in zip(weights, histograms))
+            if success or failure:
+                counts[operation] = {"count": success + failure, "success": success, "failure": failure}
+        return counts
+
+    def summary(self, hours: int = 24, operations: Iterable[str] = None) -> Dict[str, Dict[str, Any]]:
+        return {name: h.summary() for name, h in self.histograms(hours, operations).items()}
+
+    def totals(self) -> Dict[str, Histogram]:
+        """Running totals per operation since metrics were first recorded"""
+        self.flush()
+        operations = self.operations()
+        pipe = frappe.cache().pipeline()
+        for operation in operations:
+            pipe.hgetall(self._key(operation, "total"))
+        return {
+            operation: Histogram.from_hash(fields) for operation, fields in zip(operations, pipe.execute())
+        }
+
+    def prometheus(self, metric_prefix: str = None) -> str:
+        """Running totals in the Prometheus text exposition format"""
+        prefix = metric_prefix or self.namespace
+        lines = [
+            f"# HELP {prefix}_duration_seconds Operation duration",
+            f"# TYPE {prefix}_duration_seconds histogram",
+        ]
+        totals = self.totals()
+        for operation, histogram in totals.items():
+            label = f'operation="{_escape_label(operation)}"'
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS_MS + ("+Inf",), histogram.buckets):
+                cumulative += count
+                le = bound if bound == "+Inf" else f"{bound / 1000:g}"
+                lines.append(f'{prefix}_duration_seconds_bucket{{{label},le="{le}"}} {cumulative}')
+            lines.append(f"{prefix}_duration_seconds_sum{{{label}}} {histogram.sum_ms / 1000:.6f}")
+            lines.append(f"{prefix}_duration_seconds_count{{{label}}} {histogram.count}")
+
+        lines += [f"# HELP {prefix}_total Operations by outcome", f"# TYPE {prefix}_total counter"]
+        for operation, histogram in totals.items():
+            label = f'operation="{_escape_label(operation)}"'
+            lines.append(f'{prefix}_total{{{label},outcome="success"}} {histogram.success}')
+            lines.append(f'{prefix}_total{{{label},outcome="failure"}} {histogram.failure}')
+
+        lines += [
+            f"# HELP {prefix}_records_total Records processed",
+            f"# TYPE {prefix}_records_total counter",
+        ]
+        for operation, histogram in totals.items():
+            label = f'operation="{_escape_label(operation)}"'
+            lines.append(f"{prefix}_records_total{{{label}}} {histogram.records}")
+
+        return "\n".join(lines) + "\n"
+
+    def _slot_histograms(self, slots: range, operations: Iterable[str] = None) -> Dict[str, List[Histogram]]:
+        """Histogram of every slot per operation, after flushing this worker's pending ones"""
+        self.flush()
+        operations = list(operations) if operations is not None else self.operations()
+
+        pipe = frappe.cache().pipeline()
+        for operation in operations:
+            for slot in slots:
+                pipe.hgetall(self._key(operation, slot))
+        results = iter(pipe.execute())
+
+        return {operation: [Histogram.from_hash(next(results)) for _ in slots] for operation in operations}
+
+    def _key(self, *parts) -> str:
+        return frappe.cache().make_key(":".join(str(part) for part in (self.namespace, *parts)))
+
+    def _get_script(self):
+        cache = frappe.cache()
+        if self._script is None or self._script_client is not cache:
+            self._script = cache.register_script(FLUSH_SCRIPT)
+            self._script_client = cache
+        return self._script
+
+
+_instances: List[OperationMetrics] = []
+
+
+def flush_operation_metrics(*args, **kwargs):
+    """after_request / after_job hook - flush every metrics family's pending histograms"""
+    for metrics in _instances:
+        metrics.flush()
+
+
+def _site() -> str:
+    return getattr(frappe.local, "site", None) or ""
+
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -1,4 +1,5 @@
 import json
+from collections import defaultdict
 from datetime import timedelta
 
 import frappe
@@ -76,6 +77,176 @@ class PaymentRetryManager:
             "message": _("Payment retry scheduled for {0}").format(next_retry_date),
         }
 
+    def schedule_retries(self, failures):
+        """
+        Schedule retries for many failed payments at once
+
+        Used by return file processing: existing retry records are read with
+        one query, missing ones are bulk inserted, and records are updated
+        with one statement per retry count and failure reason. Retries are
+        picked up by the daily execute_payment_retry run instead of a
+        scheduled job per record; notifications are sent by a background job.
+
+        Args:
+            failures: Dicts with invoice, member, membership, amount,
+                reason_code and reason_message
+
+        Returns:
+            dict: Names of the scheduled and escalated retry records
+        """
+        failures = {failure["invoice"]: failure for failure in failures if failure.get("invoice")}
+        if not failures:
+            return {"scheduled": [], "escalated": []}
+
+        records = {
+            record.invoice: record
+            for record in frappe.get_all(
+                "SEPA Payment Retry",
+                filters={"invoice": ("in", list(failures))},
+                fields=["name", "invoice", "retry_count"],
+            )
+        }
+        records.update(
+            (record.invoice, record)
+            for record in self._insert_retry_records(
+                [failure for invoice, failure in failures.items() if invoice not in records]
+            )
+        )
+
+        groups = defaultdict(list)
+        escalated = []
+        for invoice, record in records.items():
+            retry_count = record.retry_count or 0
+            if retry_count >= self.retry_config["max_retries"]:
+                escalated.append(record.name)
+                continue
+            failure = failures[invoice]
+            reason = (failure.get("reason_code") or "Unknown", failure.get("reason_message"))
+            groups[(retry_count, *reason)].append(record.name)
+
+        timestamp = now_datetime()
+        log_rows = []
+        for (retry_count, reason_code, reason_message), names in groups.items():
+            next_retry_date = self.calculate_next_retry_date(frappe._dict(retry_count=retry_count))
+            frappe.db.sql(
+                """
+                UPDATE `tabSEPA Payment Retry`
+                SET retry_count = %(retry_count)s, next_retry_date = %(next_retry_date)s,
+                    last_failure_reason = %(reason_code)s, last_failure_message = %(reason_message)s,
+                    status = 'Scheduled', modified = %(modified)s
+                WHERE name IN %(names)s
+            """,
+                {
+                    "retry_count": retry_count + 1,
+                    "next_retry_date": next_retry_date,
+                    "reason_code": reason_code,
+                    "reason_message": reason_message or "Payment failed",
+                    "modified": timestamp,
+                    "names": tuple(names),
+                },
+            )
+            log_rows.extend(
+                (
+                    frappe.generate_hash(length=10),
+                    timestamp,
+                    timestamp,
+                    frappe.session.user,
+                    frappe.session.user,
+                    name,
+                    "SEPA Payment Retry",
+                    "retry_log",
+                    retry_count + 1,
+                    timestamp,
+                    reason_code,
+                    reason_message,
+                    next_retry_date,
+                )
+                for name in names
+            )
+
+        if log_rows:
+            frappe.db.bulk_insert(
+                "SEPA Payment Retry Log",
+                fields=[
+                    "name",
+                    "creation",
+                    "modified",
+                    "owner",
+                    "modified_by",
+                    "parent",
+                    "parenttype",
+                    "parentfield",
+                    "idx",
+                    "attempt_date",
+                    "reason_code",
+                    "reason_message",
+                    "scheduled_retry",
+                ],
+                values=log_rows,
+            )
+
+        # Escalations are rare and notify administrators individually
+        for name in escalated:
+            try:
+                self.escalate_payment_failure(frappe.get_doc("SEPA Payment Retry", name))
+            except Exception as e:
+                frappe.log_error(f"Error escalating payment retry {name}: {str(e)}", "Payment Retry Error")
+
+        scheduled = [name for names in groups.values() for name in names]
+        if scheduled:
+            frappe.enqueue(
+                "verenigingen.utils.payment_retry.send_retry_notifications",
+                queue="long",
+                retry_records=scheduled,
+                enqueue_after_commit=True,
+            )
+
+        return {"scheduled": scheduled, "escalated": escalated}
+
+    def _insert_retry_records(self, failures):
+        """Bulk insert pending retry records for failed invoices without one"""
+        if not failures:
+            return []
+
+        timestamp = now_datetime()
+        records = [
+            frappe._dict(name=frappe.generate_hash(length=10), invoice=failure["invoice"], retry_count=0)
+            for failure in failures
+        ]
+        frappe.db.bulk_insert(
+            "SEPA Payment Retry",
+            fields=[
+                "name",
+                "creation",
+                "modified",
+                "owner",
+                "modified_by",
+                "invoice",
+                "membership",
+                "member",
+                "original_amount",
+                "retry_count",
+                "status",
+            ],
+            values=[
+                (
+                    record.name,
+                    timestamp,
+                    timestamp,
+                    frappe.session.user,
+                    frappe.session.user,
+                    failure["invoice"],
+                    failure.get("membership"),
+                    failure.get("member"),
+                    failure.get("amount") or 0,
+                    0,
+                    "Pending",
+                )
+                for record, failure in zip(records, failures)
+            ],
+        )
+        return records
+
     def get_or_create_retry_record(self, invoice_name):
         """Get existing retry record or create new one"""
         existing = frappe.db.exists("SEPA Payment Retry", {"invoice": invoice_name})
@@ -228,10 +399,26 @@ class PaymentRetryManager:
             )
 
 
+def send_retry_notifications(retry_records):
+    """Background job: notify members of retries scheduled from a return file"""
+    from verenigingen.verenigingen_payments.utils.sepa_notifications import SEPAMandateNotificationManager
+
+    notification_manager = SEPAMandateNotificationManager()
+    for name in retry_records:
+        try:
+            notification_manager.send_payment_retry_notification(frappe.get_doc("SEPA Payment Retry", name))
+        except Exception as e:
+            frappe.log_error(f"Error sending retry notification for {name}: {str(e)}", "Payment Retry Error")
+
+
 @frappe.whitelist()
 def execute_payment_retry(retry_record=None):
-    """Execute a scheduled payment retry"""
+    """Execute a scheduled payment retry, or all retries due today when called by the scheduler"""
     if not retry_record:
+        for name in frappe.get_all(
+            "SEPA Payment Retry", filters={"status": "Scheduled", "next_retry_date": today()}, pluck="name"
+        ):
+            execute_payment_retry(name)
         return
 
     retry_doc = frappe.get_doc("SEPA Payment Retry", retry_record)
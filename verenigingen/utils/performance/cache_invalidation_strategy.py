@@ -4,6 +4,10 @@ Cache Invalidation Strategy Implementation
 
 Implements intelligent cache invalidation strategies for Phase 5A performance
 optimization with event-driven invalidation and dependency tracking.
+
+Invalidation goes through the security-aware cache's tag index: a change
+deletes the responses tagged with the document, its doctype and dependent
+doctypes, and the result reports how many cache keys were actually removed.
 """
 
 import json
@@ -14,7 +18,12 @@ from typing import Any, Dict, List, Optional, Set
 import frappe
 from frappe.utils import now, now_datetime
 
-from verenigingen.utils.performance.security_aware_cache import get_security_aware_cache
+from verenigingen.utils.performance.security_aware_cache import (
+    doctype_tag,
+    document_tag,
+    get_security_aware_cache,
+    user_tag,
+)
 from verenigingen.utils.security.api_security_framework import OperationType
 
 
@@ -26,39 +35,33 @@ class CacheInvalidationManager:
     - Document change event integration
     - Dependency-based invalidation
     - Time-based invalidation policies
-    - Selective invalidation patterns
+    - Tag-based selective invalidation
     - Performance impact monitoring
     """
 
-    # Invalidation patterns for different document types
+    # Invalidation configuration for different document types
     INVALIDATION_PATTERNS = {
         "Member": {
-            "patterns": ["sec_api_resp:*:member_data:*", "sec_api_resp:*:reporting:*"],
             "dependent_doctypes": ["Membership", "SEPA Mandate", "Volunteer"],
             "cache_levels": ["medium_security", "standard_security"],
         },
         "Payment Entry": {
-            "patterns": ["sec_api_resp:*:financial:*", "sec_api_resp:*:reporting:*"],
             "dependent_doctypes": ["Sales Invoice", "Member"],
             "cache_levels": ["high_security", "medium_security"],
         },
         "Sales Invoice": {
-            "patterns": ["sec_api_resp:*:financial:*", "sec_api_resp:*:reporting:*"],
             "dependent_doctypes": ["Payment Entry", "Member"],
             "cache_levels": ["high_security", "medium_security"],
         },
         "SEPA Mandate": {
-            "patterns": ["sec_api_resp:*:financial:*", "sec_api_resp:*:member_data:*"],
             "dependent_doctypes": ["Member", "Payment Entry"],
             "cache_levels": ["high_security"],
         },
         "Volunteer": {
-            "patterns": ["sec_api_resp:*:member_data:*", "sec_api_resp:*:reporting:*"],
             "dependent_doctypes": ["Member", "Volunteer Expense"],
             "cache_levels": ["medium_security"],
         },
         "Chapter": {
-            "patterns": ["sec_api_resp:*:admin:*", "sec_api_resp:*:reporting:*"],
             "dependent_doctypes": ["Member", "Chapter Member"],
             "cache_levels": ["high_security", "standard_security"],
         },
@@ -136,12 +139,13 @@ class CacheInvalidationManager:
                 "change_type": change_type,
                 "changed_fields": changed_fields or [],
                 "user": user or frappe.session.user,
-                "patterns_invalidated": [],
+                "tags_invalidated": [],
+                "keys_invalidated": 0,
                 "users_affected": [],
                 "performance_impact": {},
             }
 
-            # Get invalidation patterns for this doctype
+            # Get invalidation configuration for this doctype
             doctype_config = self.INVALIDATION_PATTERNS.get(doctype)
             if not doctype_config:
                 # No specific invalidation needed for this doctype
@@ -167,10 +171,8 @@ class CacheInvalidationManager:
             execution_time = time.time() - start_time
             invalidation_result["performance_impact"] = {
                 "execution_time": execution_time,
-                "patterns_processed": len(invalidation_result["patterns_invalidated"]),
-                "estimated_cache_keys_affected": self._estimate_affected_keys(
-                    invalidation_result["patterns_invalidated"]
-                ),
+                "tags_processed": len(invalidation_result["tags_invalidated"]),
+                "cache_keys_removed": invalidation_result["keys_invalidated"],
             }
 
             # Update statistics
@@ -179,7 +181,7 @@ class CacheInvalidationManager:
             # Log invalidation for debugging
             frappe.logger().info(
                 f"Cache invalidation for {doctype}/{doc_name}: "
-                f"{len(invalidation_result['patterns_invalidated'])} patterns, "
+                f"{invalidation_result['keys_invalidated']} keys, "
                 f"{execution_time:.3f}s"
             )
 
@@ -369,12 +371,8 @@ class CacheInvalidationManager:
     ):
         """Execute immediate cache invalidation"""
         try:
-            patterns = doctype_config.get("patterns", [])
-
-            for pattern in patterns:
-                # Use cache manager's invalidation method
-                self.cache_manager.invalidate_data_cache(doctype, doc_name)
-                result["patterns_invalidated"].append(pattern)
+            result["keys_invalidated"] += self.cache_manager.invalidate_data_cache(doctype, doc_name)
+            result["tags_invalidated"].extend([doctype_tag(doctype), document_tag(doctype, doc_name)])
 
         except Exception as e:
             frappe.log_error(f"Error in immediate invalidation: {e}")
@@ -388,8 +386,8 @@ class CacheInvalidationManager:
 
             for dependent_doctype in dependent_doctypes:
                 # Invalidate caches for dependent document types
-                self.cache_manager.invalidate_data_cache(dependent_doctype)
-                result["patterns_invalidated"].append(f"propagated:{dependent_doctype}")
+                result["keys_invalidated"] += self.cache_manager.invalidate_data_cache(dependent_doctype)
+                result["tags_invalidated"].append(doctype_tag(dependent_doctype))
 
         except Exception as e:
             frappe.log_error(f"Error in propagated invalidation: {e}")
@@ -401,9 +399,9 @@ class CacheInvalidationManager:
             affected_operations = self._get_affected_operations(doctype)
 
             # Invalidate user-specific caches
-            self.cache_manager.invalidate_user_cache(user, affected_operations)
+            result["keys_invalidated"] += self.cache_manager.invalidate_user_cache(user, affected_operations)
             result["users_affected"].append(user)
-            result["patterns_invalidated"].append(f"user_specific:{user}")
+            result["tags_invalidated"].append(user_tag(user or frappe.session.user))
 
         except Exception as e:
             frappe.log_error(f"Error in user-specific invalidation: {e}")
@@ -444,11 +442,6 @@ class CacheInvalidationManager:
 
         return doctype_operations.get(doctype, [])
 
-    def _estimate_affected_keys(self, patterns: List[str]) -> int:
-        """Estimate number of cache keys affected by patterns"""
-        # Simplified estimation - in production would query actual cache
-        return len(patterns) * 10  # Assume 10 keys per pattern on average
-
     def _update_invalidation_stats(self, doctype: str, result: Dict):
         """Update invalidation statistics"""
         self.invalidation_stats["total_invalidations"] += 1
@@ -465,7 +458,8 @@ class CacheInvalidationManager:
             {
                 "timestamp": result["invalidation_timestamp"],
                 "execution_time": result["performance_impact"]["execution_time"],
-                "patterns_processed": result["performance_impact"]["patterns_processed"],
+                "tags_processed": result["performance_impact"]["tags_processed"],
+                "keys_removed": result["keys_invalidated"],
             }
         )
 
@@ -479,12 +473,14 @@ class CacheInvalidationManager:
             return {"no_data": True}
 
         all_times = []
-        all_patterns = []
+        all_tags = []
+        all_keys = []
 
         for doctype_data in self.invalidation_stats["performance_impact"].values():
             for entry in doctype_data:
                 all_times.append(entry["execution_time"])
-                all_patterns.append(entry["patterns_processed"])
+                all_tags.append(entry["tags_processed"])
+                all_keys.append(entry["keys_removed"])
 
         if not all_times:
             return {"no_data": True}
@@ -492,7 +488,8 @@ class CacheInvalidationManager:
         return {
             "average_execution_time": sum(all_times) / len(all_times),
             "max_execution_time": max(all_times),
-            "average_patterns_per_invalidation": sum(all_patterns) / len(all_patterns),
+            "average_tags_per_invalidation": sum(all_tags) / len(all_tags),
+            "average_keys_per_invalidation": sum(all_keys) / len(all_keys),
             "total_invalidation_events": len(all_times),
         }
 
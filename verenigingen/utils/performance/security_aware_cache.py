@@ -4,18 +4,55 @@ Security-Aware API Caching System
 
 Implements intelligent caching that respects security contexts, user permissions,
 and data sensitivity levels for Phase 5A performance optimization.
+
+Every cached response is registered in a tag index: one Redis set per tag
+holding the keys cached under it. Responses are tagged with the doctypes (or
+individual documents) they depend on, the user they were computed for and their
+operation type, so a document change deletes exactly the affected keys without
+KEYS/SCAN pattern matching. That makes long TTLs safe for cached_api_call
+endpoints; the TTL only bounds memory for entries nobody invalidates.
 """
 
+import functools
 import hashlib
+import inspect
 import json
+import pickle
 import time
-from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, Iterable, List, Optional
 
 import frappe
-from frappe.utils import now, now_datetime
+from frappe.utils import now_datetime
 
 from verenigingen.utils.security.api_security_framework import OperationType
+from verenigingen.utils.security.security_matrix import get_user_roles
+
+# Tag sets outlive every entry registered in them; entry TTLs are capped to this
+TAG_INDEX_TTL = 7 * 24 * 3600
+TAG_KEY_PREFIX = "sec_cache_tag"
+STATS_KEY = "sec_cache_stats"
+# Keys sampled per operation type when estimating key count, TTL and memory
+STATS_SAMPLE_SIZE = 50
+
+
+def doctype_tag(doctype: str) -> str:
+    """Tag for responses that depend on any document of a doctype"""
+    return f"doctype:{doctype}"
+
+
+def document_tag(doctype: str, name: str) -> str:
+    """Tag for responses that depend on one document"""
+    return f"doc:{doctype}:{name}"
+
+
+def user_tag(user: str) -> str:
+    """Tag for responses cached for a user"""
+    return f"user:{user}"
+
+
+def operation_tag(operation_type: OperationType) -> str:
+    """Tag for responses of an operation type"""
+    return f"op:{operation_type.value}"
 
 
 class SecurityAwareCacheManager:
@@ -26,7 +63,7 @@ class SecurityAwareCacheManager:
     - User-specific cache isolation
     - Permission-based cache validation
     - Security-level appropriate TTL
-    - Automatic cache invalidation on data changes
+    - Tag-based invalidation on data changes
     """
 
     # Cache TTL based on security levels (in seconds)
@@ -47,10 +84,29 @@ class SecurityAwareCacheManager:
         "performance_data": "sec_perf_data",
     }
 
+    # Operation types whose responses depend on each doctype. Responses are
+    # tagged with these doctypes unless the endpoint declares its own.
+    DOCTYPE_OPERATIONS = {
+        "Member": [OperationType.MEMBER_DATA, OperationType.REPORTING],
+        "Payment Entry": [OperationType.FINANCIAL, OperationType.REPORTING],
+        "Sales Invoice": [OperationType.FINANCIAL, OperationType.REPORTING],
+        "SEPA Mandate": [OperationType.FINANCIAL, OperationType.REPORTING],
+        "Volunteer": [OperationType.MEMBER_DATA, OperationType.REPORTING],
+        "Chapter": [OperationType.ADMIN, OperationType.REPORTING],
+    }
+
     def __init__(self):
         self.cache = frappe.cache()
-        self.current_user = frappe.session.user
-        self.user_roles = frappe.get_roles(self.current_user) if self.current_user else []
+
+    @property
+    def current_user(self) -> Optional[str]:
+        # Read per call: the manager is shared by every request in the worker
+        return frappe.session.user if getattr(frappe, "session", None) else None
+
+    @property
+    def user_roles(self) -> List[str]:
+        user = self.current_user
+        return sorted(get_user_roles(user)) if user else []
 
     def generate_secure_cache_key(
         self,
@@ -76,7 +132,7 @@ class SecurityAwareCacheManager:
         if user_context and self.current_user:
             # Include user and role hash for isolation
             user_hash = hashlib.md5(
-                f"{self.current_user}:{':'.join(sorted(self.user_roles))}".encode(), usedforsecurity=False
+                f"{self.current_user}:{':'.join(self.user_roles)}".encode(), usedforsecurity=False
             ).hexdigest()[:8]
             key_components.append(f"user_{user_hash}")
 
@@ -110,35 +166,31 @@ class SecurityAwareCacheManager:
             Cached response if valid, None otherwise
         """
         try:
-            # Generate cache key
-            kwargs = kwargs or {}
-            cache_context = {
-                "function": api_function,
-                "args": str(args),
-                "kwargs": str(sorted(kwargs.items())),
-            }
-
-            cache_key = self.generate_secure_cache_key(
-                api_function, operation_type, user_context=True, additional_context=cache_context
-            )
+            cache_key = self._api_cache_key(api_function, operation_type, args, kwargs)
+            full_key = self.cache.make_key(cache_key)
 
             # Get cached data
-            cached_data = self.cache.get_value(cache_key)
-            if not cached_data:
+            raw = self.cache.get(full_key)
+            if not raw:
+                self._track_cache_access("misses")
                 return None
 
+            cached_data = pickle.loads(raw)
+
             # Validate cache hasn't expired
             if self._is_cache_expired(cached_data, operation_type):
-                self.cache.delete_value(cache_key)
+                self.cache.delete(full_key)
+                self._track_cache_access("misses")
                 return None
 
             # Validate user permissions if requested
             if validate_permissions and not self._validate_cached_permissions(cached_data):
-                self.cache.delete_value(cache_key)
+                self.cache.delete(full_key)
+                self._track_cache_access("misses")
                 return None
 
             # Update access tracking
-            self._track_cache_access(cache_key, "hit")
+            self._track_cache_access("hits")
 
             return cached_data.get("response")
 
@@ -154,6 +206,8 @@ class SecurityAwareCacheManager:
         args: tuple = (),
         kwargs: Dict = None,
         custom_ttl: int = None,
+        depends_on: Iterable[str] = None,
+        documents: Iterable[tuple] = None,
     ) -> bool:
         """
         Cache API response with security context
@@ -165,6 +219,10 @@ class SecurityAwareCacheManager:
             args: Function arguments
             kwargs: Function keyword arguments
             custom_ttl: Custom TTL override
+            depends_on: Doctypes whose changes invalidate the response
+                (defaults to the doctypes affecting the operation type)
+            documents: (doctype, name) pairs the response depends on; changes to
+                other documents of these doctypes leave the response cached
 
         Returns:
             True if cached successfully, False otherwise
@@ -174,27 +232,17 @@ class SecurityAwareCacheManager:
             if isinstance(response, dict) and response.get("error"):
                 return False
 
-            # Generate cache key
-            kwargs = kwargs or {}
-            cache_context = {
-                "function": api_function,
-                "args": str(args),
-                "kwargs": str(sorted(kwargs.items())),
-            }
-
-            cache_key = self.generate_secure_cache_key(
-                api_function, operation_type, user_context=True, additional_context=cache_context
-            )
+            cache_key = self._api_cache_key(api_function, operation_type, args, kwargs)
 
             # Prepare cache data with metadata
-            ttl = custom_ttl or self.CACHE_TTL_BY_SECURITY.get(operation_type, 300)
+            ttl = min(custom_ttl or self.CACHE_TTL_BY_SECURITY.get(operation_type, 300), TAG_INDEX_TTL)
 
             cache_data = {
                 "response": response,
-                "cached_at": now_datetime(),
+                "cached_at": time.time(),
                 "ttl": ttl,
                 "user": self.current_user,
-                "user_roles": self.user_roles.copy(),
+                "user_roles": self.user_roles,
                 "operation_type": operation_type.value,
                 "security_context": {
                     "function": api_function,
@@ -203,11 +251,8 @@ class SecurityAwareCacheManager:
                 },
             }
 
-            # Set cache with TTL
-            self.cache.set_value(cache_key, cache_data, expires_in_sec=ttl)
-
-            # Track cache write
-            self._track_cache_access(cache_key, "write")
+            tags = self._build_tags(operation_type, depends_on, documents)
+            self._store(cache_key, cache_data, ttl, tags)
 
             return True
 
@@ -215,94 +260,114 @@ class SecurityAwareCacheManager:
             frappe.log_error(f"Error caching API response: {e}")
             return False
 
-    def invalidate_user_cache(self, user: str = None, operation_types: List[OperationType] = None):
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """
+        Delete every cached response registered under any of the tags
+
+        Args:
+            tags: Tag names (see doctype_tag, document_tag, user_tag, operation_tag)
+
+        Returns:
+            Number of cache keys deleted
+        """
+        tag_keys = [self._tag_key(tag) for tag in tags]
+        if not tag_keys:
+            return 0
+
+        # Read and drop the tag sets atomically; entries cached after this
+        # point start new sets
+        pipe = self.cache.pipeline()
+        for tag_key in tag_keys:
+            pipe.smembers(tag_key)
+        pipe.delete(*tag_keys)
+        results = pipe.execute()
+
+        keys = set().union(*results[: len(tag_keys)])
+        return self._delete_keys(keys)
+
+    def invalidate_user_cache(self, user: str = None, operation_types: List[OperationType] = None) -> int:
         """
         Invalidate cache for specific user and/or operation types
 
         Args:
             user: User to invalidate cache for (current user if None)
             operation_types: List of operation types to invalidate
+
+        Returns:
+            Number of cache keys deleted
         """
         try:
             target_user = user or self.current_user
             if not target_user:
-                return
-
-            # Get user roles for key generation
-            user_roles = frappe.get_roles(target_user)
-            user_hash = hashlib.md5(
-                f"{target_user}:{':'.join(sorted(user_roles))}".encode(), usedforsecurity=False
-            ).hexdigest()[:8]
+                return 0
 
-            # Build invalidation patterns
-            invalidation_patterns = []
-
-            if operation_types:
-                for op_type in operation_types:
-                    pattern = f"{self.CACHE_PREFIXES['api_response']}:*:{op_type.value}:user_{user_hash}:*"
-                    invalidation_patterns.append(pattern)
+            if not operation_types:
+                removed = self.invalidate_tags([user_tag(target_user)])
             else:
-                # Invalidate all for user
-                pattern = f"{self.CACHE_PREFIXES['api_response']}:*:*:user_{user_hash}:*"
-                invalidation_patterns.append(pattern)
-
-            # Execute invalidation (simplified - in production would use Redis pattern matching)
-            for pattern in invalidation_patterns:
-                self._invalidate_pattern(pattern)
+                # Only the user's entries of these operation types
+                user_key = self._tag_key(user_tag(target_user))
+                pipe = self.cache.pipeline()
+                for op_type in operation_types:
+                    pipe.sinter(user_key, self._tag_key(operation_tag(op_type)))
+                keys = set().union(*pipe.execute())
+                removed = self._delete_keys(keys, untag=user_key)
 
-            frappe.logger().info(
-                f"Cache invalidated for user {target_user}, patterns: {len(invalidation_patterns)}"
-            )
+            frappe.logger().info(f"Cache invalidated for user {target_user}: {removed} keys")
+            return removed
 
         except Exception as e:
             frappe.log_error(f"Error invalidating user cache: {e}")
+            return 0
 
-    def invalidate_data_cache(self, doctype: str, doc_name: str = None):
+    def invalidate_data_cache(self, doctype: str, doc_name: str = None) -> int:
         """
         Invalidate cache when data changes
 
         Args:
             doctype: DocType that changed
             doc_name: Specific document name (optional)
+
+        Returns:
+            Number of cache keys deleted
         """
         try:
-            # Determine which cache keys might be affected by this data change
-            affected_operations = self._get_affected_operations(doctype)
-
-            if not affected_operations:
-                return
+            tags = [doctype_tag(doctype)]
+            if doc_name:
+                tags.append(document_tag(doctype, doc_name))
 
-            # Build invalidation patterns for affected operations
-            for operation_type in affected_operations:
-                pattern = f"{self.CACHE_PREFIXES['api_response']}:*:{operation_type.value}:*"
-                self._invalidate_pattern(pattern)
-
-            frappe.logger().info(
-                f"Cache invalidated for {doctype} changes, operations: {[op.value for op in affected_operations]}"
-            )
+            removed = self.invalidate_tags(tags)
+            if removed:
+                frappe.logger().info(f"Cache invalidated for {doctype} {doc_name or ''}: {removed} keys")
+            return removed
 
         except Exception as e:
             frappe.log_error(f"Error invalidating data cache: {e}")
+            return 0
 
     def get_cache_stats(self) -> Dict:
         """
         Get cache performance statistics
 
+        Key count, TTL and memory are estimated from a sample of each operation
+        type's tag set; hit rate comes from counters updated on every lookup.
+
         Returns:
             Dict with cache statistics
         """
         try:
-            # Get cache usage stats (simplified implementation)
+            counters = self._get_counters()
+            sample = self._sample_cached_keys()
+
             stats = {
                 "timestamp": now_datetime(),
                 "cache_performance": {
-                    "total_keys": self._count_cache_keys(),
-                    "hit_rate": self._calculate_hit_rate(),
-                    "average_ttl": self._calculate_average_ttl(),
-                    "memory_usage": self._estimate_memory_usage(),
+                    "total_keys": sum(entry["live_keys"] for entry in sample.values()),
+                    "hit_rate": self._calculate_hit_rate(counters),
+                    "average_ttl": self._calculate_average_ttl(sample),
+                    "memory_usage": self._estimate_memory_usage(sample),
                 },
-                "security_distribution": self._get_security_distribution(),
-                "recent_activity": self._get_recent_activity(),
+                "security_distribution": self._get_security_distribution(sample),
+                "recent_activity": self._get_recent_activity(counters),
             }
 
             return stats
@@ -311,14 +376,72 @@ class SecurityAwareCacheManager:
             frappe.log_error(f"Error getting cache stats: {e}")
             return {"error": str(e)}
 
+    def _api_cache_key(
+        self, api_function: str, operation_type: OperationType, args: tuple, kwargs: Optional[Dict]
+    ) -> str:
+        kwargs = kwargs or {}
+        cache_context = {
+            "function": api_function,
+            "args": str(args),
+            "kwargs": str(sorted(kwargs.items())),
+        }
+        return self.generate_secure_cache_key(
+            api_function, operation_type, user_context=True, additional_context=cache_context
+        )
+
+    def _build_tags(
+        self,
+        operation_type: OperationType,
+        depends_on: Optional[Iterable[str]],
+        documents: Optional[Iterable[tuple]],
+    ) -> List[str]:
+        if depends_on is None:
+            depends_on = [
+                doctype
+                for doctype, operations in self.DOCTYPE_OPERATIONS.items()
+                if operation_type in operations
+            ]
+
+        documents = [(doctype, name) for doctype, name in documents or [] if name]
+        document_doctypes = {doctype for doctype, _name in documents}
+
+        tags = [operation_tag(operation_type)]
+        if self.current_user:
+            tags.append(user_tag(self.current_user))
+        tags.extend(document_tag(doctype, name) for doctype, name in documents)
+        tags.extend(doctype_tag(doctype) for doctype in depends_on if doctype not in document_doctypes)
+        return tags
+
+    def _store(self, cache_key: str, cache_data: Dict, ttl: int, tags: List[str]):
+        """Write the entry and register it under its tags in one round trip"""
+        full_key = self.cache.make_key(cache_key)
+        pipe = self.cache.pipeline()
+        pipe.set(full_key, pickle.dumps(cache_data), ex=ttl)
+        for tag in tags:
+            tag_key = self._tag_key(tag)
+            pipe.sadd(tag_key, full_key)
+            pipe.expire(tag_key, TAG_INDEX_TTL)
+        pipe.hincrby(self.cache.make_key(STATS_KEY), "writes", 1)
+        pipe.execute()
+
+    def _delete_keys(self, keys, untag: str = None) -> int:
+        if not keys:
+            return 0
+        pipe = self.cache.pipeline()
+        pipe.delete(*keys)
+        if untag:
+            pipe.srem(untag, *keys)
+        pipe.hincrby(self.cache.make_key(STATS_KEY), "invalidations", len(keys))
+        return pipe.execute()[0]
+
+    def _tag_key(self, tag: str) -> str:
+        return self.cache.make_key(f"{TAG_KEY_PREFIX}:{tag}")
+
     def _is_cache_expired(self, cached_data: Dict, operation_type: OperationType) -> bool:
         """Check if cached data has expired"""
         try:
-            cached_at = datetime.fromisoformat(cached_data["cached_at"].replace("Z", "+00:00"))
             ttl = cached_data.get("ttl", self.CACHE_TTL_BY_SECURITY.get(operation_type, 300))
-
-            expiry_time = cached_at + timedelta(seconds=ttl)
-            return datetime.now() > expiry_time
+            return time.time() > cached_data["cached_at"] + ttl
 
         except Exception:
             return True  # Assume expired if we can't parse
@@ -373,70 +496,93 @@ class SecurityAwareCacheManager:
 
     def _get_affected_operations(self, doctype: str) -> List[OperationType]:
         """Get operation types affected by doctype changes"""
-        doctype_operations = {
-            "Member": [OperationType.MEMBER_DATA, OperationType.REPORTING],
-            "Payment Entry": [OperationType.FINANCIAL, OperationType.REPORTING],
-            "Sales Invoice": [OperationType.FINANCIAL, OperationType.REPORTING],
-            "SEPA Mandate": [OperationType.FINANCIAL, OperationType.REPORTING],
-            "Volunteer": [OperationType.MEMBER_DATA, OperationType.REPORTING],
-            "Chapter": [OperationType.ADMIN, OperationType.REPORTING],
-        }
+        return self.DOCTYPE_OPERATIONS.get(doctype, [])
 
-        return doctype_operations.get(doctype, [])
-
-    def _track_cache_access(self, cache_key: str, access_type: str):
-        """Track cache access for statistics"""
+    def _track_cache_access(self, counter: str):
+        """Count hits, misses, writes and invalidations for statistics"""
         try:
-            # Simplified tracking - in production would use more sophisticated tracking
-            tracking_key = f"cache_access_tracking:{int(time.time() // 300)}"  # 5-minute buckets
-
-            current_stats = self.cache.get_value(tracking_key) or {"hits": 0, "writes": 0, "misses": 0}
-
-            if access_type == "hit":
-                current_stats["hits"] += 1
-            elif access_type == "write":
-                current_stats["writes"] += 1
-            elif access_type == "miss":
-                current_stats["misses"] += 1
-
-            self.cache.set_value(tracking_key, current_stats, expires_in_sec=1800)  # 30 minutes
-
+            self.cache.hincrby(self.cache.make_key(STATS_KEY), counter, 1)
         except Exception:
             pass  # Don't fail operations due to tracking issues
 
-    def _invalidate_pattern(self, pattern: str):
-        """Invalidate cache keys matching pattern (simplified implementation)"""
-        # In production, this would use Redis KEYS or SCAN with pattern matching
-        # For now, we'll use a simplified approach
-        pass
+    def _get_counters(self) -> Dict[str, int]:
+        pipe = self.cache.pipeline()
+        pipe.hgetall(self.cache.make_key(STATS_KEY))
+        raw = pipe.execute()[0] or {}
+        counters = {"hits": 0, "misses": 0, "writes": 0, "invalidations": 0}
+        for name, value in raw.items():
+            name = name.decode() if isinstance(name, bytes) else name
+            counters[name] = int(value)
+        return counters
+
+    def _sample_cached_keys(self) -> Dict[str, Dict]:
+        """
+        Sample each operation type's tag set for live keys, remaining TTL and size
 
-    def _count_cache_keys(self) -> int:
-        """Count total cache keys (simplified)"""
-        return 100  # Placeholder
+        Sampled keys that have expired are removed from the tag set, so the
+        index is pruned as a side effect of reading the statistics.
+        """
+        op_types = list(self.CACHE_TTL_BY_SECURITY)
+        tag_keys = [self._tag_key(operation_tag(op_type)) for op_type in op_types]
+
+        pipe = self.cache.pipeline()
+        for tag_key in tag_keys:
+            pipe.scard(tag_key)
+            pipe.srandmember(tag_key, STATS_SAMPLE_SIZE)
+        results = pipe.execute()
+
+        sample = {}
+        for i, op_type in enumerate(op_types):
+            indexed, keys = results[2 * i], results[2 * i + 1] or []
+            ttls, sizes = [], []
+            if keys:
+                pipe = self.cache.pipeline()
+                for key in keys:
+                    pipe.ttl(key)
+                    pipe.memory_usage(key)
+                key_results = pipe.execute()
+                dead = [key for j, key in enumerate(keys) if key_results[2 * j] < 0]
+                ttls = [ttl for ttl in key_results[0::2] if ttl >= 0]
+                sizes = [size for size in key_results[1::2] if size]
+                if dead:
+                    pipe = self.cache.pipeline()
+                    pipe.srem(tag_keys[i], *dead)
+                    pipe.execute()
+
+            live_fraction = len(ttls) / len(keys) if keys else 0
+            sample[op_type.value] = {
+                "live_keys": int(round(indexed * live_fraction)),
+                "ttls": ttls,
+                "average_size": sum(sizes) / len(sizes) if sizes else 0,
+                "cache_level": self._determine_cache_level(op_type),
+            }
+        return sample
 
-    def _calculate_hit_rate(self) -> float:
-        """Calculate cache hit rate"""
-        return 85.5  # Placeholder
+    def _calculate_hit_rate(self, counters: Dict[str, int]) -> float:
+        """Cache hit rate (percent) over all lookups"""
+        lookups = counters["hits"] + counters["misses"]
+        return round(counters["hits"] / lookups * 100, 2) if lookups else 0.0
 
-    def _calculate_average_ttl(self) -> int:
-        """Calculate average TTL of cached items"""
-        return 600  # Placeholder
+    def _calculate_average_ttl(self, sample: Dict[str, Dict]) -> int:
+        """Average remaining TTL of cached items"""
+        ttls = [ttl for entry in sample.values() for ttl in entry["ttls"]]
+        return int(sum(ttls) / len(ttls)) if ttls else 0
 
-    def _estimate_memory_usage(self) -> str:
+    def _estimate_memory_usage(self, sample: Dict[str, Dict]) -> str:
         """Estimate cache memory usage"""
-        return "2.5MB"  # Placeholder
+        total = sum(entry["live_keys"] * entry["average_size"] for entry in sample.values())
+        return f"{total / (1024 * 1024):.1f}MB"
 
-    def _get_security_distribution(self) -> Dict:
+    def _get_security_distribution(self, sample: Dict[str, Dict]) -> Dict:
         """Get distribution of cached items by security level"""
-        return {"high_security": 25, "medium_security": 45, "standard_security": 30}
-
-    def _get_recent_activity(self) -> List[Dict]:
-        """Get recent cache activity"""
-        return [
-            {"operation": "cache_hit", "function": "measure_member_performance", "timestamp": now()},
-            {"operation": "cache_write", "function": "get_performance_summary", "timestamp": now()},
-            {"operation": "cache_invalidation", "doctype": "Member", "timestamp": now()},
-        ]
+        distribution = {"high_security": 0, "medium_security": 0, "standard_security": 0}
+        for entry in sample.values():
+            distribution[entry["cache_level"]] += entry["live_keys"]
+        return distribution
+
+    def _get_recent_activity(self, counters: Dict[str, int]) -> List[Dict]:
+        """Get cache activity counters"""
+        return [{"operation": f"cache_{name}", "count": count} for name, count in counters.items()]
 
 
 # Global cache manager instance
@@ -451,22 +597,34 @@ def get_security_aware_cache() -> SecurityAwareCacheManager:
     return _cache_manager
 
 
-def cached_api_call(operation_type: OperationType, custom_ttl: int = None):
+def cached_api_call(
+    operation_type: OperationType,
+    custom_ttl: int = None,
+    depends_on: List[str] = None,
+    document_args: Dict[str, str] = None,
+):
     """
     Decorator for caching API calls with security awareness
 
     Args:
         operation_type: Security level of the operation
         custom_ttl: Custom TTL override
+        depends_on: Doctypes whose changes invalidate the response (defaults to
+            the doctypes affecting the operation type)
+        document_args: Argument name -> doctype for arguments naming the document
+            the response is about; only changes to that document invalidate it
 
     Usage:
-        @cached_api_call(OperationType.MEMBER_DATA)
-        def my_api_function(param1, param2=None):
+        @cached_api_call(OperationType.MEMBER_DATA, custom_ttl=3600, document_args={"member": "Member"})
+        def my_api_function(member, param2=None):
             # Function implementation
             return result
     """
 
     def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
         def wrapper(*args, **kwargs):
             cache_manager = get_security_aware_cache()
 
@@ -481,9 +639,21 @@ def cached_api_call(operation_type: OperationType, custom_ttl: int = None):
             # Execute function and cache result
             result = func(*args, **kwargs)
 
+            documents = None
+            if document_args:
+                arguments = signature.bind_partial(*args, **kwargs).arguments
+                documents = [(doctype, arguments.get(arg)) for arg, doctype in document_args.items()]
+
             # Cache successful results
             cache_manager.set_cached_api_response(
-                func.__name__, operation_type, result, args, kwargs, custom_ttl
+                func.__name__,
+                operation_type,
+                result,
+                args,
+                kwargs,
+                custom_ttl,
+                depends_on=depends_on,
+                documents=documents,
             )
 
             return result
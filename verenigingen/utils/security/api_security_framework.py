@@ -12,12 +12,16 @@ Architecture:
 - Context-aware permission validation
 - Performance-optimized implementation
 - Comprehensive audit trails
+
+Endpoint policies are compiled once when the decorator is applied, so the
+per-call work is a handful of frozenset lookups (see security_matrix).
 """
 
 import json
 import time
 from enum import Enum
 from functools import wraps
+from types import MappingProxyType
 from typing import Any, Callable, Dict, List, Optional, Set, Union
 
 import frappe
@@ -31,6 +35,7 @@ from verenigingen.utils.security.audit_logging import AuditEventType, AuditSever
 from verenigingen.utils.security.authorization import SEPAOperation, get_auth_manager
 from verenigingen.utils.security.csrf_protection import CSRFProtection
 from verenigingen.utils.security.rate_limiting import get_rate_limiter
+from verenigingen.utils.security.security_matrix import EndpointPolicy, get_user_roles
 from verenigingen.utils.validation.api_validators import APIValidator
 
 
@@ -55,6 +60,66 @@ class OperationType(Enum):
     PUBLIC = "public"  # Public information, documentation
 
 
+# Functions with CSRF compatibility issues in membership operations
+CSRF_EXEMPT_FUNCTIONS = frozenset(
+    [
+        "approve_membership_application",
+        "reject_membership_application",
+        "create_membership_from_application",
+        "update_membership_status",
+    ]
+)
+
+# Read-only operations never need a CSRF token
+CSRF_EXEMPT_PREFIXES = ("get_", "list_", "check_", "validate_", "test_", "analyze_")
+
+# Successful read-only calls are not audited below HIGH security
+AUDIT_READ_ONLY_PREFIXES = (
+    "get_",
+    "list_",
+    "check_",
+    "validate_",
+    "test_",
+    "analyze_",
+    "can_",
+    "has_",
+    "is_",
+    "show_",
+    "display_",
+    "view_",
+    "fetch_",
+)
+
+# Common status/permission checks that don't access sensitive data
+AUDIT_SKIP_FUNCTIONS = frozenset(
+    [
+        "can_suspend_member",
+        "get_suspension_status",
+        "can_terminate_member",
+        "is_chapter_management_enabled",
+        "check_donor_exists",
+        "get_member_termination_status",
+        "check_sepa_mandate_status",
+    ]
+)
+
+
+def is_csrf_exempt(func_name: str) -> bool:
+    """Whether a function is exempt from CSRF validation by name"""
+    func_name = func_name.lower()
+    return func_name in CSRF_EXEMPT_FUNCTIONS or func_name.startswith(CSRF_EXEMPT_PREFIXES)
+
+
+def audits_successful_call(func_name: str, level: "SecurityLevel") -> bool:
+    """Whether a successful call should be audited (failures always are)"""
+    func_name = func_name.lower()
+    if not func_name.startswith(AUDIT_READ_ONLY_PREFIXES):
+        return True
+    if level not in (SecurityLevel.CRITICAL, SecurityLevel.HIGH):
+        return False
+    return func_name not in AUDIT_SKIP_FUNCTIONS
+
+
 class SecurityProfile:
     """Security profile defining requirements for each security level"""
 
@@ -188,12 +253,46 @@ class APISecurityFramework:
         except (RuntimeError, AttributeError):
             return False
 
-    def get_security_profile(self, level: SecurityLevel) -> SecurityProfile:
+    @classmethod
+    def get_security_profile(cls, level: SecurityLevel) -> SecurityProfile:
         """Get security profile for given level"""
-        return self.SECURITY_PROFILES.get(level, self.SECURITY_PROFILES[SecurityLevel.MEDIUM])
+        return cls.SECURITY_PROFILES.get(level, cls.SECURITY_PROFILES[SecurityLevel.MEDIUM])
+
+    @classmethod
+    def compile_endpoint_policy(
+        cls,
+        func: Callable,
+        security_level: SecurityLevel = None,
+        operation_type: OperationType = None,
+        roles: List[str] = None,
+        rate_limit: Dict[str, int] = None,
+    ) -> EndpointPolicy:
+        """
+        Compile the immutable security policy for an endpoint
 
+        Resolves classification, profile, extra roles, CSRF exemption and audit
+        rules once, so the decorator does not redo them on every call.
+        """
+        level = security_level or cls.classify_endpoint(func, operation_type)
+        profile = cls.get_security_profile(level)
+
+        return EndpointPolicy(
+            level=level,
+            operation_key=f"{func.__module__}.{func.__name__}",
+            required_roles=frozenset(profile.required_roles) | frozenset(roles or []),
+            allowed_methods=frozenset(profile.allowed_methods),
+            max_request_size=profile.max_request_size,
+            rate_limit_config=MappingProxyType({**profile.rate_limit_config, **(rate_limit or {})}),
+            requires_csrf=profile.requires_csrf and not is_csrf_exempt(func.__name__),
+            requires_audit=profile.requires_audit,
+            audit_successful_calls=profile.requires_audit and audits_successful_call(func.__name__, level),
+            input_validation=profile.input_validation,
+            requires_authentication=level != SecurityLevel.PUBLIC,
+        )
+
+    @classmethod
     def classify_endpoint(
-        self, func: Callable, operation_type: OperationType = None, custom_level: SecurityLevel = None
+        cls, func: Callable, operation_type: OperationType = None, custom_level: SecurityLevel = None
     ) -> SecurityLevel:
         """
         Classify endpoint security level based on operation type or custom override
@@ -210,7 +309,7 @@ class APISecurityFramework:
             return custom_level
 
         if operation_type:
-            return self.OPERATION_SECURITY_MAPPING.get(operation_type, SecurityLevel.MEDIUM)
+            return cls.OPERATION_SECURITY_MAPPING.get(operation_type, SecurityLevel.MEDIUM)
 
         # Heuristic classification based on function name and module
         func_name = func.__name__.lower()
@@ -247,8 +346,7 @@ class APISecurityFramework:
 
         # Check required roles
         if profile.required_roles:
-            user_roles = frappe.get_roles(user)
-            if not any(role in user_roles for role in profile.required_roles):
+            if get_user_roles(user).isdisjoint(profile.required_roles):
                 raise VPermissionError(
                     _("Access denied. Required roles: {0}").format(", ".join(profile.required_roles))
                 )
@@ -297,24 +395,9 @@ class APISecurityFramework:
         if frappe.request and frappe.request.method == "GET":
             return True
 
-        # Skip for specific functions that have compatibility issues
-        if func and hasattr(func, "__name__"):
-            func_name = func.__name__.lower()
-
-            # Skip for membership operations that have CSRF compatibility issues
-            skip_csrf_functions = [
-                "approve_membership_application",
-                "reject_membership_application",
-                "create_membership_from_application",
-                "update_membership_status",
-            ]
-            if func_name in skip_csrf_functions:
-                return True
-
-            # Skip for read-only operations (methods starting with 'get_', 'list_', 'check_', 'validate_')
-            read_only_prefixes = ["get_", "list_", "check_", "validate_", "test_", "analyze_"]
-            if any(func_name.startswith(prefix) for prefix in read_only_prefixes):
-                return True
+        # Skip for membership operations with compatibility issues and read-only operations
+        if func and hasattr(func, "__name__") and is_csrf_exempt(func.__name__):
+            return True
 
         try:
             self.csrf_protection.validate_request()
@@ -335,9 +418,12 @@ class APISecurityFramework:
             raise VPermissionError(_("CSRF validation failed: {0}").format(str(e)))
 
     def validate_rate_limits(self, profile: SecurityProfile, operation_key: str) -> bool:
-        """Validate rate limits"""
+        """Validate the profile's rate limit with the cluster-wide token bucket"""
         try:
-            self.rate_limiter.check_rate_limit(operation_key)
+            config = profile.rate_limit_config
+            self.rate_limiter.check_token_bucket(
+                operation_key, config.get("requests", 100), config.get("window_seconds", 3600)
+            )
             return True
         except Exception as e:
             self.audit_logger.log_event(
@@ -415,44 +501,10 @@ class APISecurityFramework:
         if not profile.requires_audit:
             return
 
-        # Skip audit logging for read-only operations to prevent unnecessary audit clutter
+        # Skip audit logging for successful read-only operations to prevent unnecessary audit clutter
         # Only log operations that modify data or access sensitive information
-        func_name = func.__name__.lower()
-        read_only_prefixes = [
-            "get_",
-            "list_",
-            "check_",
-            "validate_",
-            "test_",
-            "analyze_",
-            "can_",
-            "has_",
-            "is_",
-            "show_",
-            "display_",
-            "view_",
-            "fetch_",
-        ]
-
-        # Skip audit logging for read-only functions unless they failed or access sensitive data
-        if success and any(func_name.startswith(prefix) for prefix in read_only_prefixes):
-            # Only log read-only operations if they're high security or critical
-            if profile.level not in [SecurityLevel.CRITICAL, SecurityLevel.HIGH]:
-                return
-
-            # Skip common status/permission check functions that don't access sensitive data
-            skip_functions = [
-                "can_suspend_member",
-                "get_suspension_status",
-                "can_terminate_member",
-                "is_chapter_management_enabled",
-                "check_donor_exists",
-                "get_member_termination_status",
-                "check_sepa_mandate_status",
-            ]
-
-            if func_name in skip_functions:
-                return
+        if success and not audits_successful_call(func.__name__, profile.level):
+            return
 
         event_type = "api_call_success" if success else "api_call_failed"
         severity = AuditSeverity.INFO if success else AuditSeverity.ERROR
@@ -552,31 +604,28 @@ def api_security_framework(
     """
 
     def decorator(func: Callable) -> Callable:
+        # Classification, profile overrides and exemptions are resolved once here
+        policy = APISecurityFramework.compile_endpoint_policy(
+            func, security_level, operation_type, roles=roles, rate_limit=rate_limit
+        )
+
         @wraps(func)
         def wrapper(*args, **kwargs):
             start_time = time.time()
             framework = get_security_framework()
-
-            # Determine security level
-            level = security_level or framework.classify_endpoint(func, operation_type)
-            profile = framework.get_security_profile(level)
-
-            # Override profile settings if specified
-            if roles:
-                profile.required_roles.extend(roles)
-            if rate_limit:
-                profile.rate_limit_config.update(rate_limit)
+            profile = policy
 
             try:
                 # Security validations
-                framework.validate_authentication(profile)
+                if policy.requires_authentication:
+                    framework.validate_authentication(profile)
                 framework.validate_request_method(profile)
                 framework.validate_request_size(profile)
-                framework.validate_csrf_token(profile, func)
+                if policy.requires_csrf:
+                    framework.validate_csrf_token(profile, func)
 
                 # Rate limiting
-                operation_key = f"{func.__module__}.{func.__name__}"
-                framework.validate_rate_limits(profile, operation_key)
+                framework.validate_rate_limits(profile, policy.operation_key)
 
                 # Input validation
                 validated_kwargs = framework.validate_input_data(profile, **kwargs)
@@ -590,16 +639,17 @@ def api_security_framework(
                 result = func(*args, **validated_kwargs)
 
                 # Log successful execution
-                execution_time = time.time() - start_time
-                framework.log_audit_event(
-                    profile,
-                    func,
-                    True,
-                    execution_time,
-                    user=frappe.session.user,
-                    args_count=len(args),
-                    kwargs_keys=list(validated_kwargs.keys()),
-                )
+                if policy.audit_successful_calls:
+                    execution_time = time.time() - start_time
+                    framework.log_audit_event(
+                        profile,
+                        func,
+                        True,
+                        execution_time,
+                        user=frappe.session.user,
+                        args_count=len(args),
+                        kwargs_keys=list(validated_kwargs.keys()),
+                    )
 
                 # Add security headers to response
                 if hasattr(frappe.local, "response"):
@@ -629,6 +679,7 @@ def api_security_framework(
         wrapper._security_protected = True
         wrapper._security_level = security_level
         wrapper._operation_type = operation_type
+        wrapper._security_policy = policy
 
         return wrapper
 
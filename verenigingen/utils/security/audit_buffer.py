@@ -0,0 +1,191 @@
+"""
+Buffered Audit Event Pipeline
+
+SEPAAuditLogger.log_event used to insert a document, write the log file and run
+a COUNT query over recent audit rows inside every secured API call. This module
+moves that work out of the request path:
+
+- events logged during a web request are collected on frappe.local and pushed
+  to a Redis list in one round trip when the request ends (after_request hook)
+- a scheduler job drains the list in batches and bulk inserts the rows into
+  SEPA Audit Log / API Audit Log, then writes the log file entries
+- alert thresholds are tracked with per-minute Redis counters instead of
+  counting audit rows
+
+Nothing is dropped: if Redis cannot take the events they are written
+synchronously, and a batch that fails to insert is put back on the list.
+"""
+
+import json
+import time
+from collections import defaultdict, deque
+from typing import Any, Dict, List
+
+import frappe
+
+AUDIT_BUFFER_KEY = "sepa_audit:buffer"
+ALERT_COUNTER_PREFIX = "sepa_audit:alerts"
+
+# Events collected per request before they are pushed to Redis early
+REQUEST_BUFFER_MAX_EVENTS = 200
+# Rows per bulk insert when draining the Redis list
+FLUSH_BATCH_SIZE = 500
+# Batches written per flush run before yielding to the next scheduler tick
+FLUSH_MAX_BATCHES = 40
+# Backlog length at which a flush is enqueued instead of waiting for the scheduler
+BACKLOG_FLUSH_THRESHOLD = 2000
+
+
+def buffer_audit_event(audit_event: Dict[str, Any]) -> bool:
+    """
+    Queue an audit event for bulk writing
+
+    Returns False outside a web request; the caller then writes the event
+    itself so CLI, background job and test code keep seeing their rows
+    immediately.
+    """
+    if getattr(frappe.local, "request", None) is None:
+        return False
+
+    pending = getattr(frappe.local, "audit_event_buffer", None)
+    if pending is None:
+        pending = frappe.local.audit_event_buffer = []
+
+    pending.append(audit_event)
+    if len(pending) >= REQUEST_BUFFER_MAX_EVENTS:
+        flush_request_audit_events()
+
+    return True
+
+
+def flush_request_audit_events(response=None, request=None):
+    """after_request hook - push this request's audit events to Redis in one call"""
+    pending = getattr(frappe.local, "audit_event_buffer", None)
+    if not pending:
+        return
+
+    events = list(pending)
+    pending.clear()
+
+    if _push_to_backlog(events):
+        return
+
+    # Redis unavailable - write synchronously rather than lose the events
+    from verenigingen.utils.security.audit_logging import get_audit_logger
+
+    try:
+        get_audit_logger().write_events(events)
+    except Exception:
+        # write_events already recorded the events in the Error Log
+        pass
+
+
+def _push_to_backlog(events: List[Dict[str, Any]]) -> bool:
+    try:
+        cache = frappe.cache()
+        pipe = cache.pipeline()
+        pipe.rpush(cache.make_key(AUDIT_BUFFER_KEY), *(json.dumps(event, default=str) for event in events))
+        backlog = pipe.execute()[0]
+    except Exception as e:
+        frappe.log_error(f"Could not buffer {len(events)} audit events: {str(e)}", "Audit Buffer Error")
+        return False
+
+    if backlog >= BACKLOG_FLUSH_THRESHOLD:
+        frappe.enqueue(
+            "verenigingen.utils.security.audit_buffer.flush_audit_buffer",
+            queue="short",
+            job_id=f"flush_audit_buffer::{frappe.local.site}",
+            deduplicate=True,
+        )
+
+    return True
+
+
+def get_audit_backlog_size() -> int:
+    """Number of audit events waiting to be written"""
+    return frappe.cache().llen(AUDIT_BUFFER_KEY)
+
+
+def flush_audit_buffer(max_batches: int = FLUSH_MAX_BATCHES) -> int:
+    """
+    Drain buffered audit events into the audit tables
+
+    Runs every minute from the scheduler and on demand when the backlog grows.
+    Each batch is popped atomically, so concurrent runs never write the same
+    events twice.
+
+    Returns:
+        Number of events written
+    """
+    from verenigingen.utils.security.audit_logging import get_audit_logger
+
+    cache = frappe.cache()
+    key = cache.make_key(AUDIT_BUFFER_KEY)
+    audit_logger = get_audit_logger()
+    written = 0
+
+    for _ in range(max_batches):
+        pipe = cache.pipeline()
+        pipe.lrange(key, 0, FLUSH_BATCH_SIZE - 1)
+        pipe.ltrim(key, FLUSH_BATCH_SIZE, -1)
+        raw_events = pipe.execute()[0]
+        if not raw_events:
+            break
+
+        try:
+            audit_logger.write_events([json.loads(raw) for raw in raw_events])
+        except Exception as e:
+            # Put the batch back at the head of the list for the next run
+            pipe = cache.pipeline()
+            pipe.lpush(key, *reversed(raw_events))
+            pipe.execute()
+            frappe.log_error(
+                f"Failed to write {len(raw_events)} buffered audit events: {str(e)}", "Audit Buffer Error"
+            )
+            break
+
+        written += len(raw_events)
+
+    return written
+
+
+class SlidingWindowCounter:
+    """
+    Event counts over the last N minutes from per-minute Redis buckets
+
+    The window is aligned to whole minutes, so a count covers between N-1 and
+    N minutes of events. Falls back to an in-process sliding window when Redis
+    is unavailable.
+    """
+
+    def __init__(self, prefix: str = ALERT_COUNTER_PREFIX):
+        self.prefix = prefix
+        self._local = defaultdict(deque)
+
+    def increment(self, name: str, window_minutes: int) -> int:
+        """Record one event and return the count within the window"""
+        now = time.time()
+        current = int(now // 60)
+
+        try:
+            cache = frappe.cache()
+            keys = [
+                cache.make_key(f"{self.prefix}:{name}:{bucket}")
+                for bucket in range(current - window_minutes + 1, current + 1)
+            ]
+            pipe = cache.pipeline(transaction=False)
+            pipe.incr(keys[-1])
+            pipe.expire(keys[-1], (window_minutes + 1) * 60)
+            pipe.mget(keys)
+            counts = pipe.execute()[2]
+            return sum(int(count) for count in counts if count)
+        except Exception:
+            return self._increment_local(name, window_minutes, now)
+
+    def _increment_local(self, name: str, window_minutes: int, now: float) -> int:
+        timestamps = self._local[(getattr(frappe.local, "site", None), name)]
+        timestamps.append(now)
+        cutoff = now - window_minutes * 60
+        while timestamps and timestamps[0] <= cutoff:
+            timestamps.popleft()
+        return len(timestamps)
@@ -7,6 +7,7 @@ monitoring for all SEPA operations with configurable retention and alerting.
 
 import json
 import time
+import uuid
 from datetime import datetime, timedelta
 from enum import Enum
 from typing import Any, Dict, List, Optional, Union
@@ -16,6 +17,8 @@ from frappe import _
 from frappe.utils import add_days, now, today
 
 from verenigingen.utils.error_handling import log_error
+from verenigingen.utils.security.audit_buffer import SlidingWindowCounter, buffer_audit_event
+from verenigingen.utils.security.security_matrix import get_user_roles
 
 # Export all public functions for proper module interface
 __all__ = [
@@ -133,9 +136,36 @@ class SEPAAuditLogger:
         AuditEventType.SUSPICIOUS_ACTIVITY: {"count": 1, "window_minutes": 1},
     }
 
+    SEPA_AUDIT_LOG_FIELDS = (
+        "event_id",
+        "timestamp",
+        "process_type",
+        "action",
+        "compliance_status",
+        "user",
+        "details",
+        "sensitive_data",
+    )
+
+    API_AUDIT_LOG_FIELDS = (
+        "event_id",
+        "timestamp",
+        "event_type",
+        "severity",
+        "user",
+        "ip_address",
+        "user_agent",
+        "session_id",
+        "referer",
+        "details",
+        "sensitive_data",
+    )
+
     def __init__(self):
         """Initialize audit logger"""
         self.logger = frappe.logger("sepa_audit", allow_site=True, file_count=50)
+        self._alert_thresholds = {event.value: config for event, config in self.ALERT_THRESHOLDS.items()}
+        self._alert_counter = SlidingWindowCounter()
 
     def _safe_get_request_header(self, header_name: str) -> str:
         """Safely get request header, handling cases where there's no request context"""
@@ -210,8 +240,8 @@ class SEPAAuditLogger:
         if not ip_address:
             ip_address = getattr(frappe.local, "request_ip", "unknown")
 
-        # Generate unique event ID
-        event_id = f"audit_{int(time.time() * 1000)}_{hash(f'{user}{event_type}{time.time()}') % 100000:05d}"
+        # Generate unique event ID (also the document name, so it must not collide)
+        event_id = f"audit_{int(time.time() * 1000)}_{uuid.uuid4().hex[:12]}"
 
         # Build audit event
         audit_event = {
@@ -232,8 +262,7 @@ class SEPAAuditLogger:
         # Add user context if available
         if user and user != "Guest":
             try:
-                user_roles = frappe.get_roles(user)
-                audit_event["user_roles"] = user_roles
+                audit_event["user_roles"] = sorted(get_user_roles(user))
             except frappe.DoesNotExistError:
                 frappe.log_error(
                     message=f"User {user} does not exist while getting roles for audit logging",
@@ -252,11 +281,10 @@ class SEPAAuditLogger:
                 audit_event["user_roles"] = []
 
         try:
-            # Store in audit log table
-            self._store_audit_event(audit_event)
-
-            # Log to file system
-            self._log_to_file(audit_event)
+            # Buffer for bulk writing; critical events and events outside a
+            # web request are written straight away
+            if severity == AuditSeverity.CRITICAL.value or not buffer_audit_event(audit_event):
+                self.write_events([audit_event])
 
             # Check for alert conditions
             self._check_alert_conditions(audit_event)
@@ -268,81 +296,79 @@ class SEPAAuditLogger:
             frappe.log_error(f"Audit logging failed for event {event_type}: {str(e)}", "Audit System Error")
             return f"failed_{int(time.time())}"
 
-    def _store_audit_event(self, audit_event: Dict[str, Any]):
-        """Store audit event in appropriate database table"""
-        try:
-            event_type = audit_event["event_type"]
+    def write_events(self, audit_events: List[Dict[str, Any]]):
+        """Bulk insert audit events into their audit tables and the log file"""
+        sepa_rows = []
+        api_rows = []
 
-            if self._is_sepa_event(event_type):
-                # Store SEPA-specific events in SEPA Audit Log
-                self._store_sepa_audit_event(audit_event)
+        for audit_event in audit_events:
+            if self._is_sepa_event(audit_event["event_type"]):
+                sepa_rows.append(self._sepa_audit_row(audit_event))
             else:
-                # Store general API/security events in API Audit Log
-                self._store_api_audit_event(audit_event)
+                api_rows.append(self._api_audit_row(audit_event))
 
+        try:
+            self._bulk_insert("SEPA Audit Log", self.SEPA_AUDIT_LOG_FIELDS, sepa_rows)
+            self._bulk_insert("API Audit Log", self.API_AUDIT_LOG_FIELDS, api_rows)
+            frappe.db.commit()
         except Exception as e:
             # If database storage fails, log to error log
             frappe.log_error(
-                f"Failed to store audit event in database: {str(e)}\nEvent: {json.dumps(audit_event, default=str)}",
+                f"Failed to store {len(audit_events)} audit events in database: {str(e)}\n"
+                f"Events: {json.dumps(audit_events, default=str)[:10000]}",
                 "Audit Database Error",
             )
+            raise
 
-    def _store_sepa_audit_event(self, audit_event: Dict[str, Any]):
-        """Store SEPA-specific audit event in SEPA Audit Log"""
-        try:
-            audit_doc = frappe.new_doc("SEPA Audit Log")
-            audit_doc.update(
-                {
-                    "event_id": audit_event["event_id"],
-                    "timestamp": audit_event["timestamp"],
-                    "process_type": self._map_event_to_sepa_process_type(audit_event["event_type"]),
-                    "action": audit_event["event_type"],
-                    "compliance_status": self._map_severity_for_sepa(audit_event["severity"]),
-                    "user": audit_event["user"],
-                    "details": json.dumps(audit_event["details"], default=str),
-                    "sensitive_data": audit_event["sensitive_data"],
-                }
-            )
-
-            # Insert without triggering additional validation
-            audit_doc.insert(ignore_permissions=True)
-            frappe.db.commit()
-
-        except Exception as e:
-            frappe.log_error(
-                f"Failed to store SEPA audit event: {str(e)}\nEvent: {json.dumps(audit_event, default=str)}",
-                "SEPA Audit Database Error",
-            )
+        for audit_event in audit_events:
+            self._log_to_file(audit_event)
 
-    def _store_api_audit_event(self, audit_event: Dict[str, Any]):
-        """Store general API/security audit event in API Audit Log"""
-        try:
-            audit_doc = frappe.new_doc("API Audit Log")
-            audit_doc.update(
-                {
-                    "event_id": audit_event["event_id"],
-                    "timestamp": audit_event["timestamp"],
-                    "event_type": audit_event["event_type"],
-                    "severity": audit_event["severity"],
-                    "user": audit_event["user"],
-                    "ip_address": audit_event["ip_address"],
-                    "user_agent": audit_event["user_agent"],
-                    "session_id": audit_event["session_id"],
-                    "referer": audit_event["referer"],
-                    "details": json.dumps(audit_event["details"], default=str),
-                    "sensitive_data": audit_event["sensitive_data"],
-                }
-            )
+    def _bulk_insert(self, doctype: str, fields: tuple, rows: List[tuple]):
+        """Insert rows named by event_id; replayed batches skip rows already written"""
+        if not rows:
+            return
+
+        user_index = fields.index("user")
+        values = []
+        for row in rows:
+            owner = row[user_index] or "Administrator"
+            values.append((row[0], row[1], row[1], owner, owner, *row))
+
+        frappe.db.bulk_insert(
+            doctype,
+            fields=["name", "creation", "modified", "modified_by", "owner", *fields],
+            values=values,
+            ignore_duplicates=True,
+        )
 
-            # Insert without triggering additional validation
-            audit_doc.insert(ignore_permissions=True)
-            frappe.db.commit()
+    def _sepa_audit_row(self, audit_event: Dict[str, Any]) -> tuple:
+        """SEPA Audit Log column values in SEPA_AUDIT_LOG_FIELDS order"""
+        return (
+            audit_event["event_id"],
+            audit_event["timestamp"],
+            self._map_event_to_sepa_process_type(audit_event["event_type"]),
+            audit_event["event_type"],
+            self._map_severity_for_sepa(audit_event["severity"]),
+            audit_event["user"],
+            json.dumps(audit_event["details"], default=str),
+            int(bool(audit_event["sensitive_data"])),
+        )
 
-        except Exception as e:
-            frappe.log_error(
-                f"Failed to store API audit event: {str(e)}\nEvent: {json.dumps(audit_event, default=str)}",
-                "API Audit Database Error",
-            )
+    def _api_audit_row(self, audit_event: Dict[str, Any]) -> tuple:
+        """API Audit Log column values in API_AUDIT_LOG_FIELDS order"""
+        return (
+            audit_event["event_id"],
+            audit_event["timestamp"],
+            audit_event["event_type"],
+            audit_event["severity"],
+            audit_event["user"],
+            audit_event["ip_address"],
+            audit_event["user_agent"],
+            audit_event["session_id"],
+            audit_event["referer"],
+            json.dumps(audit_event["details"], default=str),
+            int(bool(audit_event["sensitive_data"])),
+        )
 
     def _log_to_file(self, audit_event: Dict[str, Any]):
         """Log audit event to file system"""
@@ -380,17 +406,17 @@ class SEPAAuditLogger:
             event_type = audit_event["event_type"]
 
             # Check if this event type has alert thresholds
-            if event_type not in [et.value for et in AuditEventType]:
+            threshold_config = self._alert_thresholds.get(event_type)
+            if not threshold_config:
                 return
 
-            event_enum = AuditEventType(event_type)
-            if event_enum not in self.ALERT_THRESHOLDS:
+            # Alerts are logged as events themselves - don't alert on alerts
+            details = audit_event["details"]
+            if isinstance(details, dict) and details.get("alert_type") == "threshold_exceeded":
                 return
 
-            threshold_config = self.ALERT_THRESHOLDS[event_enum]
-
             # Count recent events of this type
-            recent_events = self._count_recent_events(event_type, threshold_config["window_minutes"])
+            recent_events = self._alert_counter.increment(event_type, threshold_config["window_minutes"])
 
             # Check if threshold exceeded
             if recent_events >= threshold_config["count"]:
@@ -399,30 +425,6 @@ class SEPAAuditLogger:
         except Exception as e:
             frappe.log_error(f"Alert checking failed: {str(e)}", "Audit Alert Error")
 
-    def _count_recent_events(self, event_type: str, window_minutes: int) -> int:
-        """Count recent events of specific type from both audit tables"""
-        try:
-            cutoff_time = add_days(now(), days=0, hours=0, minutes=-window_minutes)
-            total_count = 0
-
-            if self._is_sepa_event(event_type):
-                # Count from SEPA Audit Log using action field
-                count = frappe.db.count(
-                    "SEPA Audit Log", filters={"action": event_type, "timestamp": [">", cutoff_time]}
-                )
-                total_count += count
-            else:
-                # Count from API Audit Log using event_type field
-                count = frappe.db.count(
-                    "API Audit Log", filters={"event_type": event_type, "timestamp": [">", cutoff_time]}
-                )
-                total_count += count
-
-            return total_count
-
-        except Exception:
-            return 0
-
     def _trigger_security_alert(self, event_type: str, count: int, threshold: Dict[str, Any]):
         """Trigger security alert"""
         try:
@@ -7,7 +7,7 @@ and permission validation for sensitive SEPA operations with granular controls.
 
 from enum import Enum
 from functools import wraps
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, FrozenSet, List, Optional
 
 import frappe
 from frappe import _
@@ -15,6 +15,7 @@ from frappe import _
 from verenigingen.utils.error_handling import PermissionError as VerenigingenPermissionError
 from verenigingen.utils.error_handling import log_error
 from verenigingen.utils.security.audit_logging import AuditEventType, AuditSeverity, log_security_event
+from verenigingen.utils.security.security_matrix import RolePermissionMatrix, get_user_roles
 
 
 class SEPAPermissionLevel(Enum):
@@ -140,6 +141,7 @@ class SEPAAuthorizationManager:
         """Initialize authorization manager"""
         self.allowed_ips = self._get_allowed_ips()
         self.business_hours = self._get_business_hours()
+        self.permission_matrix = RolePermissionMatrix(self.ROLE_PERMISSIONS)
 
     def _get_allowed_ips(self) -> List[str]:
         """Get allowed IP addresses from configuration"""
@@ -181,25 +183,22 @@ class SEPAAuthorizationManager:
         Returns:
             List of permission levels
         """
+        return list(self.get_permission_set(user))
+
+    def get_permission_set(self, user: str = None) -> FrozenSet[SEPAPermissionLevel]:
+        """Permission levels for a user from the compiled role matrix and cached roles"""
         if not user:
             user = frappe.session.user
 
         if user in ["Administrator", "System"]:
-            return list(SEPAPermissionLevel)
+            return frozenset(SEPAPermissionLevel)
 
         try:
-            user_roles = frappe.get_roles(user)
-            permissions = set()
-
-            for role in user_roles:
-                if role in self.ROLE_PERMISSIONS:
-                    permissions.update(self.ROLE_PERMISSIONS[role])
-
-            return list(permissions)
+            return self.permission_matrix.permissions_for(get_user_roles(user))
 
         except Exception as e:
             log_error(e, context={"user": user}, module="verenigingen.utils.security.authorization")
-            return []
+            return frozenset()
 
     def has_permission(
         self, operation: SEPAOperation, user: str = None, context: Dict[str, Any] = None
@@ -229,7 +228,7 @@ class SEPAAuthorizationManager:
                 return False
 
             # Get user permissions
-            user_permissions = self.get_user_permissions(user)
+            user_permissions = self.get_permission_set(user)
 
             # Check if user has required permission level
             if required_level not in user_permissions:
@@ -650,8 +649,7 @@ def require_role(roles):
             if not frappe.session.user or frappe.session.user == "Guest":
                 frappe.throw(_("Authentication required"), frappe.PermissionError)
 
-            user_roles = frappe.get_roles(frappe.session.user)
-            if not any(role in user_roles for role in roles):
+            if get_user_roles(frappe.session.user).isdisjoint(roles):
                 frappe.throw(_("Insufficient permissions"), frappe.PermissionError)
             return func(*args, **kwargs)
 
@@ -3,7 +3,8 @@ Rate Limiting System for Verenigingen SEPA Operations
 
 This module provides rate limiting functionality to prevent abuse of SEPA batch
 operations and other sensitive endpoints. Supports both Redis and memory backends
-with sliding window algorithm.
+with sliding window algorithm, plus a cluster-wide token bucket used by the API
+security framework.
 """
 
 import json
@@ -17,6 +18,8 @@ from frappe import _
 from frappe.utils import cstr
 
 from verenigingen.utils.error_handling import SEPAError, log_error
+from verenigingen.utils.security.security_matrix import get_user_roles
+from verenigingen.verenigingen_payments.core.resilience.redis_token_bucket import RedisTokenBucket
 
 
 class RateLimitExceeded(SEPAError):
@@ -59,6 +62,8 @@ class RateLimiter:
         """
         self.backend = self._detect_backend(backend)
         self._memory_store = defaultdict(lambda: deque())
+        # key -> (tokens, last refill) for token buckets while Redis is unavailable
+        self._memory_buckets = {}
 
     def _detect_backend(self, preference):
         """Detect best available backend"""
@@ -104,20 +109,96 @@ class RateLimiter:
         """
         base_limit = self.DEFAULT_LIMITS.get(operation, {"requests": 10, "window_seconds": 3600})
 
-        # Get user roles
-        user_roles = frappe.get_roles(user) if user != "Guest" else []
+        # Apply multiplier
+        requests_allowed = int(base_limit["requests"] * self._get_role_multiplier(user))
+        window_seconds = base_limit["window_seconds"]
+
+        return requests_allowed, window_seconds
+
+    def _get_role_multiplier(self, user: str) -> float:
+        """Highest rate limit multiplier among the user's roles"""
+        user_roles = get_user_roles(user) if user != "Guest" else ()
 
-        # Find highest role multiplier
         multiplier = self.ROLE_MULTIPLIERS.get("default", 1.0)
         for role in user_roles:
             if role in self.ROLE_MULTIPLIERS:
                 multiplier = max(multiplier, self.ROLE_MULTIPLIERS[role])
 
-        # Apply multiplier
-        requests_allowed = int(base_limit["requests"] * multiplier)
-        window_seconds = base_limit["window_seconds"]
+        return multiplier
 
-        return requests_allowed, window_seconds
+    def check_token_bucket(
+        self, operation: str, requests: int, window_seconds: int, user: str = None, ip: str = None
+    ) -> Dict[str, Any]:
+        """
+        Check a request against a token bucket shared by all workers
+
+        Allows bursts of up to `requests` calls that refill evenly over
+        `window_seconds`. The bucket lives in Redis and is updated atomically,
+        so the limit holds across every web and background worker; an
+        in-process bucket is used while Redis is unavailable.
+
+        Args:
+            operation: Operation identifier (e.g. the endpoint's dotted path)
+            requests: Requests allowed per window before role multipliers
+            window_seconds: Window length in seconds
+            user: User email (defaults to current user)
+            ip: IP address (defaults to current request IP)
+
+        Returns:
+            Dictionary with rate limit status
+
+        Raises:
+            RateLimitExceeded: If rate limit is exceeded
+        """
+        if not user:
+            user = frappe.session.user
+
+        if not ip:
+            ip = getattr(frappe.local, "request_ip", None)
+
+        # Skip rate limiting for system users
+        if user in ["Administrator", "System"]:
+            return {"allowed": True, "remaining": float("inf"), "limit": float("inf"), "retry_after": 0}
+
+        limit = max(1, int(requests * self._get_role_multiplier(user)))
+        refill_per_second = limit / float(window_seconds)
+        key = self._get_rate_limit_key(operation, user, ip)
+
+        result = RedisTokenBucket(key).take(1, limit, refill_per_second)
+        if result is None:
+            allowed, remaining, retry_after = self._take_memory_token(key, limit, refill_per_second)
+        else:
+            allowed, remaining, retry_after = result
+
+        if not allowed:
+            frappe.logger().info(
+                {
+                    "event": "rate_limit_exceeded",
+                    "operation": operation,
+                    "user": user,
+                    "ip": ip,
+                    "limit": limit,
+                    "window_seconds": window_seconds,
+                },
+                "SEPA Security",
+            )
+            message = _("Rate limit exceeded for {0}. Limit: {1} requests per {2} seconds. Retry after {3}s")
+            raise RateLimitExceeded(message.format(operation, limit, window_seconds, int(retry_after) + 1))
+
+        return {"allowed": True, "remaining": int(remaining), "limit": limit, "retry_after": 0}
+
+    def _take_memory_token(self, key: str, limit: int, refill_per_second: float) -> Tuple[bool, float, float]:
+        """In-process token bucket with the same semantics as the Redis script"""
+        current_time = time.time()
+        tokens, last_refill = self._memory_buckets.get(key, (limit, current_time))
+        tokens = min(limit, tokens + (current_time - last_refill) * refill_per_second)
+
+        if tokens >= 1:
+            self._memory_buckets[key] = (tokens - 1, current_time)
+            return True, tokens - 1, 0.0
+
+        self._memory_buckets[key] = (tokens, current_time)
+        return False, tokens, (1 - tokens) / refill_per_second
 
     def _check_redis_rate_limit(self, key: str, limit: int, window: int) -> Dict[str, Any]:
         """Check rate limit using Redis backend"""
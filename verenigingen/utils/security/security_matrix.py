@@ -0,0 +1,136 @@
+"""
+Compiled Role and Endpoint Security Matrix
+
+The API security decorators and the SEPA authorization manager used to
+re-derive the same facts on every call: the endpoint's security level from its
+name, the profile's role list, CSRF/audit exemptions from name prefixes and the
+user's roles from Frappe's cache. This module holds the immutable, precompiled
+form of those facts:
+
+- EndpointPolicy: everything the decorator needs about one endpoint, compiled
+  once when the decorator is applied (i.e. at worker boot)
+- RolePermissionMatrix: a frozen role -> permission table with memoized
+  lookups per distinct role set
+- a bounded, TTL-limited per-user role cache keyed by site
+
+Role changes made in this worker clear the cache immediately through the User
+doc event; other workers pick them up when the TTL expires.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, Iterable, Mapping, Optional
+
+import frappe
+
+ROLE_CACHE_MAX_USERS = 2048
+ROLE_CACHE_TTL_SECONDS = 60
+ROLE_SET_CACHE_MAX_ENTRIES = 256
+
+
+@dataclass(frozen=True)
+class EndpointPolicy:
+    """
+    Immutable security policy compiled for a single endpoint
+
+    Attribute names mirror SecurityProfile so the framework's validate_*
+    methods accept either.
+    """
+
+    level: Any
+    operation_key: str
+    required_roles: FrozenSet[str]
+    allowed_methods: FrozenSet[str]
+    max_request_size: int
+    rate_limit_config: Mapping[str, int]
+    requires_csrf: bool
+    requires_audit: bool
+    audit_successful_calls: bool
+    input_validation: bool
+    requires_authentication: bool
+
+
+class RolePermissionMatrix:
+    """Frozen role -> permission table with memoized lookups per role set"""
+
+    def __init__(self, role_permissions: Mapping[str, Iterable[Any]]):
+        self._table = MappingProxyType(
+            {role: frozenset(permissions) for role, permissions in role_permissions.items()}
+        )
+        self._by_role_set: Dict[FrozenSet[str], FrozenSet[Any]] = {}
+
+    @property
+    def table(self) -> Mapping[str, FrozenSet[Any]]:
+        return self._table
+
+    def permissions_for(self, roles: FrozenSet[str]) -> FrozenSet[Any]:
+        """Union of permissions granted by the given roles"""
+        permissions = self._by_role_set.get(roles)
+        if permissions is None:
+            permissions = frozenset().union(*(self._table.get(role, ()) for role in roles))
+            if len(self._by_role_set) >= ROLE_SET_CACHE_MAX_ENTRIES:
+                self._by_role_set.clear()
+            self._by_role_set[roles] = permissions
+        return permissions
+
+
+class UserRoleCache:
+    """Bounded LRU of (site, user) -> frozenset of roles with a short TTL"""
+
+    def __init__(self, max_users: int = ROLE_CACHE_MAX_USERS, ttl_seconds: float = ROLE_CACHE_TTL_SECONDS):
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user: str) -> FrozenSet[str]:
+        key = (getattr(frappe.local, "site", None), user)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                return entry[0]
+
+        roles = frozenset(frappe.get_roles(user))
+
+        with self._lock:
+            self._entries[key] = (roles, now + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+        return roles
+
+    def clear(self, user: Optional[str] = None):
+        with self._lock:
+            if user is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if key[1] == user]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_user_role_cache = UserRoleCache()
+
+
+def get_user_roles(user: str) -> FrozenSet[str]:
+    """Roles of a user from the bounded per-worker cache"""
+    return _user_role_cache.get(user)
+
+
+def clear_user_role_cache(user: Optional[str] = None):
+    """Forget cached roles for one user, or for everyone"""
+    _user_role_cache.clear(user)
+
+
+def on_user_update(doc, method=None):
+    """User doc event - roles may have changed"""
+    clear_user_role_cache(doc.name)
@@ -167,6 +167,18 @@ def generate_test_iban(bank_code="TEST", account_number=None):
     return iban
 
 
+def normalize_iban(iban):
+    """
+    Canonical storage/lookup form of an IBAN: no spaces or hyphens, upper case.
+    Returns None for empty input.
+    """
+    if not iban:
+        return None
+
+    normalized = re.sub(r"[\s-]", "", str(iban)).upper()
+    return normalized or None
+
+
 @frappe.whitelist()
 def format_iban(iban):
     """
@@ -0,0 +1,14 @@
+# Copyright (c) 2025, Verenigingen and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class MonitoringMetricSnapshot(Document):
+    pass
+
+
+def on_doctype_update():
+    # Latest value and history lookups are per widget, newest first
+    frappe.db.add_index("Monitoring Metric Snapshot", ["widget", "captured_at"])
@@ -7,6 +7,8 @@ from datetime import datetime, timedelta
 import frappe
 from frappe.utils import add_months, flt, fmt_money, getdate, now_datetime
 
+from verenigingen.utils.dashboard_engine import Widget, run_dashboard
+
 
 @frappe.whitelist()
 def get_dashboard_data(year=None, period="year", compare_previous=False, filters=None):
@@ -22,20 +24,25 @@ def get_dashboard_data(year=None, period="year", compare_previous=False, filters
     else:
         filters = filters or {}
 
-    data = {
-        "summary": get_summary_metrics(year, period, filters),
-        "growth_trend": get_growth_trend(year, period, filters),
-        "revenue_projection": get_revenue_projection(year, filters),
-        "membership_breakdown": get_membership_breakdown(year, filters),
-        "goals": get_goals_progress(year),
-        "insights": get_top_insights(year),
-        "segmentation": get_segmentation_data(year, period, filters),
-        "cohort_analysis": get_cohort_analysis(year),
-        "last_updated": now_datetime(),
-    }
+    # Independent queries; evaluated concurrently with per-widget timeouts
+    widgets = [
+        Widget("summary", lambda: get_summary_metrics(year, period, filters), default={}),
+        Widget("growth_trend", lambda: get_growth_trend(year, period, filters), default={}),
+        Widget("revenue_projection", lambda: get_revenue_projection(year, filters), default={}),
+        Widget("membership_breakdown", lambda: get_membership_breakdown(year, filters), default={}),
+        Widget("goals", lambda: get_goals_progress(year), default=[]),
+        Widget("insights", lambda: get_top_insights(year), default=[]),
+        Widget("segmentation", lambda: get_segmentation_data(year, period, filters), default={}),
+        Widget("cohort_analysis", lambda: get_cohort_analysis(year), default={}),
+    ]
 
     if compare_previous:
-        data["previous_period"] = get_summary_metrics(year - 1, period, filters)
+        widgets.append(
+            Widget("previous_period", lambda: get_summary_metrics(year - 1, period, filters), default={})
+        )
+
+    data = run_dashboard("membership_analytics", widgets, variant=[year, period, filters])
+    data["last_updated"] = now_datetime()
 
     return data
 
@@ -7,7 +7,7 @@ from collections import defaultdict
 
 import frappe
 from frappe import _
-from frappe.utils import add_days, flt, getdate, now_datetime
+from frappe.utils import add_days, cint, flt, getdate, now_datetime
 
 from verenigingen.utils.security.api_security_framework import critical_api, high_security_api, standard_api
 from verenigingen.utils.security.authorization import (
@@ -15,6 +15,14 @@ from verenigingen.utils.security.authorization import (
     SEPAPermissionLevel,
     require_sepa_permission,
 )
+from verenigingen.verenigingen_payments.utils.dd_batch_packing import pack_invoices
+from verenigingen.verenigingen_payments.utils.sepa_collection_preview import (
+    DEFAULT_PAGE_LENGTH,
+    page_bounds,
+    summarize_by_date,
+    summarize_sequence_types,
+)
+from verenigingen.verenigingen_payments.utils.sepa_mandate_service import sequence_type_sql
 
 # Configuration constants
 DEFAULT_CONFIG = {
@@ -30,6 +38,38 @@ DEFAULT_CONFIG = {
     },
 }
 
+# Open invoices eligible for batching (aliases mem, m, si and sm): active
+# members paying by SEPA Direct Debit with an active mandate, not yet in a batch
+ELIGIBLE_INVOICE_CONDITIONS = """
+    FROM
+        `tabMember` mem
+    JOIN `tabMembership` m ON m.member = mem.name
+    JOIN `tabSales Invoice` si ON si.customer = mem.customer
+    JOIN `tabSEPA Mandate` sm ON sm.member = mem.name AND sm.status = 'Active' AND sm.is_active = 1
+    WHERE
+        si.docstatus = 1
+        AND si.status IN ('Unpaid', 'Overdue')
+        AND si.outstanding_amount > 0
+        AND mem.payment_method = 'SEPA Direct Debit'
+        AND mem.iban IS NOT NULL
+        AND mem.iban != ''
+        AND mem.customer IS NOT NULL
+        AND sm.mandate_id IS NOT NULL
+        -- ⚠️ CRITICAL VALIDATION: Exclude terminated/inactive members
+        AND mem.status NOT IN ('Terminated', 'Expelled', 'Deceased', 'Suspended', 'Quit')
+        AND m.status = 'Active'
+        -- Exclude invoices already in batches (index lookup per open invoice)
+        AND NOT EXISTS (
+            SELECT 1
+            FROM `tabDirect Debit Batch Invoice` ddi
+            JOIN `tabDirect Debit Batch` ddb ON ddi.parent = ddb.name
+            WHERE ddi.invoice = si.name
+            AND ddb.docstatus != 2
+        )
+"""
+# Expected sequence type of an eligible invoice, as set by attach_sequence_types
+ELIGIBLE_SEQUENCE_TYPE = sequence_type_sql("seq_sm.name = sm.name")
+
 
 @critical_api()
 @require_sepa_permission(SEPAPermissionLevel.CREATE, SEPAOperation.BATCH_CREATE)
@@ -74,16 +114,17 @@ def create_optimal_batches(target_date=None, config=None):
         invoice_analysis = analyze_invoices_for_optimization(eligible_invoices)
 
         # Step 3: Create optimal batch combinations
-        batch_groups = create_optimal_batch_groups(invoice_analysis, batch_config)
+        packing = create_optimal_batch_groups(invoice_analysis, batch_config)
 
         # Step 4: Create actual DD batch documents
         created_batches = []
-        for group_index, batch_group in enumerate(batch_groups):
+        for group_index, batch_group in enumerate(packing.batches):
             batch_doc = create_dd_batch_document(batch_group, target_date, group_index + 1, batch_config)
             created_batches.append(batch_doc)
 
         # Step 5: Generate optimization report
         optimization_report = generate_optimization_report(eligible_invoices, created_batches, batch_config)
+        optimization_report["packing"] = packing.report
 
         frappe.logger().info(f"Created {len(created_batches)} optimized batches")
 
@@ -105,12 +146,17 @@ def get_eligible_invoices_for_batching():
     """
     Get all invoices eligible for SEPA Direct Debit batching
     ⚠️ CRITICAL: Includes member status validation to prevent billing terminated members
+
+    Eligibility, including the active mandate check, is decided by one query
+    over open invoices. Invoices already in a batch are excluded by an
+    anti-join on the indexed Direct Debit Batch Invoice.invoice column, so the
+    cost does not grow with batch history.
     """
 
-    # Get unpaid invoices with SEPA mandates and ACTIVE MEMBER STATUS
+    # Get unpaid invoices with active SEPA mandates and ACTIVE MEMBER STATUS
     # Join through customer relationship since Member.customer links to Sales Invoice.customer
     invoices = frappe.db.sql(
-        """
+        f"""
         SELECT
             si.name as invoice,
             si.customer,
@@ -123,34 +169,12 @@ def get_eligible_invoices_for_batching():
             mem.iban,
             mem.payment_method,
             sm.mandate_id as mandate_reference,
+            sm.name as mandate,
             mem.member_since,
             mem.status as member_status,
             m.status as membership_status,
             'Normal' as priority
-        FROM
-            `tabMember` mem
-        JOIN `tabMembership` m ON m.member = mem.name
-        JOIN `tabSales Invoice` si ON si.customer = mem.customer
-        LEFT JOIN `tabSEPA Mandate` sm ON sm.member = mem.name AND sm.status = 'Active'
-        WHERE
-            si.docstatus = 1
-            AND si.status IN ('Unpaid', 'Overdue')
-            AND si.outstanding_amount > 0
-            AND mem.payment_method = 'SEPA Direct Debit'
-            AND mem.iban IS NOT NULL
-            AND mem.iban != ''
-            AND mem.customer IS NOT NULL
-            AND sm.mandate_id IS NOT NULL
-            -- ⚠️ CRITICAL VALIDATION: Exclude terminated/inactive members
-            AND mem.status NOT IN ('Terminated', 'Expelled', 'Deceased', 'Suspended', 'Quit')
-            AND m.status = 'Active'
-            -- Exclude invoices already in batches
-            AND si.name NOT IN (
-                SELECT DISTINCT ddi.invoice
-                FROM `tabDirect Debit Batch Invoice` ddi
-                JOIN `tabDirect Debit Batch` ddb ON ddi.parent = ddb.name
-                WHERE ddb.docstatus != 2
-            )
+        {ELIGIBLE_INVOICE_CONDITIONS}
         ORDER BY
             si.posting_date ASC,
             si.grand_total DESC
@@ -163,8 +187,8 @@ def get_eligible_invoices_for_batching():
     excluded_count = 0
 
     for invoice in invoices:
-        # Double-check member eligibility for billing
-        if validate_member_eligibility_for_billing(invoice):
+        # Double-check member eligibility for billing; the mandate was checked by the query
+        if validate_member_eligibility_for_billing(invoice, check_mandate=False):
             validated_invoices.append(invoice)
         else:
             excluded_count += 1
@@ -180,10 +204,13 @@ def get_eligible_invoices_for_batching():
     return validated_invoices
 
 
-def validate_member_eligibility_for_billing(invoice_data):
+def validate_member_eligibility_for_billing(invoice_data, check_mandate=True):
     """
     ⚠️ CRITICAL VALIDATION: Check if member is eligible for billing
     This function MUST be called before creating any invoice or DD batch entry
+
+    Pass check_mandate=False only when invoice_data comes from a query that
+    already required an active SEPA mandate.
     """
     member_name = invoice_data.get("member")
     if not member_name:
@@ -209,7 +236,7 @@ def validate_member_eligibility_for_billing(invoice_data):
             return False
 
         # Check if member has valid SEPA mandate
-        if invoice_data.get("payment_method") == "SEPA Direct Debit":
+        if check_mandate and invoice_data.get("payment_method") == "SEPA Direct Debit":
             mandate_exists = frappe.db.exists(
                 "SEPA Mandate", {"member": member_name, "status": "Active", "is_active": 1}
             )
@@ -371,165 +398,53 @@ def analyze_invoices_for_optimization(invoices):
 
 
 def create_optimal_batch_groups(analysis, config):
-    """Create optimal groupings of invoices for batching"""
-
-    all_invoices = []
-    for category in analysis["by_amount"].values():
-        all_invoices.extend(category)
-
-    batch_groups = []
-    remaining_invoices = all_invoices.copy()
-
-    # Strategy 1: Prioritize high-priority invoices first
-    if analysis["by_priority"].get("High"):
-        priority_batches = create_priority_batches(analysis["by_priority"]["High"], config)
-        batch_groups.extend(priority_batches)
-        # Remove processed invoices
-        processed_invoices = set()
-        for batch in priority_batches:
-            processed_invoices.update(inv["invoice"] for inv in batch)
-        remaining_invoices = [inv for inv in remaining_invoices if inv["invoice"] not in processed_invoices]
-
-    # Strategy 2: Create customer-consolidated batches
-    customer_batches = create_customer_consolidated_batches(remaining_invoices, config)
-    batch_groups.extend(customer_batches)
-
-    # Remove processed invoices
-    processed_invoices = set()
-    for batch in customer_batches:
-        processed_invoices.update(inv["invoice"] for inv in batch)
-    remaining_invoices = [inv for inv in remaining_invoices if inv["invoice"] not in processed_invoices]
-
-    # Strategy 3: Create amount-optimized batches for remaining invoices
-    amount_batches = create_amount_optimized_batches(remaining_invoices, config)
-    batch_groups.extend(amount_batches)
-
-    frappe.logger().info(f"Created {len(batch_groups)} optimal batch groups")
-    return batch_groups
-
-
-def create_priority_batches(priority_invoices, config):
-    """Create batches for high-priority invoices"""
-    batches = []
-    current_batch = []
-    current_amount = 0
-
-    for invoice in sorted(priority_invoices, key=lambda x: flt(x["amount"]), reverse=True):
-        invoice_amount = flt(invoice["amount"])
-
-        # Check if adding this invoice would exceed limits
-        if (
-            len(current_batch) >= config["max_invoices_per_batch"]
-            or current_amount + invoice_amount > config["max_amount_per_batch"]
-        ):
-            if len(current_batch) >= config["min_invoices_per_batch"]:
-                batches.append(current_batch)
-            current_batch = []
-            current_amount = 0
-
-        current_batch.append(invoice)
-        current_amount += invoice_amount
-
-    # Add final batch if it meets minimum requirements
-    if len(current_batch) >= config["min_invoices_per_batch"]:
-        batches.append(current_batch)
-
-    return batches
-
-
-def create_customer_consolidated_batches(invoices, config):
-    """Create batches that consolidate invoices by customer when beneficial"""
-    batches = []
-    customer_groups = defaultdict(list)
-
-    # Group by customer
-    for invoice in invoices:
-        customer_groups[invoice["customer"]].append(invoice)
-
-    # Process customers with multiple invoices first
-    multi_invoice_customers = {k: v for k, v in customer_groups.items() if len(v) > 1}
-    # single_invoice_customers = {k: v for k, v in customer_groups.items() if len(v) == 1}  # Unused
-
-    current_batch = []
-    current_amount = 0
-    processed_customers = set()
-
-    # Process multi-invoice customers
-    for customer, customer_invoices in multi_invoice_customers.items():
-        customer_total = sum(flt(inv["amount"]) for inv in customer_invoices)
-
-        # If customer's invoices alone make a good batch
-        if (
-            len(customer_invoices) >= config["min_invoices_per_batch"]
-            and customer_total <= config["max_amount_per_batch"]
-        ):
-            batches.append(customer_invoices)
-            processed_customers.add(customer)
-        else:
-            # Try to fit customer invoices in current batch
-            if (
-                len(current_batch) + len(customer_invoices) <= config["max_invoices_per_batch"]
-                and current_amount + customer_total <= config["max_amount_per_batch"]
-            ):
-                current_batch.extend(customer_invoices)
-                current_amount += customer_total
-                processed_customers.add(customer)
-
-    # Add current batch if it's substantial
-    if len(current_batch) >= config["min_invoices_per_batch"]:
-        batches.append(current_batch)
-
-    # Process remaining invoices
-    remaining_invoices = []
-    for customer, customer_invoices in customer_groups.items():
-        if customer not in processed_customers:
-            remaining_invoices.extend(customer_invoices)
-
-    # Create additional batches from remaining invoices
-    if remaining_invoices:
-        additional_batches = create_amount_optimized_batches(remaining_invoices, config)
-        batches.extend(additional_batches)
-
-    return batches
-
-
-def create_amount_optimized_batches(invoices, config):
-    """Create batches optimized for amount distribution and risk"""
-    batches = []
+    """
+    Create optimal groupings of invoices for batching
 
-    # Sort invoices by amount (mix high and low for balanced risk)
-    sorted_invoices = sorted(invoices, key=lambda x: flt(x["amount"]), reverse=True)
+    Returns:
+        PackingResult with the invoice groups and packing statistics
+    """
+    invoices = [invoice for category in analysis["by_amount"].values() for invoice in category]
+    attach_sequence_types(invoices)
 
-    current_batch = []
-    current_amount = 0
+    packing = pack_invoices(invoices, config)
 
-    for invoice in sorted_invoices:
-        invoice_amount = flt(invoice["amount"])
+    frappe.logger().info(f"Created {len(packing.batches)} optimal batch groups: {packing.report}")
+    return packing
 
-        # Check batch limits
-        if (
-            len(current_batch) >= config["max_invoices_per_batch"]
-            or current_amount + invoice_amount > config["max_amount_per_batch"]
-        ):
-            if len(current_batch) >= config["min_invoices_per_batch"]:
-                batches.append(current_batch)
-            current_batch = []
-            current_amount = 0
 
-        current_batch.append(invoice)
-        current_amount += invoice_amount
+def attach_sequence_types(invoices):
+    """
+    Set the expected sequence type (FRST/RCUR) on each invoice row
 
-        # Create batch if we hit the preferred size
-        if len(current_batch) >= config["preferred_batch_size"]:
-            batches.append(current_batch)
-            current_batch = []
-            current_amount = 0
+    Uses the same rule as get_mandate_sequence_type (FRST until the mandate
+    has a collected usage after its sign date), for all mandates in one query
+    per chunk instead of per invoice.
+    """
+    mandates = sorted({invoice["mandate"] for invoice in invoices if invoice.get("mandate")})
+    recurring = set()
 
-    # Add final batch if it meets requirements
-    if len(current_batch) >= config["min_invoices_per_batch"]:
-        batches.append(current_batch)
+    for i in range(0, len(mandates), 1000):
+        rows = frappe.db.sql(
+            """
+            SELECT sm.name, sm.sign_date, MAX(smu.usage_date) as last_collected
+            FROM `tabSEPA Mandate` sm
+            LEFT JOIN `tabSEPA Mandate Usage` smu ON smu.parent = sm.name AND smu.status = 'Collected'
+            WHERE sm.name IN %(mandates)s
+            GROUP BY sm.name, sm.sign_date
+        """,
+            {"mandates": mandates[i : i + 1000]},
+            as_dict=True,
+        )
+        recurring.update(
+            row.name
+            for row in rows
+            if row.last_collected
+            and not (row.sign_date and getdate(row.sign_date) > getdate(row.last_collected))
+        )
 
-    return batches
+    for invoice in invoices:
+        invoice["sequence_type"] = "RCUR" if invoice.get("mandate") in recurring else "FRST"
 
 
 def create_dd_batch_document(batch_invoices, target_date, batch_number, config):
@@ -740,25 +655,41 @@ def calculate_efficiency_score(avg_batch_size, target_size, risk_dist, batch_cou
 @standard_api()
 @require_sepa_permission(SEPAPermissionLevel.READ, SEPAOperation.BATCH_VALIDATE)
 @frappe.whitelist()
-def get_batching_preview(config=None):
-    """Preview what batches would be created without actually creating them"""
+def get_batching_preview(config=None, summary_only=False, start=0, page_length=DEFAULT_PAGE_LENGTH):
+    """
+    Preview what batches would be created without actually creating them
+
+    Counts, totals and the FRST/RCUR split per posting date are aggregated by
+    the database. Unless summary_only is set, the eligible invoices are packed
+    into batches from a projection of the columns packing needs, and one page
+    of the resulting batches is returned.
+    """
 
     batch_config = DEFAULT_CONFIG.copy()
     if config:
-        batch_config.update(config)
+        batch_config.update(frappe.parse_json(config))
 
-    # Get eligible invoices
-    eligible_invoices = get_eligible_invoices_for_batching()
+    summary = get_eligible_invoice_summary()
 
-    if not eligible_invoices:
-        return {"success": True, "message": "No eligible invoices found", "preview": []}
+    if not summary["count"]:
+        return {"success": True, "message": "No eligible invoices found", "preview": [], "batch_count": 0}
 
-    # Analyze and create preview
-    invoice_analysis = analyze_invoices_for_optimization(eligible_invoices)
-    batch_groups = create_optimal_batch_groups(invoice_analysis, batch_config)
+    result = {
+        "success": True,
+        "eligible_invoices": summary["count"],
+        "total_amount": summary["total_amount"],
+        "by_date": summary["by_date"],
+        "sequence_types": summary["sequence_types"],
+        "config_used": batch_config,
+    }
+    if cint(summary_only):
+        return result
+
+    packing = pack_invoices(get_invoices_for_packing(), batch_config)
+    start, page_length = page_bounds(start, page_length)
 
     preview = []
-    for i, group in enumerate(batch_groups):
+    for i, group in enumerate(packing.batches[start : start + page_length], start):
         group_total = sum(flt(inv["amount"]) for inv in group)
         preview.append(
             {
@@ -770,20 +701,73 @@ def get_batching_preview(config=None):
                 else "Medium"
                 if group_total > 2000
                 else "Low",
-                "customers": list(set(inv["customer"] for inv in group)),
+                "customer_count": len(set(inv["customer"] for inv in group)),
                 "sample_invoices": [inv["invoice"] for inv in group[:3]],  # Show first 3
             }
         )
 
+    result.update(
+        {
+            "batch_count": len(packing.batches),
+            "start": start,
+            "page_length": page_length,
+            "preview": preview,
+            "packing": packing.report,
+        }
+    )
+    return result
+
+
+def get_eligible_invoice_summary():
+    """Count, total and FRST/RCUR split per posting date of the invoices eligible for batching"""
+    groups = frappe.db.sql(
+        f"""
+        SELECT
+            si.posting_date AS date,
+            {ELIGIBLE_SEQUENCE_TYPE} AS sequence_type,
+            COUNT(*) AS count,
+            SUM(si.grand_total) AS total_amount
+        {ELIGIBLE_INVOICE_CONDITIONS}
+        GROUP BY si.posting_date, sequence_type
+        ORDER BY si.posting_date
+    """,
+        as_dict=True,
+    )
+
     return {
-        "success": True,
-        "eligible_invoices": len(eligible_invoices),
-        "total_amount": sum(flt(inv["amount"]) for inv in eligible_invoices),
-        "preview": preview,
-        "config_used": batch_config,
+        "count": sum(cint(group["count"]) for group in groups),
+        "total_amount": sum(flt(group["total_amount"]) for group in groups),
+        "by_date": summarize_by_date(groups),
+        "sequence_types": summarize_sequence_types(groups),
     }
 
 
+def get_invoices_for_packing():
+    """
+    The eligible invoices with only the columns batch packing reads
+
+    The member and membership status checks of
+    validate_member_eligibility_for_billing are part of
+    ELIGIBLE_INVOICE_CONDITIONS, and the sequence type is computed by the
+    same query, so no per-invoice work is left in Python.
+    """
+    return frappe.db.sql(
+        f"""
+        SELECT
+            si.name as invoice,
+            si.customer,
+            si.grand_total as amount,
+            'Normal' as priority,
+            {ELIGIBLE_SEQUENCE_TYPE} as sequence_type
+        {ELIGIBLE_INVOICE_CONDITIONS}
+        ORDER BY
+            si.posting_date ASC,
+            si.grand_total DESC
+    """,
+        as_dict=True,
+    )
+
+
 @critical_api()
 @require_sepa_permission(SEPAPermissionLevel.ADMIN, SEPAOperation.BATCH_CREATE)
 @frappe.whitelist()
@@ -82,6 +82,7 @@ from verenigingen.verenigingen_payments.api.sepa_duplicate_prevention import (
     release_processing_lock,
     validate_batch_mandates,
 )
+from verenigingen.verenigingen_payments.utils.sepa_mandate_health import record_mandate_returns
 
 # ========================
 # PHASE 1: CONSERVATIVE APPROACH
@@ -520,10 +521,24 @@ def process_sepa_return_file(file_content, file_type="csv"):
             return {"success": False, "error": "Unsupported file type"}
 
         processed_returns = []
+        mandate_returns = []
 
         for return_item in return_items:
             result = process_individual_return(return_item)
             processed_returns.append(result)
+            if result.get("status") == "processed":
+                mandate_returns.append(
+                    {
+                        "invoice": result["invoice"],
+                        "reason": return_item.get("return_code") or return_item.get("return_reason"),
+                    }
+                )
+
+        # Mark the mandate usages as returned and rescore their mandates in one pass
+        try:
+            record_mandate_returns(mandate_returns)
+        except Exception as e:
+            frappe.log_error(f"Error updating mandate health for returns: {str(e)}", "Mandate Health")
 
         return {
             "success": True,
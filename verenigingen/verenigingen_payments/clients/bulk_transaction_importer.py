@@ -8,7 +8,10 @@ from typing import Dict, List, Optional
 
 import frappe
 from frappe import _
-from frappe.utils import formatdate, getdate
+from frappe.utils import flt, formatdate, getdate
+
+from verenigingen.utils.iban_lookup import lookup_active_mandates_by_iban
+from verenigingen.utils.validation.iban_validator import normalize_iban
 
 from ..core.compliance.audit_trail import AuditEventType, AuditSeverity
 from ..core.compliance.audit_trail import ImmutableAuditTrail as AuditTrail
@@ -47,6 +50,10 @@ class BulkTransactionImporter(MollieBaseClient):
         self.warnings = []
         self.imported_transactions = []
 
+        # Per-import lookups shared by every page
+        self._mollie_fields_validated = False
+        self._member_by_iban = {}
+
     def import_transactions(
         self,
         from_date: datetime,
@@ -54,6 +61,7 @@ class BulkTransactionImporter(MollieBaseClient):
         import_strategy: str = "hybrid",
         company: Optional[str] = None,
         bank_account: Optional[str] = None,
+        resume_from: Optional[str] = None,
     ) -> Dict:
         """
         Import transactions for a date range using specified strategy
@@ -64,6 +72,8 @@ class BulkTransactionImporter(MollieBaseClient):
             import_strategy: "settlements", "payments", or "hybrid"
             company: Company to import for
             bank_account: Bank account to link transactions to
+            resume_from: Payments ``from`` cursor of an interrupted import
+                (its ``payments_resume_cursor`` result)
 
         Returns:
             Dict with import results
@@ -128,7 +138,10 @@ class BulkTransactionImporter(MollieBaseClient):
 
             if import_strategy in ["payments", "hybrid"]:
                 # Import individual payment data
-                payment_results = self._import_payment_data(from_date, to_date, company, bank_account)
+                payment_results = self._import_payment_data(
+                    from_date, to_date, company, bank_account, resume_from=resume_from
+                )
+                results["payments_resume_cursor"] = payment_results.get("resume_cursor")
                 results["transactions"]["payments_imported"] = payment_results.get("imported", 0)
                 results["transactions"]["duplicates_skipped"] += payment_results.get("duplicates_skipped", 0)
 
@@ -206,7 +219,15 @@ class BulkTransactionImporter(MollieBaseClient):
 
             frappe.logger().info(f"Found {len(settlements)} settlements for bulk import")
 
+            # One query for every settlement that was imported before
+            existing_settlements = self._find_existing_settlement_ids(settlements)
+            company, bank_account = self._resolve_import_accounts(company, bank_account)
+
             for settlement in settlements:
+                if settlement.get("id") in existing_settlements:
+                    results["skipped"] += 1
+                    continue
+
                 try:
                     # Process each settlement
                     settlement_result = self._process_settlement_for_import(settlement, company, bank_account)
@@ -233,20 +254,33 @@ class BulkTransactionImporter(MollieBaseClient):
         to_date: datetime,
         company: Optional[str] = None,
         bank_account: Optional[str] = None,
+        resume_from: Optional[str] = None,
     ) -> Dict:
         """
         Import individual payment data for detailed transaction records
 
+        Payments are streamed page by page from the Mollie API; each page is
+        processed and committed while the next one is fetched (up to the page
+        that reaches from_date), so memory stays bounded by the page size. When the import stops early, ``resume_cursor``
+        holds the cursor of the first unprocessed page.
+
         Args:
             from_date: Start date
             to_date: End date
             company: Company to import for
             bank_account: Bank account to link to
+            resume_from: ``from`` cursor to resume an interrupted import
 
         Returns:
             Dict with payment import results
         """
-        results = {"imported": 0, "duplicates_skipped": 0, "errors": [], "warnings": []}
+        results = {
+            "imported": 0,
+            "duplicates_skipped": 0,
+            "errors": [],
+            "warnings": [],
+            "resume_cursor": resume_from,
+        }
 
         try:
             # Convert naive datetime objects to timezone-aware (UTC) for proper comparison
@@ -265,46 +299,47 @@ class BulkTransactionImporter(MollieBaseClient):
             else:
                 to_date_tz = to_date
 
-            # Get payments for the date range
-            payments = self.payments_client.list_payments(from_date=from_date_tz, to_date=to_date_tz)
+            # Stream payments for the date range, one API page per batch
+            pages = self.payments_client.iter_payment_pages(
+                from_date=from_date_tz, to_date=to_date_tz, start_from=resume_from
+            )
 
-            frappe.logger().info(f"Found {len(payments)} payments for bulk import")
+            # Company and bank account are resolved once, not per payment
+            company, bank_account = self._resolve_import_accounts(company, bank_account)
 
-            # Process in batches for large datasets
-            batch_size = 100  # Process 100 transactions at a time
-            total_batches = (len(payments) + batch_size - 1) // batch_size
+            for page in pages:
+                frappe.logger().info(f"Processing page {page.page_number} ({len(page.items)} payments)")
 
-            for batch_num in range(total_batches):
-                start_idx = batch_num * batch_size
-                end_idx = min((batch_num + 1) * batch_size, len(payments))
-                batch_payments = payments[start_idx:end_idx]
+                # Build duplicate-check rows for the whole page; malformed payments are reported below
+                page_transactions = {}
+                batch_payments = []
+                for payment in page.items:
+                    try:
+                        page_transactions[payment.get("id")] = self._payment_transaction_data(payment)
+                        batch_payments.append(payment)
+                    except (ValueError, TypeError) as e:
+                        error_msg = (
+                            f"Data validation error for payment {payment.get('id', 'unknown')}: {str(e)}"
+                        )
+                        results["errors"].append(error_msg)
+                        frappe.log_error(error_msg, "Payment Data Validation")
 
-                frappe.logger().info(
-                    f"Processing batch {batch_num + 1}/{total_batches} ({len(batch_payments)} payments)"
+                # Enhanced duplicate detection and member matching: one query each per page
+                duplicates = self._find_duplicate_payment_ids(list(page_transactions.values()))
+                self._prefetch_members_by_iban(
+                    (payment.get("details") or {}).get("consumerAccount") for payment in batch_payments
                 )
 
                 for payment in batch_payments:
                     try:
-                        # Create transaction data for duplicate checking
-                        transaction_data = {
-                            "custom_mollie_payment_id": payment.get("id"),
-                            "date": datetime.fromisoformat(
-                                payment.get("createdAt", "").replace("Z", "+00:00")
-                            ).date(),
-                            "deposit": float(payment.get("amount", {}).get("value", "0"))
-                            if float(payment.get("amount", {}).get("value", "0")) > 0
-                            else 0,
-                            "withdrawal": abs(float(payment.get("amount", {}).get("value", "0")))
-                            if float(payment.get("amount", {}).get("value", "0")) < 0
-                            else 0,
-                            "reference_number": payment.get("id"),
-                        }
-
-                        # Enhanced duplicate detection
-                        if self._validate_duplicate_transaction(transaction_data):
+                        payment_id = payment.get("id")
+                        if payment_id in duplicates:
                             results["duplicates_skipped"] += 1
                             continue
 
+                        # Guard against the same payment appearing twice on a page
+                        duplicates.add(payment_id)
+
                         # Process payment for import
                         payment_result = self._process_payment_for_import(payment, company, bank_account)
 
@@ -331,9 +366,10 @@ class BulkTransactionImporter(MollieBaseClient):
                         results["errors"].append(error_msg)
                         frappe.log_error(error_msg, "Bulk Payment Import")
 
-                # Commit batch to database
+                # Commit page to database, then advance the resume point past it
                 frappe.db.commit()
-                frappe.logger().info(f"Completed batch {batch_num + 1}/{total_batches}")
+                results["resume_cursor"] = page.next_cursor
+                frappe.logger().info(f"Completed page {page.page_number}")
 
         except (ConnectionError, TimeoutError) as e:
             results["errors"].append(f"Network error during payment import: {str(e)}")
@@ -464,18 +500,7 @@ class BulkTransactionImporter(MollieBaseClient):
         """
         try:
             # Get default company and bank account if not provided
-            if not company:
-                company = frappe.defaults.get_user_default("Company") or frappe.db.get_single_value(
-                    "Global Defaults", "default_company"
-                )
-
-            if not bank_account:
-                # Get first active bank account for the company
-                bank_account = frappe.db.get_value(
-                    "Bank Account", {"company": company, "is_default": 1}, "name"
-                )
-                if not bank_account:
-                    bank_account = frappe.db.get_value("Bank Account", {"company": company}, "name")
+            company, bank_account = self._resolve_import_accounts(company, bank_account)
 
             if not bank_account:
                 frappe.logger().warning("No bank account found for settlement import")
@@ -548,18 +573,7 @@ class BulkTransactionImporter(MollieBaseClient):
         """
         try:
             # Get default company and bank account if not provided
-            if not company:
-                company = frappe.defaults.get_user_default("Company") or frappe.db.get_single_value(
-                    "Global Defaults", "default_company"
-                )
-
-            if not bank_account:
-                # Get first active bank account for the company
-                bank_account = frappe.db.get_value(
-                    "Bank Account", {"company": company, "is_default": 1}, "name"
-                )
-                if not bank_account:
-                    bank_account = frappe.db.get_value("Bank Account", {"company": company}, "name")
+            company, bank_account = self._resolve_import_accounts(company, bank_account)
 
             if not bank_account:
                 frappe.logger().warning("No bank account found for payment import")
@@ -682,6 +696,136 @@ class BulkTransactionImporter(MollieBaseClient):
             frappe.logger().warning(f"Error checking for existing payment: {str(e)}")
             return False
 
+    def _payment_transaction_data(self, payment: Dict) -> Dict:
+        """Duplicate-check fields of a Mollie payment, as compared by _validate_duplicate_transaction"""
+        amount = float(payment.get("amount", {}).get("value", "0"))
+        return {
+            "custom_mollie_payment_id": payment.get("id"),
+            "date": datetime.fromisoformat(payment.get("createdAt", "").replace("Z", "+00:00")).date(),
+            "deposit": amount if amount > 0 else 0,
+            "withdrawal": abs(amount) if amount < 0 else 0,
+            "reference_number": payment.get("id"),
+        }
+
+    def _find_duplicate_payment_ids(self, transactions: List[Dict]) -> set:
+        """
+        Bulk form of _validate_duplicate_transaction for one page of payments
+
+        Resolves both the Mollie payment ID check and the amount/date/reference
+        check with a single query.
+
+        Args:
+            transactions: Rows built by _payment_transaction_data
+
+        Returns:
+            Set of Mollie payment IDs that already exist as Bank Transactions
+        """
+        payment_ids = tuple(
+            {t["custom_mollie_payment_id"] for t in transactions if t.get("custom_mollie_payment_id")}
+        )
+        references = tuple({t["reference_number"] for t in transactions if t.get("reference_number")})
+        if not payment_ids and not references:
+            return set()
+
+        try:
+            existing = frappe.db.sql(
+                """
+                SELECT name, custom_mollie_payment_id, reference_number, date, deposit, withdrawal, docstatus
+                FROM `tabBank Transaction`
+                WHERE custom_mollie_payment_id IN %(payment_ids)s
+                    OR reference_number IN %(references)s
+            """,
+                {"payment_ids": payment_ids or ("",), "references": references or ("",)},
+                as_dict=True,
+            )
+        except Exception as e:
+            frappe.log_error(f"Error in bulk duplicate validation: {str(e)}", "Duplicate Detection")
+            # If validation fails, assume no duplicate to avoid blocking imports
+            return set()
+
+        existing_payment_ids = {
+            row.custom_mollie_payment_id for row in existing if row.custom_mollie_payment_id
+        }
+        by_reference = {}
+        for row in existing:
+            if row.reference_number and row.docstatus != 2:
+                by_reference.setdefault(row.reference_number, []).append(row)
+
+        duplicates = set()
+        for transaction in transactions:
+            payment_id = transaction.get("custom_mollie_payment_id")
+            if payment_id in existing_payment_ids:
+                duplicates.add(payment_id)
+                continue
+
+            # Secondary check: amount, date, and reference combination (not cancelled)
+            deposit = transaction.get("deposit")
+            withdrawal = transaction.get("withdrawal")
+            if not (deposit or withdrawal) or not transaction.get("date"):
+                continue
+
+            for row in by_reference.get(transaction.get("reference_number"), []):
+                if (
+                    getdate(row.date) == transaction["date"]
+                    and (not deposit or flt(row.deposit, 2) == flt(deposit, 2))
+                    and (not withdrawal or flt(row.withdrawal, 2) == flt(withdrawal, 2))
+                ):
+                    frappe.logger().info(f"Duplicate transaction found: {row.name}")
+                    duplicates.add(payment_id)
+                    break
+
+        return duplicates
+
+    def _find_existing_settlement_ids(self, settlements: List[Dict]) -> set:
+        """Mollie settlement IDs that already have a Bank Transaction, in one query"""
+        settlement_ids = tuple({s.get("id") for s in settlements if s.get("id")})
+        if not settlement_ids:
+            return set()
+
+        try:
+            return set(
+                frappe.db.sql_list(
+                    """
+                    SELECT DISTINCT custom_mollie_settlement_id
+                    FROM `tabBank Transaction`
+                    WHERE custom_mollie_settlement_id IN %(ids)s AND docstatus != 2
+                """,
+                    {"ids": settlement_ids},
+                )
+            )
+        except Exception as e:
+            frappe.log_error(f"Error checking existing settlements: {str(e)}", "Duplicate Detection")
+            return set()
+
+    def _prefetch_members_by_iban(self, accounts):
+        """Resolve Active SEPA Mandate members for a page of consumer IBANs in one indexed query"""
+        ibans = {
+            normalize_iban(account) for account in accounts if account and self._validate_iban_format(account)
+        } - set(self._member_by_iban)
+        if not ibans:
+            return
+
+        matches = lookup_active_mandates_by_iban(ibans)
+
+        for iban in ibans:
+            match = matches.get(iban)
+            self._member_by_iban[iban] = match["member"] if match else None
+
+    def _resolve_import_accounts(self, company: Optional[str], bank_account: Optional[str]):
+        """Default company and bank account for imported Bank Transactions"""
+        if not company:
+            company = frappe.defaults.get_user_default("Company") or frappe.db.get_single_value(
+                "Global Defaults", "default_company"
+            )
+
+        if not bank_account:
+            # Get first active bank account for the company
+            bank_account = frappe.db.get_value("Bank Account", {"company": company, "is_default": 1}, "name")
+            if not bank_account:
+                bank_account = frappe.db.get_value("Bank Account", {"company": company}, "name")
+
+        return company, bank_account
+
     def _validate_mollie_custom_fields(self):
         """
         Validate that required Mollie custom fields exist on Bank Transaction DocType
@@ -701,6 +845,9 @@ class BulkTransactionImporter(MollieBaseClient):
             "custom_import_batch_id",
         ]
 
+        if self._mollie_fields_validated:
+            return
+
         # Get Bank Transaction DocType meta
         try:
             bank_transaction_meta = frappe.get_meta("Bank Transaction")
@@ -718,6 +865,8 @@ class BulkTransactionImporter(MollieBaseClient):
                 frappe.log_error(error_msg, "Mollie Bulk Import Validation")
                 raise frappe.ValidationError(error_msg)
 
+            self._mollie_fields_validated = True
+
         except Exception as e:
             if "ValidationError" in str(type(e)):
                 raise  # Re-raise validation errors
@@ -1147,23 +1296,16 @@ class BulkTransactionImporter(MollieBaseClient):
             # First try to match by IBAN in SEPA Mandates
             if consumer_iban and self._validate_iban_format(consumer_iban):
                 # Clean and standardize IBAN format
-                clean_iban = consumer_iban.replace(" ", "").upper()
+                clean_iban = normalize_iban(consumer_iban)
 
-                # Look for SEPA Mandate with matching IBAN (secure SQL query)
-                sepa_mandates = frappe.db.sql(
-                    """
-                    SELECT member, iban
-                    FROM `tabSEPA Mandate`
-                    WHERE UPPER(REPLACE(iban, ' ', '')) = %s AND status = %s
-                    LIMIT 1
-                """,
-                    (clean_iban, "Active"),
-                    as_dict=True,
-                )
+                # Page-level prefetch usually resolved this IBAN already
+                if clean_iban not in self._member_by_iban:
+                    self._prefetch_members_by_iban([consumer_iban])
+                iban_member = self._member_by_iban.get(clean_iban)
 
-                if sepa_mandates and sepa_mandates[0].member:
-                    frappe.logger().info(f"Member matched by IBAN: {sepa_mandates[0].member}")
-                    return sepa_mandates[0].member
+                if iban_member:
+                    frappe.logger().info(f"Member matched by IBAN: {iban_member}")
+                    return iban_member
 
             # Second, try to match by consumer name if provided
             if consumer_name:
@@ -5,12 +5,12 @@ Client for managing and monitoring payments
 
 from datetime import datetime, timedelta, timezone
 from decimal import Decimal
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 
 import frappe
 from frappe import _
 
-from ..core.mollie_base_client import MollieBaseClient
+from ..core.mollie_base_client import MollieBaseClient, MolliePage
 
 
 class PaymentsClient(MollieBaseClient):
@@ -42,56 +42,89 @@ class PaymentsClient(MollieBaseClient):
         Returns:
             List of payment dictionaries
         """
-        params = {"limit": limit}
-
         # Note: Mollie Payments API doesn't support date filtering via from/to parameters
-        # We get all payments and filter in memory
-        if status:
-            params["status"] = status
+        # We stream pages and filter in memory, stopping once past from_date
+        try:
+            payments = [
+                payment
+                for page in self.iter_payment_pages(from_date=from_date, to_date=to_date, status=status)
+                for payment in page.items
+            ]
+            frappe.logger().info(f"Retrieved {len(payments)} payments from API for the requested range")
+            return payments
+        except Exception as e:
+            frappe.logger().error(f"Failed to list payments: {e}")
+            return []
+
+    def iter_payment_pages(
+        self,
+        from_date: Optional[datetime] = None,
+        to_date: Optional[datetime] = None,
+        status: Optional[str] = None,
+        start_from: Optional[str] = None,
+    ) -> Iterator[MolliePage]:
+        """
+        Stream payments page by page, filtered to a date range
 
+        Mollie returns payments newest first, so iteration stops at the first
+        page that reaches past ``from_date`` instead of walking the whole
+        account history. Until then each page's oldest payment is still in
+        range, so the next page is prefetched while the caller processes it.
+
+        Args:
+            from_date: Start date for filtering
+            to_date: End date for filtering
+            status: Payment status filter
+            start_from: ``from`` cursor to resume from
+
+        Yields:
+            MolliePage objects whose items fall inside the date range; pages
+            may be empty when every payment on them is newer than ``to_date``
+        """
+        from ..utils.timezone_utils import ensure_timezone_aware
+
+        from_date = ensure_timezone_aware(from_date) if from_date else None
+        to_date = ensure_timezone_aware(to_date) if to_date else None
+
+        params = {"status": status} if status else {}
+
+        def reaches_start(payments: List[Dict]) -> bool:
+            return from_date is not None and any(
+                payment_date and payment_date < from_date for payment_date in map(_created_at, payments)
+            )
+
+        pages = self.iter_pages("payments", params, start_from=start_from, is_last=reaches_start)
         try:
-            response = self.get("payments", params=params, paginated=True)
-            frappe.logger().info(f"Retrieved {len(response)} payments from API")
-
-            # Apply date filtering in memory if requested
-            if from_date or to_date:
-                filtered_payments = []
-
-                # Ensure filter dates are timezone-aware for comparison
-                from ..utils.timezone_utils import ensure_timezone_aware
-
-                if from_date:
-                    from_date = ensure_timezone_aware(from_date)
-                if to_date:
-                    to_date = ensure_timezone_aware(to_date)
-
-                for payment in response:
-                    payment_date = None
-
-                    # Try to get payment creation date
-                    if payment.get("createdAt"):
-                        try:
-                            payment_date = datetime.fromisoformat(payment["createdAt"].replace("Z", "+00:00"))
-                        except (ValueError, TypeError) as e:
-                            frappe.logger().warning(f"Failed to parse payment createdAt date: {e}")
-                            continue
+            for page in pages:
+                in_range = []
+                reached_start = False
+
+                for payment in page.items:
+                    payment_date = _created_at(payment)
+                    if payment.get("createdAt") and payment_date is None:
+                        frappe.logger().warning(f"Failed to parse payment createdAt: {payment['createdAt']}")
+                        continue
 
                     if payment_date:
-                        # Apply date filter using timezone-aware comparison
                         if from_date and payment_date < from_date:
+                            reached_start = True
                             continue
                         if to_date and payment_date > to_date:
                             continue
 
-                    filtered_payments.append(payment)
+                    in_range.append(payment)
 
-                frappe.logger().info(f"Filtered to {len(filtered_payments)} payments based on date range")
-                return filtered_payments
+                yield MolliePage(
+                    items=in_range,
+                    cursor=page.cursor,
+                    next_cursor=None if reached_start else page.next_cursor,
+                    page_number=page.page_number,
+                )
 
-            return response
-        except Exception as e:
-            frappe.logger().error(f"Failed to list payments: {e}")
-            return []
+                if reached_start:
+                    break
+        finally:
+            pages.close()
 
     def get_payments_for_period(
         self, start_date: datetime, end_date: Optional[datetime] = None
@@ -165,3 +198,13 @@ class PaymentsClient(MollieBaseClient):
             status_breakdown[status] = status_breakdown.get(status, 0) + 1
 
         return status_breakdown
+
+
+def _created_at(payment: Dict) -> Optional[datetime]:
+    """Creation time of a payment, None when missing or unparseable"""
+    if not payment.get("createdAt"):
+        return None
+    try:
+        return datetime.fromisoformat(payment["createdAt"].replace("Z", "+00:00"))
+    except (ValueError, TypeError):
+        return None
@@ -47,6 +47,7 @@ class ResilientHTTPClient:
         max_retries: int = 3,
         rate_limit: int = 10,
         circuit_breaker_threshold: int = 5,
+        rate_limit_key: Optional[str] = None,
     ):
         """
         Initialize resilient HTTP client
@@ -57,6 +58,7 @@ class ResilientHTTPClient:
             max_retries: Maximum retry attempts
             rate_limit: Requests per second limit
             circuit_breaker_threshold: Failure threshold for circuit breaker
+            rate_limit_key: Share the rate limit across workers through Redis under this name
         """
         self.base_url = base_url
         self.timeout = timeout
@@ -74,7 +76,7 @@ class ResilientHTTPClient:
         )
 
         self.rate_limiter = AdaptiveRateLimiter(
-            initial_max_tokens=rate_limit * 2, initial_refill_rate=rate_limit
+            initial_max_tokens=rate_limit * 2, initial_refill_rate=rate_limit, distributed_key=rate_limit_key
         )
 
         self.retry_policy = SmartRetryPolicy(retry_budget=max_retries * 10)
@@ -8,13 +8,17 @@ Features:
 - Response validation
 - Error handling
 - API versioning
+- Streaming pagination with resumable cursors
 """
 
 import hashlib
 import hmac
 import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 import frappe
 import requests
@@ -42,6 +46,36 @@ class MollieAPIError(Exception):
         self.details = details or {}
 
 
+@dataclass(frozen=True)
+class MolliePage:
+    """
+    One page of a Mollie collection
+
+    ``cursor`` is the ``from`` value that produced this page (None for the first
+    page) and ``next_cursor`` the one for the following page (None on the last
+    page). Store ``next_cursor`` after a page has been processed to resume an
+    interrupted import from exactly that point.
+    """
+
+    items: List[Dict[str, Any]]
+    cursor: Optional[str]
+    next_cursor: Optional[str]
+    page_number: int
+
+
+def _init_prefetch_thread(site: str):
+    """Give the prefetch thread its own site context for logging and error records"""
+    frappe.init(site=site)
+    frappe.connect()
+
+
+def _close_prefetch_thread():
+    try:
+        frappe.db.commit()
+    finally:
+        frappe.destroy()
+
+
 class MollieBaseClient:
     """
     Base client for Mollie backend API operations
@@ -60,6 +94,9 @@ class MollieBaseClient:
     # API versions
     API_VERSION = "v2"
 
+    # Largest page Mollie returns for collection endpoints
+    PAGE_SIZE = 250
+
     def __init__(self, api_key: Optional[str] = None, test_mode: bool = False, use_backend_api: bool = True):
         """
         Initialize Mollie base client
@@ -90,6 +127,8 @@ class MollieBaseClient:
             max_retries=3,
             rate_limit=10,  # Mollie rate limit
             circuit_breaker_threshold=5,
+            # One bucket per API key mode, shared by all workers
+            rate_limit_key=f"mollie_api:{'test' if test_mode else 'live'}",
         )
 
         self.security_manager = MollieSecurityManager(self.mollie_settings)
@@ -236,6 +275,9 @@ class MollieBaseClient:
         """
         Handle paginated API requests
 
+        Collects every page into one list. Prefer iter_pages for large
+        collections, which keeps only one page in memory at a time.
+
         Args:
             method: HTTP method
             endpoint: API endpoint
@@ -246,59 +288,148 @@ class MollieBaseClient:
             List of all items from paginated response
         """
         all_items = []
-        params = params or {}
+        for page in self.iter_pages(endpoint, params, method=method, data=data, prefetch=False):
+            all_items.extend(page.items)
+        return all_items
+
+    def iter_pages(
+        self,
+        endpoint: str,
+        params: Optional[Dict[str, Any]] = None,
+        start_from: Optional[str] = None,
+        method: str = "GET",
+        data: Optional[Dict[str, Any]] = None,
+        prefetch: bool = True,
+        is_last: Optional[Callable[[List[Dict[str, Any]]], bool]] = None,
+    ) -> Iterator[MolliePage]:
+        """
+        Stream a paginated collection one page at a time
 
-        # Set initial pagination parameters
-        params["limit"] = 250  # Max limit for Mollie
+        With ``prefetch`` the next page is requested on a background thread while
+        the caller processes the current one, so network and database time
+        overlap. At most two pages are held in memory. ``is_last`` decides from a
+        page's items whether the pages after it are needed at all, so a stream
+        that ends early (e.g. once past a date) never prefetches a page too many.
 
-        while True:
-            # Make request
-            response, status_code = self.http_client.request(
-                method=method, endpoint=endpoint, params=params, json_data=data
-            )
+        Args:
+            endpoint: API endpoint
+            params: Query parameters
+            start_from: ``from`` cursor to resume from (a previous page's next_cursor)
+            method: HTTP method
+            data: Request payload
+            prefetch: Fetch the next page in the background (needs a site context)
+            is_last: Called with each page's items; True stops the stream after
+                that page
 
-            # Debug logging - only log on error or if needed for debugging
-            if status_code >= 400:
-                frappe.log_error(
-                    f"[MOLLIE ERROR] MollieBaseClient._request_paginated: Error response (status {status_code}): {response}",
-                    "Mollie Error",
-                )
+        Yields:
+            MolliePage objects in API order
+        """
+        params = dict(params or {})
+        params["limit"] = self.PAGE_SIZE
 
-            # Validate response
-            self._validate_response(response, status_code)
-
-            # Extract items based on response structure
-            if "_embedded" in response:
-                # Mollie uses _embedded for collections
-                for key in response["_embedded"]:
-                    items = response["_embedded"][key]
-                    if isinstance(items, list):
-                        all_items.extend(items)
-            elif "data" in response and isinstance(response["data"], list):
-                all_items.extend(response["data"])
-            else:
-                # Single item response
-                all_items.append(response)
-                break
-
-            # Check for next page
-            if "_links" in response and "next" in response["_links"] and response["_links"]["next"]:
-                next_url = response["_links"]["next"]["href"]
-                # Extract cursor or from parameter
-                if "from" in next_url:
-                    import re
-
-                    match = re.search(r"from=([^&]+)", next_url)
-                    if match:
-                        params["from"] = match.group(1)
-                    else:
-                        break
-                else:
+        site = getattr(frappe.local, "site", None)
+        executor = None
+        if prefetch and site:
+            executor = ThreadPoolExecutor(max_workers=1, initializer=_init_prefetch_thread, initargs=(site,))
+
+        try:
+            cursor = start_from
+            items, next_cursor = self._fetch_page(method, endpoint, params, data, cursor)
+            page_number = 1
+
+            while True:
+                last = not next_cursor or (is_last is not None and is_last(items))
+                pending = None
+                if not last and executor:
+                    pending = executor.submit(self._fetch_page, method, endpoint, params, data, next_cursor)
+
+                yield MolliePage(items=items, cursor=cursor, next_cursor=next_cursor, page_number=page_number)
+
+                if last:
                     break
-            else:
-                break
 
-        return all_items
+                cursor = next_cursor
+                if pending:
+                    items, next_cursor = pending.result()
+                else:
+                    items, next_cursor = self._fetch_page(method, endpoint, params, data, cursor)
+                page_number += 1
+
+        except requests.RequestException as e:
+            self._handle_request_error(e, method, endpoint)
+        finally:
+            if executor:
+                executor.submit(_close_prefetch_thread)
+                executor.shutdown(wait=True)
+
+    def iter_items(
+        self,
+        endpoint: str,
+        params: Optional[Dict[str, Any]] = None,
+        start_from: Optional[str] = None,
+        prefetch: bool = True,
+    ) -> Iterator[Dict[str, Any]]:
+        """Stream the items of a paginated collection (see iter_pages)"""
+        for page in self.iter_pages(endpoint, params, start_from=start_from, prefetch=prefetch):
+            yield from page.items
+
+    def _fetch_page(
+        self,
+        method: str,
+        endpoint: str,
+        params: Dict[str, Any],
+        data: Optional[Dict[str, Any]],
+        cursor: Optional[str],
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Fetch a single page
+
+        Returns:
+            Tuple of (items, next cursor or None)
+        """
+        page_params = dict(params)
+        if cursor:
+            page_params["from"] = cursor
+
+        response, status_code = self.http_client.request(
+            method=method, endpoint=endpoint, params=page_params, json_data=data
+        )
+
+        # Debug logging - only log on error or if needed for debugging
+        if status_code >= 400:
+            frappe.log_error(
+                f"[MOLLIE ERROR] MollieBaseClient._fetch_page: Error response (status {status_code}): {response}",
+                "Mollie Error",
+            )
+
+        # Validate response
+        self._validate_response(response, status_code)
+
+        # Extract items based on response structure
+        items = []
+        if "_embedded" in response:
+            # Mollie uses _embedded for collections
+            for key in response["_embedded"]:
+                embedded = response["_embedded"][key]
+                if isinstance(embedded, list):
+                    items.extend(embedded)
+        elif "data" in response and isinstance(response["data"], list):
+            items.extend(response["data"])
+        else:
+            # Single item response
+            return [response], None
+
+        return items, self._next_cursor(response)
+
+    @staticmethod
+    def _next_cursor(response: Dict[str, Any]) -> Optional[str]:
+        """Extract the ``from`` cursor of the next page from a collection response"""
+        next_link = (response.get("_links") or {}).get("next")
+        if not next_link:
+            return None
+
+        match = re.search(r"[?&]from=([^&]+)", next_link.get("href", ""))
+        return match.group(1) if match else None
 
     def _validate_request_data(self, endpoint: str, data: Dict[str, Any]):
         """
@@ -457,6 +588,12 @@ class MollieBaseClient:
         """Make GET request"""
         return self.request("GET", endpoint, params=params, paginated=paginated)
 
+    def get_pages(
+        self, endpoint: str, params: Optional[Dict[str, Any]] = None, start_from: Optional[str] = None
+    ) -> Iterator[MolliePage]:
+        """Stream a paginated GET collection page by page"""
+        return self.iter_pages(endpoint, params, start_from=start_from)
+
     def post(self, endpoint: str, data: Dict[str, Any]) -> Any:
         """Make POST request"""
         return self.request("POST", endpoint, data=data)
@@ -7,6 +7,7 @@ Features:
 - Burst capacity handling
 - Per-endpoint rate limiting
 - Adaptive rate adjustment based on API responses
+- Optional Redis-backed buckets shared by all workers
 """
 
 import threading
@@ -18,6 +19,8 @@ from typing import Dict, Optional, Tuple
 import frappe
 from frappe import _
 
+from .redis_token_bucket import RedisTokenBucket
+
 
 class TokenBucketRateLimiter:
     """
@@ -28,9 +31,17 @@ class TokenBucketRateLimiter:
     - Thread-safe token management
     - Configurable refill rates
     - Wait capabilities for token availability
+    - Cluster-wide limits when given a distributed key (falls back to the
+      in-process bucket while Redis is unavailable)
     """
 
-    def __init__(self, max_tokens: int = 300, refill_rate: float = 5.0, refill_period: float = 1.0):
+    def __init__(
+        self,
+        max_tokens: int = 300,
+        refill_rate: float = 5.0,
+        refill_period: float = 1.0,
+        distributed_key: Optional[str] = None,
+    ):
         """
         Initialize token bucket rate limiter
 
@@ -38,6 +49,7 @@ class TokenBucketRateLimiter:
             max_tokens: Maximum tokens in bucket (burst capacity)
             refill_rate: Tokens added per refill period
             refill_period: Seconds between refills
+            distributed_key: Share the bucket through Redis under this name
         """
         self.max_tokens = max_tokens
         self.tokens = max_tokens
@@ -54,6 +66,13 @@ class TokenBucketRateLimiter:
         self.total_denied = 0
         self.total_wait_time = 0.0
 
+        # Shared state across workers
+        self.distributed_bucket = RedisTokenBucket(distributed_key) if distributed_key else None
+
+    @property
+    def refill_per_second(self) -> float:
+        return self.refill_rate / self.refill_period
+
     def acquire(self, tokens: int = 1, wait: bool = False, timeout: float = 30.0) -> bool:
         """
         Acquire tokens for API request
@@ -66,6 +85,11 @@ class TokenBucketRateLimiter:
         Returns:
             bool: True if tokens acquired, False otherwise
         """
+        if self.distributed_bucket is not None:
+            acquired = self._acquire_distributed(tokens, wait, timeout)
+            if acquired is not None:
+                return acquired
+
         with self.lock:
             self.total_requests += 1
 
@@ -86,6 +110,46 @@ class TokenBucketRateLimiter:
             # Wait for tokens
             return self._wait_for_tokens(tokens, timeout)
 
+    def _acquire_distributed(self, tokens: int, wait: bool, timeout: float) -> Optional[bool]:
+        """
+        Acquire tokens from the shared Redis bucket
+
+        Returns:
+            True/False like acquire(), or None when Redis is unavailable
+        """
+        start_time = time.time()
+
+        while True:
+            result = self.distributed_bucket.take(tokens, self.max_tokens, self.refill_per_second)
+            if result is None:
+                return None
+
+            elapsed = time.time() - start_time
+            if result.allowed:
+                with self.lock:
+                    self.total_requests += 1
+                    self.total_granted += 1
+                    self.total_wait_time += elapsed
+                return True
+
+            remaining = timeout - elapsed
+            if not wait or remaining <= 0 or result.retry_after < 0:
+                with self.lock:
+                    self.total_requests += 1
+                    self.total_denied += 1
+                return False
+
+            time.sleep(min(max(result.retry_after, 0.01), remaining))
+
+    def release(self, tokens: int = 1):
+        """Return tokens that were acquired but not used"""
+        if self.distributed_bucket is not None:
+            if self.distributed_bucket.take(-tokens, self.max_tokens, self.refill_per_second) is not None:
+                return
+
+        with self.lock:
+            self.tokens = min(self.max_tokens, self.tokens + tokens)
+
     def wait_for_token(self, timeout: float = 30.0) -> bool:
         """
         Wait for a single token to become available
@@ -148,6 +212,11 @@ class TokenBucketRateLimiter:
         Returns:
             int: Number of available tokens
         """
+        if self.distributed_bucket is not None:
+            result = self.distributed_bucket.take(0, self.max_tokens, self.refill_per_second)
+            if result is not None:
+                return int(result.tokens)
+
         with self.lock:
             self._refill_bucket()
             return int(self.tokens)
@@ -165,6 +234,7 @@ class TokenBucketRateLimiter:
                 "available_tokens": self.get_available_tokens(),
                 "refill_rate": self.refill_rate,
                 "refill_period": self.refill_period,
+                "distributed": self.distributed_bucket is not None,
                 "total_requests": self.total_requests,
                 "total_granted": self.total_granted,
                 "total_denied": self.total_denied,
@@ -176,6 +246,9 @@ class TokenBucketRateLimiter:
 
     def reset(self):
         """Reset rate limiter to initial state"""
+        if self.distributed_bucket is not None:
+            self.distributed_bucket.reset()
+
         with self.lock:
             self.tokens = self.max_tokens
             self.last_refill = time.time()
@@ -201,6 +274,7 @@ class AdaptiveRateLimiter(TokenBucketRateLimiter):
         initial_refill_rate: float = 5.0,
         min_refill_rate: float = 1.0,
         max_refill_rate: float = 10.0,
+        distributed_key: Optional[str] = None,
     ):
         """
         Initialize adaptive rate limiter
@@ -210,8 +284,9 @@ class AdaptiveRateLimiter(TokenBucketRateLimiter):
             initial_refill_rate: Starting refill rate
             min_refill_rate: Minimum refill rate
             max_refill_rate: Maximum refill rate
+            distributed_key: Share the bucket through Redis under this name
         """
-        super().__init__(initial_max_tokens, initial_refill_rate)
+        super().__init__(initial_max_tokens, initial_refill_rate, distributed_key=distributed_key)
 
         self.min_refill_rate = min_refill_rate
         self.max_refill_rate = max_refill_rate
@@ -246,12 +321,19 @@ class AdaptiveRateLimiter(TokenBucketRateLimiter):
             if retry_after:
                 self.retry_after = retry_after
                 # Pause for retry_after duration
-                self.tokens = 0
-                self.last_refill = time.time() + retry_after
+                self._pause(retry_after)
 
             # Reduce rate significantly
             self._decrease_rate()
 
+    def _pause(self, seconds: float):
+        """Stop granting tokens for the given time, in every worker when distributed"""
+        self.tokens = 0
+        self.last_refill = time.time() + seconds
+
+        if self.distributed_bucket is not None:
+            self.distributed_bucket.pause(seconds, self.max_tokens, self.refill_per_second)
+
     def _increase_rate(self):
         """Gradually increase refill rate"""
         new_rate = min(self.max_refill_rate, self.refill_rate * 1.1)
@@ -289,8 +371,7 @@ class AdaptiveRateLimiter(TokenBucketRateLimiter):
             if reset_time > current_time:
                 # Pause until reset
                 with self.lock:
-                    self.tokens = 0
-                    self.last_refill = reset_time
+                    self._pause(reset_time - current_time)
 
         if "Retry-After" in response_headers:
             retry_after = int(response_headers["Retry-After"])
@@ -307,15 +388,20 @@ class EndpointRateLimiter:
     - Priority-based token allocation
     """
 
-    def __init__(self, global_limit: int = 1000):
+    def __init__(self, global_limit: int = 1000, distributed_prefix: Optional[str] = None):
         """
         Initialize endpoint rate limiter
 
         Args:
             global_limit: Total API calls per minute across all endpoints
+            distributed_prefix: Share all buckets through Redis under this prefix
         """
+        self.distributed_prefix = distributed_prefix
         self.global_limiter = TokenBucketRateLimiter(
-            max_tokens=global_limit, refill_rate=global_limit / 60.0, refill_period=1.0  # Per second
+            max_tokens=global_limit,
+            refill_rate=global_limit / 60.0,
+            refill_period=1.0,  # Per second
+            distributed_key=self._distributed_key("global"),
         )
 
         self.endpoint_limiters = {}
@@ -338,6 +424,9 @@ class EndpointRateLimiter:
             "invoices": 4,
         }
 
+    def _distributed_key(self, name: str) -> Optional[str]:
+        return f"{self.distributed_prefix}:{name}" if self.distributed_prefix else None
+
     def acquire(self, endpoint: str, tokens: int = 1, wait: bool = True) -> bool:
         """
         Acquire tokens for endpoint request
@@ -354,7 +443,9 @@ class EndpointRateLimiter:
         if endpoint not in self.endpoint_limiters:
             limit = self.endpoint_limits.get(endpoint, 60)
             self.endpoint_limiters[endpoint] = AdaptiveRateLimiter(
-                initial_max_tokens=limit, initial_refill_rate=limit / 60.0
+                initial_max_tokens=limit,
+                initial_refill_rate=limit / 60.0,
+                distributed_key=self._distributed_key(endpoint),
             )
 
         endpoint_limiter = self.endpoint_limiters[endpoint]
@@ -374,7 +465,7 @@ class EndpointRateLimiter:
         # Check endpoint limit
         if not endpoint_limiter.acquire(tokens, wait=wait):
             # Return global tokens if endpoint fails
-            self.global_limiter.tokens += tokens
+            self.global_limiter.release(tokens)
             return False
 
         return True
@@ -443,5 +534,5 @@ def get_endpoint_rate_limiter() -> EndpointRateLimiter:
     """
     global _endpoint_rate_limiter
     if _endpoint_rate_limiter is None:
-        _endpoint_rate_limiter = EndpointRateLimiter()
+        _endpoint_rate_limiter = EndpointRateLimiter(distributed_prefix="mollie")
     return _endpoint_rate_limiter
@@ -0,0 +1,165 @@
+"""
+Redis Token Bucket
+Cluster-wide token bucket shared by every web and background worker
+
+Features:
+- Bucket state (tokens, last refill time) kept in one Redis hash per bucket
+- Refill and take done atomically in a single Lua script call
+- Shared pause (Retry-After / rate limit reset) visible to all workers
+- Returns None when Redis is unavailable so callers can fall back to a local bucket
+"""
+
+from typing import NamedTuple, Optional
+
+import frappe
+
+# Both scripts read the clock with redis.call('TIME'), so every worker refills
+# and pauses the bucket against the same clock regardless of host clock skew.
+
+# KEYS[1]: bucket hash
+# ARGV: capacity, refill rate (tokens/second), tokens requested, ttl (seconds)
+# A negative request returns tokens to the bucket. The refill timestamp may lie
+# in the future while the bucket is paused; no tokens accrue until it passes.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil or ts == nil then
+    tokens = capacity
+    ts = now
+end
+
+if now > ts then
+    tokens = math.min(capacity, tokens + (now - ts) * rate)
+    ts = now
+end
+
+local allowed = 0
+local retry_after = 0
+if tokens >= requested then
+    tokens = math.min(capacity, tokens - requested)
+    allowed = 1
+elseif rate > 0 then
+    retry_after = (requested - tokens) / rate + math.max(0, ts - now)
+else
+    retry_after = -1
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', ts)
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[4]))
+return {allowed, tostring(tokens), tostring(retry_after)}
+"""
+
+# KEYS[1]: bucket hash
+# ARGV: pause (seconds), ttl (seconds)
+PAUSE_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+redis.call('HSET', KEYS[1], 'tokens', 0, 'ts', now + tonumber(ARGV[1]))
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[2]))
+return 1
+"""
+
+
+_scripts = None
+_scripts_client = None
+
+
+def _get_scripts():
+    """Token bucket scripts registered once per Redis client (EVALSHA, reloaded if flushed)"""
+    global _scripts, _scripts_client
+
+    cache = frappe.cache()
+    if _scripts is None or _scripts_client is not cache:
+        _scripts = {
+            "take": cache.register_script(TOKEN_BUCKET_SCRIPT),
+            "pause": cache.register_script(PAUSE_SCRIPT),
+        }
+        _scripts_client = cache
+    return _scripts
+
+
+class BucketResult(NamedTuple):
+    """Outcome of one token bucket call"""
+
+    allowed: bool
+    tokens: float
+    retry_after: float
+
+
+class RedisTokenBucket:
+    """
+    Token bucket stored in Redis and updated atomically with Lua
+
+    Capacity and refill rate are passed on every call, so instances that adapt
+    their rate (AdaptiveRateLimiter) keep working against the same shared state.
+    """
+
+    KEY_PREFIX = "token_bucket"
+
+    def __init__(self, name: str):
+        """
+        Initialize distributed bucket
+
+        Args:
+            name: Bucket identifier shared by all workers (site-scoped)
+        """
+        self.name = name
+
+    @property
+    def key(self):
+        return frappe.cache().make_key(f"{self.KEY_PREFIX}:{self.name}")
+
+    def take(self, tokens: float, capacity: float, refill_per_second: float) -> Optional[BucketResult]:
+        """
+        Refill the bucket and take tokens if available
+
+        Args:
+            tokens: Tokens to take (0 to peek, negative to return tokens)
+            capacity: Maximum tokens in the bucket
+            refill_per_second: Tokens added per second
+
+        Returns:
+            BucketResult, or None when Redis is unavailable
+        """
+        try:
+            ttl = self._ttl(capacity, refill_per_second)
+            allowed, remaining, retry_after = _get_scripts()["take"](
+                keys=[self.key], args=[capacity, refill_per_second, tokens, ttl]
+            )
+            return BucketResult(bool(allowed), float(remaining), float(retry_after))
+
+        except Exception as e:
+            frappe.logger("rate_limiter").warning(f"Redis token bucket {self.name} unavailable: {str(e)}")
+            return None
+
+    def pause(self, seconds: float, capacity: float, refill_per_second: float) -> bool:
+        """Empty the bucket for every worker until the pause has passed"""
+        try:
+            ttl = self._ttl(capacity, refill_per_second) + int(seconds)
+            _get_scripts()["pause"](keys=[self.key], args=[max(0.0, seconds), ttl])
+            return True
+        except Exception as e:
+            frappe.logger("rate_limiter").warning(f"Could not pause token bucket {self.name}: {str(e)}")
+            return False
+
+    def reset(self):
+        """Drop the shared state; the next call starts with a full bucket"""
+        try:
+            frappe.cache().delete(self.key)
+        except Exception:
+            pass
+
+    @staticmethod
+    def _ttl(capacity: float, refill_per_second: float) -> int:
+        # An idle bucket is full again after capacity / rate seconds; keep it a little longer
+        if refill_per_second <= 0:
+            return 3600
+        return int(capacity / refill_per_second) + 60
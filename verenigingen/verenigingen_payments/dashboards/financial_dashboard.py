@@ -5,6 +5,7 @@ Provides comprehensive financial insights and reporting
 
 import decimal
 import json
+import threading
 from datetime import datetime, timedelta, timezone
 from decimal import Decimal
 from typing import Dict, List, Optional
@@ -13,6 +14,8 @@ import frappe
 from frappe import _
 from frappe.utils import add_days, flt, get_datetime, now_datetime
 
+from verenigingen.utils.dashboard_engine import DashboardEngine, Widget
+
 from ..clients.balances_client import BalancesClient
 from ..clients.chargebacks_client import ChargebacksClient
 from ..clients.invoices_client import InvoicesClient
@@ -20,6 +23,9 @@ from ..clients.payments_client import PaymentsClient
 from ..clients.settlements_client import SettlementsClient
 from ..workflows.reconciliation_engine import ReconciliationEngine
 
+# Seconds before a slow Mollie section is served from its last good value
+DASHBOARD_WIDGET_TIMEOUT = 20.0
+
 
 class FinancialDashboard:
     """
@@ -52,6 +58,9 @@ class FinancialDashboard:
         self._settlements_cache = None
         # Cache for payments data to prevent redundant API calls
         self._payments_cache = None
+        # Dashboard widgets run concurrently; fetch the shared data only once
+        self._settlements_lock = threading.Lock()
+        self._payments_lock = threading.Lock()
 
     def _safe_datetime_to_isoformat(self, dt_value):
         """
@@ -89,6 +98,10 @@ class FinancialDashboard:
 
     def _get_settlements_data(self) -> List[Dict]:
         """Get settlements data with caching to prevent redundant API calls"""
+        with self._settlements_lock:
+            return self._fetch_settlements_data()
+
+    def _fetch_settlements_data(self) -> List[Dict]:
         if self._settlements_cache is None:
             try:
                 self._settlements_cache = self.settlements_client.get("settlements", paginated=True)
@@ -108,6 +121,10 @@ class FinancialDashboard:
 
     def _get_payments_data(self) -> List[Dict]:
         """Get payments data with caching to prevent redundant API calls"""
+        with self._payments_lock:
+            return self._fetch_payments_data()
+
+    def _fetch_payments_data(self) -> List[Dict]:
         if self._payments_cache is None and self.payments_client is not None:
             try:
                 # Fetch all payments once, without date filtering
@@ -302,17 +319,26 @@ class FinancialDashboard:
         Returns:
             Dict with all dashboard metrics
         """
+        # Each section makes its own Mollie API calls; run them concurrently
+        engine = DashboardEngine(
+            "mollie_financial",
+            [
+                Widget("balance_overview", self._get_balance_overview, default={}),
+                Widget("settlement_metrics", self._get_settlement_metrics, default={}),
+                Widget("revenue_analysis", self._get_revenue_analysis, default={}),
+                Widget("cost_breakdown", self._get_cost_breakdown, default={}),
+                Widget("chargeback_metrics", self._get_chargeback_metrics, default={}),
+                Widget("reconciliation_status", self._get_reconciliation_status, default={}),
+                Widget("alerts", self._get_active_alerts, depends_on=("reconciliation_status",), default=[]),
+            ],
+            timeout=DASHBOARD_WIDGET_TIMEOUT,
+        )
+
         summary = {
             "generated_at": now_datetime().isoformat(),
             "period": self._get_current_period(),
-            "balance_overview": self._get_balance_overview(),
-            "settlement_metrics": self._get_settlement_metrics(),
-            "revenue_analysis": self._get_revenue_analysis(),
-            "cost_breakdown": self._get_cost_breakdown(),
-            "chargeback_metrics": self._get_chargeback_metrics(),
-            "reconciliation_status": self._get_reconciliation_status(),
-            "alerts": self._get_active_alerts(),
         }
+        summary.update(engine.values())
 
         return summary
 
@@ -755,7 +781,7 @@ class FinancialDashboard:
 
         return status
 
-    def _get_active_alerts(self) -> List[Dict]:
+    def _get_active_alerts(self, reconciliation_status: Optional[Dict] = None) -> List[Dict]:
         """Get active alerts and warnings"""
         alerts = []
 
@@ -798,7 +824,7 @@ class FinancialDashboard:
                 )
 
             # Check reconciliation issues
-            recon_status = self._get_reconciliation_status()
+            recon_status = reconciliation_status or self._get_reconciliation_status()
             if recon_status.get("last_status") == "failed":
                 alerts.append(
                     {
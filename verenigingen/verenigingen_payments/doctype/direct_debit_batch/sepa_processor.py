@@ -2,19 +2,27 @@
 SEPA Direct Debit processor for the flexible membership dues system
 """
 
-import xml.etree.ElementTree as ET
 from datetime import datetime
 
 import frappe
 from frappe import _
-from frappe.utils import add_days, cstr, flt, getdate, today
+from frappe.utils import add_days, cint, cstr, flt, getdate, today
 
 from verenigingen.verenigingen_payments.utils.batch_performance_optimizer import (
     get_batch_performance_optimizer,
 )
+from verenigingen.verenigingen_payments.utils.sepa_collection_preview import (
+    DEFAULT_PAGE_LENGTH,
+    get_unpaid_invoice_page,
+    get_unpaid_invoice_summary,
+    get_upcoming_collection_summary,
+    get_upcoming_schedule_page,
+    page_bounds,
+)
 from verenigingen.verenigingen_payments.utils.sepa_config_manager import get_sepa_config_manager
 from verenigingen.verenigingen_payments.utils.sepa_error_handler import get_sepa_error_handler, sepa_retry
 from verenigingen.verenigingen_payments.utils.sepa_mandate_service import get_sepa_mandate_service
+from verenigingen.verenigingen_payments.utils.sepa_return_processing import process_return_file
 
 
 class SEPAProcessor:
@@ -387,32 +395,9 @@ class SEPAProcessor:
     def process_batch_returns(self, batch_name, return_file_path):
         """Process SEPA return file and handle failed payments"""
         try:
-            batch = frappe.get_doc("Direct Debit Batch", batch_name)
-
-            # Parse return file
-            returns = self.parse_sepa_return_file(return_file_path)
-
-            failed_count = 0
-            for return_item in returns:
-                # Find the invoice in the batch
-                invoice_item = self.find_invoice_in_batch(batch, return_item)
-                if invoice_item:
-                    # Update invoice status
-                    invoice_item.status = "Failed"
-                    invoice_item.result_code = return_item.get("reason_code")
-                    invoice_item.result_message = return_item.get("reason_description")
-
-                    # Handle the failed payment
-                    self.handle_failed_payment(invoice_item, return_item)
-                    failed_count += 1
-
-            # Update batch status
-            if failed_count > 0:
-                batch.status = "Partially Failed"
-                batch.add_to_batch_log(f"Processed {failed_count} returned payments")
-
-            batch.save()
-            return failed_count
+            # Resolve, fail, schedule retries and notify for the whole file in one pass
+            result = process_return_file(return_file_path, batch=batch_name)
+            return result["rejected"] + result["returned"]
 
         except Exception as e:
             frappe.log_error(f"Error processing batch returns: {str(e)}", "SEPA Return Processing Error")
@@ -488,30 +473,6 @@ Organization
                 f"Error sending payment failure notification: {str(e)}", "Payment Failure Notification Error"
             )
 
-    def parse_sepa_return_file(self, file_path):
-        """Parse SEPA return file (pain.002 format)"""
-        # This is a simplified parser - implement according to your bank's format
-        returns = []
-
-        try:
-            ET.parse(file_path)
-            # Navigate through the XML structure to find returns
-            # This will vary based on your bank's implementation
-
-            return returns
-
-        except Exception as e:
-            frappe.log_error(f"Error parsing SEPA return file: {str(e)}", "SEPA Return File Parser Error")
-            return []
-
-    def find_invoice_in_batch(self, batch, return_item):
-        """Find invoice in batch based on return information"""
-        # Match by end-to-end ID or other reference
-        for invoice_item in batch.invoices:
-            if invoice_item.invoice == return_item.get("end_to_end_id"):
-                return invoice_item
-        return None
-
     def verify_invoice_coverage(self, collection_date):
         """
         Verify that all eligible members have been properly invoiced
@@ -1071,70 +1032,84 @@ def verify_invoice_coverage_status(collection_date=None):
 
 @frappe.whitelist()
 def get_sepa_batch_preview(collection_date=None):
-    """Preview what SEPA batch would be created without actually creating it"""
-    processor = SEPAProcessor()
+    """
+    Preview what SEPA batch would be created without actually creating it
+
+    Counts, totals and the FRST/RCUR split per due date are aggregated by the
+    database; use get_sepa_batch_preview_invoices for the invoices themselves.
+    """
+    if not collection_date:
+        collection_date = today()
+
+    lookback_days = get_sepa_config_manager().get_processing_config()["lookback_days"]
+    summary = get_unpaid_invoice_summary(collection_date, lookback_days)
+
+    return {
+        "success": True,
+        "collection_date": collection_date,
+        "unpaid_invoices_found": summary["count"],
+        "total_amount": summary["total_amount"],
+        "sample_invoices": get_unpaid_invoice_page(collection_date, lookback_days, page_length=5),
+        "members_affected": summary["members"],
+        "by_date": summary["by_date"],
+        "sequence_types": summary["sequence_types"],
+    }
+
+
+@frappe.whitelist()
+def get_sepa_batch_preview_invoices(
+    collection_date=None, start=0, page_length=DEFAULT_PAGE_LENGTH, due_date=None, sequence_type=None
+):
+    """One page of the invoices get_sepa_batch_preview counted, optionally of one due date or sequence type"""
     if not collection_date:
         collection_date = today()
 
-    invoices = processor.get_existing_unpaid_sepa_invoices(collection_date)
+    lookback_days = get_sepa_config_manager().get_processing_config()["lookback_days"]
+    start, page_length = page_bounds(start, page_length)
 
     return {
         "success": True,
         "collection_date": collection_date,
-        "unpaid_invoices_found": len(invoices),
-        "total_amount": sum(flt(inv["amount"]) for inv in invoices),
-        "sample_invoices": invoices[:5],  # Show first 5 as preview
-        "members_affected": len(set(inv["member"] for inv in invoices)),
+        "start": start,
+        "page_length": page_length,
+        "invoices": get_unpaid_invoice_page(
+            collection_date, lookback_days, start, page_length, due_date=due_date, sequence_type=sequence_type
+        ),
     }
 
 
 @frappe.whitelist()
 def get_upcoming_dues_collections(days_ahead=30):
-    """Get upcoming dues collections for review"""
-    # Get schedules that will be collected in the next X days
-    future_date = add_days(today(), days_ahead)
+    """
+    Get upcoming dues collections for review
 
-    schedules = frappe.get_all(
-        "Membership Dues Schedule",
-        filters={
-            "status": "Active",
-            "payment_terms_template": "SEPA Direct Debit",
-            "next_invoice_date": ["between", [today(), future_date]],
-        },
-        fields=[
-            "name",
-            "member",
-            "minimum_amount",
-            "suggested_amount",
-            "uses_custom_amount",
-            "billing_frequency",
-            "next_invoice_date",
-            "contribution_mode",
-            "last_invoice_coverage_start",
-            "last_invoice_coverage_end",
-        ],
-        order_by="next_invoice_date",
-    )
-
-    # Group by collection date
-    collections_by_date = {}
-    for schedule in schedules:
-        date_key = str(schedule.next_invoice_date)
-        if date_key not in collections_by_date:
-            collections_by_date[date_key] = {
-                "date": schedule.next_invoice_date,
-                "schedules": [],
-                "total_amount": 0,
-                "count": 0,
-            }
+    Returns one entry per collection date with the number of schedules, their
+    total amount and the FRST/RCUR split; use
+    get_upcoming_dues_collection_schedules for the schedules themselves.
+    """
+    return get_upcoming_collection_summary(today(), add_days(today(), cint(days_ahead)))
 
-        collections_by_date[date_key]["schedules"].append(schedule)
-        # Use suggested_amount if available, otherwise minimum_amount
-        amount = schedule.suggested_amount if schedule.suggested_amount else schedule.minimum_amount
-        collections_by_date[date_key]["total_amount"] += flt(amount)
-        collections_by_date[date_key]["count"] += 1
 
-    return list(collections_by_date.values())
+@frappe.whitelist()
+def get_upcoming_dues_collection_schedules(
+    days_ahead=30, collection_date=None, start=0, page_length=DEFAULT_PAGE_LENGTH, sequence_type=None
+):
+    """One page of the dues schedules get_upcoming_dues_collections counted"""
+    start, page_length = page_bounds(start, page_length)
+
+    return {
+        "success": True,
+        "start": start,
+        "page_length": page_length,
+        "schedules": get_upcoming_schedule_page(
+            today(),
+            add_days(today(), cint(days_ahead)),
+            start,
+            page_length,
+            collection_date=collection_date,
+            sequence_type=sequence_type,
+        ),
+    }
 
 
 @frappe.whitelist()
@@ -0,0 +1,318 @@
+"""
+Direct Debit Batch Packing
+
+Packs invoices into Direct Debit batches under the batch limits
+(max_amount_per_batch, max_invoices_per_batch, min_invoices_per_batch):
+
+- invoices are partitioned by sequence type (FRST and RCUR are never mixed)
+  and priority, and packed per partition
+- invoices of one customer form a single item, so they end up in the same
+  batch; a customer whose invoices exceed the limits is split into as few
+  items as fit
+- items are packed first-fit decreasing; a max segment tree over the
+  remaining amount of each batch finds the first batch with room in
+  O(log n), so packing is O(n log n). Batches without invoice room left for
+  a customer with several invoices are stepped over, which only happens
+  when nearly full batches meet multi-invoice customers
+- local improvement then redistributes the items, each to the least loaded
+  batch with room, over the lower bound number of batches if they fit and
+  otherwise over as many batches as first-fit used; this balances amounts
+  (and with them risk) across batches and often saves a batch. Batches below
+  the minimum size are topped up from the largest batches
+- every invoice is placed: partitions too small for the minimum size become
+  one small batch, and invoices above the amount limit get a batch of their
+  own; both are reported
+"""
+
+import heapq
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+from frappe.utils import flt
+
+from verenigingen.utils.amount_combinations import to_cents
+
+SEQUENCE_TYPES = ("FRST", "RCUR")
+
+
+@dataclass
+class PackingResult:
+    """Batches of invoices, in creation order, with packing statistics"""
+
+    batches: List[List[Dict]]
+    report: Dict[str, Any]
+
+
+@dataclass
+class _Item:
+    invoices: List[Dict]
+    amount: int  # cents
+
+    @property
+    def count(self) -> int:
+        return len(self.invoices)
+
+
+@dataclass
+class _Bin:
+    items: List[_Item] = field(default_factory=list)
+    amount: int = 0
+    count: int = 0
+
+    def add(self, item: _Item):
+        self.items.append(item)
+        self.amount += item.amount
+        self.count += item.count
+
+    def remove(self, item: _Item):
+        self.items.remove(item)
+        self.amount -= item.amount
+        self.count -= item.count
+
+
+class _CapacityTree:
+    """Max segment tree over remaining batch amounts; finds the first batch with enough room"""
+
+    def __init__(self, size: int, capacity: int):
+        self.size = 1
+        while self.size < size:
+            self.size *= 2
+        self.tree = [capacity] * (2 * self.size)
+
+    def set(self, index: int, value: int):
+        tree = self.tree
+        node = index + self.size
+        tree[node] = value
+        node //= 2
+        while node:
+            left, right = tree[2 * node], tree[2 * node + 1]
+            best = left if left > right else right
+            if tree[node] == best:
+                break  # Ancestors are unchanged
+            tree[node] = best
+            node //= 2
+
+    def first_at_least(self, value: int, start: int = 0) -> int:
+        """Lowest index from start with capacity >= value, or -1"""
+        if start >= self.size:
+            return -1
+
+        tree = self.tree
+        node = start + self.size
+        # Climb to the first subtree right of start that has enough capacity
+        while tree[node] < value:
+            while node & 1:
+                node //= 2
+                if node <= 1:
+                    return -1
+            node += 1
+
+        while node < self.size:
+            node = 2 * node if tree[2 * node] >= value else 2 * node + 1
+        return node - self.size
+
+    def first_fit(self, bins: List[_Bin], amount: int, count: int, max_count: int) -> int:
+        """Lowest batch index with room for the amount and invoice count, or -1"""
+        index = self.first_at_least(amount)
+        while 0 <= index < len(bins) and bins[index].count + count > max_count:
+            index = self.first_at_least(amount, index + 1)
+        return index
+
+
+def pack_invoices(invoices: List[Dict], config: Dict[str, Any]) -> PackingResult:
+    """
+    Pack invoices into Direct Debit batches
+
+    Args:
+        invoices: Invoice rows with invoice, customer, amount, and optionally
+            sequence_type (FRST when unknown) and priority
+        config: Batch limits (see DEFAULT_CONFIG in dd_batch_optimizer)
+
+    Returns:
+        PackingResult with high-priority batches first, then FRST and RCUR
+    """
+    max_amount = to_cents(config["max_amount_per_batch"])
+    max_count = max(int(config["max_invoices_per_batch"]), 1)
+    min_count = min(int(config.get("min_invoices_per_batch") or 1), max_count)
+
+    partitions = defaultdict(list)
+    for invoice in invoices:
+        sequence_type = invoice.get("sequence_type")
+        if sequence_type not in SEQUENCE_TYPES:
+            sequence_type = "FRST"
+        partitions[(invoice.get("priority") != "High", sequence_type)].append(invoice)
+
+    batches = []
+    oversized = []
+    lower_bound = 0
+    partition_counts = {}
+    for key in sorted(partitions):
+        partition = partitions[key]
+        items, large = _customer_items(partition, max_amount, max_count)
+        oversized.extend(invoice["invoice"] for item in large for invoice in item.invoices)
+
+        # No packing can use fewer batches than the amount or count limit requires
+        total = sum(item.amount for item in items)
+        least = max(-(-total // max_amount), -(-sum(item.count for item in items) // max_count))
+        lower_bound += least + len(large)
+
+        bins = _first_fit_decreasing(items, max_amount, max_count)
+        for bin_count in sorted({least, len(bins)}):
+            balanced = _rebalance(items, bin_count, max_amount, max_count)
+            if balanced:
+                bins = balanced
+                break
+        _top_up_small_bins(bins, min_count, max_amount, max_count)
+        bins.extend(_Bin(items=[item], amount=item.amount, count=item.count) for item in large)
+
+        partition_counts[key[1] if key[0] else f"Priority/{key[1]}"] = len(bins)
+        batches.extend(bins)
+
+    result = [[invoice for item in bin.items for invoice in item.invoices] for bin in batches]
+    amounts = [bin.amount for bin in batches]
+    report = {
+        "batches": len(batches),
+        "invoices": sum(bin.count for bin in batches),
+        "lower_bound": lower_bound,
+        "efficiency": round(100 * lower_bound / len(batches), 1) if batches else 100.0,
+        "fill_rate": round(
+            100 * sum(max(b.amount / max_amount, b.count / max_count) for b in batches) / len(batches), 1
+        )
+        if batches
+        else 0.0,
+        "amount_spread": flt((max(amounts) - min(amounts)) / 100, 2) if amounts else 0.0,
+        "undersized_batches": sum(1 for bin in batches if bin.count < min_count),
+        "oversized_invoices": oversized,
+        "batches_by_partition": partition_counts,
+    }
+    return PackingResult(batches=result, report=report)
+
+
+def _customer_items(invoices: List[Dict], max_amount: int, max_count: int) -> Tuple[List[_Item], List[_Item]]:
+    """Group invoices per customer into items within the limits; also returns over-limit invoices"""
+    by_customer = defaultdict(list)
+    for invoice in invoices:
+        by_customer[invoice.get("customer") or invoice["invoice"]].append(invoice)
+
+    items, large = [], []
+    for customer_invoices in by_customer.values():
+        current = _Item(invoices=[], amount=0)
+        for invoice in sorted(customer_invoices, key=lambda inv: to_cents(inv["amount"]), reverse=True):
+            amount = to_cents(invoice["amount"])
+            if amount > max_amount:
+                large.append(_Item(invoices=[invoice], amount=amount))
+                continue
+            if current.count >= max_count or current.amount + amount > max_amount:
+                items.append(current)
+                current = _Item(invoices=[], amount=0)
+            current.invoices.append(invoice)
+            current.amount += amount
+        if current.invoices:
+            items.append(current)
+
+    items.sort(key=lambda item: (item.amount, item.count), reverse=True)
+    return items, large
+
+
+def _first_fit_decreasing(items: List[_Item], max_amount: int, max_count: int) -> List[_Bin]:
+    """Place each item (largest first) in the first batch with room for it"""
+    bins: List[_Bin] = []
+    # Leaves past the last batch stand for empty batches
+    tree = _CapacityTree(len(items), max_amount)
+
+    for item in items:
+        index = tree.first_fit(bins, item.amount, item.count, max_count)
+        if index == len(bins):
+            bins.append(_Bin())
+
+        target = bins[index]
+        target.add(item)
+        tree.set(index, max_amount - target.amount if target.count < max_count else -1)
+
+    return bins
+
+
+def _rebalance(items: List[_Item], bin_count: int, max_amount: int, max_count: int) -> List[_Bin]:
+    """
+    Distribute items (largest first) over bin_count batches, each to the least loaded with room
+
+    Returns None when an item does not fit.
+    """
+    if not bin_count:
+        return None
+
+    balanced = [_Bin() for _ in range(bin_count)]
+    heap = [(0, index) for index in range(len(balanced))]
+    for item in items:
+        skipped = []
+        while heap:
+            amount, index = heapq.heappop(heap)
+            target = balanced[index]
+            if target.count + item.count <= max_count:
+                break
+            if target.count < max_count:
+                skipped.append((amount, index))
+        else:
+            return None
+
+        if target.amount + item.amount > max_amount:
+            return None  # The least loaded batch has the most room
+        target.add(item)
+        if target.count < max_count:
+            heapq.heappush(heap, (target.amount, index))
+        for entry in skipped:
+            heapq.heappush(heap, entry)
+
+    return balanced
+
+
+def _top_up_small_bins(bins: List[_Bin], min_count: int, max_amount: int, max_count: int):
+    """Move items from the largest batches into batches below the minimum, merging what remains"""
+    small = [bin for bin in bins if bin.count < min_count]
+    if not small:
+        return
+
+    donors = [(-bin.count, index) for index, bin in enumerate(bins) if bin.count > min_count]
+    heapq.heapify(donors)
+    for target in small:
+        while target.count < min_count and donors:
+            _, index = heapq.heappop(donors)
+            donor = bins[index]
+            movable = [
+                item
+                for item in donor.items
+                if donor.count - item.count >= min_count
+                and target.count + item.count <= max_count
+                and target.amount + item.amount <= max_amount
+            ]
+            if not movable:
+                continue
+            item = min(movable, key=lambda candidate: (candidate.count, candidate.amount))
+            donor.remove(item)
+            target.add(item)
+            if donor.count > min_count:
+                heapq.heappush(donors, (-donor.count, index))
+
+    # Batches that could not be topped up are merged into the first other batch with room
+    tree = _CapacityTree(len(bins), -1)
+    for index, bin in enumerate(bins):
+        if bin.count and bin.count < max_count:
+            tree.set(index, max_amount - bin.amount)
+
+    for index, target in enumerate(bins):
+        if not target.count or target.count >= min_count:
+            continue
+        tree.set(index, -1)
+        other_index = tree.first_fit(bins, target.amount, target.count, max_count)
+        if other_index < 0:
+            tree.set(index, max_amount - target.amount)
+            continue
+
+        other = bins[other_index]
+        for item in list(target.items):
+            target.remove(item)
+            other.add(item)
+        tree.set(other_index, max_amount - other.amount if other.count < max_count else -1)
+
+    bins[:] = [bin for bin in bins if bin.count]
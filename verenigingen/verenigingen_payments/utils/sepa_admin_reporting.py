@@ -22,6 +22,10 @@ from frappe.utils import cint, flt, format_datetime, formatdate, get_datetime, n
 from frappe.utils.pdf import get_pdf
 
 from verenigingen.utils.error_handling import log_error
+from verenigingen.verenigingen_payments.utils.sepa_mandate_health import (
+    HEALTH_DOCTYPE,
+    get_mandate_health_summary,
+)
 from verenigingen.verenigingen_payments.utils.sepa_memory_optimizer import SEPAMemoryMonitor
 from verenigingen.verenigingen_payments.utils.sepa_monitoring_dashboard import get_dashboard_instance
 
@@ -183,65 +187,50 @@ class SEPAAdminReportGenerator:
         Returns:
             Mandate lifecycle report data
         """
-        # Get mandate data with lifecycle information
-        mandate_data = frappe.db.sql(
-            """
+        # Counts, ages, health and usage recency from the mandate health table
+        mandate_summary = get_mandate_health_summary()
+
+        # Most recently signed mandates for the detail listing and CSV export
+        detailed_mandates = frappe.db.sql(
+            f"""
             SELECT
-                sm.name,
-                sm.mandate_id,
-                sm.member,
-                sm.status,
-                sm.sign_date,
-                sm.iban,
-                sm.bic,
-                sm.creation,
-                sm.modified,
-                m.full_name as member_name,
-                m.email as member_email,
-                m.status as member_status,
-                DATEDIFF(NOW(), sm.sign_date) as age_days,
-                (SELECT COUNT(*) FROM `tabDirect Debit Batch Invoice` ddbi
-                 JOIN `tabDirect Debit Batch` ddb ON ddb.name = ddbi.parent
-                 JOIN `tabSales Invoice` si ON si.name = ddbi.invoice
-                 JOIN `tabMember` mem ON mem.customer = si.customer
-                 WHERE mem.name = sm.member
-                 AND ddb.docstatus = 1) as usage_count,
-                (SELECT MAX(ddb.batch_date) FROM `tabDirect Debit Batch Invoice` ddbi
-                 JOIN `tabDirect Debit Batch` ddb ON ddb.name = ddbi.parent
-                 JOIN `tabSales Invoice` si ON si.name = ddbi.invoice
-                 JOIN `tabMember` mem ON mem.customer = si.customer
-                 WHERE mem.name = sm.member
-                 AND ddb.docstatus = 1) as last_used,
-                (SELECT SUM(ddb.total_amount) FROM `tabDirect Debit Batch Invoice` ddbi
-                 JOIN `tabDirect Debit Batch` ddb ON ddb.name = ddbi.parent
-                 JOIN `tabSales Invoice` si ON si.name = ddbi.invoice
-                 JOIN `tabMember` mem ON mem.customer = si.customer
-                 WHERE mem.name = sm.member
-                 AND ddb.docstatus = 1) as total_processed_amount
-            FROM `tabSEPA Mandate` sm
-            LEFT JOIN `tabMember` m ON m.name = sm.member
-            WHERE sm.docstatus = 1
-            ORDER BY sm.creation DESC
+                mandate AS name,
+                mandate_id,
+                member,
+                member_name,
+                mandate_status AS status,
+                sign_date,
+                DATEDIFF(CURDATE(), sign_date) AS age_days,
+                usage_count,
+                last_used,
+                total_collected AS total_processed_amount,
+                returned_count,
+                health_score,
+                health_status,
+                valid_until
+            FROM `tab{HEALTH_DOCTYPE}`
+            ORDER BY sign_date DESC
+            LIMIT 100
         """,
             as_dict=True,
         )
 
         # Analyze mandate lifecycle
-        lifecycle_analysis = self._analyze_mandate_lifecycle(mandate_data)
+        lifecycle_analysis = self._analyze_mandate_lifecycle(mandate_summary)
 
         # Health scoring
-        health_scores = self._calculate_mandate_health_scores(mandate_data)
+        health_scores = self._calculate_mandate_health_scores(mandate_summary)
 
         # Usage patterns
-        usage_patterns = self._analyze_mandate_usage_patterns(mandate_data)
+        usage_patterns = self._analyze_mandate_usage_patterns(mandate_summary)
 
         # Compliance status
-        compliance_status = self._check_mandate_compliance(mandate_data)
+        compliance_status = self._check_mandate_compliance(mandate_summary)
 
         return {
             "report_type": "mandate_lifecycle_report",
             "generated_at": get_datetime().isoformat(),
-            "total_mandates": len(mandate_data),
+            "total_mandates": mandate_summary["total"],
             "lifecycle_analysis": lifecycle_analysis,
             "health_scores": health_scores,
             "usage_patterns": usage_patterns,
@@ -249,7 +238,7 @@ class SEPAAdminReportGenerator:
             "recommendations": self._generate_mandate_recommendations(
                 lifecycle_analysis, health_scores, usage_patterns
             ),
-            "detailed_mandates": mandate_data[:100],  # Top 100 recent mandates
+            "detailed_mandates": detailed_mandates,  # Top 100 recent mandates
         }
 
     def generate_performance_benchmark_report(self, days: int = 30) -> Dict[str, Any]:
@@ -845,46 +834,26 @@ class SEPAAdminReportGenerator:
         else:
             return now + timedelta(days=1)  # Default to daily
 
-    def _analyze_mandate_lifecycle(self, mandate_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def _analyze_mandate_lifecycle(self, mandate_summary: Dict[str, Any]) -> Dict[str, Any]:
         """Analyze mandate lifecycle patterns"""
-        if not mandate_data:
+        if not mandate_summary["total"]:
             return {}
 
-        # Group mandates by status and age
-        lifecycle_stats = {
-            "active_mandates": 0,
-            "pending_mandates": 0,
-            "cancelled_mandates": 0,
-            "average_mandate_age_days": 0,
-            "lifecycle_distribution": {},
-        }
-
-        total_age = 0
-        status_counts = defaultdict(int)
-
-        for mandate in mandate_data:
-            status = mandate.get("status", "unknown")
-            status_counts[status] += 1
+        by_status = mandate_summary["by_status"]
+        status_counts = {status: stats["count"] for status, stats in by_status.items()}
 
-            # Calculate mandate age
-            creation_date = mandate.get("creation")
-            if creation_date:
-                if isinstance(creation_date, str):
-                    creation_date = get_datetime(creation_date)
-                age_days = (get_datetime() - creation_date).days
-                total_age += age_days
+        # Average sign date age over all dated mandates
+        dated = [stats for stats in by_status.values() if stats["avg_age_days"] is not None]
+        total_age = sum(stats["avg_age_days"] * stats["count"] for stats in dated)
+        dated_count = sum(stats["count"] for stats in dated)
 
-        # Update lifecycle stats
-        lifecycle_stats["active_mandates"] = status_counts.get("Active", 0)
-        lifecycle_stats["pending_mandates"] = status_counts.get("Pending", 0)
-        lifecycle_stats["cancelled_mandates"] = status_counts.get("Cancelled", 0)
-
-        if mandate_data:
-            lifecycle_stats["average_mandate_age_days"] = total_age / len(mandate_data)
-
-        lifecycle_stats["lifecycle_distribution"] = dict(status_counts)
-
-        return lifecycle_stats
+        return {
+            "active_mandates": status_counts.get("Active", 0),
+            "pending_mandates": status_counts.get("Pending", 0),
+            "cancelled_mandates": status_counts.get("Cancelled", 0),
+            "average_mandate_age_days": total_age / dated_count if dated_count else 0,
+            "lifecycle_distribution": status_counts,
+        }
 
     def _analyze_performance_trends(self, cutoff_time: datetime, days: int) -> Dict[str, Any]:
         """Analyze performance trends over time"""
@@ -939,16 +908,16 @@ class SEPAAdminReportGenerator:
 
         return (std_dev / mean_val) * 100
 
-    def _calculate_mandate_health_scores(self, mandate_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def _calculate_mandate_health_scores(self, mandate_summary: Dict[str, Any]) -> Dict[str, Any]:
         """Calculate health scores for mandates"""
-        if not mandate_data:
+        total_mandates = mandate_summary["total"]
+        if not total_mandates:
             return {}
 
-        total_mandates = len(mandate_data)
-        active_mandates = sum(1 for m in mandate_data if m.get("status") == "Active")
+        active_mandates = mandate_summary["by_status"].get("Active", {}).get("count", 0)
 
         # Calculate health score (percentage of active mandates)
-        health_score = (active_mandates / total_mandates * 100) if total_mandates > 0 else 0
+        health_score = active_mandates / total_mandates * 100
 
         return {
             "overall_health_score": health_score,
@@ -959,33 +928,17 @@ class SEPAAdminReportGenerator:
             else "good"
             if health_score >= 70
             else "needs_attention",
+            "average_mandate_score": mandate_summary["average_score"],
+            "score_distribution": mandate_summary["by_health"],
+            "expiring_mandates": mandate_summary["expiring"],
         }
 
-    def _analyze_mandate_usage_patterns(self, mandate_data: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Analyze mandate usage patterns"""
-        if not mandate_data:
+    def _analyze_mandate_usage_patterns(self, mandate_summary: Dict[str, Any]) -> Dict[str, Any]:
+        """Analyze mandate usage patterns: active mandates by last collection recency"""
+        if not mandate_summary["total"]:
             return {}
 
-        # Simple usage pattern analysis
-        usage_stats = {"frequent_usage": 0, "moderate_usage": 0, "low_usage": 0}
-
-        # This is a placeholder - in real implementation, would analyze transaction frequency
-        for mandate in mandate_data:
-            # Placeholder logic - categorize by creation date recency
-            creation_date = mandate.get("creation")
-            if creation_date:
-                if isinstance(creation_date, str):
-                    creation_date = get_datetime(creation_date)
-                days_old = (get_datetime() - creation_date).days
-
-                if days_old < 30:
-                    usage_stats["frequent_usage"] += 1
-                elif days_old < 90:
-                    usage_stats["moderate_usage"] += 1
-                else:
-                    usage_stats["low_usage"] += 1
-
-        return usage_stats
+        return dict(mandate_summary["usage"])
 
     def _calculate_total_amount_processed_optimized(self, cutoff_time: datetime) -> float:
         """
@@ -1070,24 +1023,21 @@ class SEPAAdminReportGenerator:
             frappe.logger().error(f"Python fallback calculation failed for total amount: {str(e)}")
             return 0.0
 
-    def _check_mandate_compliance(self, mandate_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def _check_mandate_compliance(self, mandate_summary: Dict[str, Any]) -> Dict[str, Any]:
         """Check mandate compliance status"""
-        if not mandate_data:
+        if not mandate_summary["total"]:
             return {}
 
-        compliance_stats = {"compliant_mandates": 0, "non_compliant_mandates": 0, "compliance_issues": []}
-
-        for mandate in mandate_data:
-            # Simple compliance check - mandates with IBAN are compliant
-            if mandate.get("iban"):
-                compliance_stats["compliant_mandates"] += 1
-            else:
-                compliance_stats["non_compliant_mandates"] += 1
-                compliance_stats["compliance_issues"].append(
-                    f"Mandate {mandate.get('name', 'Unknown')} missing IBAN"
-                )
+        # Simple compliance check - mandates with IBAN are compliant
+        missing_iban = frappe.get_all(
+            HEALTH_DOCTYPE, filters={"has_iban": 0}, pluck="mandate", limit_page_length=100
+        )
 
-        return compliance_stats
+        return {
+            "compliant_mandates": mandate_summary["with_iban"],
+            "non_compliant_mandates": mandate_summary["total"] - mandate_summary["with_iban"],
+            "compliance_issues": [f"Mandate {mandate} missing IBAN" for mandate in missing_iban],
+        }
 
     def _generate_mandate_recommendations(
         self, lifecycle_analysis: Dict, health_scores: Dict, usage_patterns: Dict
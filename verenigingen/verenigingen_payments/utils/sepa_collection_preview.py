@@ -0,0 +1,242 @@
+"""
+SEPA Collection Preview
+
+Previews of upcoming Direct Debit collections computed by the database.
+Counts, totals and the FRST/RCUR split per date come from grouped queries
+over the same conditions a batch run uses, so previewing a collection for
+tens of thousands of members reads a few aggregate rows instead of loading
+every invoice or dues schedule into the worker. Invoice and schedule detail
+is read one page at a time, on demand.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import frappe
+from frappe.utils import add_days, cint, flt
+
+from verenigingen.verenigingen_payments.utils.sepa_mandate_service import (
+    SEPA_INVOICE_CONDITIONS,
+    SEPA_INVOICE_FIELDS,
+    sequence_type_sql,
+)
+
+DEFAULT_PAGE_LENGTH = 50
+MAX_PAGE_LENGTH = 500
+
+# Dues schedule amount: the suggested amount when set, otherwise the minimum amount
+SCHEDULE_AMOUNT = "COALESCE(NULLIF(mds.suggested_amount, 0), mds.minimum_amount, 0)"
+
+# Active SEPA dues schedules with their next invoice in a date range (alias mds)
+UPCOMING_SCHEDULE_CONDITIONS = """
+    FROM `tabMembership Dues Schedule` mds
+    WHERE
+        mds.status = 'Active'
+        AND mds.payment_terms_template = 'SEPA Direct Debit'
+        AND mds.next_invoice_date BETWEEN %(from_date)s AND %(to_date)s
+"""
+
+# Group key of schedules whose member has no active mandate
+WITHOUT_MANDATE = "Without Mandate"
+
+INVOICE_SEQUENCE_TYPE = sequence_type_sql("seq_sm.name = sm.name")
+SCHEDULE_SEQUENCE_TYPE = """
+    CASE WHEN EXISTS (
+        SELECT 1 FROM `tabSEPA Mandate` active_sm
+        WHERE active_sm.member = mds.member AND active_sm.status = 'Active'
+    ) THEN {sequence_type} END""".format(
+    sequence_type=sequence_type_sql("seq_sm.member = mds.member AND seq_sm.status = 'Active'")
+)
+
+
+def get_unpaid_invoice_summary(collection_date, lookback_days: int) -> Dict[str, Any]:
+    """
+    Aggregates of the unpaid invoices a batch run for collection_date would collect
+
+    Returns:
+        Dict with count, total_amount, members, by_date (per due date) and
+        sequence_types (count and amount per FRST/RCUR)
+    """
+    values = {"lookback_date": add_days(collection_date, -cint(lookback_days))}
+
+    totals = frappe.db.sql(
+        f"""
+        SELECT
+            COUNT(*) AS count,
+            COALESCE(SUM(si.grand_total), 0) AS total_amount,
+            COUNT(DISTINCT mds.member) AS members
+        {SEPA_INVOICE_CONDITIONS}
+    """,
+        values,
+        as_dict=True,
+    )[0]
+
+    groups = frappe.db.sql(
+        f"""
+        SELECT
+            si.due_date AS date,
+            {INVOICE_SEQUENCE_TYPE} AS sequence_type,
+            COUNT(*) AS count,
+            SUM(si.grand_total) AS total_amount
+        {SEPA_INVOICE_CONDITIONS}
+        GROUP BY si.due_date, sequence_type
+        ORDER BY si.due_date
+    """,
+        values,
+        as_dict=True,
+    )
+
+    return {
+        "count": cint(totals.count),
+        "total_amount": flt(totals.total_amount),
+        "members": cint(totals.members),
+        "by_date": summarize_by_date(groups),
+        "sequence_types": summarize_sequence_types(groups),
+    }
+
+
+def get_unpaid_invoice_page(
+    collection_date,
+    lookback_days: int,
+    start: int = 0,
+    page_length: int = DEFAULT_PAGE_LENGTH,
+    due_date=None,
+    sequence_type: Optional[str] = None,
+) -> List[Dict]:
+    """One page of the invoices a batch run would collect, in batch run order"""
+    start, page_length = page_bounds(start, page_length)
+    filters = ""
+    if due_date:
+        filters += " AND si.due_date = %(due_date)s"
+    if sequence_type:
+        filters += f" AND {INVOICE_SEQUENCE_TYPE} = %(sequence_type)s"
+
+    return frappe.db.sql(
+        f"""
+        SELECT
+            {SEPA_INVOICE_FIELDS},
+            {INVOICE_SEQUENCE_TYPE} AS sequence_type
+        {SEPA_INVOICE_CONDITIONS}
+        {filters}
+        ORDER BY si.posting_date ASC, si.grand_total DESC, si.name ASC
+        LIMIT %(page_length)s OFFSET %(start)s
+    """,
+        {
+            "lookback_date": add_days(collection_date, -cint(lookback_days)),
+            "due_date": due_date,
+            "sequence_type": sequence_type,
+            "start": start,
+            "page_length": page_length,
+        },
+        as_dict=True,
+    )
+
+
+def get_upcoming_collection_summary(from_date, to_date) -> List[Dict[str, Any]]:
+    """
+    Dues schedules to be collected per date between from_date and to_date
+
+    Returns:
+        Per next invoice date: date, count, total_amount and sequence_types
+        (count and amount per FRST/RCUR, and for members without an active
+        mandate)
+    """
+    groups = frappe.db.sql(
+        f"""
+        SELECT
+            mds.next_invoice_date AS date,
+            {SCHEDULE_SEQUENCE_TYPE} AS sequence_type,
+            COUNT(*) AS count,
+            SUM({SCHEDULE_AMOUNT}) AS total_amount
+        {UPCOMING_SCHEDULE_CONDITIONS}
+        GROUP BY mds.next_invoice_date, sequence_type
+        ORDER BY mds.next_invoice_date
+    """,
+        {"from_date": from_date, "to_date": to_date},
+        as_dict=True,
+    )
+
+    return summarize_by_date(groups)
+
+
+def get_upcoming_schedule_page(
+    from_date,
+    to_date,
+    start: int = 0,
+    page_length: int = DEFAULT_PAGE_LENGTH,
+    collection_date=None,
+    sequence_type: Optional[str] = None,
+) -> List[Dict]:
+    """One page of the dues schedules to be collected between from_date and to_date"""
+    start, page_length = page_bounds(start, page_length)
+    filters = ""
+    if collection_date:
+        filters += " AND mds.next_invoice_date = %(collection_date)s"
+    if sequence_type == WITHOUT_MANDATE:
+        filters += f" AND {SCHEDULE_SEQUENCE_TYPE} IS NULL"
+    elif sequence_type:
+        filters += f" AND {SCHEDULE_SEQUENCE_TYPE} = %(sequence_type)s"
+
+    return frappe.db.sql(
+        f"""
+        SELECT
+            mds.name,
+            mds.member,
+            mds.minimum_amount,
+            mds.suggested_amount,
+            mds.uses_custom_amount,
+            mds.billing_frequency,
+            mds.next_invoice_date,
+            mds.contribution_mode,
+            mds.last_invoice_coverage_start,
+            mds.last_invoice_coverage_end,
+            {SCHEDULE_AMOUNT} AS amount,
+            {SCHEDULE_SEQUENCE_TYPE} AS sequence_type
+        {UPCOMING_SCHEDULE_CONDITIONS}
+        {filters}
+        ORDER BY mds.next_invoice_date ASC, mds.name ASC
+        LIMIT %(page_length)s OFFSET %(start)s
+    """,
+        {
+            "from_date": from_date,
+            "to_date": to_date,
+            "collection_date": collection_date,
+            "sequence_type": sequence_type,
+            "start": start,
+            "page_length": page_length,
+        },
+        as_dict=True,
+    )
+
+
+def summarize_by_date(groups: List[Dict]) -> List[Dict[str, Any]]:
+    """Fold (date, sequence_type) aggregate rows into one entry per date"""
+    by_date = {}
+    for group in groups:
+        entry = by_date.setdefault(
+            group["date"], {"date": group["date"], "count": 0, "total_amount": 0, "sequence_types": {}}
+        )
+        entry["count"] += cint(group["count"])
+        entry["total_amount"] += flt(group["total_amount"])
+        entry["sequence_types"][group["sequence_type"] or WITHOUT_MANDATE] = {
+            "count": cint(group["count"]),
+            "total_amount": flt(group["total_amount"]),
+        }
+
+    return list(by_date.values())
+
+
+def summarize_sequence_types(groups: List[Dict]) -> Dict[str, Dict[str, Any]]:
+    """Count and amount per sequence type over all dates"""
+    totals = {}
+    for group in groups:
+        total = totals.setdefault(group["sequence_type"] or WITHOUT_MANDATE, {"count": 0, "total_amount": 0})
+        total["count"] += cint(group["count"])
+        total["total_amount"] += flt(group["total_amount"])
+
+    return totals
+
+
+def page_bounds(start, page_length) -> Tuple[int, int]:
+    """Offset and length of a requested page, capped at MAX_PAGE_LENGTH rows"""
+    page_length = cint(page_length) or DEFAULT_PAGE_LENGTH
+    return max(cint(start), 0), min(max(page_length, 1), MAX_PAGE_LENGTH)
@@ -0,0 +1,422 @@
+"""
+SEPA Mandate Health
+
+Scores every SEPA mandate from its collection history: the share of failed
+and returned collections, the date of the last return, a missing IBAN and
+the date the mandate lapses (its expiry date, or 36 months after its last
+collection under the SEPA rulebook). SEPA Mandate Health stores the score
+with the usage and return counts behind it, one row per mandate, so
+lifecycle reports, health summaries and expiry alerts filter and aggregate
+that table instead of scoring every mandate on each request.
+
+Scores are rewritten when a mandate or one of its usage rows is saved and
+when a return file marks collections as returned. Scores that only change
+with the date (a mandate coming up to its lapse date, a return growing
+older) are recomputed by the daily rebuild.
+"""
+
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Tuple
+
+import frappe
+from frappe.utils import add_days, add_months, cint, flt, getdate, now, today
+
+from verenigingen.utils.derived_table import DerivedTable
+
+HEALTH_DOCTYPE = "SEPA Mandate Health"
+
+# SEPA rulebook: a mandate lapses 36 months after its last collection
+MANDATE_VALIDITY_MONTHS = 36
+# Returns within this many days lower the score
+RECENT_RETURN_DAYS = 90
+# Active mandates lapsing within this many days are reported as expiring
+EXPIRY_WARNING_DAYS = 90
+
+health_table = DerivedTable(
+    HEALTH_DOCTYPE,
+    [
+        "mandate",
+        "mandate_id",
+        "member",
+        "member_name",
+        "mandate_status",
+        "has_iban",
+        "health_score",
+        "health_status",
+        "sign_date",
+        "expiry_date",
+        "valid_until",
+        "usage_count",
+        "collected_count",
+        "failed_count",
+        "returned_count",
+        "total_collected",
+        "first_used",
+        "last_used",
+        "last_return_date",
+        "last_return_reason",
+    ],
+    "Mandate Health",
+)
+
+_MANDATE_QUERY = """
+    SELECT
+        sm.name, sm.mandate_id, sm.member, sm.member_name, sm.status, sm.iban, sm.sign_date, sm.expiry_date,
+        COALESCE(u.usage_count, 0) AS usage_count,
+        COALESCE(u.collected_count, 0) AS collected_count,
+        COALESCE(u.failed_count, 0) AS failed_count,
+        COALESCE(u.returned_count, 0) AS returned_count,
+        COALESCE(u.total_collected, 0) AS total_collected,
+        u.first_used, u.last_used, u.last_return_date,
+        (
+            SELECT r.failure_reason FROM `tabSEPA Mandate Usage` r
+            WHERE r.parent = sm.name AND r.parenttype = 'SEPA Mandate' AND r.status = 'Returned'
+            ORDER BY r.processing_date DESC, r.modified DESC
+            LIMIT 1
+        ) AS last_return_reason
+    FROM `tabSEPA Mandate` sm
+    LEFT JOIN (
+        SELECT
+            parent,
+            COUNT(*) AS usage_count,
+            SUM(status = 'Collected') AS collected_count,
+            SUM(status = 'Failed') AS failed_count,
+            SUM(status = 'Returned') AS returned_count,
+            SUM(CASE WHEN status = 'Collected' THEN amount ELSE 0 END) AS total_collected,
+            MIN(usage_date) AS first_used,
+            MAX(usage_date) AS last_used,
+            MAX(CASE WHEN status = 'Returned' THEN processing_date END) AS last_return_date
+        FROM `tabSEPA Mandate Usage`
+        WHERE parenttype = 'SEPA Mandate' {usage_condition}
+        GROUP BY parent
+    ) u ON u.parent = sm.name
+    WHERE sm.docstatus < 2 {mandate_condition}
+"""
+
+
+def refresh_mandate_health(mandates: Iterable[str]) -> int:
+    """
+    Rescore the given mandates from their current usage
+
+    Returns:
+        int: Number of mandates that still exist
+    """
+    return health_table.refresh(mandates, _score_mandates)
+
+
+def rebuild_mandate_health() -> Dict:
+    """
+    Daily task to rescore every mandate.
+
+    Ages the date-dependent parts of the score (lapsing mandates, returns
+    older than RECENT_RETURN_DAYS) and picks up mandates and usage rows
+    written without their hooks.
+    """
+    return health_table.rebuild(_score_all_mandates)
+
+
+def record_mandate_returns(returns: Iterable[Dict[str, Any]]) -> int:
+    """
+    Mark the mandate usages of returned or rejected collections and refresh their mandates
+
+    Args:
+        returns: Dicts with invoice, reason and optionally status
+            ("Returned" by default, "Failed" for rejections) and processing_date
+
+    Returns:
+        int: Number of mandates refreshed
+    """
+    groups = defaultdict(set)
+    for item in returns:
+        if item.get("invoice"):
+            key = (
+                item.get("status") or "Returned",
+                (item.get("reason") or "")[:140],
+                getdate(item.get("processing_date") or today()),
+            )
+            groups[key].add(item["invoice"])
+
+    if not groups:
+        return 0
+
+    invoices = set()
+    for (status, reason, processing_date), group in groups.items():
+        # One statement per status and reason; return files repeat a handful of reason codes
+        frappe.db.sql(
+            """
+            UPDATE `tabSEPA Mandate Usage`
+            SET status = %(status)s, failure_reason = %(reason)s, processing_date = %(processing_date)s,
+                modified = %(modified)s
+            WHERE parenttype = 'SEPA Mandate'
+            AND reference_doctype = 'Sales Invoice'
+            AND reference_name IN %(invoices)s
+        """,
+            {
+                "status": status,
+                "reason": reason,
+                "processing_date": processing_date,
+                "modified": now(),
+                "invoices": tuple(group),
+            },
+        )
+        invoices.update(group)
+
+    mandates = frappe.db.sql_list(
+        """
+        SELECT DISTINCT parent FROM `tabSEPA Mandate Usage`
+        WHERE parenttype = 'SEPA Mandate'
+        AND reference_doctype = 'Sales Invoice'
+        AND reference_name IN %(invoices)s
+    """,
+        {"invoices": tuple(invoices)},
+    )
+    return refresh_mandate_health(mandates)
+
+
+def score_mandate(row: Dict[str, Any], today_date=None) -> Tuple[int, str]:
+    """
+    Health score (0-100) and status of a mandate health row
+
+    Inactive mandates are not scored. Active mandates lose points for a
+    missing IBAN, for the share of failed and returned collections, for a
+    recent return and for lapsing soon; a lapsed mandate is critical.
+    """
+    if row.get("mandate_status") != "Active":
+        return 0, "Inactive"
+
+    today_date = getdate(today_date or today())
+    valid_until = getdate(row["valid_until"]) if row.get("valid_until") else None
+    if valid_until and valid_until < today_date:
+        return 0, "Critical"
+
+    score = 100
+    if not row.get("has_iban"):
+        score -= 50
+
+    usage_count = cint(row.get("usage_count"))
+    if usage_count:
+        failures = cint(row.get("failed_count")) + cint(row.get("returned_count"))
+        score -= round(50 * failures / usage_count)
+
+    last_return = row.get("last_return_date")
+    if last_return and (today_date - getdate(last_return)).days <= RECENT_RETURN_DAYS:
+        score -= 15
+
+    if valid_until:
+        days_left = (valid_until - today_date).days
+        if days_left <= 30:
+            score -= 30
+        elif days_left <= EXPIRY_WARNING_DAYS:
+            score -= 15
+
+    score = max(score, 0)
+    return score, "Healthy" if score >= 80 else "Attention" if score >= 50 else "Critical"
+
+
+def calculate_valid_until(sign_date, expiry_date, last_used):
+    """Date the mandate lapses: its expiry date or 36 months after last use, whichever is first"""
+    anchor = last_used or sign_date
+    lapse = getdate(add_months(anchor, MANDATE_VALIDITY_MONTHS)) if anchor else None
+    candidates = [getdate(date) for date in (expiry_date, lapse) if date]
+    return min(candidates) if candidates else None
+
+
+def get_mandate_health_summary() -> Dict[str, Any]:
+    """
+    Mandate counts, ages, health, usage recency and expiry from one aggregate query
+
+    Returns:
+        Dict with total, by_status (count and sign date ages per mandate
+        status), by_health, average_score, with_iban, usage and expiring
+    """
+    today_date = getdate(today())
+    rows = frappe.db.sql(
+        f"""
+        SELECT
+            mandate_status, health_status,
+            COUNT(*) AS count,
+            SUM(health_score) AS score_total,
+            SUM(has_iban) AS with_iban,
+            SUM(DATEDIFF(%(today)s, sign_date)) AS age_total,
+            COUNT(sign_date) AS dated,
+            MIN(sign_date) AS oldest_sign_date,
+            MAX(sign_date) AS newest_sign_date,
+            SUM(last_used >= %(last_30d)s) AS used_30d,
+            SUM(last_used >= %(last_90d)s) AS used_90d,
+            SUM(valid_until BETWEEN %(today)s AND %(expiry)s) AS expiring
+        FROM `tab{HEALTH_DOCTYPE}`
+        GROUP BY mandate_status, health_status
+    """,
+        {
+            "today": today_date,
+            "last_30d": add_days(today_date, -30),
+            "last_90d": add_days(today_date, -90),
+            "expiry": add_days(today_date, EXPIRY_WARNING_DAYS),
+        },
+        as_dict=True,
+    )
+
+    summary = {
+        "total": 0,
+        "by_status": {},
+        "by_health": defaultdict(int),
+        "average_score": 0.0,
+        "with_iban": 0,
+        "usage": {"frequent_usage": 0, "moderate_usage": 0, "low_usage": 0},
+        "expiring": 0,
+    }
+    ages = defaultdict(lambda: [0, 0])
+    active_count = active_score = 0
+
+    for row in rows:
+        count = cint(row["count"])
+        summary["total"] += count
+        summary["by_health"][row.health_status] += count
+        summary["with_iban"] += cint(row.with_iban)
+
+        status = summary["by_status"].setdefault(
+            row.mandate_status, {"count": 0, "oldest_sign_date": None, "newest_sign_date": None}
+        )
+        status["count"] += count
+        ages[row.mandate_status][0] += flt(row.age_total)
+        ages[row.mandate_status][1] += cint(row.dated)
+        for field, pick in (("oldest_sign_date", min), ("newest_sign_date", max)):
+            dates = [date for date in (status[field], row[field]) if date]
+            status[field] = pick(dates) if dates else None
+
+        if row.mandate_status == "Active":
+            active_count += count
+            active_score += flt(row.score_total)
+            summary["expiring"] += cint(row.expiring)
+            summary["usage"]["frequent_usage"] += cint(row.used_30d)
+            summary["usage"]["moderate_usage"] += cint(row.used_90d) - cint(row.used_30d)
+            summary["usage"]["low_usage"] += count - cint(row.used_90d)
+
+    for mandate_status, (age_total, dated) in ages.items():
+        summary["by_status"][mandate_status]["avg_age_days"] = age_total / dated if dated else None
+
+    summary["by_health"] = dict(summary["by_health"])
+    summary["average_score"] = active_score / active_count if active_count else 0.0
+    return summary
+
+
+def get_expiring_mandates(days: int = EXPIRY_WARNING_DAYS, limit: int = 100) -> List[Dict[str, Any]]:
+    """Active mandates lapsing within the given number of days, soonest first"""
+    today_date = getdate(today())
+    return frappe.get_all(
+        HEALTH_DOCTYPE,
+        filters={
+            "mandate_status": "Active",
+            "valid_until": ["between", [today_date, add_days(today_date, cint(days))]],
+        },
+        fields=["mandate", "mandate_id", "member", "member_name", "valid_until", "last_used", "health_score"],
+        order_by="valid_until asc",
+        limit_page_length=cint(limit),
+    )
+
+
+def count_expiring_mandates(days: int = EXPIRY_WARNING_DAYS) -> int:
+    today_date = getdate(today())
+    return frappe.db.count(
+        HEALTH_DOCTYPE,
+        {
+            "mandate_status": "Active",
+            "valid_until": ["between", [today_date, add_days(today_date, cint(days))]],
+        },
+    )
+
+
+def on_mandate_update(doc, method=None):
+    """SEPA Mandate on_update hook - rescore the mandate"""
+    health_table.refresh_logged([doc.name], _score_mandates, f"mandate {doc.name}")
+
+
+def on_mandate_usage_update(doc, method=None):
+    """SEPA Mandate Usage on_update hook - rescore the mandate of a usage saved on its own"""
+    if doc.get("parenttype") == "SEPA Mandate":
+        health_table.refresh_logged([doc.parent], _score_mandates, f"mandate {doc.parent}")
+
+
+def on_mandate_delete(doc, method=None):
+    """SEPA Mandate after_delete hook - drop the mandate's health row"""
+    health_table.refresh_logged([doc.name], _score_mandates, f"mandate {doc.name}")
+
+
+@frappe.whitelist()
+def get_mandate_expiry_alerts(days=EXPIRY_WARNING_DAYS, limit=100):
+    """
+    Active mandates that lapse soon
+
+    Args:
+        days: Look-ahead window in days
+        limit: Maximum number of mandates to return
+
+    Returns:
+        Dict with the total number of lapsing mandates and the first ones, soonest first
+    """
+    frappe.only_for(["System Manager", "Verenigingen Administrator", "Verenigingen Manager"])
+
+    return {
+        "count": count_expiring_mandates(days),
+        "mandates": get_expiring_mandates(days, limit),
+    }
+
+
+def _score_mandates(mandates: List[str]) -> List[tuple]:
+    rows = frappe.db.sql(
+        _MANDATE_QUERY.format(
+            usage_condition="AND parent IN %(mandates)s", mandate_condition="AND sm.name IN %(mandates)s"
+        ),
+        {"mandates": mandates},
+        as_dict=True,
+    )
+    return _health_rows(rows)
+
+
+def _score_all_mandates() -> List[tuple]:
+    return _health_rows(
+        frappe.db.sql(_MANDATE_QUERY.format(usage_condition="", mandate_condition=""), as_dict=True)
+    )
+
+
+def _health_rows(mandates: List[Dict]) -> List[tuple]:
+    """Scored health rows for mandates read with _MANDATE_QUERY"""
+    today_date = getdate(today())
+    values = []
+    for mandate in mandates:
+        row = {
+            "mandate_status": mandate.status,
+            "has_iban": 1 if mandate.iban else 0,
+            "valid_until": calculate_valid_until(mandate.sign_date, mandate.expiry_date, mandate.last_used),
+            "usage_count": cint(mandate.usage_count),
+            "failed_count": cint(mandate.failed_count),
+            "returned_count": cint(mandate.returned_count),
+            "last_return_date": mandate.last_return_date,
+        }
+        health_score, health_status = score_mandate(row, today_date)
+        values.append(
+            (
+                mandate.name,
+                mandate.name,
+                mandate.mandate_id,
+                mandate.member,
+                mandate.member_name,
+                mandate.status,
+                row["has_iban"],
+                health_score,
+                health_status,
+                mandate.sign_date,
+                mandate.expiry_date,
+                row["valid_until"],
+                row["usage_count"],
+                cint(mandate.collected_count),
+                row["failed_count"],
+                row["returned_count"],
+                flt(mandate.total_collected, 2),
+                mandate.first_used,
+                mandate.last_used,
+                mandate.last_return_date,
+                (mandate.last_return_reason or "")[:140] or None,
+            )
+        )
+    return values
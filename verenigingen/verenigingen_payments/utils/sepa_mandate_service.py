@@ -8,6 +8,71 @@ from typing import Dict, List, Optional, Tuple
 import frappe
 from frappe.utils import getdate, today
 
+# Unpaid SEPA invoices that a dues collection batch run picks up (aliases si,
+# mds, mem, paying_member and sm); shared by the batch run and its preview
+SEPA_INVOICE_FIELDS = """
+    si.name,
+    si.customer,
+    si.grand_total as amount,
+    si.currency,
+    si.posting_date,
+    si.due_date,
+    si.membership_dues_schedule_display as schedule_name,
+    si.custom_coverage_start_date,
+    si.custom_coverage_end_date,
+    si.custom_paying_for_member,
+    mds.member,
+    mds.membership,
+    COALESCE(paying_member.full_name, mem.full_name) as member_name,
+    sm.name as mandate_name,
+    sm.iban,
+    sm.bic,
+    sm.mandate_id as mandate_reference
+"""
+SEPA_INVOICE_CONDITIONS = """
+    FROM
+        `tabSales Invoice` si USE INDEX (idx_sepa_invoice_lookup)
+    JOIN `tabMembership Dues Schedule` mds ON si.membership_dues_schedule_display = mds.name
+    JOIN `tabMember` mem ON mds.member = mem.name
+    LEFT JOIN `tabMember` paying_member ON si.custom_paying_for_member = paying_member.name
+    JOIN `tabSEPA Mandate` sm ON sm.member = mem.name AND sm.status = 'Active'
+    WHERE
+        si.docstatus = 1
+        AND si.status IN ('Unpaid', 'Overdue')
+        AND si.outstanding_amount > 0
+        AND si.posting_date >= %(lookback_date)s
+        AND mds.payment_terms_template = 'SEPA Direct Debit'
+        AND sm.iban IS NOT NULL
+        AND sm.iban != ''
+        AND sm.mandate_id IS NOT NULL
+        -- Exclude invoices already in other batches
+        AND NOT EXISTS (
+            SELECT 1
+            FROM `tabDirect Debit Batch Invoice` ddi
+            JOIN `tabDirect Debit Batch` ddb ON ddi.parent = ddb.name
+            WHERE ddi.invoice = si.name AND ddb.docstatus != 2
+        )
+"""
+
+
+def sequence_type_sql(mandate_filter: str) -> str:
+    """
+    SQL expression for the expected sequence type of a collection
+
+    Same rule as get_mandate_sequence_type: RCUR once a mandate matching
+    mandate_filter (alias seq_sm) has a collected usage on or after its sign
+    date, FRST before that.
+    """
+    return f"""
+        CASE WHEN EXISTS (
+            SELECT 1
+            FROM `tabSEPA Mandate` seq_sm
+            JOIN `tabSEPA Mandate Usage` seq_smu
+                ON seq_smu.parent = seq_sm.name AND seq_smu.status = 'Collected'
+            WHERE {mandate_filter}
+                AND (seq_sm.sign_date IS NULL OR seq_smu.usage_date >= seq_sm.sign_date)
+        ) THEN 'RCUR' ELSE 'FRST' END"""
+
 
 class SEPAMandateService:
     """Centralized service for SEPA mandate operations with caching and batch processing"""
@@ -143,47 +208,10 @@ class SEPAMandateService:
 
         # Optimized query with explicit joins and index hints
         invoices = frappe.db.sql(
-            """
+            f"""
             SELECT
-                si.name,
-                si.customer,
-                si.grand_total as amount,
-                si.currency,
-                si.posting_date,
-                si.due_date,
-                si.membership_dues_schedule_display as schedule_name,
-                si.custom_coverage_start_date,
-                si.custom_coverage_end_date,
-                si.custom_paying_for_member,
-                mds.member,
-                mds.membership,
-                COALESCE(paying_member.full_name, mem.full_name) as member_name,
-                sm.name as mandate_name,
-                sm.iban,
-                sm.bic,
-                sm.mandate_id as mandate_reference
-            FROM
-                `tabSales Invoice` si USE INDEX (idx_sepa_invoice_lookup)
-            JOIN `tabMembership Dues Schedule` mds ON si.membership_dues_schedule_display = mds.name
-            JOIN `tabMember` mem ON mds.member = mem.name
-            LEFT JOIN `tabMember` paying_member ON si.custom_paying_for_member = paying_member.name
-            JOIN `tabSEPA Mandate` sm ON sm.member = mem.name AND sm.status = 'Active'
-            WHERE
-                si.docstatus = 1
-                AND si.status IN ('Unpaid', 'Overdue')
-                AND si.outstanding_amount > 0
-                AND si.posting_date >= %(lookback_date)s
-                AND mds.payment_terms_template = 'SEPA Direct Debit'
-                AND sm.iban IS NOT NULL
-                AND sm.iban != ''
-                AND sm.mandate_id IS NOT NULL
-                -- Exclude invoices already in other batches
-                AND NOT EXISTS (
-                    SELECT 1
-                    FROM `tabDirect Debit Batch Invoice` ddi
-                    JOIN `tabDirect Debit Batch` ddb ON ddi.parent = ddb.name
-                    WHERE ddi.invoice = si.name AND ddb.docstatus != 2
-                )
+                {SEPA_INVOICE_FIELDS}
+            {SEPA_INVOICE_CONDITIONS}
             ORDER BY
                 si.posting_date ASC,
                 si.grand_total DESC
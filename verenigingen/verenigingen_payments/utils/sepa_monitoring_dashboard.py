@@ -17,10 +17,17 @@ from typing import Any, Dict, List, Optional, Tuple
 
 import frappe
 from frappe import _
-from frappe.utils import cint, flt, get_datetime, now_datetime
+from frappe.utils import add_days, cint, flt, get_datetime, now_datetime, today
 
 from verenigingen.utils.error_handling import log_error
+from verenigingen.utils.operation_metrics import Histogram as OperationHistogram
+from verenigingen.utils.operation_metrics import OperationMetrics
 from verenigingen.utils.performance_dashboard import PerformanceMetrics
+from verenigingen.verenigingen_payments.utils.sepa_mandate_health import (
+    EXPIRY_WARNING_DAYS,
+    HEALTH_DOCTYPE,
+    get_mandate_health_summary,
+)
 from verenigingen.verenigingen_payments.utils.sepa_memory_optimizer import SEPAMemoryMonitor
 
 
@@ -32,7 +39,7 @@ class SEPAOperationMetric:
     execution_time_ms: float
     success: bool
     record_count: int
-    memory_usage_mb: float
+    memory_usage_mb: Optional[float]
     error_message: Optional[str] = None
     timestamp: datetime = None
 
@@ -41,20 +48,27 @@ class SEPAOperationMetric:
             self.timestamp = get_datetime()
 
 
+# Operation counts and latency histograms shared by all workers
+sepa_operation_metrics = OperationMetrics("sepa_operations")
+
+
 class SEPAMonitoringDashboard:
     """
     Enhanced monitoring dashboard specifically for SEPA operations
 
     Provides detailed insights into batch processing, mandate management,
     financial operations, and business metrics.
+
+    Counts, success rates and latency percentiles come from
+    sepa_operation_metrics and cover every worker; the recent operations
+    kept in memory only provide error messages and slow operation details
+    for this worker.
     """
 
     def __init__(self):
         self.memory_monitor = SEPAMemoryMonitor()
         self.performance_metrics = PerformanceMetrics()
-        self.sepa_metrics = deque(maxlen=1000)  # Keep last 1000 SEPA operations
-        self.batch_analytics = defaultdict(list)
-        self.mandate_analytics = defaultdict(int)
+        self.sepa_metrics = deque(maxlen=1000)  # Last 1000 SEPA operations of this worker
 
     def record_sepa_operation(
         self,
@@ -74,30 +88,18 @@ class SEPAMonitoringDashboard:
             record_count: Number of records processed
             error_message: Error message if operation failed
         """
-        # Get current memory usage
-        memory_snapshot = self.memory_monitor.take_snapshot()
-
-        # Create metric record
-        metric = SEPAOperationMetric(
-            operation_type=operation_type,
-            execution_time_ms=execution_time_ms,
-            success=success,
-            record_count=record_count,
-            memory_usage_mb=memory_snapshot.process_memory_mb,
-            error_message=error_message,
-        )
-
-        # Store metric
-        self.sepa_metrics.append(metric)
-
-        # Update analytics
-        self.batch_analytics[operation_type].append(
-            {
-                "execution_time_ms": execution_time_ms,
-                "success": success,
-                "record_count": record_count,
-                "timestamp": metric.timestamp,
-            }
+        sepa_operation_metrics.record(operation_type, execution_time_ms, success, record_count)
+
+        # Keep details for error analysis and alerts; memory is sampled by get_system_alerts
+        self.sepa_metrics.append(
+            SEPAOperationMetric(
+                operation_type=operation_type,
+                execution_time_ms=execution_time_ms,
+                success=success,
+                record_count=record_count,
+                memory_usage_mb=None,
+                error_message=error_message,
+            )
         )
 
         # Log slow operations
@@ -121,43 +123,42 @@ class SEPAMonitoringDashboard:
         Returns:
             SEPA performance summary
         """
-        cutoff_time = get_datetime() - timedelta(hours=hours)
-        recent_metrics = [m for m in self.sepa_metrics if m.timestamp >= cutoff_time]
+        operations = sepa_operation_metrics.summary(hours=hours)
 
-        if not recent_metrics:
+        if not operations:
             return {"message": "No SEPA operations in the specified time period", "time_period_hours": hours}
 
-        # Group by operation type
-        operation_stats = defaultdict(list)
-        for metric in recent_metrics:
-            operation_stats[metric.operation_type].append(metric)
-
+        total_operations = sum(stats["count"] for stats in operations.values())
         summary = {
-            "total_operations": len(recent_metrics),
+            "total_operations": total_operations,
             "time_period_hours": hours,
-            "overall_success_rate": sum(1 for m in recent_metrics if m.success) / len(recent_metrics) * 100,
-            "total_records_processed": sum(m.record_count for m in recent_metrics),
+            "overall_success_rate": sum(stats["success"] for stats in operations.values())
+            / total_operations
+            * 100,
+            "total_records_processed": sum(stats["records"] for stats in operations.values()),
             "operations": {},
         }
 
         # Calculate stats per operation type
-        for operation_type, metrics in operation_stats.items():
-            execution_times = [m.execution_time_ms for m in metrics]
-            record_counts = [m.record_count for m in metrics]
-            success_count = sum(1 for m in metrics if m.success)
-
+        for operation_type, stats in operations.items():
             summary["operations"][operation_type] = {
-                "operation_count": len(metrics),
-                "success_rate": (success_count / len(metrics)) * 100,
-                "total_records": sum(record_counts),
-                "avg_records_per_operation": statistics.mean(record_counts) if record_counts else 0,
-                "avg_execution_time_ms": statistics.mean(execution_times),
-                "min_execution_time_ms": min(execution_times),
-                "max_execution_time_ms": max(execution_times),
-                "p95_execution_time_ms": self._percentile(execution_times, 95),
-                "throughput_records_per_second": self._calculate_throughput(metrics),
-                "error_count": len(metrics) - success_count,
-                "last_execution": max(m.timestamp for m in metrics).isoformat(),
+                "operation_count": stats["count"],
+                "success_rate": stats["success"] / stats["count"] * 100,
+                "total_records": stats["records"],
+                "avg_records_per_operation": stats["records"] / stats["count"],
+                "avg_execution_time_ms": stats["avg_ms"],
+                "min_execution_time_ms": stats["min_ms"],
+                "max_execution_time_ms": stats["max_ms"],
+                "p50_execution_time_ms": stats["p50_ms"],
+                "p95_execution_time_ms": stats["p95_ms"],
+                "p99_execution_time_ms": stats["p99_ms"],
+                "throughput_records_per_second": stats["records"] / (stats["sum_ms"] / 1000)
+                if stats["sum_ms"] > 0
+                else 0.0,
+                "error_count": stats["failure"],
+                "last_execution": datetime.fromtimestamp(stats["last_at"]).isoformat()
+                if stats["last_at"]
+                else None,
             }
 
         return summary
@@ -174,11 +175,14 @@ class SEPAMonitoringDashboard:
         """
         cutoff_time = get_datetime() - timedelta(days=days)
 
-        # Get batch creation metrics
-        batch_metrics = [
+        # Batch creation metrics from all workers; failure details from this worker
+        batch_stats = sepa_operation_metrics.summary(hours=days * 24, operations=["batch_creation"]).get(
+            "batch_creation"
+        )
+        failed_operations = [
             m
             for m in self.sepa_metrics
-            if m.operation_type == "batch_creation" and m.timestamp >= cutoff_time
+            if m.operation_type == "batch_creation" and not m.success and m.timestamp >= cutoff_time
         ]
 
         # Get actual batch data from database
@@ -226,18 +230,16 @@ class SEPAMonitoringDashboard:
             analytics["daily_statistics"][day_key]["invoice_count"] += cint(batch.invoice_count)
 
         # Performance metrics from recorded operations
-        if batch_metrics:
-            execution_times = [m.execution_time_ms for m in batch_metrics]
+        if batch_stats:
             analytics["performance_metrics"] = {
-                "avg_creation_time_ms": statistics.mean(execution_times),
-                "min_creation_time_ms": min(execution_times),
-                "max_creation_time_ms": max(execution_times),
-                "p95_creation_time_ms": self._percentile(execution_times, 95),
-                "success_rate": sum(1 for m in batch_metrics if m.success) / len(batch_metrics) * 100,
+                "avg_creation_time_ms": batch_stats["avg_ms"],
+                "min_creation_time_ms": batch_stats["min_ms"],
+                "max_creation_time_ms": batch_stats["max_ms"],
+                "p95_creation_time_ms": batch_stats["p95_ms"],
+                "success_rate": batch_stats["success"] / batch_stats["count"] * 100,
             }
 
             # Error analysis
-            failed_operations = [m for m in batch_metrics if not m.success]
             for failed_op in failed_operations:
                 analytics["error_analysis"].append(
                     {
@@ -256,49 +258,47 @@ class SEPAMonitoringDashboard:
         Returns:
             Mandate health analysis
         """
-        # Get mandate statistics from database
-        mandate_stats = frappe.db.sql(
-            """
-            SELECT
-                status,
-                COUNT(*) as count,
-                AVG(DATEDIFF(NOW(), sign_date)) as avg_age_days,
-                MIN(sign_date) as oldest_mandate,
-                MAX(sign_date) as newest_mandate
-            FROM `tabSEPA Mandate`
-            WHERE docstatus = 1
-            GROUP BY status
-        """,
-            as_dict=True,
-        )
+        # Mandate counts and ages from the mandate health table
+        mandate_summary = get_mandate_health_summary()
+        mandate_stats = mandate_summary["by_status"]
 
-        # Get recent mandate operations
-        recent_mandate_metrics = [
-            m
-            for m in self.sepa_metrics
-            if m.operation_type in ["mandate_validation", "mandate_creation", "mandate_update"]
-            and m.timestamp >= get_datetime() - timedelta(hours=24)
-        ]
+        # Get recent mandate operations (all workers)
+        mandate_operations = sepa_operation_metrics.histograms(
+            hours=24, operations=["mandate_validation", "mandate_creation", "mandate_update"]
+        )
+        recent_mandate_metrics = OperationHistogram()
+        for histogram in mandate_operations.values():
+            recent_mandate_metrics.merge(histogram)
 
         # Check for problematic patterns
         problems = []
 
         # Analyze mandate age distribution
-        active_mandates = next((s for s in mandate_stats if s.status == "Active"), None)
-        if active_mandates and active_mandates.avg_age_days > 365:
+        active_mandates = mandate_stats.get("Active")
+        if active_mandates and (active_mandates["avg_age_days"] or 0) > 365:
             problems.append(
                 {
                     "type": "old_mandates",
                     "severity": "warning",
-                    "message": f"Active mandates are averaging {active_mandates.avg_age_days:.0f} days old",
+                    "message": "Active mandates are averaging "
+                    f"{active_mandates['avg_age_days']:.0f} days old",
+                }
+            )
+
+        # Active mandates that lapse soon (expiry date or 36 months without collection)
+        if mandate_summary["expiring"]:
+            problems.append(
+                {
+                    "type": "expiring_mandates",
+                    "severity": "warning",
+                    "message": f"{mandate_summary['expiring']} active mandates lapse within "
+                    f"{EXPIRY_WARNING_DAYS} days",
                 }
             )
 
         # Check for high failure rates in recent operations
-        if recent_mandate_metrics:
-            failure_rate = (
-                1 - sum(1 for m in recent_mandate_metrics if m.success) / len(recent_mandate_metrics)
-            ) * 100
+        if recent_mandate_metrics.count:
+            failure_rate = recent_mandate_metrics.failure / recent_mandate_metrics.count * 100
             if failure_rate > 10:  # More than 10% failure rate
                 problems.append(
                     {
@@ -309,22 +309,9 @@ class SEPAMonitoringDashboard:
                 )
 
         # Get inactive mandates with recent usage attempts
-        inactive_with_attempts = (
-            frappe.db.sql(
-                """
-            SELECT COUNT(DISTINCT sm.name) as count
-            FROM `tabSEPA Mandate` sm
-            JOIN `tabDirect Debit Batch Invoice` ddbi ON ddbi.invoice IN (
-                SELECT si.name FROM `tabSales Invoice` si
-                JOIN `tabMember` m ON m.customer = si.customer
-                WHERE m.name = sm.member
-            )
-            JOIN `tabDirect Debit Batch` ddb ON ddb.name = ddbi.parent
-            WHERE sm.status != 'Active'
-            AND ddb.creation >= DATE_SUB(NOW(), INTERVAL 7 DAY)
-        """
-            )[0][0]
-            or 0
+        inactive_with_attempts = frappe.db.count(
+            HEALTH_DOCTYPE,
+            {"mandate_status": ("!=", "Active"), "last_used": (">=", add_days(today(), -7))},
         )
 
         if inactive_with_attempts > 0:
@@ -337,27 +324,28 @@ class SEPAMonitoringDashboard:
             )
 
         return {
-            "mandate_distribution": {stat.status: stat.count for stat in mandate_stats},
+            "mandate_distribution": {status: stat["count"] for status, stat in mandate_stats.items()},
             "mandate_ages": {
-                stat.status: {
-                    "avg_age_days": stat.avg_age_days,
-                    "oldest_mandate": stat.oldest_mandate.isoformat() if stat.oldest_mandate else None,
-                    "newest_mandate": stat.newest_mandate.isoformat() if stat.newest_mandate else None,
+                status: {
+                    "avg_age_days": stat["avg_age_days"],
+                    "oldest_mandate": stat["oldest_sign_date"].isoformat()
+                    if stat["oldest_sign_date"]
+                    else None,
+                    "newest_mandate": stat["newest_sign_date"].isoformat()
+                    if stat["newest_sign_date"]
+                    else None,
                 }
-                for stat in mandate_stats
+                for status, stat in mandate_stats.items()
             },
+            "health_distribution": mandate_summary["by_health"],
+            "average_health_score": mandate_summary["average_score"],
+            "expiring_mandates": mandate_summary["expiring"],
             "recent_operations": {
-                "total_operations": len(recent_mandate_metrics),
-                "success_rate": sum(1 for m in recent_mandate_metrics if m.success)
-                / len(recent_mandate_metrics)
-                * 100
-                if recent_mandate_metrics
+                "total_operations": recent_mandate_metrics.count,
+                "success_rate": recent_mandate_metrics.success / recent_mandate_metrics.count * 100
+                if recent_mandate_metrics.count
                 else 100,
-                "avg_execution_time_ms": statistics.mean(
-                    [m.execution_time_ms for m in recent_mandate_metrics]
-                )
-                if recent_mandate_metrics
-                else 0,
+                "avg_execution_time_ms": recent_mandate_metrics.summary()["avg_ms"],
             },
             "health_problems": problems,
             "overall_health": "healthy"
@@ -464,21 +452,19 @@ class SEPAMonitoringDashboard:
         """
         alerts = []
 
-        # Check recent SEPA operation failures
-        recent_failures = [
-            m
-            for m in self.sepa_metrics
-            if not m.success and m.timestamp >= get_datetime() - timedelta(hours=1)
-        ]
+        # Check recent SEPA operation failures (sliding last hour, all workers)
+        recent_failures = round(
+            sum(counts["failure"] for counts in sepa_operation_metrics.window_counts(3600).values())
+        )
 
-        if len(recent_failures) > 5:
+        if recent_failures > 5:
             alerts.append(
                 {
                     "type": "high_failure_rate",
                     "severity": "critical",
-                    "message": f"{len(recent_failures)} SEPA operations failed in the last hour",
+                    "message": f"{recent_failures} SEPA operations failed in the last hour",
                     "timestamp": get_datetime().isoformat(),
-                    "details": {"failure_count": len(recent_failures)},
+                    "details": {"failure_count": recent_failures},
                 }
             )
 
@@ -637,31 +623,6 @@ class SEPAMonitoringDashboard:
 
         return recommendations or ["SEPA system performance is optimal. Continue regular monitoring."]
 
-    def _percentile(self, data: List[float], percentile: int) -> float:
-        """Calculate percentile of a dataset"""
-        if not data:
-            return 0.0
-
-        sorted_data = sorted(data)
-        index = (percentile / 100) * (len(sorted_data) - 1)
-
-        if index.is_integer():
-            return sorted_data[int(index)]
-        else:
-            lower = sorted_data[int(index)]
-            upper = sorted_data[int(index) + 1]
-            return lower + (upper - lower) * (index % 1)
-
-    def _calculate_throughput(self, metrics: List[SEPAOperationMetric]) -> float:
-        """Calculate throughput in records per second"""
-        if not metrics:
-            return 0.0
-
-        total_records = sum(m.record_count for m in metrics)
-        total_time_seconds = sum(m.execution_time_ms for m in metrics) / 1000
-
-        return total_records / total_time_seconds if total_time_seconds > 0 else 0.0
-
     def _calculate_avg_processing_days(self, financial_data: List[Dict[str, Any]]) -> float:
         """Calculate average processing days for batches"""
         if not financial_data:
@@ -763,6 +724,20 @@ def get_system_alerts() -> List[Dict[str, Any]]:
     return _sepa_dashboard.get_system_alerts()
 
 
+@frappe.whitelist()
+def get_sepa_prometheus_metrics():
+    """
+    SEPA operation counters and duration histograms for Prometheus scraping
+
+    Returns the totals of all workers in the Prometheus text exposition format.
+    """
+    frappe.only_for(["System Manager", "Verenigingen Administrator"])
+
+    frappe.response["result"] = sepa_operation_metrics.prometheus(metric_prefix="verenigingen_sepa_operation")
+    frappe.response["type"] = "txt"
+    frappe.response["doctype"] = "sepa_metrics"
+
+
 @frappe.whitelist()
 def record_sepa_operation(
     operation_type: str,
@@ -19,6 +19,12 @@ import frappe
 from frappe import _
 from frappe.utils import add_seconds, get_datetime, now
 
+from verenigingen.utils.distributed_lock import (
+    DistributedLock,
+    force_release,
+    get_lock_info,
+    holds_fencing_token,
+)
 from verenigingen.utils.error_handling import SEPAError, handle_api_error, log_error
 from verenigingen.utils.performance_utils import performance_monitor
 
@@ -34,14 +40,17 @@ class LockInfo:
     expires_at: datetime
     lock_type: str
     metadata: Dict[str, Any]
+    fencing_token: Optional[int] = None
 
 
 class SEPADistributedLock:
     """
-    Distributed locking system for SEPA operations using database-backed locks
+    Distributed locking system for SEPA operations
 
-    This system prevents race conditions in batch processing by implementing
-    Redis-style distributed locks using Frappe's database infrastructure.
+    Locks are kept in Redis by verenigingen.utils.distributed_lock: acquisition
+    is a single atomic script, waiting for a held lock listens for its release
+    instead of polling, and held locks are renewed every HEARTBEAT_INTERVAL so a
+    crashed worker's lock expires quickly while long batch runs keep theirs.
     """
 
     # Lock types
@@ -57,7 +66,6 @@ class SEPADistributedLock:
 
     def __init__(self):
         self.session_id = self._generate_session_id()
-        self._ensure_lock_table()
 
     def _generate_session_id(self) -> str:
         """Generate unique session ID for this lock instance"""
@@ -69,51 +77,6 @@ class SEPADistributedLock:
         session_data = f"{user}:{site}:{timestamp}:{random_part}"
         return hashlib.md5(session_data.encode(), usedforsecurity=False).hexdigest()[:16]
 
-    def _ensure_lock_table(self):
-        """Ensure distributed lock table exists"""
-        try:
-            # Check if table exists
-            exists = frappe.db.sql(
-                """
-                SELECT COUNT(*) as count
-                FROM information_schema.tables
-                WHERE table_schema = DATABASE()
-                AND table_name = 'tabSEPA_Distributed_Lock'
-            """,
-                as_dict=True,
-            )
-
-            if not exists or exists[0].count == 0:
-                # Create lock table
-                frappe.db.sql(
-                    """
-                    CREATE TABLE IF NOT EXISTS `tabSEPA_Distributed_Lock` (
-                        `name` varchar(255) NOT NULL PRIMARY KEY,
-                        `creation` datetime(6) DEFAULT NULL,
-                        `modified` datetime(6) DEFAULT NULL,
-                        `modified_by` varchar(255) DEFAULT NULL,
-                        `owner` varchar(255) DEFAULT NULL,
-                        `docstatus` int(1) NOT NULL DEFAULT 0,
-                        `lock_id` varchar(255) NOT NULL,
-                        `resource` varchar(255) NOT NULL,
-                        `lock_owner` varchar(255) NOT NULL,
-                        `acquired_at` datetime(6) NOT NULL,
-                        `expires_at` datetime(6) NOT NULL,
-                        `lock_type` varchar(100) NOT NULL,
-                        `metadata` longtext DEFAULT NULL,
-                        `is_active` tinyint(1) DEFAULT 1,
-                        INDEX `idx_resource_active` (`resource`, `is_active`),
-                        INDEX `idx_expires_at` (`expires_at`),
-                        INDEX `idx_lock_owner` (`lock_owner`)
-                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-                """
-                )
-                frappe.db.commit()
-
-        except Exception as e:
-            # Table might already exist or creation failed - continue
-            frappe.logger().warning(f"Lock table creation issue: {str(e)}")
-
     @contextmanager
     def acquire_lock(
         self, resource: str, lock_type: str = None, timeout: int = None, metadata: Dict[str, Any] = None
@@ -133,224 +96,101 @@ class SEPADistributedLock:
         Raises:
             SEPAError: If lock cannot be acquired
         """
-        lock_info = None
-        try:
-            lock_info = self._acquire_lock_internal(
-                resource=resource,
-                lock_type=lock_type or self.BATCH_CREATION_LOCK,
-                timeout=timeout or self.DEFAULT_TIMEOUT,
-                metadata=metadata or {},
-            )
+        with self.acquire_locks([resource], lock_type, timeout, metadata) as lock_info:
             yield lock_info
 
-        except Exception:
-            if lock_info:
-                # Ensure cleanup on error
-                self._release_lock_internal(lock_info.lock_id)
-            raise
-
-        finally:
-            if lock_info:
-                self._release_lock_internal(lock_info.lock_id)
-
-    def _acquire_lock_internal(
-        self, resource: str, lock_type: str, timeout: int, metadata: Dict[str, Any]
-    ) -> LockInfo:
+    @contextmanager
+    def acquire_locks(
+        self,
+        resources: List[str],
+        lock_type: str = None,
+        timeout: int = None,
+        metadata: Dict[str, Any] = None,
+    ):
         """
-        Internal method to acquire distributed lock
+        Context manager to lock several resources at once
+
+        All resources are acquired together or not at all, so operations on
+        overlapping sets (e.g. batches sharing invoices) exclude each other
+        without deadlocking.
 
         Args:
-            resource: Resource to lock
-            lock_type: Type of lock
-            timeout: Lock timeout in seconds
-            metadata: Lock metadata
+            resources: Resource identifiers to lock
+            lock_type: Type of lock (batch_creation, invoice_processing, etc.)
+            timeout: Seconds the lock survives without renewal, capped at HEARTBEAT_INTERVAL
+            metadata: Additional metadata to store with lock
 
-        Returns:
-            LockInfo if lock acquired
+        Yields:
+            LockInfo object if lock acquired successfully
 
         Raises:
             SEPAError: If lock cannot be acquired
         """
-        lock_id = self._generate_lock_id(resource, lock_type)
-        start_time = time.time()
-        attempt = 0
-
-        while time.time() - start_time < self.ACQUISITION_TIMEOUT:
-            attempt += 1
-
-            try:
-                # Clean up expired locks first
-                self._cleanup_expired_locks()
-
-                # Try to acquire lock atomically
-                acquired_at = get_datetime(now())
-                expires_at = acquired_at + timedelta(seconds=timeout)
-
-                # Use INSERT ... ON DUPLICATE KEY UPDATE for atomicity
-                frappe.db.sql(
-                    """
-                    INSERT INTO `tabSEPA_Distributed_Lock`
-                    (name, creation, modified, modified_by, owner,
-                     lock_id, resource, lock_owner, acquired_at, expires_at,
-                     lock_type, metadata, is_active)
-                    VALUES (%(name)s, %(now)s, %(now)s, %(user)s, %(user)s,
-                            %(lock_id)s, %(resource)s, %(owner)s, %(acquired_at)s, %(expires_at)s,
-                            %(lock_type)s, %(metadata)s, 1)
-                    ON DUPLICATE KEY UPDATE
-                    lock_id = IF(expires_at < %(now)s OR is_active = 0,
-                                VALUES(lock_id), lock_id),
-                    lock_owner = IF(expires_at < %(now)s OR is_active = 0,
-                                   VALUES(lock_owner), lock_owner),
-                    acquired_at = IF(expires_at < %(now)s OR is_active = 0,
-                                    VALUES(acquired_at), acquired_at),
-                    expires_at = IF(expires_at < %(now)s OR is_active = 0,
-                                   VALUES(expires_at), expires_at),
-                    modified = %(now)s,
-                    is_active = IF(expires_at < %(now)s OR is_active = 0, 1, is_active)
-                """,
-                    {
-                        "name": f"SEPA_LOCK_{resource}",
-                        "now": acquired_at,
-                        "user": frappe.session.user if frappe.session else "system",
-                        "lock_id": lock_id,
-                        "resource": resource,
-                        "owner": self.session_id,
-                        "acquired_at": acquired_at,
-                        "expires_at": expires_at,
-                        "lock_type": lock_type,
-                        "metadata": frappe.as_json(metadata),
-                    },
-                )
-
-                # Check if we got the lock
-                current_lock = frappe.db.get_value(
-                    "SEPA_Distributed_Lock",
-                    f"SEPA_LOCK_{resource}",
-                    ["lock_id", "lock_owner", "acquired_at", "expires_at", "is_active"],
-                    as_dict=True,
-                )
-
-                if (
-                    current_lock
-                    and current_lock.lock_id == lock_id
-                    and current_lock.lock_owner == self.session_id
-                    and current_lock.is_active
-                ):
-                    # Successfully acquired lock
-                    frappe.db.commit()
-
-                    return LockInfo(
-                        lock_id=lock_id,
-                        resource=resource,
-                        owner=self.session_id,
-                        acquired_at=current_lock.acquired_at,
-                        expires_at=current_lock.expires_at,
-                        lock_type=lock_type,
-                        metadata=metadata,
-                    )
-
-                # Lock is held by someone else
-                if current_lock and current_lock.is_active:
-                    owner_info = current_lock.lock_owner
-                    expires_info = current_lock.expires_at
-
-                    frappe.logger().debug(
-                        f"Lock acquisition attempt {attempt} failed: "
-                        f"resource={resource}, current_owner={owner_info}, "
-                        f"expires_at={expires_info}"
-                    )
-
-                # Wait with exponential backoff
-                wait_time = min(2**attempt * 0.1, 2.0)  # Max 2 seconds
-                time.sleep(wait_time)
-
-            except Exception as e:
-                frappe.db.rollback()
-                frappe.logger().error(f"Lock acquisition error on attempt {attempt}: {str(e)}")
-
-                if attempt >= 3:  # Give up after 3 attempts on errors
-                    break
-
-                time.sleep(0.5)
-
-        # Failed to acquire lock
-        current_lock_info = self._get_current_lock_info(resource)
-        error_msg = (
-            f"Failed to acquire lock for resource '{resource}' after {attempt} attempts. "
-            f"Lock held by: {current_lock_info.get('owner', 'unknown')} "
-            f"since {current_lock_info.get('acquired_at', 'unknown')}"
+        lock_type = lock_type or self.BATCH_CREATION_LOCK
+        ttl = min(timeout or self.DEFAULT_TIMEOUT, self.HEARTBEAT_INTERVAL)
+        lock = DistributedLock(
+            resources,
+            ttl=ttl,
+            wait=self.ACQUISITION_TIMEOUT,
+            metadata={"lock_type": lock_type, "session_id": self.session_id, **(metadata or {})},
         )
 
-        raise SEPAError(_(error_msg))
-
-    def _release_lock_internal(self, lock_id: str):
-        """
-        Release distributed lock
-
-        Args:
-            lock_id: Lock ID to release
-        """
         try:
-            frappe.db.sql(
-                """
-                UPDATE `tabSEPA_Distributed_Lock`
-                SET is_active = 0, modified = %s
-                WHERE lock_id = %s AND lock_owner = %s
-            """,
-                (now(), lock_id, self.session_id),
-            )
-
-            frappe.db.commit()
-
+            acquired = lock.acquire()
         except Exception as e:
-            frappe.logger().error(f"Error releasing lock {lock_id}: {str(e)}")
-
-    def _generate_lock_id(self, resource: str, lock_type: str) -> str:
-        """Generate unique lock ID"""
-        timestamp = str(int(time.time() * 1000))
-        lock_data = f"{resource}:{lock_type}:{self.session_id}:{timestamp}"
-        return hashlib.md5(lock_data.encode(), usedforsecurity=False).hexdigest()
+            raise SEPAError(_(f"Lock service unavailable: {str(e)}"))
+
+        if not acquired:
+            holder = next(filter(None, map(self._get_current_lock_info, lock.resources)), {})
+            raise SEPAError(
+                _(
+                    f"Failed to acquire lock for resource '{holder.get('resource', lock.resources[0])}' "
+                    f"within {self.ACQUISITION_TIMEOUT} seconds. "
+                    f"Lock held by: {holder.get('owner', 'unknown')} "
+                    f"since {holder.get('acquired_at', 'unknown')}"
+                )
+            )
 
-    def _cleanup_expired_locks(self):
-        """Clean up expired locks"""
         try:
-            current_time = now()
+            acquired_at = get_datetime(now())
+            resource = lock.resources[0]
+            if len(lock.resources) > 1:
+                resource = f"{resource} and {len(lock.resources) - 1} more"
 
-            # Mark expired locks as inactive
-            frappe.db.sql(
-                """
-                UPDATE `tabSEPA_Distributed_Lock`
-                SET is_active = 0, modified = %s
-                WHERE expires_at < %s AND is_active = 1
-            """,
-                (current_time, current_time),
-            )
-
-            # Delete very old inactive locks (older than 24 hours)
-            cleanup_time = add_seconds(current_time, -86400)  # 24 hours ago
-            frappe.db.sql(
-                """
-                DELETE FROM `tabSEPA_Distributed_Lock`
-                WHERE modified < %s AND is_active = 0
-            """,
-                (cleanup_time,),
+            yield LockInfo(
+                lock_id=lock.lock_id,
+                resource=resource,
+                owner=self.session_id,
+                acquired_at=acquired_at,
+                expires_at=acquired_at + timedelta(seconds=ttl),
+                lock_type=lock_type,
+                metadata=metadata or {},
+                fencing_token=lock.fencing_token,
             )
-
-        except Exception as e:
-            frappe.logger().warning(f"Lock cleanup error: {str(e)}")
+        finally:
+            lock.release()
 
     def _get_current_lock_info(self, resource: str) -> Dict[str, Any]:
         """Get information about current lock on resource"""
         try:
-            lock_info = frappe.db.get_value(
-                "SEPA_Distributed_Lock",
-                f"SEPA_LOCK_{resource}",
-                ["lock_owner", "acquired_at", "expires_at", "lock_type", "is_active"],
-                as_dict=True,
-            )
-            return lock_info or {}
+            lock_info = get_lock_info(resource)
         except Exception:
             return {}
+        if not lock_info:
+            return {}
+
+        metadata = lock_info.get("metadata") or {}
+        return {
+            "resource": resource,
+            "lock_id": lock_info.get("lock_id"),
+            "owner": metadata.get("session_id") or lock_info.get("owner"),
+            "user": lock_info.get("owner"),
+            "acquired_at": datetime.fromtimestamp(lock_info["acquired_at"]),
+            "expires_at": add_seconds(now(), lock_info["expires_in"]),
+            "lock_type": metadata.get("lock_type"),
+            "fencing_token": lock_info.get("fencing_token"),
+            "is_active": 1,
+        }
 
     def force_release_lock(self, resource: str, admin_override: bool = False) -> bool:
         """
@@ -367,16 +207,7 @@ class SEPADistributedLock:
             raise SEPAError(_("Only system managers can force release locks"))
 
         try:
-            frappe.db.sql(
-                """
-                UPDATE `tabSEPA_Distributed_Lock`
-                SET is_active = 0, modified = %s
-                WHERE resource = %s AND is_active = 1
-            """,
-                (now(), resource),
-            )
-
-            frappe.db.commit()
+            force_release(resource)
             return True
 
         except Exception as e:
@@ -416,8 +247,8 @@ class SEPABatchRaceConditionManager:
         if not invoice_names:
             raise SEPAError(_("No valid invoice names found"))
 
-        # Create resource identifier for this batch operation
-        batch_resource = f"batch_creation_{hashlib.md5(str(sorted(invoice_names)).encode(), usedforsecurity=False).hexdigest()[:16]}"
+        # Lock every invoice, so batches over overlapping invoice sets exclude each other
+        invoice_resources = [f"invoice:{name}" for name in invoice_names]
 
         # Metadata for lock
         lock_metadata = {
@@ -430,19 +261,25 @@ class SEPABatchRaceConditionManager:
         }
 
         # Use distributed lock for batch creation
-        with self.lock_manager.acquire_lock(
-            resource=batch_resource,
+        with self.lock_manager.acquire_locks(
+            resources=invoice_resources,
             lock_type=SEPADistributedLock.BATCH_CREATION_LOCK,
-            timeout=600,  # 10 minutes for batch creation
+            timeout=600,  # Renewed while held, so this only bounds how long a dead worker blocks
             metadata=lock_metadata,
         ) as lock_info:
             frappe.logger().info(f"Acquired batch creation lock: {lock_info.lock_id}")
 
             # Execute batch creation with transaction isolation
-            return self._execute_batch_creation_with_isolation(batch_data, invoice_names)
+            return self._execute_batch_creation_with_isolation(
+                batch_data, invoice_names, invoice_resources, lock_info.fencing_token
+            )
 
     def _execute_batch_creation_with_isolation(
-        self, batch_data: Dict[str, Any], invoice_names: List[str]
+        self,
+        batch_data: Dict[str, Any],
+        invoice_names: List[str],
+        locked_resources: List[str],
+        fencing_token: Optional[int],
     ) -> Dict[str, Any]:
         """
         Execute batch creation with transaction isolation
@@ -450,6 +287,8 @@ class SEPABatchRaceConditionManager:
         Args:
             batch_data: Batch creation data
             invoice_names: List of invoice names
+            locked_resources: Lock resources held for the invoices
+            fencing_token: Fencing token of that lock, checked before committing
 
         Returns:
             Result dictionary
@@ -485,11 +324,18 @@ class SEPABatchRaceConditionManager:
                 }
 
             # Step 4: Create the batch document
-            batch_doc = self._create_batch_document(batch_data, validation_result["validated_invoices"])
+            batch_doc = self._create_batch_document(
+                batch_data, validation_result["validated_invoices"], fencing_token
+            )
 
             # Step 5: Link invoices to batch
             self._link_invoices_to_batch(batch_doc, validation_result["validated_invoices"])
 
+            # Step 6: Only commit while still holding the invoice locks; if this worker
+            # stalled past the lock's expiry, another batch may already own the invoices
+            if not holds_fencing_token(locked_resources, fencing_token):
+                raise SEPAError(_("Invoice lock expired before the batch was committed"))
+
             # Commit transaction
             frappe.db.commit()
 
@@ -673,7 +519,10 @@ class SEPABatchRaceConditionManager:
         return result
 
     def _create_batch_document(
-        self, batch_data: Dict[str, Any], validated_invoices: List[Dict[str, Any]]
+        self,
+        batch_data: Dict[str, Any],
+        validated_invoices: List[Dict[str, Any]],
+        fencing_token: Optional[int] = None,
     ) -> Any:
         """
         Create the Direct Debit Batch document
@@ -681,6 +530,7 @@ class SEPABatchRaceConditionManager:
         Args:
             batch_data: Batch creation data
             validated_invoices: List of validated invoices
+            fencing_token: Fencing token of the invoice lock, recorded on the batch
 
         Returns:
             Created batch document
@@ -701,7 +551,8 @@ class SEPABatchRaceConditionManager:
             "Info",
             f"Batch created with race condition protection. "
             f"Processed {len(validated_invoices)} invoices. "
-            f"Session: {self.lock_manager.session_id}",
+            f"Session: {self.lock_manager.session_id}. "
+            f"Fencing token: {fencing_token}",
         )
 
         batch_doc.insert()
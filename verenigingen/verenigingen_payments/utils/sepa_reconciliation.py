@@ -13,6 +13,11 @@ from verenigingen.utils.security.authorization import (
     require_sepa_permission,
 )
 from verenigingen.verenigingen_payments.clients.settlements_client import SettlementsClient
+from verenigingen.verenigingen_payments.utils.sepa_return_processing import (
+    invoice_from_end_to_end_id,
+    iter_return_transactions,
+    process_return_transactions,
+)
 
 
 class PaymentReconciliationManager:
@@ -1054,71 +1059,40 @@ class PaymentReconciliationManager:
 def process_sepa_return_file(file_content, file_type="pain.002"):
     """Process SEPA return/status file from bank"""
 
-    PaymentReconciliationManager()
-
-    if file_type == "pain.002":
-        # Parse pain.002 status report
-        return_data = parse_pain002_file(file_content)
-    else:
-        # Parse other formats (MT940, CAMT, etc.)
+    if file_type not in ("pain.002", "camt.053", "camt.054"):
+        # Other formats (MT940, ...) carry no end-to-end status information
         frappe.throw(_("File type {0} not yet supported").format(file_type))
 
-    processed_count = 0
-
-    for return_item in return_data:
-        if return_item["status"] == "Rejected":
-            # Handle rejection
-            handle_payment_rejection(
-                return_item["end_to_end_id"], return_item["reason_code"], return_item["reason_text"]
-            )
-            processed_count += 1
-
-        elif return_item["status"] == "Accepted":
-            # Mark as successfully processed
-            mark_payment_successful(return_item["end_to_end_id"])
-            processed_count += 1
+    # Streamed and applied in bulk: one lookup per chunk of end-to-end IDs
+    result = process_return_transactions(iter_return_transactions(file_content))
 
-    return {"processed": processed_count, "total": len(return_data)}
+    return {"processed": result["rejected"] + result["returned"] + result["accepted"], **result}
 
 
 def parse_pain002_file(file_content):
-    """Parse pain.002 XML file"""
-    # Implementation would parse the XML and extract status information
-    # This is a placeholder for the actual XML parsing logic
+    """Parse a pain.002 XML file into a list of transaction statuses"""
+    return list(iter_return_transactions(file_content))
 
 
 def handle_payment_rejection(end_to_end_id, reason_code, reason_text):
-    """Handle rejected SEPA payment"""
-
-    # Extract invoice number from end-to-end ID
-    invoice_match = re.search(r"E2E-(.+)", end_to_end_id)
-    if not invoice_match:
-        return
-
-    invoice_name = invoice_match.group(1)
-
-    # Schedule retry
-    from verenigingen.utils.payment_retry import PaymentRetryManager
-
-    retry_manager = PaymentRetryManager()
-    retry_manager.schedule_retry(invoice_name, reason_code, reason_text)
+    """Handle rejected SEPA payment and return the rejected invoice"""
+    result = process_return_transactions(
+        [
+            {
+                "end_to_end_id": end_to_end_id,
+                "status": "Rejected",
+                "reason_code": reason_code,
+                "reason_text": reason_text,
+            }
+        ]
+    )
+    if result["rejected"]:
+        return invoice_from_end_to_end_id(end_to_end_id)
 
 
 def mark_payment_successful(end_to_end_id):
     """Mark payment as successful"""
-
-    # Extract invoice number from end-to-end ID
-    invoice_match = re.search(r"E2E-(.+)", end_to_end_id)
-    if not invoice_match:
-        return
-
-    invoice_name = invoice_match.group(1)
-
-    # Update invoice status
-    invoice = frappe.get_doc("Sales Invoice", invoice_name)
-    if invoice.status in ["Unpaid", "Overdue"]:
-        # Payment will be created when bank transaction is imported
-        invoice.add_comment("Comment", "SEPA payment accepted by bank")
+    process_return_transactions([{"end_to_end_id": end_to_end_id, "status": "Accepted"}])
 
 
 @frappe.whitelist()
@@ -0,0 +1,347 @@
+"""
+SEPA Return File Processing
+
+Processes bank status reports (pain.002) and return notifications (camt.053
+/ camt.054) in one pass. The file is parsed incrementally, so only the
+transactions of the chunk being processed are held in memory. Per chunk,
+end-to-end IDs are resolved to Direct Debit Batch Invoice rows with one
+query; status changes, SEPA Payment Retry records and mandate usage are then
+applied with a handful of set-based statements, and member notifications
+are sent by a background job.
+
+Processing is idempotent: batch invoices that are already marked failed are
+skipped, so a return file that is uploaded twice, or reprocessed after an
+error, does not schedule retries twice.
+"""
+
+import io
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import frappe
+from frappe.utils import flt, format_datetime, now_datetime
+
+# End-to-end IDs are generated as E2E-<invoice> (see DirectDebitBatch.generate_sepa_xml)
+E2E_PREFIX = "E2E-"
+# Transactions resolved and updated per round trip
+RETURN_CHUNK_SIZE = 1000
+# Unmatched end-to-end IDs listed in the processing summary
+MAX_UNMATCHED_LISTED = 100
+
+# pain.002 transaction statuses; pending statuses (PDNG) are not final and are skipped
+ACCEPTED_STATUSES = {"ACCP", "ACSC", "ACSP", "ACTC", "ACWC"}
+REJECTED_STATUSES = {"RJCT"}
+
+# Mandate usage status per kind of failure: rejections happen before settlement, returns after
+MANDATE_USAGE_STATUS = {"Rejected": "Failed", "Returned": "Returned"}
+
+
+def process_return_file(source, batch: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Process a pain.002 status report or camt.053/054 return notification
+
+    Args:
+        source: File path, file object or XML content
+        batch: Only match invoices of this Direct Debit Batch
+
+    Returns:
+        Processing summary (see process_return_transactions)
+    """
+    return process_return_transactions(iter_return_transactions(source), batch=batch)
+
+
+def iter_return_transactions(source) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the final transaction statuses of a pain.002 or camt file
+
+    Each item has end_to_end_id, status ("Accepted", "Rejected" or
+    "Returned"), reason_code, reason_text and amount. Elements are cleared
+    once read, so memory use does not grow with the file size.
+    """
+    if isinstance(source, str) and source.lstrip().startswith("<"):
+        source = source.encode()
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+
+    for _event, elem in ET.iterparse(source, events=("end",)):
+        tag = _local_name(elem.tag)
+        if tag == "TxInfAndSts":
+            item = _parse_status_transaction(elem)
+        elif tag == "TxDtls":
+            item = _parse_return_transaction(elem)
+        else:
+            if tag in ("OrgnlPmtInfAndSts", "Ntry"):
+                elem.clear()
+            continue
+
+        elem.clear()
+        if item:
+            yield item
+
+
+def process_return_transactions(
+    transactions: Iterable[Dict[str, Any]], batch: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Apply returned, rejected and accepted transactions to their batch invoices
+
+    Args:
+        transactions: Dicts with end_to_end_id, status ("Accepted",
+            "Rejected" or "Returned"), reason_code and reason_text
+        batch: Only match invoices of this Direct Debit Batch
+
+    Returns:
+        Dict with the number of transactions, rejected, returned, accepted,
+        already processed and unmatched ones, the first unmatched end-to-end
+        IDs, failures per batch and the scheduled and escalated retries
+    """
+    from verenigingen.utils.payment_retry import PaymentRetryManager
+
+    summary = {
+        "total": 0,
+        "rejected": 0,
+        "returned": 0,
+        "accepted": 0,
+        "already_processed": 0,
+        "unmatched": 0,
+        "unmatched_ids": [],
+        "batches": defaultdict(int),
+        "retries_scheduled": 0,
+        "retries_escalated": 0,
+    }
+    retry_manager = PaymentRetryManager()
+
+    chunk = []
+    for transaction in transactions:
+        chunk.append(transaction)
+        if len(chunk) >= RETURN_CHUNK_SIZE:
+            _process_chunk(chunk, batch, retry_manager, summary)
+            chunk = []
+    if chunk:
+        _process_chunk(chunk, batch, retry_manager, summary)
+
+    _log_batch_failures(summary["batches"])
+    summary["batches"] = dict(summary["batches"])
+    return summary
+
+
+def resolve_end_to_end_ids(end_to_end_ids: Iterable[str], batch: Optional[str] = None) -> Dict[str, Dict]:
+    """
+    Map end-to-end IDs to their Direct Debit Batch Invoice rows with one query
+
+    An invoice collected in several batches (retries) resolves to the row of
+    its most recent batch.
+    """
+    invoices = {}
+    for end_to_end_id in end_to_end_ids:
+        invoices[invoice_from_end_to_end_id(end_to_end_id)] = end_to_end_id
+
+    if not invoices:
+        return {}
+
+    batch_condition = "AND ddb.name = %(batch)s" if batch else ""
+    rows = frappe.db.sql(
+        f"""
+        SELECT
+            ddbi.name, ddbi.parent AS batch, ddbi.invoice, ddbi.member, ddbi.membership,
+            ddbi.amount, ddbi.status
+        FROM `tabDirect Debit Batch Invoice` ddbi
+        INNER JOIN `tabDirect Debit Batch` ddb ON ddb.name = ddbi.parent
+        WHERE ddbi.parenttype = 'Direct Debit Batch'
+        AND ddbi.invoice IN %(invoices)s
+        AND ddb.docstatus < 2
+        {batch_condition}
+        ORDER BY ddb.batch_date, ddb.creation
+    """,
+        {"invoices": tuple(invoices), "batch": batch},
+        as_dict=True,
+    )
+
+    # Later batches overwrite earlier ones
+    return {invoices[row.invoice]: row for row in rows}
+
+
+def invoice_from_end_to_end_id(end_to_end_id: str) -> str:
+    """Invoice name of an end-to-end ID generated for a batch invoice"""
+    return end_to_end_id[len(E2E_PREFIX) :] if end_to_end_id.startswith(E2E_PREFIX) else end_to_end_id
+
+
+def _process_chunk(chunk: List[Dict], batch: Optional[str], retry_manager, summary: Dict) -> None:
+    """Resolve and apply one chunk of transactions"""
+    summary["total"] += len(chunk)
+
+    # The last status reported for an end-to-end ID wins
+    latest = {}
+    for transaction in chunk:
+        if transaction.get("end_to_end_id"):
+            latest[transaction["end_to_end_id"]] = transaction
+        else:
+            summary["unmatched"] += 1
+
+    rows = resolve_end_to_end_ids(latest, batch)
+    failures, accepted = [], []
+    for end_to_end_id, transaction in latest.items():
+        row = rows.get(end_to_end_id)
+        if not row:
+            summary["unmatched"] += 1
+            if len(summary["unmatched_ids"]) < MAX_UNMATCHED_LISTED:
+                summary["unmatched_ids"].append(end_to_end_id)
+        elif row.status == "Failed" or (transaction["status"] == "Accepted" and row.status == "Successful"):
+            summary["already_processed"] += 1
+        elif transaction["status"] == "Accepted":
+            accepted.append(row.name)
+        else:
+            failures.append((row, transaction))
+
+    if accepted:
+        frappe.db.sql(
+            """
+            UPDATE `tabDirect Debit Batch Invoice`
+            SET status = 'Successful', modified = %(modified)s
+            WHERE name IN %(names)s
+        """,
+            {"names": tuple(accepted), "modified": now_datetime()},
+        )
+        summary["accepted"] += len(accepted)
+
+    if not failures:
+        return
+
+    _mark_failed(failures)
+
+    retries = retry_manager.schedule_retries(
+        {
+            "invoice": row.invoice,
+            "member": row.member,
+            "membership": row.membership,
+            "amount": row.amount,
+            "reason_code": transaction.get("reason_code"),
+            "reason_message": transaction.get("reason_text"),
+        }
+        for row, transaction in failures
+    )
+    summary["retries_scheduled"] += len(retries["scheduled"])
+    summary["retries_escalated"] += len(retries["escalated"])
+
+    from verenigingen.verenigingen_payments.utils.sepa_mandate_health import record_mandate_returns
+
+    try:
+        record_mandate_returns(
+            {
+                "invoice": row.invoice,
+                "reason": transaction.get("reason_code") or transaction.get("reason_text"),
+                "status": MANDATE_USAGE_STATUS[transaction["status"]],
+            }
+            for row, transaction in failures
+        )
+    except Exception as e:
+        frappe.log_error(f"Error updating mandate health for returns: {str(e)}", "Mandate Health")
+
+    for row, transaction in failures:
+        summary["rejected" if transaction["status"] == "Rejected" else "returned"] += 1
+        summary["batches"][row.batch] += 1
+
+
+def _mark_failed(failures: List) -> None:
+    """Mark batch invoices failed with one statement per reason"""
+    groups = defaultdict(list)
+    for row, transaction in failures:
+        groups[(transaction.get("reason_code"), transaction.get("reason_text"))].append(row.name)
+
+    timestamp = now_datetime()
+    for (reason_code, reason_text), names in groups.items():
+        frappe.db.sql(
+            """
+            UPDATE `tabDirect Debit Batch Invoice`
+            SET status = 'Failed', result_code = %(result_code)s, result_message = %(result_message)s,
+                modified = %(modified)s
+            WHERE name IN %(names)s
+        """,
+            {
+                "result_code": reason_code,
+                "result_message": reason_text,
+                "modified": timestamp,
+                "names": tuple(names),
+            },
+        )
+
+
+def _log_batch_failures(batches: Dict[str, int]) -> None:
+    """Add the number of failed payments to each batch log; fail batches without a successful invoice"""
+    timestamp = now_datetime()
+    for batch, count in batches.items():
+        frappe.db.sql(
+            """
+            UPDATE `tabDirect Debit Batch`
+            SET batch_log = CONCAT(COALESCE(batch_log, ''), %(message)s),
+                status = IF(
+                    EXISTS(
+                        SELECT 1 FROM `tabDirect Debit Batch Invoice`
+                        WHERE parent = %(batch)s AND status != 'Failed'
+                    ),
+                    status,
+                    'Failed'
+                ),
+                modified = %(modified)s
+            WHERE name = %(batch)s
+        """,
+            {
+                "batch": batch,
+                "message": f"{format_datetime(timestamp)}: Processed {count} returned payments\n",
+                "modified": timestamp,
+            },
+        )
+
+
+def _parse_status_transaction(elem) -> Optional[Dict[str, Any]]:
+    """pain.002 TxInfAndSts: final accepted or rejected status of a collection"""
+    status = _child_text(elem, "TxSts")
+    if status in REJECTED_STATUSES:
+        status = "Rejected"
+    elif status in ACCEPTED_STATUSES:
+        status = "Accepted"
+    else:
+        return None
+
+    return {
+        "end_to_end_id": _child_text(elem, "OrgnlEndToEndId"),
+        "status": status,
+        "reason_code": _child_text(elem, "StsRsnInf", "Rsn", "Cd"),
+        "reason_text": _child_text(elem, "StsRsnInf", "AddtlInf"),
+        "amount": flt(_child_text(elem, "OrgnlTxRef", "Amt", "InstdAmt")),
+    }
+
+
+def _parse_return_transaction(elem) -> Optional[Dict[str, Any]]:
+    """camt TxDtls: only transactions with return information are R-transactions"""
+    if _child(elem, "RtrInf") is None:
+        return None
+
+    return {
+        "end_to_end_id": _child_text(elem, "Refs", "EndToEndId"),
+        "status": "Returned",
+        "reason_code": _child_text(elem, "RtrInf", "Rsn", "Cd"),
+        "reason_text": _child_text(elem, "RtrInf", "AddtlInf"),
+        "amount": flt(_child_text(elem, "AmtDtls", "TxAmt", "Amt") or _child_text(elem, "Amt")),
+    }
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _child(elem, *path):
+    """Follow a path of child element names, ignoring XML namespaces"""
+    for name in path:
+        elem = next((child for child in elem if _local_name(child.tag) == name), None)
+        if elem is None:
+            return None
+    return elem
+
+
+def _child_text(elem, *path) -> Optional[str]:
+    elem = _child(elem, *path)
+    if elem is None or not elem.text:
+        return None
+    return elem.text.strip() or None
@@ -25,6 +25,15 @@ from frappe import _
 from frappe.utils import add_days, getdate, today
 
 from verenigingen.utils.error_handling import SEPAError, ValidationError, handle_api_error
+from verenigingen.utils.validation.iban_validator import validate_iban
+from verenigingen.verenigingen_payments.utils.sepa_validation_plan import (
+    MAX_AMOUNT,
+    MIN_AMOUNT,
+    SEPA_CHAR_PATTERN,
+    group_rows,
+    mandate_age_months,
+    validate_ibans,
+)
 from verenigingen.verenigingen_payments.utils.sepa_xml_enhanced_generator import (
     SEPALocalInstrument,
     SEPASequenceType,
@@ -85,10 +94,16 @@ class SEPARulebookValidator:
     - Country-specific requirements (focus on Netherlands)
     """
 
+    # Rules applicable per country, compiled once per process
+    _rule_sets: Dict[str, Tuple[SEPARule, ...]] = {}
+
     def __init__(self):
         self.namespace = {"sepa": "urn:iso:std:iso:20022:tech:xsd:pain.008.001.08"}
         self.rules = self._initialize_sepa_rules()
         self.validation_cache = {}
+        # Transaction columns of the document being validated, extracted on first use
+        self._columns_root = None
+        self._columns = None
 
     def _initialize_sepa_rules(self) -> List[SEPARule]:
         """Initialize SEPA rulebook rules"""
@@ -271,15 +286,7 @@ class SEPARulebookValidator:
             # Run all applicable rules
             issues = []
 
-            for rule in self.rules:
-                # Skip country-specific rules if not applicable
-                if (
-                    rule.rule_type == SEPARuleType.COUNTRY_SPECIFIC
-                    and rule.countries
-                    and country not in rule.countries
-                ):
-                    continue
-
+            for rule in self._get_rule_set(country):
                 # Run rule validation
                 rule_issues = self._validate_rule(rule, root, xml_content)
                 issues.extend(rule_issues)
@@ -335,6 +342,54 @@ class SEPARulebookValidator:
                 "error": str(e),
             }
 
+    def _get_rule_set(self, country: str) -> Tuple[SEPARule, ...]:
+        """Rules applicable to a country; country-specific rules of other countries are skipped"""
+        if country not in self._rule_sets:
+            self._rule_sets[country] = tuple(
+                rule
+                for rule in self.rules
+                if not (
+                    rule.rule_type == SEPARuleType.COUNTRY_SPECIFIC
+                    and rule.countries
+                    and country not in rule.countries
+                )
+            )
+        return self._rule_sets[country]
+
+    def _transaction_columns(self, root: ET.Element) -> Dict[str, List[Optional[str]]]:
+        """
+        Transaction fields of the document as columns, extracted in one pass
+
+        Transaction rules validate whole columns instead of searching the
+        document again per rule. The sequence type is read from the payment
+        information block the transaction belongs to. Missing elements are
+        None, empty ones "".
+        """
+        if self._columns_root is root:
+            return self._columns
+
+        fields = {
+            "end_to_end_id": ".//sepa:PmtId/sepa:EndToEndId",
+            "amount": "sepa:InstdAmt",
+            "mandate_id": ".//sepa:MndtRltdInf/sepa:MndtId",
+            "date_of_signature": ".//sepa:MndtRltdInf/sepa:DtOfSgntr",
+            "debtor_name": ".//sepa:Dbtr/sepa:Nm",
+            "debtor_iban": ".//sepa:DbtrAcct/sepa:Id/sepa:IBAN",
+            "remittance_info": ".//sepa:RmtInf/sepa:Ustrd",
+        }
+        columns = {column: [] for column in fields}
+        columns["sequence_type"] = []
+
+        for pmt_inf in root.iterfind(".//sepa:PmtInf", self.namespace):
+            sequence_type = pmt_inf.findtext(".//sepa:PmtTpInf/sepa:SeqTp", None, self.namespace)
+            for txn in pmt_inf.iterfind(".//sepa:DrctDbtTxInf", self.namespace):
+                columns["sequence_type"].append(sequence_type)
+                for column, xpath in fields.items():
+                    columns[column].append(txn.findtext(xpath, None, self.namespace))
+
+        self._columns_root, self._columns = root, columns
+        return columns
+
     def _validate_rule(self, rule: SEPARule, root: ET.Element, xml_content: str) -> List[ValidationIssue]:
         """Validate a specific SEPA rule"""
         issues = []
@@ -634,43 +689,48 @@ class SEPARulebookValidator:
     ) -> List[ValidationIssue]:
         """Validate mandate is not older than 36 months"""
         issues = []
+        today_date = date.today()
+        sign_dates = self._transaction_columns(root)["date_of_signature"]
+
+        # Months since signature per distinct date; None for an invalid date
+        ages = {}
+        for sign_date_text in group_rows(sign_dates):
+            if sign_date_text is None:
+                continue
+            try:
+                ages[sign_date_text] = mandate_age_months(
+                    datetime.fromisoformat(sign_date_text).date(), today_date
+                )
+            except ValueError:
+                ages[sign_date_text] = None
 
-        for mandate_elem in root.findall(".//sepa:MndtRltdInf", self.namespace):
-            sign_date_elem = mandate_elem.find("sepa:DtOfSgntr", self.namespace)
-
-            if sign_date_elem is not None:
-                try:
-                    sign_date = datetime.fromisoformat(sign_date_elem.text).date()
-                    today_date = date.today()
+        for sign_date_text in sign_dates:
+            if sign_date_text is None:
+                continue
 
-                    # Calculate months difference
-                    months_diff = (today_date.year - sign_date.year) * 12 + (
-                        today_date.month - sign_date.month
+            months_diff = ages[sign_date_text]
+            if months_diff is None:
+                issues.append(
+                    ValidationIssue(
+                        rule_id=rule.rule_id,
+                        severity=ValidationSeverity.ERROR,
+                        message="Invalid mandate signature date format",
+                        xpath="sepa:DtOfSgntr",
+                        element_value=sign_date_text,
+                        suggested_fix="Use ISO 8601 date format (YYYY-MM-DD)",
                     )
-
-                    if months_diff > 36:
-                        issues.append(
-                            ValidationIssue(
-                                rule_id=rule.rule_id,
-                                severity=rule.severity,
-                                message=f"Mandate is {months_diff} months old (maximum 36 months)",
-                                xpath="sepa:DtOfSgntr",
-                                element_value=sign_date_elem.text,
-                                suggested_fix="Obtain new mandate from debtor",
-                            )
-                        )
-
-                except ValueError:
-                    issues.append(
-                        ValidationIssue(
-                            rule_id=rule.rule_id,
-                            severity=ValidationSeverity.ERROR,
-                            message="Invalid mandate signature date format",
-                            xpath="sepa:DtOfSgntr",
-                            element_value=sign_date_elem.text,
-                            suggested_fix="Use ISO 8601 date format (YYYY-MM-DD)",
-                        )
+                )
+            elif months_diff > 36:
+                issues.append(
+                    ValidationIssue(
+                        rule_id=rule.rule_id,
+                        severity=rule.severity,
+                        message=f"Mandate is {months_diff} months old (maximum 36 months)",
+                        xpath="sepa:DtOfSgntr",
+                        element_value=sign_date_text,
+                        suggested_fix="Obtain new mandate from debtor",
                     )
+                )
 
         return issues
 
@@ -679,153 +739,89 @@ class SEPARulebookValidator:
     ) -> List[ValidationIssue]:
         """Validate SEPA character set usage"""
         issues = []
+        columns = self._transaction_columns(root)
 
-        # SEPA character set pattern
-        sepa_pattern = re.compile(r"^[a-zA-Z0-9\+\?\-\:\(\)\.\,\'\s/]*$")
-
-        # Check common text fields
+        # Check common text fields; transaction fields come from the extracted columns
         text_fields = [
-            ".//sepa:InitgPty/sepa:Nm",
-            ".//sepa:Cdtr/sepa:Nm",
-            ".//sepa:Dbtr/sepa:Nm",
-            ".//sepa:RmtInf/sepa:Ustrd",
+            (".//sepa:InitgPty/sepa:Nm", None),
+            (".//sepa:Cdtr/sepa:Nm", None),
+            (".//sepa:Dbtr/sepa:Nm", "debtor_name"),
+            (".//sepa:RmtInf/sepa:Ustrd", "remittance_info"),
         ]
 
-        for xpath in text_fields:
-            for elem in root.findall(xpath, self.namespace):
-                if elem.text and not sepa_pattern.match(elem.text):
+        for xpath, column in text_fields:
+            if column:
+                texts = columns[column]
+            else:
+                texts = [elem.text for elem in root.iterfind(xpath, self.namespace)]
+
+            invalid = {text for text in group_rows(texts) if text and not SEPA_CHAR_PATTERN.match(text)}
+            for text in texts:
+                if text in invalid:
                     issues.append(
                         ValidationIssue(
                             rule_id=rule.rule_id,
                             severity=rule.severity,
-                            message=f"Text contains non-SEPA characters: {elem.text[:50]}...",
+                            message=f"Text contains non-SEPA characters: {text[:50]}...",
                             xpath=xpath,
-                            element_value=elem.text,
+                            element_value=text,
                             suggested_fix="Remove or replace non-SEPA characters",
                         )
                     )
 
         return issues
 
-    # Additional validator methods for other rules...
-    def validate_frst_mandate_usage(
-        self, rule: SEPARule, root: ET.Element, xml_content: str
+    def _validate_mandate_id_usage(
+        self, rule: SEPARule, root: ET.Element, sequence_type: str
     ) -> List[ValidationIssue]:
-        """Validate FRST sequence type usage - first collection on mandate"""
+        """Validate the mandate IDs of the transactions collected with a sequence type"""
         issues = []
+        columns = self._transaction_columns(root)
 
-        # Find all FRST transactions
-        frst_transactions = root.findall(".//sepa:DrctDbtTxInf[.//sepa:SeqTp='FRST']", self.namespace)
-
-        for txn in frst_transactions:
-            mandate_elem = txn.find(".//sepa:MndtRltdInf/sepa:MndtId", self.namespace)
-            if mandate_elem is not None:
-                mandate_id = mandate_elem.text
+        for mandate_id, txn_sequence_type in zip(columns["mandate_id"], columns["sequence_type"]):
+            if txn_sequence_type != sequence_type or mandate_id is None:
+                continue
 
-                # FRST should be used only for first collection on this mandate
-                # In a real implementation, this would check mandate usage history
-                # For now, we validate the mandate ID format
-                if not mandate_id or len(mandate_id) > 35:
-                    issues.append(
-                        ValidationIssue(
-                            severity=ValidationSeverity.CRITICAL,
-                            rule_id=rule.rule_id,
-                            message="FRST mandate ID invalid or exceeds 35 characters",
-                            xpath=rule.xpath,
-                            element_value=mandate_id,
-                            suggested_fix="Use valid mandate ID (max 35 chars)",
-                        )
+            # The mandate usage history is checked when the batch is built;
+            # here we validate the mandate ID format
+            if not mandate_id or len(mandate_id) > 35:
+                issues.append(
+                    ValidationIssue(
+                        severity=ValidationSeverity.CRITICAL,
+                        rule_id=rule.rule_id,
+                        message=f"{sequence_type} mandate ID invalid or exceeds 35 characters",
+                        xpath=rule.xpath,
+                        element_value=mandate_id,
+                        suggested_fix="Use valid mandate ID (max 35 chars)",
                     )
+                )
 
         return issues
 
+    # Additional validator methods for other rules...
+    def validate_frst_mandate_usage(
+        self, rule: SEPARule, root: ET.Element, xml_content: str
+    ) -> List[ValidationIssue]:
+        """Validate FRST sequence type usage - first collection on mandate"""
+        return self._validate_mandate_id_usage(rule, root, "FRST")
+
     def validate_rcur_mandate_usage(
         self, rule: SEPARule, root: ET.Element, xml_content: str
     ) -> List[ValidationIssue]:
         """Validate RCUR sequence type usage - recurring collections"""
-        issues = []
-
-        # Find all RCUR transactions
-        rcur_transactions = root.findall(".//sepa:DrctDbtTxInf[.//sepa:SeqTp='RCUR']", self.namespace)
-
-        for txn in rcur_transactions:
-            mandate_elem = txn.find(".//sepa:MndtRltdInf/sepa:MndtId", self.namespace)
-            if mandate_elem is not None:
-                mandate_id = mandate_elem.text
-
-                # RCUR should only be used after FRST has been used
-                # Validate basic mandate ID requirements
-                if not mandate_id or len(mandate_id) > 35:
-                    issues.append(
-                        ValidationIssue(
-                            severity=ValidationSeverity.CRITICAL,
-                            rule_id=rule.rule_id,
-                            message="RCUR mandate ID invalid or exceeds 35 characters",
-                            xpath=rule.xpath,
-                            element_value=mandate_id,
-                            suggested_fix="Use valid mandate ID (max 35 chars)",
-                        )
-                    )
-
-        return issues
+        return self._validate_mandate_id_usage(rule, root, "RCUR")
 
     def validate_ooff_mandate_usage(
         self, rule: SEPARule, root: ET.Element, xml_content: str
     ) -> List[ValidationIssue]:
         """Validate OOFF sequence type usage - one-off collections"""
-        issues = []
-
-        # Find all OOFF transactions
-        ooff_transactions = root.findall(".//sepa:DrctDbtTxInf[.//sepa:SeqTp='OOFF']", self.namespace)
-
-        for txn in ooff_transactions:
-            mandate_elem = txn.find(".//sepa:MndtRltdInf/sepa:MndtId", self.namespace)
-            if mandate_elem is not None:
-                mandate_id = mandate_elem.text
-
-                # OOFF is for single-use mandates
-                if not mandate_id or len(mandate_id) > 35:
-                    issues.append(
-                        ValidationIssue(
-                            severity=ValidationSeverity.CRITICAL,
-                            rule_id=rule.rule_id,
-                            message="OOFF mandate ID invalid or exceeds 35 characters",
-                            xpath=rule.xpath,
-                            element_value=mandate_id,
-                            suggested_fix="Use valid mandate ID (max 35 chars)",
-                        )
-                    )
-
-        return issues
+        return self._validate_mandate_id_usage(rule, root, "OOFF")
 
     def validate_fnal_mandate_usage(
         self, rule: SEPARule, root: ET.Element, xml_content: str
     ) -> List[ValidationIssue]:
         """Validate FNAL sequence type usage - final collection on mandate"""
-        issues = []
-
-        # Find all FNAL transactions
-        fnal_transactions = root.findall(".//sepa:DrctDbtTxInf[.//sepa:SeqTp='FNAL']", self.namespace)
-
-        for txn in fnal_transactions:
-            mandate_elem = txn.find(".//sepa:MndtRltdInf/sepa:MndtId", self.namespace)
-            if mandate_elem is not None:
-                mandate_id = mandate_elem.text
-
-                # FNAL should be used for the last collection on this mandate
-                if not mandate_id or len(mandate_id) > 35:
-                    issues.append(
-                        ValidationIssue(
-                            severity=ValidationSeverity.CRITICAL,
-                            rule_id=rule.rule_id,
-                            message="FNAL mandate ID invalid or exceeds 35 characters",
-                            xpath=rule.xpath,
-                            element_value=mandate_id,
-                            suggested_fix="Use valid mandate ID (max 35 chars)",
-                        )
-                    )
-
-        return issues
+        return self._validate_mandate_id_usage(rule, root, "FNAL")
 
     def validate_transaction_limit(
         self, rule: SEPARule, root: ET.Element, xml_content: str
@@ -854,8 +850,6 @@ class SEPARulebookValidator:
         """Validate creditor IBAN"""
         issues = []
 
-        from verenigingen.utils.validation.iban_validator import validate_iban
-
         iban_elem = root.find(".//sepa:CdtrAcct/sepa:Id/sepa:IBAN", self.namespace)
         if iban_elem is not None:
             iban_result = validate_iban(iban_elem.text)
@@ -879,45 +873,53 @@ class SEPARulebookValidator:
     ) -> List[ValidationIssue]:
         """Validate transaction amounts"""
         issues = []
+        amounts = self._transaction_columns(root)["amount"]
 
-        for amount_elem in root.findall(".//sepa:DrctDbtTxInf/sepa:InstdAmt", self.namespace):
+        # Parse each distinct amount once; None for an invalid amount
+        parsed = {}
+        for amount_text in group_rows(amounts):
             try:
-                amount = Decimal(amount_elem.text)
-
-                if amount < Decimal("0.01"):
-                    issues.append(
-                        ValidationIssue(
-                            rule_id=rule.rule_id,
-                            severity=rule.severity,
-                            message=f"Transaction amount too small: {amount} (minimum 0.01)",
-                            xpath=rule.xpath,
-                            element_value=amount_elem.text,
-                            suggested_fix="Use minimum amount of 0.01 EUR",
-                        )
-                    )
-                elif amount > Decimal("999999999.99"):
-                    issues.append(
-                        ValidationIssue(
-                            rule_id=rule.rule_id,
-                            severity=rule.severity,
-                            message=f"Transaction amount too large: {amount} (maximum 999,999,999.99)",
-                            xpath=rule.xpath,
-                            element_value=amount_elem.text,
-                            suggested_fix="Split into multiple smaller transactions",
-                        )
-                    )
-
-            except (ValueError, TypeError):
+                parsed[amount_text] = Decimal(amount_text)
+            except (ArithmeticError, ValueError, TypeError):
+                parsed[amount_text] = None
+
+        for amount_text in amounts:
+            amount = parsed[amount_text]
+            if amount is None:
+                if amount_text is None:
+                    continue
                 issues.append(
                     ValidationIssue(
                         rule_id=rule.rule_id,
                         severity=ValidationSeverity.ERROR,
                         message="Invalid amount format",
                         xpath=rule.xpath,
-                        element_value=amount_elem.text,
+                        element_value=amount_text,
                         suggested_fix="Use decimal format with up to 2 decimal places",
                     )
                 )
+            elif amount < MIN_AMOUNT:
+                issues.append(
+                    ValidationIssue(
+                        rule_id=rule.rule_id,
+                        severity=rule.severity,
+                        message=f"Transaction amount too small: {amount} (minimum 0.01)",
+                        xpath=rule.xpath,
+                        element_value=amount_text,
+                        suggested_fix="Use minimum amount of 0.01 EUR",
+                    )
+                )
+            elif amount > MAX_AMOUNT:
+                issues.append(
+                    ValidationIssue(
+                        rule_id=rule.rule_id,
+                        severity=rule.severity,
+                        message=f"Transaction amount too large: {amount} (maximum 999,999,999.99)",
+                        xpath=rule.xpath,
+                        element_value=amount_text,
+                        suggested_fix="Split into multiple smaller transactions",
+                    )
+                )
 
         return issues
 
@@ -927,20 +929,11 @@ class SEPARulebookValidator:
         """Validate end-to-end ID uniqueness"""
         issues = []
 
-        end_to_end_ids = []
-        for elem in root.findall(".//sepa:PmtId/sepa:EndToEndId", self.namespace):
-            if elem.text:
-                end_to_end_ids.append(elem.text)
-
-        # Check for duplicates
-        seen = set()
-        duplicates = set()
-
-        for e2e_id in end_to_end_ids:
-            if e2e_id in seen:
-                duplicates.add(e2e_id)
-            else:
-                seen.add(e2e_id)
+        duplicates = [
+            e2e_id
+            for e2e_id, rows in group_rows(self._transaction_columns(root)["end_to_end_id"]).items()
+            if e2e_id and len(rows) > 1
+        ]
 
         if duplicates:
             issues.append(
@@ -957,13 +950,13 @@ class SEPARulebookValidator:
     def validate_debtor_iban(
         self, rule: SEPARule, root: ET.Element, xml_content: str
     ) -> List[ValidationIssue]:
-        """Validate debtor IBANs"""
+        """Validate debtor IBANs; each distinct IBAN is checked once and cached across batches"""
         issues = []
+        ibans = [iban for iban in self._transaction_columns(root)["debtor_iban"] if iban is not None]
+        results = validate_ibans(ibans)
 
-        from verenigingen.utils.validation.iban_validator import validate_iban
-
-        for iban_elem in root.findall(".//sepa:DbtrAcct/sepa:Id/sepa:IBAN", self.namespace):
-            iban_result = validate_iban(iban_elem.text)
+        for iban in ibans:
+            iban_result = results.get(iban) or validate_iban(iban)
 
             if not iban_result["valid"]:
                 issues.append(
@@ -972,7 +965,7 @@ class SEPARulebookValidator:
                         severity=rule.severity,
                         message=f"Invalid debtor IBAN: {iban_result['message']}",
                         xpath=rule.xpath,
-                        element_value=iban_elem.text,
+                        element_value=iban,
                         suggested_fix="Use a valid IBAN",
                     )
                 )
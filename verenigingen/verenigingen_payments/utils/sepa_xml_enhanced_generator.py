@@ -8,7 +8,6 @@ SEPA mandate types (OOFF, FRST, RCUR, FNAL).
 Implements Week 3 Day 3-4 requirements from the SEPA billing improvements project.
 """
 
-import re
 import xml.etree.ElementTree as ET
 from dataclasses import dataclass
 from datetime import date, datetime
@@ -23,6 +22,14 @@ from frappe.utils import format_datetime, getdate, today
 from verenigingen.utils.error_handling import SEPAError, ValidationError, handle_api_error
 from verenigingen.utils.performance_utils import performance_monitor
 from verenigingen.utils.validation.iban_validator import derive_bic_from_iban, validate_iban
+from verenigingen.verenigingen_payments.utils.sepa_validation_plan import (
+    MAX_AMOUNT,
+    SEPA_CHAR_PATTERN,
+    ColumnRule,
+    ValidationPlan,
+    is_valid_bic,
+    mandate_cache,
+)
 
 
 class SEPASequenceType(Enum):
@@ -145,7 +152,7 @@ class EnhancedSEPAXMLGenerator:
     MAX_TOWN_NAME_LENGTH = 35
 
     # SEPA character set (restricted to basic Latin)
-    SEPA_CHAR_PATTERN = re.compile(r"^[a-zA-Z0-9\+\?\-\:\(\)\.\,\'\s/]*$")
+    SEPA_CHAR_PATTERN = SEPA_CHAR_PATTERN
 
     def __init__(self):
         self.validation_errors = []
@@ -294,9 +301,8 @@ class EnhancedSEPAXMLGenerator:
                 f"{prefix}: Too many transactions ({len(payment_info.transactions)}, max 10,000)"
             )
 
-        # Validate transactions
-        for j, transaction in enumerate(payment_info.transactions):
-            self._validate_transaction(transaction, f"{prefix}, Transaction {j + 1}")
+        # Validate transactions column by column
+        self._validate_transactions(payment_info.transactions, prefix)
 
         # Validate sequence type consistency
         self._validate_sequence_type_consistency(payment_info, prefix)
@@ -332,78 +338,25 @@ class EnhancedSEPAXMLGenerator:
         if creditor.address_line_2 and len(creditor.address_line_2) > self.MAX_ADDRESS_LINE_LENGTH:
             self.validation_errors.append(f"{prefix}: Creditor address line 2 too long")
 
-    def _validate_transaction(self, transaction: SEPATransaction, prefix: str):
-        """Validate individual transaction"""
-        # End-to-end ID validation
-        if not transaction.end_to_end_id or len(transaction.end_to_end_id) > self.MAX_END_TO_END_ID_LENGTH:
-            self.validation_errors.append(
-                f"{prefix}: End-to-end ID must be 1-{self.MAX_END_TO_END_ID_LENGTH} characters"
-            )
-
-        # Amount validation
-        if transaction.amount <= 0:
-            self.validation_errors.append(f"{prefix}: Amount must be positive")
-
-        if transaction.amount > Decimal("999999999.99"):
-            self.validation_errors.append(f"{prefix}: Amount exceeds maximum allowed")
-
-        # Currency validation
-        if transaction.currency != "EUR":
-            self.validation_errors.append(f"{prefix}: Only EUR currency is supported in SEPA")
-
-        # Debtor validation
-        self._validate_debtor(transaction.debtor, prefix)
-
-        # Mandate validation
-        self._validate_mandate(transaction.mandate, prefix)
-
-        # Remittance info validation
-        if len(transaction.remittance_info) > self.MAX_REMITTANCE_INFO_LENGTH:
-            self.validation_errors.append(
-                f"{prefix}: Remittance info exceeds {self.MAX_REMITTANCE_INFO_LENGTH} characters"
-            )
-
-        if not self.SEPA_CHAR_PATTERN.match(transaction.remittance_info):
-            self.validation_errors.append(f"{prefix}: Remittance info contains invalid characters")
-
-    def _validate_debtor(self, debtor: SEPADebtor, prefix: str):
-        """Validate debtor information"""
-        # Name validation
-        if not debtor.name or len(debtor.name) > self.MAX_DEBTOR_NAME_LENGTH:
-            self.validation_errors.append(
-                f"{prefix}: Debtor name must be 1-{self.MAX_DEBTOR_NAME_LENGTH} characters"
-            )
-
-        if not self.SEPA_CHAR_PATTERN.match(debtor.name):
-            self.validation_errors.append(f"{prefix}: Debtor name contains invalid characters")
-
-        # IBAN validation
-        iban_result = validate_iban(debtor.iban)
-        if not iban_result["valid"]:
-            self.validation_errors.append(f"{prefix}: Invalid debtor IBAN: {iban_result['message']}")
-
-        # BIC validation (optional but if provided must be valid)
-        if debtor.bic and not self._validate_bic(debtor.bic):
-            self.validation_errors.append(f"{prefix}: Invalid debtor BIC format")
-
-    def _validate_mandate(self, mandate: SEPAMandate, prefix: str):
-        """Validate mandate information"""
-        # Mandate ID validation
-        if not mandate.mandate_id or len(mandate.mandate_id) > self.MAX_MANDATE_ID_LENGTH:
-            self.validation_errors.append(
-                f"{prefix}: Mandate ID must be 1-{self.MAX_MANDATE_ID_LENGTH} characters"
-            )
+    def _validate_transactions(self, transactions: List[SEPATransaction], prefix: str):
+        """
+        Validate all transactions of a payment info with the transaction validation plan
 
-        # Date of signature validation
-        if not mandate.date_of_signature:
-            self.validation_errors.append(f"{prefix}: Mandate date of signature is required")
-        elif mandate.date_of_signature > date.today():
-            self.validation_warnings.append(f"{prefix}: Mandate signature date is in the future")
+        Each check runs once per distinct value of its column; debtor and
+        mandate checks are cached per mandate across batches.
+        """
+        columns = {
+            "end_to_end_id": [transaction.end_to_end_id for transaction in transactions],
+            "amount": [transaction.amount for transaction in transactions],
+            "currency": [transaction.currency for transaction in transactions],
+            "mandate": [mandate_fingerprint(transaction) for transaction in transactions],
+            "date_of_signature": [transaction.mandate.date_of_signature for transaction in transactions],
+            "remittance_info": [transaction.remittance_info for transaction in transactions],
+        }
 
-        # Amendment validation
-        if mandate.amendment_indicator:
-            if not mandate.original_mandate_id:
-                self.validation_errors.append(f"{prefix}: Original mandate ID required for amendments")
+        for row, severity, message in TRANSACTION_VALIDATION_PLAN.run(columns):
+            findings = self.validation_errors if severity == "error" else self.validation_warnings
+            findings.append(f"{prefix}, Transaction {row + 1}: {message}")
 
     def _validate_sequence_type_consistency(self, payment_info: SEPAPaymentInfo, prefix: str):
         """Validate sequence type consistency within payment info"""
@@ -420,16 +373,7 @@ class EnhancedSEPAXMLGenerator:
 
     def _validate_bic(self, bic: str) -> bool:
         """Validate BIC format"""
-        if not bic:
-            return False
-
-        # BIC format: 8 or 11 characters
-        if len(bic) not in [8, 11]:
-            return False
-
-        # Basic format check: 4 letters + 2 letters + 2 alphanumeric + optional 3 alphanumeric
-        pattern = r"^[A-Z]{6}[A-Z0-9]{2}([A-Z0-9]{3})?$"
-        return bool(re.match(pattern, bic.upper()))
+        return is_valid_bic(bic)
 
     def _create_document_root(self) -> ET.Element:
         """Create document root element with proper namespaces"""
@@ -707,6 +651,101 @@ class EnhancedSEPAXMLGenerator:
         return {"errors": self.validation_errors, "warnings": self.validation_warnings}
 
 
+# Transaction validation plan: one rule per column, run once per distinct value
+
+
+def mandate_fingerprint(transaction: SEPATransaction) -> Tuple:
+    """Every debtor and mandate field checked by _check_mandate; a changed mandate is a cache miss"""
+    debtor, mandate = transaction.debtor, transaction.mandate
+    return (
+        debtor.name,
+        debtor.iban,
+        debtor.bic,
+        mandate.mandate_id,
+        bool(mandate.amendment_indicator),
+        mandate.original_mandate_id,
+    )
+
+
+def _check_end_to_end_id(end_to_end_id: str) -> List[Tuple[str, str]]:
+    max_length = EnhancedSEPAXMLGenerator.MAX_END_TO_END_ID_LENGTH
+    if not end_to_end_id or len(end_to_end_id) > max_length:
+        return [("error", f"End-to-end ID must be 1-{max_length} characters")]
+    return []
+
+
+def _check_amount(amount: Decimal) -> List[Tuple[str, str]]:
+    if amount <= 0:
+        return [("error", "Amount must be positive")]
+    if amount > MAX_AMOUNT:
+        return [("error", "Amount exceeds maximum allowed")]
+    return []
+
+
+def _check_currency(currency: str) -> List[Tuple[str, str]]:
+    return [] if currency == "EUR" else [("error", "Only EUR currency is supported in SEPA")]
+
+
+def _check_mandate(fingerprint: Tuple) -> List[Tuple[str, str]]:
+    """Debtor and mandate checks that do not depend on the date, cached per mandate"""
+    name, iban, bic, mandate_id, amendment_indicator, original_mandate_id = fingerprint
+    findings = []
+
+    max_name_length = EnhancedSEPAXMLGenerator.MAX_DEBTOR_NAME_LENGTH
+    if not name or len(name) > max_name_length:
+        findings.append(("error", f"Debtor name must be 1-{max_name_length} characters"))
+    if not SEPA_CHAR_PATTERN.match(name or ""):
+        findings.append(("error", "Debtor name contains invalid characters"))
+
+    iban_result = validate_iban(iban)
+    if not iban_result["valid"]:
+        findings.append(("error", f"Invalid debtor IBAN: {iban_result['message']}"))
+
+    # BIC is optional but if provided must be valid
+    if bic and not is_valid_bic(bic):
+        findings.append(("error", "Invalid debtor BIC format"))
+
+    max_mandate_id_length = EnhancedSEPAXMLGenerator.MAX_MANDATE_ID_LENGTH
+    if not mandate_id or len(mandate_id) > max_mandate_id_length:
+        findings.append(("error", f"Mandate ID must be 1-{max_mandate_id_length} characters"))
+
+    if amendment_indicator and not original_mandate_id:
+        findings.append(("error", "Original mandate ID required for amendments"))
+
+    return findings
+
+
+def _check_date_of_signature(date_of_signature: Optional[date]) -> List[Tuple[str, str]]:
+    # Depends on today, so never cached
+    if not date_of_signature:
+        return [("error", "Mandate date of signature is required")]
+    if date_of_signature > date.today():
+        return [("warning", "Mandate signature date is in the future")]
+    return []
+
+
+def _check_remittance_info(remittance_info: str) -> List[Tuple[str, str]]:
+    findings = []
+    max_length = EnhancedSEPAXMLGenerator.MAX_REMITTANCE_INFO_LENGTH
+    if len(remittance_info) > max_length:
+        findings.append(("error", f"Remittance info exceeds {max_length} characters"))
+    if not SEPA_CHAR_PATTERN.match(remittance_info):
+        findings.append(("error", "Remittance info contains invalid characters"))
+    return findings
+
+
+TRANSACTION_VALIDATION_PLAN = ValidationPlan(
+    [
+        ColumnRule("end_to_end_id", _check_end_to_end_id),
+        ColumnRule("amount", _check_amount),
+        ColumnRule("currency", _check_currency),
+        ColumnRule("mandate", _check_mandate, cache=mandate_cache),
+        ColumnRule("date_of_signature", _check_date_of_signature),
+        ColumnRule("remittance_info", _check_remittance_info),
+    ]
+)
+
+
 # Factory functions for creating SEPA objects from Frappe data
 
 
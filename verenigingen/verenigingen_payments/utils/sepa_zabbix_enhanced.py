@@ -7,6 +7,12 @@ monitoring of SEPA batch operations and dues invoicing.
 
 This module extends the existing Zabbix integration with detailed SEPA
 business metrics and operational intelligence.
+
+All metric families and the discovery data are collected together in one
+pass of consolidated aggregate queries. The snapshot is cached in Redis for
+SNAPSHOT_TTL seconds and shared by every poll, item and endpoint. When it
+expires, one worker collects a new snapshot while the others keep serving
+the previous one.
 """
 
 import json
@@ -19,11 +25,22 @@ import frappe
 from frappe import _
 from frappe.utils import cint, flt, get_datetime, now_datetime
 
+from verenigingen.utils.distributed_lock import DistributedLock
 from verenigingen.utils.error_handling import log_error
 from verenigingen.utils.performance_dashboard import _performance_dashboard
 from verenigingen.utils.security.security_monitoring import get_security_monitor
 from verenigingen.verenigingen_payments.utils.sepa_memory_optimizer import SEPAMemoryMonitor
-from verenigingen.verenigingen_payments.utils.sepa_monitoring_dashboard import get_dashboard_instance
+from verenigingen.verenigingen_payments.utils.sepa_monitoring_dashboard import (
+    get_dashboard_instance,
+    sepa_operation_metrics,
+)
+
+# Seconds a metrics snapshot is served before it is collected again
+SNAPSHOT_TTL = 30
+# Seconds an expired snapshot is kept for pollers while another worker collects a new one
+SNAPSHOT_STALE_TTL = 600
+SNAPSHOT_CACHE_KEY = "sepa_zabbix_metrics_snapshot"
+DISCOVERY_BATCH_LIMIT = 20
 
 
 class SEPAZabbixIntegration:
@@ -279,28 +296,8 @@ class SEPAZabbixIntegration:
             metrics = {}
             timestamp = int(time.time())
 
-            # Collect all metric values
-            batch_metrics = self._get_batch_metrics()
-            mandate_metrics = self._get_mandate_metrics()
-            financial_metrics = self._get_financial_metrics()
-            performance_metrics = self._get_performance_metrics()
-            business_metrics = self._get_business_metrics()
-            health_metrics = self._get_health_metrics()
-            security_metrics = self._get_security_metrics()
-
-            # Combine all metrics
-            all_metrics = {
-                **batch_metrics,
-                **mandate_metrics,
-                **financial_metrics,
-                **performance_metrics,
-                **business_metrics,
-                **health_metrics,
-                **security_metrics,
-            }
-
             # Format for Zabbix
-            for key, value in all_metrics.items():
+            for key, value in self.get_metrics_snapshot()["values"].items():
                 if key in self.zabbix_items:
                     metrics[key] = {
                         "value": value,
@@ -327,324 +324,233 @@ class SEPAZabbixIntegration:
                 "error": str(e),
             }
 
-    def _get_batch_metrics(self) -> Dict[str, Union[int, float]]:
-        """Get SEPA batch processing metrics"""
-        try:
-            today_start = get_datetime().replace(hour=0, minute=0, second=0, microsecond=0)
-
-            # Total batches
-            total_batches = frappe.db.count("Direct Debit Batch")
-
-            # Daily batches
-            daily_batches = frappe.db.count("Direct Debit Batch", {"creation": [">=", today_start]})
-
-            # Total amount with enhanced calculation
-            total_amount = self._calculate_total_batch_amount_optimized()
-
-            # Daily amount with enhanced calculation
-            daily_amount = self._calculate_daily_batch_amount_optimized(today_start)
-
-            # Success rate (last 24 hours)
-            last_24h = get_datetime() - timedelta(hours=24)
-            total_recent = frappe.db.count("Direct Debit Batch", {"creation": [">=", last_24h]})
-            successful_recent = frappe.db.count(
-                "Direct Debit Batch", {"creation": [">=", last_24h], "docstatus": 1}
-            )
-
-            success_rate = (successful_recent / total_recent * 100) if total_recent > 0 else 100
-
-            # Average processing time (simplified - would need actual timing data)
-            avg_processing_time = 5000.0  # Placeholder - implement actual timing
-
-            # Stuck batches (draft for more than 2 hours)
-            stuck_threshold = get_datetime() - timedelta(hours=2)
-            stuck_batches = frappe.db.count(
-                "Direct Debit Batch", {"status": "Draft", "creation": ["<", stuck_threshold]}
-            )
-
-            return {
-                "sepa.batch.count.total": total_batches,
-                "sepa.batch.count.daily": daily_batches,
-                "sepa.batch.amount.total": float(total_amount),
-                "sepa.batch.amount.daily": float(daily_amount),
-                "sepa.batch.success_rate": float(success_rate),
-                "sepa.batch.avg_processing_time": avg_processing_time,
-                "sepa.batch.stuck_count": stuck_batches,
-            }
-
-        except Exception as e:
-            frappe.logger().error(f"Error getting batch metrics: {str(e)}")
-            return {}
-
-    def _calculate_total_batch_amount_optimized(self) -> float:
-        """
-        Calculate total batch amount with SQL optimization and Python fallback
-
-        Follows the functional equivalence pattern from direct_debit_batch.py
-        for consistent NULL/None handling and defensive programming.
+    def get_metrics_snapshot(self, refresh: bool = False) -> Dict[str, Any]:
         """
-        try:
-            # Primary SQL approach with COALESCE for NULL handling
-            result = frappe.db.sql(
-                """
-                SELECT COALESCE(SUM(total_amount), 0)
-                FROM `tabDirect Debit Batch`
-                WHERE docstatus = 1
-            """
-            )
+        Get the cached metrics snapshot, collecting a new one when it has expired
 
-            if result and result[0] and result[0][0] is not None:
-                return float(result[0][0])
-            else:
-                return 0.0
-
-        except Exception as e:
-            # Fallback to Python iteration if SQL fails (graceful degradation)
-            frappe.logger().warning(
-                f"SQL aggregation failed for total batch amount, using Python fallback: {str(e)}"
-            )
-            return self._calculate_total_batch_amount_python()
+        Args:
+            refresh: Collect a new snapshot even if the cached one is fresh
 
-    def _calculate_total_batch_amount_python(self) -> float:
+        Returns:
+            Snapshot with collected_at, metric values and discovery batches
         """
-        Python fallback calculation functionally equivalent to SQL aggregation
+        cache = frappe.cache()
+        snapshot = cache.get_value(SNAPSHOT_CACHE_KEY)
+        if snapshot and not refresh and time.time() - snapshot["collected_at"] < SNAPSHOT_TTL:
+            return snapshot
 
-        Implements the same defensive programming patterns as direct_debit_batch.py:
-        - NULL/None handling equivalent to SQL COALESCE(total_amount, 0)
-        - Type safety with try/except blocks for conversion errors
-        - Currency precision with round(total, 2) for financial calculations
-        - Handles edge cases (strings, invalid data) gracefully
-        """
+        lock = DistributedLock([SNAPSHOT_CACHE_KEY], ttl=60, wait=0, auto_renew=False)
         try:
-            # Get batch data using Frappe ORM
-            batches = frappe.get_all("Direct Debit Batch", filters={"docstatus": 1}, fields=["total_amount"])
-
-            if not batches:
-                return 0.0
-
-            # Handle None/NULL values same way as SQL COALESCE(total_amount, 0)
-            # Also handle potential string values and invalid data types gracefully
-            total = 0.0
-            for batch in batches:
-                try:
-                    amount = batch.get("total_amount")
-                    if amount is None:
-                        # Same as SQL COALESCE(total_amount, 0)
-                        amount = 0.0
-                    elif isinstance(amount, str):
-                        # Handle string amounts (shouldn't happen but defensive programming)
-                        amount = float(amount) if amount.strip() else 0.0
-                    else:
-                        # Ensure it's a float for precision consistency with SQL
-                        amount = float(amount)
-
-                    total += amount
-
-                except (ValueError, TypeError, AttributeError):
-                    # Handle any conversion errors by treating as 0 (same as SQL COALESCE behavior)
-                    # This matches SQL behavior where invalid/NULL data becomes 0
-                    continue
-
-            # Ensure precision consistency with database currency handling
-            return round(total, 2)
+            acquired = lock.acquire()
+        except Exception:
+            acquired = False  # Lock service unavailable; collect without it
 
-        except Exception as e:
-            # Final fallback - log error and return 0
-            frappe.logger().error(f"Python fallback calculation failed for total batch amount: {str(e)}")
-            return 0.0
+        if snapshot and not acquired:
+            # Another worker is collecting; serve the previous snapshot meanwhile
+            return snapshot
 
-    def _calculate_daily_batch_amount_optimized(self, cutoff_date) -> float:
-        """
-        Calculate daily batch amount with SQL optimization and Python fallback
+        try:
+            snapshot = self._collect_snapshot()
+            cache.set_value(SNAPSHOT_CACHE_KEY, snapshot, expires_in_sec=SNAPSHOT_STALE_TTL)
+        finally:
+            if acquired:
+                lock.release()
+        return snapshot
+
+    def _collect_snapshot(self) -> Dict[str, Any]:
+        """Collect every metric family and the discovery data in one pass"""
+        values = {}
+        values.update(self._collect_database_metrics())
+        values.update(self._collect_operation_metrics())
+        values.update(self._get_performance_metrics())
+        values.update(self._get_health_metrics())
+        values.update(self._get_security_metrics())
+
+        return {"collected_at": time.time(), "values": values, "discovery": self._collect_discovery_data()}
+
+    def _collect_database_metrics(self) -> Dict[str, Union[int, float]]:
+        """Batch, mandate, financial, business and error metrics from three aggregate queries"""
+        now = get_datetime()
+        params = {
+            "today": now.replace(hour=0, minute=0, second=0, microsecond=0),
+            "last_1h": now - timedelta(hours=1),
+            "last_24h": now - timedelta(hours=24),
+            "last_7d": now - timedelta(days=7),
+            "last_30d": now - timedelta(days=30),
+            # Draft batches older than this are stuck
+            "stuck": now - timedelta(hours=2),
+            # Mandates signed before this are due for renewal
+            "expiring": now - timedelta(days=3 * 365),
+        }
 
-        Follows the functional equivalence pattern from direct_debit_batch.py
-        for consistent NULL/None handling and defensive programming.
-        """
         try:
-            # Primary SQL approach with COALESCE for NULL handling
-            result = frappe.db.sql(
+            counts = frappe.db.sql(
+                """
+                SELECT
+                    COUNT(*) AS total_mandates,
+                    COALESCE(SUM(sm.status = 'Active'), 0) AS active_mandates,
+                    COALESCE(SUM(sm.status = 'Active' AND sm.sign_date < %(expiring)s), 0)
+                        AS expiring_mandates,
+                    (
+                        SELECT COUNT(*) FROM `tabMembership Dues Schedule` WHERE status = 'Active'
+                    ) AS active_schedules,
+                    (
+                        SELECT COUNT(DISTINCT si.name)
+                        FROM `tabSales Invoice` si
+                        INNER JOIN `tabMembership Dues Schedule` mds ON mds.member = si.member
+                        WHERE si.creation >= %(today)s
+                        AND si.docstatus = 1
+                        AND mds.status = 'Active'
+                        AND si.member IS NOT NULL
+                    ) AS dues_invoices_today,
+                    (SELECT COUNT(*) FROM `tabError Log` WHERE creation >= %(last_1h)s) AS errors_last_hour
+                FROM `tabSEPA Mandate` sm
+            """,
+                params,
+                as_dict=True,
+            )[0]
+
+            batches = frappe.db.sql(
                 """
-                SELECT COALESCE(SUM(total_amount), 0)
+                SELECT
+                    COUNT(*) AS total_batches,
+                    COALESCE(SUM(creation >= %(today)s), 0) AS daily_batches,
+                    COALESCE(SUM(CASE WHEN docstatus = 1 THEN total_amount END), 0) AS total_amount,
+                    COALESCE(
+                        SUM(CASE WHEN docstatus = 1 AND creation >= %(today)s THEN total_amount END), 0
+                    ) AS daily_amount,
+                    COALESCE(SUM(creation >= %(last_24h)s), 0) AS recent_batches,
+                    COALESCE(SUM(creation >= %(last_24h)s AND docstatus = 1), 0) AS recent_submitted,
+                    COALESCE(SUM(status = 'Draft' AND creation < %(stuck)s), 0) AS stuck_batches
                 FROM `tabDirect Debit Batch`
-                WHERE creation >= %s AND docstatus = 1
             """,
-                (cutoff_date,),
-            )
+                params,
+                as_dict=True,
+            )[0]
 
-            if result and result[0] and result[0][0] is not None:
-                return float(result[0][0])
-            else:
-                return 0.0
+            # Every Direct Debit invoice once, with the batch it was collected in
+            invoices = frappe.db.sql(
+                """
+                SELECT
+                    COALESCE(SUM(CASE WHEN si.outstanding_amount > 0 THEN si.outstanding_amount END), 0)
+                        AS outstanding_amount,
+                    COALESCE(SUM(CASE WHEN ddb.creation >= %(last_30d)s THEN si.grand_total END), 0)
+                        AS invoiced_30d,
+                    COALESCE(
+                        SUM(CASE WHEN ddb.creation >= %(last_30d)s
+                            THEN si.grand_total - si.outstanding_amount END),
+                        0
+                    ) AS collected_30d,
+                    COALESCE(SUM(si.status IN ('Unpaid', 'Overdue') AND si.creation >= %(last_30d)s), 0)
+                        AS failed_collections,
+                    COALESCE(SUM(ddb.creation >= %(last_7d)s), 0) AS attempts_7d,
+                    COALESCE(SUM(ddb.creation >= %(last_7d)s AND si.status IN ('Unpaid', 'Overdue')), 0)
+                        AS failed_7d
+                FROM `tabSales Invoice` si
+                JOIN `tabDirect Debit Batch Invoice` ddbi ON ddbi.invoice = si.name
+                LEFT JOIN `tabDirect Debit Batch` ddb ON ddb.name = ddbi.parent
+                WHERE si.docstatus = 1
+            """,
+                params,
+                as_dict=True,
+            )[0]
 
         except Exception as e:
-            # Fallback to Python iteration if SQL fails (graceful degradation)
-            frappe.logger().warning(
-                f"SQL aggregation failed for daily batch amount, using Python fallback: {str(e)}"
-            )
-            return self._calculate_daily_batch_amount_python(cutoff_date)
-
-    def _calculate_daily_batch_amount_python(self, cutoff_date) -> float:
-        """
-        Python fallback calculation functionally equivalent to SQL aggregation for daily amounts
-
-        Implements the same defensive programming patterns as direct_debit_batch.py:
-        - NULL/None handling equivalent to SQL COALESCE(total_amount, 0)
-        - Type safety with try/except blocks for conversion errors
-        - Currency precision with round(total, 2) for financial calculations
-        - Handles edge cases (strings, invalid data) gracefully
-        """
-        try:
-            # Get batch data using Frappe ORM
-            batches = frappe.get_all(
-                "Direct Debit Batch",
-                filters={"creation": [">=", cutoff_date], "docstatus": 1},
-                fields=["total_amount"],
-            )
+            frappe.logger().error(f"Error getting SEPA database metrics: {str(e)}")
+            return {}
 
-            if not batches:
-                return 0.0
-
-            # Handle None/NULL values same way as SQL COALESCE(total_amount, 0)
-            # Also handle potential string values and invalid data types gracefully
-            total = 0.0
-            for batch in batches:
-                try:
-                    amount = batch.get("total_amount")
-                    if amount is None:
-                        # Same as SQL COALESCE(total_amount, 0)
-                        amount = 0.0
-                    elif isinstance(amount, str):
-                        # Handle string amounts (shouldn't happen but defensive programming)
-                        amount = float(amount) if amount.strip() else 0.0
-                    else:
-                        # Ensure it's a float for precision consistency with SQL
-                        amount = float(amount)
-
-                    total += amount
-
-                except (ValueError, TypeError, AttributeError):
-                    # Handle any conversion errors by treating as 0 (same as SQL COALESCE behavior)
-                    # This matches SQL behavior where invalid/NULL data becomes 0
-                    continue
-
-            # Ensure precision consistency with database currency handling
-            return round(total, 2)
+        recent_batches = cint(batches.recent_batches)
+        invoiced_30d = flt(invoices.invoiced_30d)
+        attempts_7d = cint(invoices.attempts_7d)
 
-        except Exception as e:
-            # Final fallback - log error and return 0
-            frappe.logger().error(f"Python fallback calculation failed for daily batch amount: {str(e)}")
-            return 0.0
+        return {
+            "sepa.batch.count.total": cint(batches.total_batches),
+            "sepa.batch.count.daily": cint(batches.daily_batches),
+            "sepa.batch.amount.total": flt(batches.total_amount, 2),
+            "sepa.batch.amount.daily": flt(batches.daily_amount, 2),
+            "sepa.batch.success_rate": cint(batches.recent_submitted) / recent_batches * 100
+            if recent_batches
+            else 100.0,
+            "sepa.batch.stuck_count": cint(batches.stuck_batches),
+            "sepa.mandate.count.active": cint(counts.active_mandates),
+            "sepa.mandate.count.total": cint(counts.total_mandates),
+            "sepa.mandate.expiring_count": cint(counts.expiring_mandates),
+            "sepa.financial.outstanding_amount": flt(invoices.outstanding_amount),
+            "sepa.financial.collection_rate": flt(invoices.collected_30d) / invoiced_30d * 100
+            if invoiced_30d > 0
+            else 100.0,
+            "sepa.financial.failed_collections": cint(invoices.failed_collections),
+            "sepa.business.dues_invoices_today": cint(counts.dues_invoices_today),
+            "sepa.business.active_schedules": cint(counts.active_schedules),
+            "sepa.business.payment_failures_rate": cint(invoices.failed_7d) / attempts_7d * 100
+            if attempts_7d
+            else 0.0,
+            # Approximate error rate (errors per hour as percentage)
+            "sepa.health.error_rate": float(min(cint(counts.errors_last_hour), 100)),
+        }
 
-    def _get_mandate_metrics(self) -> Dict[str, Union[int, float]]:
-        """Get SEPA mandate management metrics"""
+    def _collect_operation_metrics(self) -> Dict[str, float]:
+        """Batch creation time and mandate validation success rate over the last 24 hours"""
         try:
-            # Active mandates
-            active_mandates = frappe.db.count("SEPA Mandate", {"status": "Active"})
-
-            # Total mandates
-            total_mandates = frappe.db.count("SEPA Mandate")
-
-            # This would need actual validation tracking - placeholder calculation
-            validation_success_rate = 95.0  # Placeholder
-
-            # Expiring mandates (signed more than 3 years ago)
-            expiring_threshold = get_datetime() - timedelta(days=3 * 365)
-            expiring_mandates = (
-                frappe.db.sql(
-                    """
-                SELECT COUNT(*) FROM `tabSEPA Mandate`
-                WHERE status = 'Active'
-                AND sign_date < %s
-            """,
-                    (expiring_threshold,),
-                )[0][0]
-                or 0
+            operations = sepa_operation_metrics.summary(
+                hours=24, operations=["batch_creation", "mandate_validation"]
             )
-
-            return {
-                "sepa.mandate.count.active": active_mandates,
-                "sepa.mandate.count.total": total_mandates,
-                "sepa.mandate.validation_success_rate": float(validation_success_rate),
-                "sepa.mandate.expiring_count": expiring_mandates,
-            }
-
         except Exception as e:
-            frappe.logger().error(f"Error getting mandate metrics: {str(e)}")
-            return {}
-
-    def _get_financial_metrics(self) -> Dict[str, Union[int, float]]:
-        """Get SEPA financial metrics"""
-        try:
-            # Outstanding amount
-            outstanding_amount = (
-                frappe.db.sql(
-                    """
-                SELECT COALESCE(SUM(si.outstanding_amount), 0)
-                FROM `tabSales Invoice` si
-                JOIN `tabDirect Debit Batch Invoice` ddbi ON ddbi.invoice = si.name
-                WHERE si.docstatus = 1 AND si.outstanding_amount > 0
-            """
-                )[0][0]
-                or 0
-            )
+            frappe.logger().error(f"Error getting SEPA operation metrics: {str(e)}")
+            operations = {}
 
-            # Collection rate (last 30 days)
-            last_30d = get_datetime() - timedelta(days=30)
+        batch_creation = operations.get("batch_creation")
+        mandate_validation = operations.get("mandate_validation")
 
-            total_invoiced = (
-                frappe.db.sql(
-                    """
-                SELECT COALESCE(SUM(si.grand_total), 0)
-                FROM `tabSales Invoice` si
-                JOIN `tabDirect Debit Batch Invoice` ddbi ON ddbi.invoice = si.name
-                JOIN `tabDirect Debit Batch` ddb ON ddb.name = ddbi.parent
-                WHERE ddb.creation >= %s AND si.docstatus = 1
-            """,
-                    (last_30d,),
-                )[0][0]
-                or 0
-            )
+        # Defaults until operations have been recorded
+        return {
+            "sepa.batch.avg_processing_time": batch_creation["avg_ms"] if batch_creation else 5000.0,
+            "sepa.mandate.validation_success_rate": mandate_validation["success"]
+            / mandate_validation["count"]
+            * 100
+            if mandate_validation
+            else 95.0,
+        }
 
-            total_collected = (
-                frappe.db.sql(
-                    """
-                SELECT COALESCE(SUM(si.grand_total - si.outstanding_amount), 0)
-                FROM `tabSales Invoice` si
-                JOIN `tabDirect Debit Batch Invoice` ddbi ON ddbi.invoice = si.name
-                JOIN `tabDirect Debit Batch` ddb ON ddb.name = ddbi.parent
-                WHERE ddb.creation >= %s AND si.docstatus = 1
+    def _collect_discovery_data(self) -> List[Dict[str, str]]:
+        """Recent batches for low-level discovery"""
+        try:
+            recent_batches = frappe.db.sql(
+                """
+                SELECT name, status, total_amount, creation
+                FROM `tabDirect Debit Batch`
+                WHERE creation >= DATE_SUB(NOW(), INTERVAL 7 DAY)
+                ORDER BY creation DESC
+                LIMIT %s
             """,
-                    (last_30d,),
-                )[0][0]
-                or 0
+                (DISCOVERY_BATCH_LIMIT,),
+                as_dict=True,
             )
+        except Exception as e:
+            frappe.logger().error(f"Error getting SEPA discovery data: {str(e)}")
+            return []
 
-            collection_rate = (total_collected / total_invoiced * 100) if total_invoiced > 0 else 100
+        return [
+            {
+                "{#BATCH_NAME}": batch.name,
+                "{#BATCH_STATUS}": batch.status,
+                "{#BATCH_AMOUNT}": str(batch.total_amount),
+                "{#BATCH_DATE}": batch.creation.strftime("%Y-%m-%d"),
+            }
+            for batch in recent_batches
+        ]
 
-            # Failed collections (invoices with status indicating failure)
-            failed_collections = (
-                frappe.db.sql(
-                    """
-                SELECT COUNT(*)
-                FROM `tabSales Invoice` si
-                JOIN `tabDirect Debit Batch Invoice` ddbi ON ddbi.invoice = si.name
-                WHERE si.status IN ('Unpaid', 'Overdue')
-                AND si.creation >= %s
-            """,
-                    (last_30d,),
-                )[0][0]
-                or 0
-            )
+    def _get_batch_metrics(self) -> Dict[str, Union[int, float]]:
+        """Get SEPA batch processing metrics from the current snapshot"""
+        return self._get_snapshot_family("sepa.batch.")
 
-            return {
-                "sepa.financial.outstanding_amount": float(outstanding_amount),
-                "sepa.financial.collection_rate": float(collection_rate),
-                "sepa.financial.failed_collections": failed_collections,
-            }
+    def _get_mandate_metrics(self) -> Dict[str, Union[int, float]]:
+        """Get SEPA mandate management metrics from the current snapshot"""
+        return self._get_snapshot_family("sepa.mandate.")
 
-        except Exception as e:
-            frappe.logger().error(f"Error getting financial metrics: {str(e)}")
-            return {}
+    def _get_snapshot_family(self, prefix: str) -> Dict[str, Union[int, float]]:
+        values = self.get_metrics_snapshot()["values"]
+        return {key: value for key, value in values.items() if key.startswith(prefix)}
 
     def _get_performance_metrics(self) -> Dict[str, Union[int, float]]:
         """Get SEPA performance metrics"""
@@ -685,78 +591,6 @@ class SEPAZabbixIntegration:
             frappe.logger().error(f"Error getting performance metrics: {str(e)}")
             return {}
 
-    def _get_business_metrics(self) -> Dict[str, Union[int, float]]:
-        """Get SEPA business intelligence metrics"""
-        try:
-            today_start = get_datetime().replace(hour=0, minute=0, second=0, microsecond=0)
-
-            # Dues invoices generated today
-            dues_invoices_today = (
-                frappe.db.sql(
-                    """
-                SELECT COUNT(DISTINCT si.name)
-                FROM `tabSales Invoice` si
-                INNER JOIN `tabMembership Dues Schedule` mds ON mds.member = si.member
-                WHERE si.creation >= %s
-                AND si.docstatus = 1
-                AND mds.status = 'Active'
-                AND si.member IS NOT NULL
-            """,
-                    (today_start,),
-                )[0][0]
-                or 0
-            )
-
-            # Active dues schedules
-            active_schedules = frappe.db.count("Membership Dues Schedule", {"status": "Active"})
-
-            # Payment failure rate (last 7 days)
-            last_7d = get_datetime() - timedelta(days=7)
-
-            total_payment_attempts = (
-                frappe.db.sql(
-                    """
-                SELECT COUNT(*)
-                FROM `tabSales Invoice` si
-                JOIN `tabDirect Debit Batch Invoice` ddbi ON ddbi.invoice = si.name
-                JOIN `tabDirect Debit Batch` ddb ON ddb.name = ddbi.parent
-                WHERE ddb.creation >= %s AND si.docstatus = 1
-            """,
-                    (last_7d,),
-                )[0][0]
-                or 0
-            )
-
-            failed_payments = (
-                frappe.db.sql(
-                    """
-                SELECT COUNT(*)
-                FROM `tabSales Invoice` si
-                JOIN `tabDirect Debit Batch Invoice` ddbi ON ddbi.invoice = si.name
-                JOIN `tabDirect Debit Batch` ddb ON ddb.name = ddbi.parent
-                WHERE ddb.creation >= %s
-                AND si.docstatus = 1
-                AND si.status IN ('Unpaid', 'Overdue')
-            """,
-                    (last_7d,),
-                )[0][0]
-                or 0
-            )
-
-            payment_failure_rate = (
-                (failed_payments / total_payment_attempts * 100) if total_payment_attempts > 0 else 0
-            )
-
-            return {
-                "sepa.business.dues_invoices_today": dues_invoices_today,
-                "sepa.business.active_schedules": active_schedules,
-                "sepa.business.payment_failures_rate": float(payment_failure_rate),
-            }
-
-        except Exception as e:
-            frappe.logger().error(f"Error getting business metrics: {str(e)}")
-            return {}
-
     def _get_health_metrics(self) -> Dict[str, Union[int, float]]:
         """Get SEPA system health metrics"""
         try:
@@ -789,19 +623,10 @@ class SEPAZabbixIntegration:
             except Exception:
                 scheduler_status = 1
 
-            # Error rate (last hour)
-            last_1h = get_datetime() - timedelta(hours=1)
-
-            # Count recent errors from error log
-            error_count = frappe.db.count("Error Log", {"creation": [">=", last_1h]})
-
-            # Approximate error rate (errors per hour as percentage)
-            error_rate = min(error_count, 100)  # Cap at 100%
-
+            # The error rate is collected with the database metrics
             return {
                 "sepa.health.overall_status": overall_status,
                 "sepa.health.scheduler_status": scheduler_status,
-                "sepa.health.error_rate": float(error_rate),
             }
 
         except Exception as e:
@@ -875,34 +700,9 @@ class SEPAZabbixIntegration:
             Discovery data for dynamic item creation
         """
         try:
-            discovery_data = {"data": []}
-
-            # Discover SEPA batches for individual monitoring
-            recent_batches = frappe.db.sql(
-                """
-                SELECT name, status, total_amount, creation
-                FROM `tabDirect Debit Batch`
-                WHERE creation >= DATE_SUB(NOW(), INTERVAL 7 DAY)
-                ORDER BY creation DESC
-                LIMIT 20
-            """,
-                as_dict=True,
-            )
-
-            for batch in recent_batches:
-                discovery_data["data"].append(
-                    {
-                        "{#BATCH_NAME}": batch.name,
-                        "{#BATCH_STATUS}": batch.status,
-                        "{#BATCH_AMOUNT}": str(batch.total_amount),
-                        "{#BATCH_DATE}": batch.creation.strftime("%Y-%m-%d"),
-                    }
-                )
-
             # Note: Bank account discovery removed as Direct Debit Batch doesn't have bank_account field
             # This could be implemented by linking to SEPA Mandate bank details if needed
-
-            return discovery_data
+            return {"data": self.get_metrics_snapshot()["discovery"]}
 
         except Exception as e:
             log_error(e, context={"operation": "get_zabbix_discovery_data"}, module="sepa_zabbix_enhanced")
@@ -21,8 +21,37 @@ import frappe
 from frappe.utils import add_to_date, now
 
 from verenigingen.api.security_monitoring_dashboard import get_security_dashboard_data
+from verenigingen.utils.monitoring_metrics_store import get_dashboard_widgets, precomputed_widget
 from verenigingen.utils.security.security_monitoring import get_security_monitor
 
+# Widgets shown on the page, all served from the precomputed metrics store
+PAGE_WIDGETS = (
+    "system_metrics",
+    "recent_errors",
+    "audit_summary",
+    "alerts",
+    "performance_metrics",
+    # Phase 3 Enhancement: Advanced Analytics
+    "analytics_summary",
+    "trend_forecasts",
+    "compliance_metrics",
+    "optimization_insights",
+    "executive_summary",
+    # Security Monitoring Integration
+    "security_dashboard",
+    "security_framework_health",
+)
+
+BASIC_REFRESH_WIDGETS = (
+    "system_metrics",
+    "recent_errors",
+    "audit_summary",
+    "alerts",
+    "performance_metrics",
+    "security_dashboard",
+    "security_framework_health",
+)
+
 
 def get_context(context):
     """Get context for monitoring dashboard page"""
@@ -37,24 +66,8 @@ def get_context(context):
         )
 
     try:
-        context.update(
-            {
-                "system_metrics": get_system_metrics(),
-                "recent_errors": get_recent_errors(),
-                "audit_summary": get_audit_summary(),
-                "alerts": get_active_alerts(),
-                "performance_metrics": get_performance_metrics(),
-                # Phase 3 Enhancement: Advanced Analytics
-                "analytics_summary": get_analytics_summary(),
-                "trend_forecasts": get_trend_forecasts(),
-                "compliance_metrics": get_compliance_metrics(),
-                "optimization_insights": get_optimization_insights(),
-                "executive_summary": get_executive_summary(),
-                # Security Monitoring Integration
-                "security_dashboard": get_security_metrics_for_dashboard(),
-                "security_framework_health": get_security_framework_health(),
-            }
-        )
+        # Widgets are materialized by the scheduler; the page only reads stored values
+        context.update(get_dashboard_widgets(PAGE_WIDGETS))
     except Exception as e:
         frappe.log_error(f"Error loading monitoring dashboard: {str(e)}")
         # Provide fallback data
@@ -77,6 +90,7 @@ def get_context(context):
 
 
 @frappe.whitelist()
+@precomputed_widget("system_metrics")
 def get_system_metrics():
     """Get real-time system metrics"""
     try:
@@ -117,6 +131,7 @@ def get_system_metrics():
 
 
 @frappe.whitelist()
+@precomputed_widget("recent_errors")
 def get_recent_errors():
     """Get recent error summary"""
     try:
@@ -142,6 +157,7 @@ def get_recent_errors():
 
 
 @frappe.whitelist()
+@precomputed_widget("audit_summary")
 def get_audit_summary():
     """Get audit trail summary"""
     try:
@@ -170,6 +186,7 @@ def get_audit_summary():
 
 
 @frappe.whitelist()
+@precomputed_widget("alerts")
 def get_active_alerts():
     """Get active system alerts"""
     try:
@@ -189,6 +206,7 @@ def get_active_alerts():
 
 
 @frappe.whitelist()
+@precomputed_widget("performance_metrics")
 def get_performance_metrics():
     """Get performance metrics"""
     try:
@@ -341,16 +359,9 @@ def get_member_growth_rate():
 def refresh_dashboard_data():
     """Refresh all dashboard data"""
     try:
-        return {
-            "system_metrics": get_system_metrics(),
-            "recent_errors": get_recent_errors(),
-            "audit_summary": get_audit_summary(),
-            "alerts": get_active_alerts(),
-            "performance_metrics": get_performance_metrics(),
-            "security_dashboard": get_security_metrics_for_dashboard(),
-            "security_framework_health": get_security_framework_health(),
-            "timestamp": now(),
-        }
+        data = get_dashboard_widgets(BASIC_REFRESH_WIDGETS)
+        data["timestamp"] = now()
+        return data
     except Exception as e:
         frappe.log_error(f"Error refreshing dashboard data: {str(e)}")
         return {"error": str(e)}
@@ -384,6 +395,7 @@ def test_monitoring_system():
 
 
 @frappe.whitelist()
+@precomputed_widget("security_dashboard")
 def get_security_metrics_for_dashboard():
     """Get security metrics optimized for main dashboard display"""
     try:
@@ -428,6 +440,7 @@ def get_security_metrics_for_dashboard():
 
 
 @frappe.whitelist()
+@precomputed_widget("security_framework_health")
 def get_security_framework_health():
     """Get security framework health status"""
     try:
@@ -454,6 +467,7 @@ def get_security_framework_health():
 
 
 @frappe.whitelist()
+@precomputed_widget("unified_security_summary")
 def get_unified_security_summary():
     """Get unified security summary combining security monitoring with SEPA security"""
     try:
@@ -526,6 +540,7 @@ def get_unified_security_summary():
 
 
 @frappe.whitelist()
+@precomputed_widget("analytics_summary")
 def get_analytics_summary():
     """Get analytics summary for dashboard"""
     try:
@@ -566,6 +581,7 @@ def get_analytics_summary():
 
 
 @frappe.whitelist()
+@precomputed_widget("trend_forecasts")
 def get_trend_forecasts():
     """Get trend forecasts for dashboard"""
     try:
@@ -601,6 +617,7 @@ def get_trend_forecasts():
 
 
 @frappe.whitelist()
+@precomputed_widget("compliance_metrics")
 def get_compliance_metrics():
     """Get comprehensive compliance metrics for dashboard"""
     try:
@@ -624,6 +641,7 @@ def get_compliance_metrics():
 
 
 @frappe.whitelist()
+@precomputed_widget("optimization_insights")
 def get_optimization_insights():
     """Get performance optimization insights for dashboard"""
     try:
@@ -651,6 +669,7 @@ def get_optimization_insights():
 
 
 @frappe.whitelist()
+@precomputed_widget("executive_summary")
 def get_executive_summary():
     """Get executive summary for dashboard"""
     try:
@@ -824,25 +843,9 @@ def get_compliance_audit_report():
 def refresh_advanced_dashboard_data():
     """Refresh all advanced dashboard data including analytics"""
     try:
-        return {
-            # Original data
-            "system_metrics": get_system_metrics(),
-            "recent_errors": get_recent_errors(),
-            "audit_summary": get_audit_summary(),
-            "alerts": get_active_alerts(),
-            "performance_metrics": get_performance_metrics(),
-            # Phase 3 analytics data
-            "analytics_summary": get_analytics_summary(),
-            "trend_forecasts": get_trend_forecasts(),
-            "compliance_metrics": get_compliance_metrics(),
-            "optimization_insights": get_optimization_insights(),
-            "executive_summary": get_executive_summary(),
-            # Security monitoring integration
-            "security_dashboard": get_security_metrics_for_dashboard(),
-            "security_framework_health": get_security_framework_health(),
-            "unified_security_summary": get_unified_security_summary(),
-            "timestamp": now(),
-        }
+        data = get_dashboard_widgets(PAGE_WIDGETS + ("unified_security_summary",))
+        data["timestamp"] = now()
+        return data
     except Exception as e:
         frappe.log_error(f"Error refreshing advanced dashboard data: {str(e)}")
         return {"error": str(e)}